@@ -62,8 +62,8 @@ DATABASES["default"]["ATOMIC_REQUESTS"] = True
 
 # DuckDB Configuration
 # ------------------------------------------------------------------------------
-ICFES_DUCKDB_PATH = str(BASE_DIR.parent.parent / 'dbt' /
-                        'icfes_processing' / 'dev.duckdb')
+ICFES_DUCKDB_PATH = env("ICFES_DUCKDB_PATH", default=str(BASE_DIR.parent.parent / 'dbt' /
+                        'icfes_processing' / 'dev.duckdb'))
 # https://docs.djangoproject.com/en/stable/ref/settings/#std:setting-DEFAULT_AUTO_FIELD
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
@@ -92,11 +92,41 @@ WSGI_APPLICATION = "config.wsgi.application"
 # Public base URL used for canonical, OG tags, robots and sitemaps.
 PUBLIC_SITE_URL = env("PUBLIC_SITE_URL", default="")
 INDEXNOW_KEY = env("INDEXNOW_KEY", default="")
+INDEXNOW_ENDPOINT = env("INDEXNOW_ENDPOINT", default="https://api.indexnow.org/indexnow")
 PERF_LOGGING_ENABLED = env.bool("PERF_LOGGING_ENABLED", default=False)
 CACHE_DEBUG_HEADER_ENABLED = env.bool("CACHE_DEBUG_HEADER_ENABLED", default=False)
 PAYMENTS_DEBUG_LOGS = env.bool("PAYMENTS_DEBUG_LOGS", default=False)
 TRAFFIC_ANALYTICS_ENABLED = env.bool("TRAFFIC_ANALYTICS_ENABLED", default=False)
 TRAFFIC_ANALYTICS_DEBUG_LOGS = env.bool("TRAFFIC_ANALYTICS_DEBUG_LOGS", default=False)
+# Days of RailwayTrafficLog kept in Postgres; `archive_traffic_logs` moves older days
+# to Parquet here (railway.py points it at the /app/data volume).
+TRAFFIC_RETENTION_DAYS = env.int("TRAFFIC_RETENTION_DAYS", default=30)
+TRAFFIC_ARCHIVE_DIR = env("TRAFFIC_ARCHIVE_DIR", default=str(BASE_DIR / "traffic_archive"))
+# ETag/Last-Modified (304) on public pages, derived from the loaded dataset version.
+CONDITIONAL_GET_ENABLED = env.bool("CONDITIONAL_GET_ENABLED", default=True)
+# Part of the ETag so template/code deploys invalidate it (Railway injects the commit SHA).
+HTTP_TEMPLATE_VERSION = env(
+    "HTTP_TEMPLATE_VERSION", default=env("RAILWAY_GIT_COMMIT_SHA", default="dev")
+)
+# Purge-by-tag endpoint of the edge/CDN (Cloudflare purge_cache format); empty = Redis only.
+EDGE_PURGE_URL = env("EDGE_PURGE_URL", default="")
+EDGE_PURGE_TOKEN = env("EDGE_PURGE_TOKEN", default="")
+# Shared secret sent by `manage.py warm_cache` (X-Cache-Warm): skips rate limit and traffic logging.
+CACHE_WARM_TOKEN = env("CACHE_WARM_TOKEN", default="")
+# Run `warm_cache --post-deploy` from gunicorn's when_ready hook (gunicorn.conf.py).
+CACHE_WARM_ON_DEPLOY = env.bool("CACHE_WARM_ON_DEPLOY", default=False)
+# Boot warm-up per gunicorn worker (gunicorn.conf.py); /health/ is 503 until it finishes.
+WORKER_WARMUP_ENABLED = env.bool("WORKER_WARMUP_ENABLED", default=True)
+WORKER_WARMUP_CONNECTIONS = env.int("WORKER_WARMUP_CONNECTIONS", default=4)
+WORKER_WARMUP_ATTEMPTS = env.int("WORKER_WARMUP_ATTEMPTS", default=3)
+# Threads per worker that evaluate dashboard bundle panels (each on a DuckDB cursor).
+DASHBOARD_BUNDLE_WORKERS = env.int("DASHBOARD_BUNDLE_WORKERS", default=4)
+# Directory of the full-population SHAP Parquet tables (`manage.py build_shap_population`);
+# empty = icfes_dashboard/ml/artifacts.
+SHAP_POPULATION_DIR = env("SHAP_POPULATION_DIR", default="")
+# Encoded students per school for the what-if engine (`manage.py build_what_if_population`);
+# empty = icfes_dashboard/ml/artifacts/what_if_population.npz.
+WHAT_IF_POPULATION_PATH = env("WHAT_IF_POPULATION_PATH", default="")
 
 # APPS
 # ------------------------------------------------------------------------------
@@ -194,6 +224,8 @@ MIDDLEWARE = [
     "reback.middleware.perf_logging.PerfLoggingMiddleware",
     "reback.middleware.traffic_ingest.TrafficIngestMiddleware",
     "reback.middleware.perf_logging.CacheDebugHeaderMiddleware",
+    # Innermost: 304 for public pages before the view runs (still logged above)
+    "reback.middleware.conditional_get.DatasetConditionalGetMiddleware",
 ]
 
 # STATIC
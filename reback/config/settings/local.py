@@ -65,6 +65,12 @@ INTERNAL_IPS = ["127.0.0.1", "10.0.2.2"]
 # https://django-extensions.readthedocs.io/en/latest/installation_instructions.html#configuration
 INSTALLED_APPS += ["django_extensions"]
 
+# Celery
+# ------------------------------------------------------------------------------
+# Sin worker en local las tareas (PDFs) corren en el mismo proceso.
+# CELERY_TASK_ALWAYS_EAGER=False para probar con `celery -A config worker`.
+CELERY_TASK_ALWAYS_EAGER = env.bool("CELERY_TASK_ALWAYS_EAGER", default=True)
+
 # Your stuff...
 # ------------------------------------------------------------------------------
 
@@ -64,6 +64,8 @@ MIDDLEWARE = [
     "reback.middleware.perf_logging.PerfLoggingMiddleware",
     "reback.middleware.perf_logging.CacheDebugHeaderMiddleware",
     "reback.middleware.traffic_ingest.TrafficIngestMiddleware",
+    # Innermost: 304 for public pages before the view runs (still logged above)
+    "reback.middleware.conditional_get.DatasetConditionalGetMiddleware",
 ]
 
 # DATABASES
@@ -100,6 +102,14 @@ CACHES = {
     }
 }
 
+# CELERY
+# ------------------------------------------------------------------------------
+# railway.json only starts gunicorn: without a worker service the PDF reports
+# are built inside the request (still cached per dataset version). After adding
+# a service running `celery -A config worker -l info`, set
+# CELERY_TASK_ALWAYS_EAGER=False on the web service.
+CELERY_TASK_ALWAYS_EAGER = env.bool("CELERY_TASK_ALWAYS_EAGER", default=True)
+
 # SECURITY
 # ------------------------------------------------------------------------------
 SECURE_PROXY_SSL_HEADER = ("HTTP_X_FORWARDED_PROTO", "https")
@@ -236,6 +246,14 @@ LOGGING = {
     },
 }
 
+# Traffic archive
+# ------------------------------------------------------------------------------
+# Only /app/data is a volume: archives anywhere else are lost on redeploy, after
+# their days were already dropped from Postgres. railway.json runs
+# archive_traffic_logs at boot and every 24 h inside this service, since the
+# volume cannot be mounted on a separate cron service.
+TRAFFIC_ARCHIVE_DIR = env("TRAFFIC_ARCHIVE_DIR", default="/app/data/traffic_archive")
+
 # DuckDB Configuration
 # ------------------------------------------------------------------------------
 # Use S3 path if DUCKDB_S3_PATH is set, otherwise use local path (for dev)
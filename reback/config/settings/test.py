@@ -34,5 +34,9 @@ TEMPLATES[0]["OPTIONS"]["debug"] = True  # type: ignore[index]
 # ------------------------------------------------------------------------------
 # https://docs.djangoproject.com/en/dev/ref/settings/#media-url
 MEDIA_URL = "http://media.testserver"
+# CELERY
+# ------------------------------------------------------------------------------
+# Tasks run inline (no broker / worker in tests)
+CELERY_TASK_ALWAYS_EAGER = True
 # Your stuff...
 # ------------------------------------------------------------------------------
@@ -9,11 +9,22 @@ from django.views import defaults as default_views
 from django.views.generic.base import RedirectView
 from icfes_dashboard import email_graph_views
 from icfes_dashboard import sitemap_views
+from icfes_dashboard import warmup
 from reback import seo_views
 
 
 def health_check(request):
-    """Lightweight health check — no DB, no DuckDB. Railway uses this to detect readiness."""
+    """
+    Lightweight health check — no DB, no DuckDB. Railway uses this to detect readiness.
+    Answers 503 while this worker's boot warm-up (gunicorn.conf.py) is still running,
+    "ok: degraded" if it gave up after its retries.
+    """
+    if not warmup.is_ready():
+        return HttpResponse(
+            f"warming: {warmup.state()['status']}", content_type="text/plain", status=503
+        )
+    if warmup.state()["status"] == "degraded":
+        return HttpResponse("ok: degraded", content_type="text/plain", status=200)
     return HttpResponse("ok", content_type="text/plain", status=200)
 
 home_redirect_view = RedirectView.as_view(url='/', permanent=True)
@@ -0,0 +1,303 @@
+"""
+Script 1b: Build Materialized Leaderboards
+
+Materializes every long-tail ranking page (already ordered, slugs joined)
+into gold.fct_leaderboards so the web app serves a page miss with a single
+key lookup (icfes_dashboard/leaderboards.py) instead of the ranking CTEs,
+and the sitemaps enumerate valid combinations from the same table.
+
+Kinds (key = kind, ano, scope_sector, scope_departamento, scope_municipio):
+- sector:               top 20 per sector × (nacional | departamento | municipio),
+                        latest year only, with the previous-year position and
+                        the scope's population (scope_colegios, scope_estudiantes:
+                        every school with >= 10 students, not just the top 20)
+- general:              top 50 per year (puntaje global)
+- matematicas:          top 50 per year (/icfes/ranking/matematicas/<ano>/)
+- materia:matematicas,
+  materia:ingles:       top 100 per year (/icfes/materia/<materia>/<ano>/)
+- mejoraron:            top 100 per year by cambio_absoluto_global
+
+Run after 01_generate_slugs.py (joins gold.dim_colegios_slugs) and before
+02_sync_gold_to_prod.py.
+"""
+import duckdb
+from pathlib import Path
+
+# Database paths
+DEV_DB = Path(r"C:\proyectos\dbt\icfes_processing\dev.duckdb")
+
+YEAR_EXPR = (
+    "CASE WHEN regexp_matches(CAST({col} AS VARCHAR), '^[0-9]+$') "
+    "THEN CAST({col} AS INTEGER) ELSE NULL END"
+)
+
+# Column order shared by every kind (NULL where a kind has no value).
+COLUMNS = """
+    kind, ano, scope_sector, scope_departamento, scope_municipio, scope_colegios,
+    scope_estudiantes, posicion, ranking_prev,
+    codigo_dane, nombre_colegio, departamento, municipio, sector, slug, total_estudiantes,
+    punt_global, punt_lectura, punt_matematicas, punt_naturales, punt_sociales, punt_ingles,
+    punt_global_anterior, cambio_abs, cambio_pct, percentil_sector_pct, z_score_global,
+    ranking_nacional
+"""
+
+# Mirrors longtail_landing_views._fetch_top20_rows for every scope at once.
+SECTOR_SQL = f"""
+    WITH source AS (
+        SELECT
+            {YEAR_EXPR.format(col='h.ano')} AS ano,
+            h.codigo_dane,
+            h.nombre_colegio,
+            h.departamento,
+            h.municipio,
+            h.sector,
+            h.total_estudiantes,
+            h.avg_punt_global,
+            h.avg_punt_lectura_critica,
+            h.avg_punt_matematicas,
+            h.avg_punt_c_naturales,
+            h.avg_punt_sociales_ciudadanas,
+            h.avg_punt_ingles,
+            h.percentil_sector,
+            h.cambio_absoluto_global,
+            h.cambio_porcentual_global,
+            a.avg_global_zscore,
+            COALESCE(s.slug, '') AS slug
+        FROM gold.fct_colegio_historico h
+        LEFT JOIN gold.dim_colegios_slugs s ON s.codigo = h.codigo_dane
+        LEFT JOIN gold.fct_agg_colegios_ano a
+          ON a.colegio_bk = h.codigo_dane
+         AND a.ano = h.ano
+        WHERE h.ano IN (CAST($latest AS VARCHAR), CAST($prev AS VARCHAR))
+          AND h.sector IN ('OFICIAL', 'NO OFICIAL')
+          AND h.total_estudiantes >= 10
+    ),
+    scoped AS (
+        SELECT *, '' AS scope_departamento, '' AS scope_municipio FROM source
+        UNION ALL
+        SELECT *, departamento, '' FROM source
+        WHERE departamento IS NOT NULL AND departamento != ''
+        UNION ALL
+        SELECT *, departamento, municipio FROM source
+        WHERE departamento IS NOT NULL AND departamento != ''
+          AND municipio IS NOT NULL AND municipio != ''
+    ),
+    ranked AS (
+        SELECT
+            *,
+            ROW_NUMBER() OVER (
+                PARTITION BY ano, sector, scope_departamento, scope_municipio
+                ORDER BY avg_punt_global DESC NULLS LAST, nombre_colegio
+            ) AS ranking_scope
+        FROM scoped
+        WHERE nombre_colegio IS NOT NULL
+    ),
+    -- Whole scope, same thresholds as sitemap_views._sector_municipio_rows
+    population AS (
+        SELECT
+            ano, sector, scope_departamento, scope_municipio,
+            COUNT(DISTINCT codigo_dane) AS scope_colegios,
+            SUM(total_estudiantes) AS scope_estudiantes
+        FROM scoped
+        WHERE ano = $latest
+        GROUP BY ano, sector, scope_departamento, scope_municipio
+    ),
+    current_year AS (
+        SELECT * FROM ranked WHERE ano = $latest AND ranking_scope <= 20
+    ),
+    previous_year AS (
+        SELECT codigo_dane, sector, scope_departamento, scope_municipio, ranking_scope AS ranking_scope_prev
+        FROM ranked
+        WHERE ano = $prev
+    )
+    SELECT
+        'sector', c.ano, c.sector, c.scope_departamento, c.scope_municipio,
+        n.scope_colegios, n.scope_estudiantes, c.ranking_scope, p.ranking_scope_prev,
+        c.codigo_dane, c.nombre_colegio, c.departamento, c.municipio, c.sector, c.slug,
+        c.total_estudiantes,
+        ROUND(c.avg_punt_global, 1),
+        ROUND(c.avg_punt_lectura_critica, 1),
+        ROUND(c.avg_punt_matematicas, 1),
+        ROUND(c.avg_punt_c_naturales, 1),
+        ROUND(c.avg_punt_sociales_ciudadanas, 1),
+        ROUND(c.avg_punt_ingles, 1),
+        NULL,
+        ROUND(c.cambio_absoluto_global, 2),
+        ROUND(c.cambio_porcentual_global, 2),
+        ROUND(c.percentil_sector * 100.0, 1),
+        ROUND(c.avg_global_zscore, 2),
+        NULL
+    FROM current_year c
+    JOIN population n
+      ON n.ano = c.ano
+     AND n.sector = c.sector
+     AND n.scope_departamento = c.scope_departamento
+     AND n.scope_municipio = c.scope_municipio
+    LEFT JOIN previous_year p
+      ON p.codigo_dane = c.codigo_dane
+     AND p.sector = c.sector
+     AND p.scope_departamento = c.scope_departamento
+     AND p.scope_municipio = c.scope_municipio
+"""
+
+
+def agg_ranking_sql(kind, order_col, limit, extra_filters=""):
+    """Top-N per year over fct_agg_colegios_ano (ranking general / materia pages)."""
+    return f"""
+        SELECT
+            '{kind}', ano, '', '', '', NULL, NULL, posicion, NULL,
+            codigo_dane, nombre_colegio, departamento, municipio, sector, slug,
+            total_estudiantes,
+            punt_global, NULL, punt_matematicas, NULL, NULL, punt_ingles,
+            NULL, NULL, NULL, NULL, NULL, NULL
+        FROM (
+            SELECT
+                {YEAR_EXPR.format(col='f.ano')} AS ano,
+                f.colegio_bk AS codigo_dane,
+                f.nombre_colegio,
+                f.departamento,
+                f.municipio,
+                f.sector,
+                f.total_estudiantes,
+                ROUND(f.avg_punt_global, 1) AS punt_global,
+                ROUND(f.avg_punt_matematicas, 1) AS punt_matematicas,
+                ROUND(f.avg_punt_ingles, 1) AS punt_ingles,
+                COALESCE(s.slug, '') AS slug,
+                ROW_NUMBER() OVER (
+                    PARTITION BY f.ano
+                    ORDER BY f.{order_col} DESC NULLS LAST, f.nombre_colegio
+                ) AS posicion
+            FROM gold.fct_agg_colegios_ano f
+            LEFT JOIN gold.dim_colegios_slugs s ON f.colegio_bk = s.codigo
+            WHERE f.nombre_colegio IS NOT NULL
+              AND f.sector != 'SINTETICO'
+              {extra_filters}
+        )
+        WHERE posicion <= {limit} AND ano IS NOT NULL
+    """
+
+
+MEJORARON_SQL = f"""
+    SELECT
+        'mejoraron', ano, '', '', '', NULL, NULL, posicion, NULL,
+        codigo_dane, nombre_colegio, departamento, municipio, sector, slug,
+        total_estudiantes,
+        punt_global, NULL, NULL, NULL, NULL, NULL,
+        punt_global_anterior, mejora, NULL, NULL, NULL, ranking_nacional
+    FROM (
+        SELECT
+            {YEAR_EXPR.format(col='h.ano')} AS ano,
+            h.codigo_dane,
+            h.nombre_colegio,
+            h.departamento,
+            h.municipio,
+            h.sector,
+            h.total_estudiantes,
+            h.ranking_nacional,
+            ROUND(h.cambio_absoluto_global, 1) AS mejora,
+            ROUND(h.avg_punt_global, 1) AS punt_global,
+            ROUND(h.punt_global_ano_anterior, 1) AS punt_global_anterior,
+            COALESCE(s.slug, '') AS slug,
+            ROW_NUMBER() OVER (
+                PARTITION BY h.ano
+                ORDER BY ROUND(h.cambio_absoluto_global, 1) DESC, h.nombre_colegio
+            ) AS posicion
+        FROM gold.fct_colegio_historico h
+        LEFT JOIN gold.dim_colegios_slugs s ON s.codigo = h.codigo_dane
+        WHERE h.cambio_absoluto_global IS NOT NULL
+          AND h.total_estudiantes >= 10
+          AND h.nombre_colegio IS NOT NULL
+    )
+    WHERE posicion <= 100 AND ano IS NOT NULL
+"""
+
+
+def build_sql():
+    parts = [
+        SECTOR_SQL,
+        agg_ranking_sql("general", "avg_punt_global", 50),
+        agg_ranking_sql("matematicas", "avg_punt_matematicas", 50,
+                        "AND f.avg_punt_matematicas IS NOT NULL"),
+        agg_ranking_sql("materia:matematicas", "avg_punt_matematicas", 100,
+                        "AND f.avg_punt_matematicas IS NOT NULL AND f.total_estudiantes >= 5"),
+        agg_ranking_sql("materia:ingles", "avg_punt_ingles", 100,
+                        "AND f.avg_punt_ingles IS NOT NULL AND f.total_estudiantes >= 5"),
+        MEJORARON_SQL,
+    ]
+    body = "\nUNION ALL\n".join(parts)
+    return f"""
+        CREATE OR REPLACE TABLE gold.fct_leaderboards AS
+        SELECT * FROM (
+            SELECT {COLUMNS} FROM (
+                {body}
+            ) AS t({COLUMNS})
+        )
+        ORDER BY kind, ano, scope_sector, scope_departamento, scope_municipio, posicion
+    """
+
+
+def latest_years(conn):
+    """(latest, previous) year, same source as the long-tail pages."""
+    rows = conn.execute(f"""
+        SELECT DISTINCT {YEAR_EXPR.format(col='ano')} AS ano
+        FROM gold.fct_agg_colegios_ano
+        WHERE {YEAR_EXPR.format(col='ano')} IS NOT NULL
+        ORDER BY ano DESC
+        LIMIT 2
+    """).fetchall()
+    years = [int(r[0]) for r in rows]
+    if not years:
+        raise RuntimeError("gold.fct_agg_colegios_ano has no years")
+    return years[0], years[1] if len(years) > 1 else years[0]
+
+
+def build(conn):
+    latest, prev = latest_years(conn)
+    conn.execute(build_sql(), {"latest": latest, "prev": prev})
+    return latest, prev
+
+
+def main():
+    print("=" * 80)
+    print("STEP 1b: BUILDING MATERIALIZED LEADERBOARDS")
+    print("=" * 80)
+
+    if not DEV_DB.exists():
+        print(f"\n❌ ERROR: Database not found at {DEV_DB}")
+        return False
+
+    print(f"\n📂 Using database: {DEV_DB}")
+    conn = duckdb.connect(str(DEV_DB), read_only=False)
+
+    try:
+        print("\n1. Building gold.fct_leaderboards...")
+        latest, prev = build(conn)
+        print(f"   Sector leaderboards for {latest} (previous year {prev})")
+
+        counts = conn.execute("""
+            SELECT kind, COUNT(DISTINCT (ano, scope_sector, scope_departamento, scope_municipio)), COUNT(*)
+            FROM gold.fct_leaderboards
+            GROUP BY kind
+            ORDER BY kind
+        """).fetchall()
+        for kind, boards, rows in counts:
+            print(f"   {kind:<22} {boards:>6,} leaderboards  {rows:>8,} rows")
+
+        print("\n" + "=" * 80)
+        print("✅ SUCCESS: gold.fct_leaderboards built")
+        print("=" * 80)
+        return True
+
+    except Exception as e:
+        print(f"\n❌ ERROR: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    success = main()
+    exit(0 if success else 1)
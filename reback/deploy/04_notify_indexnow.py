@@ -1,24 +1,28 @@
 """
 Script 4: Notify IndexNow
 
-Submits all updated URLs to IndexNow after a deploy.
-IndexNow is supported by Bing, Yandex and other search engines.
+Submits the URLs that are new or changed since the last accepted
+submission to IndexNow after a deploy. IndexNow is supported by Bing,
+Yandex and other search engines.
+
+The URL list comes from the sitemap views (same queries as sitemap-*.xml)
+and the record of submitted URLs lives in the Django database, so this
+script runs `manage.py ping_indexnow --send` against prod.duckdb.
 
 Requires env vars:
   INDEXNOW_KEY     — key registered at indexnow.org / Bing Webmaster Tools
   PUBLIC_SITE_URL  — e.g. https://www.icfes-analytics.com
+  DATABASE_URL     — Postgres holding the IndexNow record (same as production)
 
 Run after deploy:
   python deploy/04_notify_indexnow.py
 """
-import json
 import os
 import platform
-import urllib.request
-import urllib.error
+import subprocess
+import sys
 from pathlib import Path
 
-import duckdb
 from dotenv import load_dotenv
 
 # ---------------------------------------------------------------------------
@@ -32,16 +36,15 @@ def _default_prod_db():
     return Path("/home/ubuntu/dbt/icfes_processing/prod.duckdb")
 
 PROD_DB = Path(os.getenv("PROD_DB_PATH", str(_default_prod_db())))
-INDEXNOW_ENDPOINT = "https://api.indexnow.org/indexnow"
-BATCH_SIZE = 10_000  # IndexNow max per request
+PROJECT_DIR = Path(__file__).parent.parent
 
 
 def _load_env():
     # Try .env files in common locations
     for candidate in [
-        Path(__file__).parent.parent / ".env",
-        Path(__file__).parent.parent / ".envs" / ".local" / ".django",
-        Path(__file__).parent.parent / ".envs" / ".production" / ".django",
+        PROJECT_DIR / ".env",
+        PROJECT_DIR / ".envs" / ".local" / ".django",
+        PROJECT_DIR / ".envs" / ".production" / ".django",
     ]:
         if candidate.exists():
             load_dotenv(candidate)
@@ -52,145 +55,6 @@ def _load_env():
     return key, base
 
 
-# ---------------------------------------------------------------------------
-# URL builders
-# ---------------------------------------------------------------------------
-
-def _static_urls(base):
-    return [
-        f"{base}/",
-        f"{base}/icfes/ranking/",
-        f"{base}/icfes/departamentos/",
-        f"{base}/icfes/historia/",
-        f"{base}/icfes/ingles/",
-        f"{base}/icfes/historico/puntaje-global/",
-        f"{base}/icfes/colegios-bilingues/",
-        f"{base}/icfes/que-es-icfes-analytics/",
-        f"{base}/icfes/materia/matematicas/",
-        f"{base}/icfes/materia/ingles/",
-        f"{base}/icfes/colegios-que-mas-mejoraron/",
-    ]
-
-
-def _db_urls(base):
-    """Generate geo + school URLs from prod.duckdb."""
-    urls = []
-
-    if not PROD_DB.exists():
-        print(f"  ⚠️  prod_v2.duckdb not found at {PROD_DB} — skipping DB URLs")
-        return urls
-
-    conn = duckdb.connect(str(PROD_DB), read_only=True)
-
-    try:
-        from slugify import slugify
-
-        # Departamentos
-        rows = conn.execute("""
-            SELECT DISTINCT departamento
-            FROM main.fct_agg_colegios_ano
-            WHERE departamento IS NOT NULL AND departamento != ''
-              AND ano = (SELECT MAX(ano) FROM main.fct_agg_colegios_ano)
-            ORDER BY departamento
-        """).fetchall()
-        for (dept,) in rows:
-            slug = slugify(dept)
-            urls.append(f"{base}/icfes/departamento/{slug}/")
-            urls.append(f"{base}/icfes/departamento/{slug}/colegios-bilingues/")
-            urls.append(f"{base}/icfes/ranking/sector/oficiales/departamento/{slug}/")
-            urls.append(f"{base}/icfes/ranking/sector/privados/departamento/{slug}/")
-
-        # Municipios
-        rows = conn.execute("""
-            SELECT DISTINCT departamento, municipio
-            FROM main.fct_agg_colegios_ano
-            WHERE departamento IS NOT NULL AND departamento != ''
-              AND municipio IS NOT NULL AND municipio != ''
-              AND ano = (SELECT MAX(ano) FROM main.fct_agg_colegios_ano)
-            ORDER BY departamento, municipio
-        """).fetchall()
-        for dept, muni in rows:
-            d = slugify(dept)
-            m = slugify(muni)
-            urls.append(f"{base}/icfes/departamento/{d}/municipio/{m}/")
-
-        # School pages (slug-based)
-        rows = conn.execute("""
-            SELECT slug FROM main.dim_colegios_slugs
-            WHERE slug IS NOT NULL AND slug != ''
-            ORDER BY slug
-        """).fetchall()
-        for (slug,) in rows:
-            urls.append(f"{base}/icfes/colegio/{slug}/")
-
-        # Ranking by year
-        years = conn.execute("""
-            SELECT DISTINCT CAST(ano AS INTEGER)
-            FROM main.fct_agg_colegios_ano
-            WHERE ano IS NOT NULL
-            ORDER BY 1 DESC
-            LIMIT 5
-        """).fetchall()
-        for (year,) in years:
-            urls.append(f"{base}/icfes/ranking/colegios/{year}/")
-            urls.append(f"{base}/icfes/materia/matematicas/{year}/")
-            urls.append(f"{base}/icfes/materia/ingles/{year}/")
-            urls.append(f"{base}/icfes/colegios-que-mas-mejoraron/{year}/")
-
-    finally:
-        conn.close()
-
-    return urls
-
-
-# ---------------------------------------------------------------------------
-# IndexNow submission
-# ---------------------------------------------------------------------------
-
-def _post_batch(key, host, urls):
-    payload = json.dumps({
-        "host": host,
-        "key": key,
-        "urlList": urls,
-    }).encode("utf-8")
-
-    req = urllib.request.Request(
-        INDEXNOW_ENDPOINT,
-        data=payload,
-        headers={"Content-Type": "application/json; charset=utf-8"},
-        method="POST",
-    )
-    try:
-        with urllib.request.urlopen(req, timeout=30) as resp:
-            return resp.status, resp.read().decode()
-    except urllib.error.HTTPError as e:
-        return e.code, e.read().decode()
-    except Exception as e:
-        return None, str(e)
-
-
-def _submit(key, base, urls):
-    from urllib.parse import urlparse
-    host = urlparse(base).netloc
-
-    total = len(urls)
-    submitted = 0
-    failed = 0
-
-    for i in range(0, total, BATCH_SIZE):
-        batch = urls[i: i + BATCH_SIZE]
-        status, body = _post_batch(key, host, batch)
-
-        if status in (200, 202):
-            submitted += len(batch)
-            print(f"  ✅ Batch {i // BATCH_SIZE + 1}: {len(batch)} URLs → HTTP {status}")
-        else:
-            failed += len(batch)
-            print(f"  ❌ Batch {i // BATCH_SIZE + 1}: HTTP {status} — {body[:200]}")
-
-    return submitted, failed
-
-
 # ---------------------------------------------------------------------------
 # Main
 # ---------------------------------------------------------------------------
@@ -210,24 +74,20 @@ def main():
         print("\n⚠️  PUBLIC_SITE_URL not set — skipping (not a fatal error)")
         return True
 
+    if not PROD_DB.exists():
+        print(f"\n⚠️  prod.duckdb not found at {PROD_DB} — skipping")
+        return True
+
     print(f"\n🔑 Key: {key[:8]}...")
     print(f"🌐 Site: {base}")
+    print(f"🦆 DuckDB: {PROD_DB}")
 
-    print("\n📋 Building URL list...")
-    urls = _static_urls(base)
-    print(f"  Static pages: {len(urls)}")
-
-    db_urls = _db_urls(base)
-    print(f"  DB pages (geo + schools + rankings): {len(db_urls)}")
-
-    all_urls = list(dict.fromkeys(urls + db_urls))  # deduplicate, preserve order
-    print(f"  Total unique URLs: {len(all_urls)}")
-
-    print("\n📤 Submitting to IndexNow...")
-    submitted, failed = _submit(key, base, all_urls)
-
-    print(f"\n{'✅' if failed == 0 else '⚠️ '} Done — {submitted} submitted, {failed} failed")
-    return failed == 0
+    env = {**os.environ, "ICFES_DUCKDB_PATH": str(PROD_DB)}
+    result = subprocess.run(
+        [sys.executable, str(PROJECT_DIR / "manage.py"), "ping_indexnow", "--send"],
+        cwd=PROJECT_DIR, env=env,
+    )
+    return result.returncode == 0
 
 
 if __name__ == "__main__":
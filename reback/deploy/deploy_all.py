@@ -43,6 +43,7 @@ ML_SCRIPTS = [
 # Deploy scripts — run after ML
 DEPLOY_SCRIPTS = [
     ("01_generate_slugs.py",   "Generating slugs"),
+    ("01b_build_leaderboards.py", "Building materialized leaderboards"),
     ("02_sync_gold_to_prod.py","Syncing gold tables to prod"),
     ("03_verify_deployment.py","Verifying deployment"),
     ("04_notify_indexnow.py",  "Notifying IndexNow of updated URLs"),
@@ -0,0 +1,48 @@
+"""
+Gunicorn config, picked up automatically from the working directory (/app).
+
+Only hooks live here; bind/workers/threads/timeout stay on the command line
+(railway.json / Dockerfile).
+"""
+
+
+def post_worker_init(worker):
+    # Warm DuckDB + in-process caches in the background; /health/ stays 503
+    # until done so Railway only switches traffic to warmed workers.
+    from django.conf import settings
+
+    if not getattr(settings, "WORKER_WARMUP_ENABLED", True):
+        return
+
+    from icfes_dashboard import warmup
+
+    warmup.start_warmup(threads=worker.cfg.threads)
+
+
+def when_ready(server):
+    # Post-deploy cache warm-up once the master is listening. warm_cache
+    # --post-deploy is a no-op unless CACHE_WARM_ON_DEPLOY; its output and
+    # exit status go to the gunicorn log instead of a detached shell job.
+    import os
+    import subprocess
+    import sys
+    import threading
+
+    settings_module = os.environ.get("DJANGO_SETTINGS_MODULE", "config.settings.production")
+    command = [sys.executable, "manage.py", "warm_cache", "--post-deploy", f"--settings={settings_module}"]
+
+    def run():
+        try:
+            proc = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        except OSError as exc:
+            server.log.error("[warm_cache] could not start: %s", exc)
+            return
+        for line in proc.stdout:
+            server.log.info("[warm_cache] %s", line.rstrip())
+        status = proc.wait()
+        if status:
+            server.log.error("[warm_cache] failed with exit status %s", status)
+        else:
+            server.log.info("[warm_cache] finished")
+
+    threading.Thread(target=run, name="warm-cache", daemon=True).start()
@@ -1,34 +1,46 @@
 import csv
 from django.contrib import admin, messages
-from django.http import HttpResponse
+from django.http import StreamingHttpResponse
 from django.utils import timezone
 from django.utils.html import format_html
 from django.urls import path, reverse
 from django.shortcuts import get_object_or_404, redirect
 
 from .models import Campaign, CampaignProspect, RailwayTrafficLog
+from .tasks import pregenerate_campaign_reports
 
 
 # ============================================================================
 # ACCIONES REUTILIZABLES
 # ============================================================================
 
-def export_csv(modeladmin, request, queryset):
-    """Exporta prospectos seleccionados a CSV listo para envío."""
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="prospectos_campaña.csv"'
-    writer = csv.writer(response)
-    writer.writerow([
+class _Echo:
+    """Pseudo-buffer para csv.writer: devuelve la línea en vez de guardarla."""
+
+    def write(self, value):
+        return value
+
+
+def _stream_prospect_rows(queryset):
+    writer = csv.writer(_Echo())
+    yield writer.writerow([
         'Colegio', 'Rector', 'Email', 'Teléfono',
         'Municipio', 'Departamento', 'Ranking Ciudad',
         'Puntaje Global', 'Demo URL', 'Estado'
     ])
-    for p in queryset:
-        writer.writerow([
+    # iterator(): filas por lotes desde la BD, sin cachear todo el queryset
+    for p in queryset.iterator(chunk_size=2000):
+        yield writer.writerow([
             p.nombre_colegio, p.rector, p.email, p.telefono,
             p.municipio, p.departamento, p.rank_municipio,
             round(p.avg_punt_global, 1), p.demo_url, p.get_estado_display()
         ])
+
+
+def export_csv(modeladmin, request, queryset):
+    """Exporta prospectos seleccionados a CSV listo para envío (en streaming)."""
+    response = StreamingHttpResponse(_stream_prospect_rows(queryset), content_type='text/csv')
+    response['Content-Disposition'] = 'attachment; filename="prospectos_campaña.csv"'
     return response
 
 export_csv.short_description = "⬇ Exportar seleccionados a CSV"
@@ -64,6 +76,19 @@ def marcar_cliente(modeladmin, request, queryset):
 marcar_cliente.short_description = "🏆 Marcar como Cliente pagando"
 
 
+def pregenerar_reportes_pdf(modeladmin, request, queryset):
+    """Encola el reporte PDF de cada colegio de las campañas seleccionadas."""
+    for campaign in queryset:
+        pregenerate_campaign_reports.delay(campaign.pk)
+    messages.success(
+        request,
+        f"Reportes PDF en cola para {queryset.count()} campaña(s). "
+        "Quedan en caché hasta el próximo dataset."
+    )
+
+pregenerar_reportes_pdf.short_description = "📄 Pre-generar reportes PDF de los colegios"
+
+
 # ============================================================================
 # ADMIN: CAMPAIGN PROSPECT (tabla de detalle)
 # ============================================================================
@@ -159,6 +184,7 @@ class CampaignAdmin(admin.ModelAdmin):
     search_fields = ['nombre', 'descripcion']
     readonly_fields = ['fecha_creacion', 'fecha_lanzamiento', 'fecha_completada', 'pipeline_detalle']
     inlines       = [CampaignProspectInline]
+    actions       = [pregenerar_reportes_pdf]
 
     fieldsets = (
         ('Identificación', {
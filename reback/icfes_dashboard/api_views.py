@@ -8,7 +8,6 @@ from django.http import JsonResponse
 from django.views.decorators.http import require_GET
 from django.core.cache import cache
 import statistics as _stats
-import unicodedata
 
 from icfes_dashboard.db_utils import (
     get_duckdb_connection,
@@ -37,6 +36,9 @@ from icfes_dashboard.db_utils import (
     get_inteligencia_potencial,
     get_inteligencia_potencial_scatter,
 )
+from icfes_dashboard import school_search
+from icfes_dashboard import score_distribution
+from icfes_dashboard.gazetteer import departamento_variants
 
 logger = logging.getLogger(__name__)
 
@@ -48,45 +50,11 @@ def normalize_departamento(name):
     para que coincida con icfes_master_resumen.
     Retorna una lista de posibles variaciones (ej: BOGOTA y BOGOTÁ) para
     evitar pérdida de datos por inconsistencias en la base de datos.
+    Las variantes salen del gazetteer (todas las grafías vistas en las tablas gold).
     """
     if not name:
         return name
-
-    raw = str(name).strip()
-    original = raw.upper()
-    no_accents = ''.join(
-        c for c in unicodedata.normalize('NFD', original)
-        if unicodedata.category(c) != 'Mn'
-    )
-    # Remueve puntuación para cubrir variantes como "D.C." vs "DC"
-    no_punct = ''.join(ch if ch.isalnum() or ch.isspace() else ' ' for ch in no_accents)
-    no_punct = ' '.join(no_punct.split())
-
-    # Incluye variante original (con mayúsculas/minúsculas) por si la BD guarda title case.
-    values = set([raw, original, no_accents, no_punct])
-
-    # Casos especiales de alta variación
-    if 'BOGOTA' in no_punct:
-        values.update([
-            'BOGOTA', 'BOGOTÁ',
-            'BOGOTA D.C.', 'BOGOTÁ D.C.',
-            'BOGOTA DC', 'BOGOTÁ DC',
-        ])
-    if 'VALLE DEL CAUCA' in no_punct:
-        values.update(['VALLE', 'VALLE DEL CAUCA'])
-    if 'NORTE DE SANTANDER' in no_punct:
-        values.update(['NORTE DE SANTANDER', 'NORTE SANTANDER'])
-    if 'SAN ANDRES' in no_punct:
-        values.update([
-            'SAN ANDRES',
-            'SAN ANDRES PROVIDENCIA Y SANTA CATALINA',
-            'ARCHIPIELAGO DE SAN ANDRES PROVIDENCIA Y SANTA CATALINA',
-        ])
-    if 'NARINO' in no_punct:
-        values.update(['NARIÑO', 'NARINO'])
-
-    # Lista ordenada para estabilidad de caché
-    return sorted(values)
+    return departamento_variants(name)
 
 def _cached(key, timeout, func):
     """Helper method para cachear resultados de bd."""
@@ -125,40 +93,94 @@ def search_schools(request):
         return JsonResponse({'results': []})
     
     try:
-        with get_duckdb_connection() as conn:
-            sql = resolve_schema("""
-                SELECT DISTINCT
-                    colegio_bk as code,
-                    nombre_colegio as name,
-                    departamento as department,
-                    municipio as municipality
-                FROM gold.dim_colegios
-                WHERE nombre_colegio ILIKE ?
-                   OR CAST(colegio_bk AS VARCHAR) LIKE ?
-                ORDER BY nombre_colegio
-                LIMIT 20
-            """)
-            results = conn.execute(sql, [f'%{query}%', f'%{query}%']).fetchall()
-            
-            schools = [
-                {
-                    'code': str(r[0]) if r[0] else '',
-                    'name': r[1] or '',
-                    'department': r[2] or '',
-                    'municipality': r[3] or '',
-                    'label': f"{r[1]} - {r[2]}, {r[3]}"
-                }
-                for r in results
-            ]
-            
-            logger.info(f"School search: '{query}' returned {len(schools)} results")
-            return JsonResponse({'results': schools})
-            
+        schools = [
+            {
+                'code': doc['codigo_dane'],
+                'name': doc['nombre_colegio'],
+                'department': doc['departamento'],
+                'municipality': doc['municipio'],
+                'label': f"{doc['nombre_colegio']} - {doc['departamento']}, {doc['municipio']}"
+            }
+            for doc in school_search.search_schools(query)
+        ]
+        logger.info(f"School search: '{query}' returned {len(schools)} results")
+        return JsonResponse({'results': schools})
+
     except Exception as e:
         logger.error(f"Error searching schools: {e}")
         return JsonResponse({'error': 'Error searching schools'}, status=500)
 
 
+@require_GET
+def score_ranking(request):
+    """
+    Rank and percentile of a (real or hypothetical) score, for the
+    "what if my school scored X" tools. Binary search over the in-memory
+    distributions (score_distribution), no SQL per request.
+
+    Query params:
+        puntaje: score to rank (required, 0-500)
+        materia: global | matematicas | lectura | naturales | sociales | ingles
+        ano: year (default: latest)
+        departamento, municipio, sector: optional scopes (sector: OFICIAL /
+            NO OFICIAL in any spelling, e.g. no-oficial; 400 if unknown)
+
+    Returns:
+        JSON: {
+            'puntaje': 285.0, 'materia': 'global', 'ano': 2024,
+            'rankings': {
+                'nacional': {'rank': 1523, 'total': 12873, 'percentile': 88.2},
+                'departamento': {...}, 'municipio': {...}, 'sector': {...}
+            }
+        }
+    """
+    try:
+        puntaje = float(request.GET.get('puntaje', ''))
+    except ValueError:
+        return JsonResponse({'error': 'puntaje must be a number'}, status=400)
+    if not 0 <= puntaje <= 500:
+        return JsonResponse({'error': 'puntaje must be between 0 and 500'}, status=400)
+
+    materia = request.GET.get('materia', 'global').strip().lower()
+    if materia not in score_distribution.SUBJECTS:
+        return JsonResponse(
+            {'error': f"materia must be one of {', '.join(score_distribution.SUBJECTS)}"}, status=400
+        )
+    ano = request.GET.get('ano', '').strip()
+    if ano and not ano.isdigit():
+        return JsonResponse({'error': 'ano must be a year'}, status=400)
+
+    sector = request.GET.get('sector') or None
+
+    try:
+        distributions = score_distribution.get_distributions()
+        if sector and score_distribution.sector_key(sector) not in distributions.sectors:
+            return JsonResponse(
+                {'error': f"sector must be one of {', '.join(distributions.sectors)}"}, status=400
+            )
+        ano = int(ano) if ano else distributions.latest_year
+        rankings = distributions.ranks(
+            puntaje,
+            ano,
+            materia,
+            departamento=request.GET.get('departamento') or None,
+            municipio=request.GET.get('municipio') or None,
+            sector=sector,
+        )
+    except Exception as e:
+        logger.error(f"Error ranking score: {e}")
+        return JsonResponse({'error': 'Error computing ranking'}, status=500)
+
+    if not rankings:
+        return JsonResponse({'error': f'No data for {ano}'}, status=404)
+    return JsonResponse({
+        'puntaje': puntaje,
+        'materia': materia,
+        'ano': ano,
+        'rankings': {scope: ranking._asdict() for scope, ranking in rankings.items()},
+    })
+
+
 @require_GET
 def get_departments(request):
     """
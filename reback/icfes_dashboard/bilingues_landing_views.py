@@ -6,21 +6,13 @@ from django.conf import settings
 from django.http import Http404
 from django.shortcuts import redirect, render
 from django.utils.text import slugify
-from django.views.decorators.cache import cache_page
 
 from .db_utils import get_duckdb_connection, resolve_schema
+from .gazetteer import get_gazetteer
+from .response_cache import add_cache_tags, compressed_cache_page, geo_cache_tags
 
 logger = logging.getLogger(__name__)
 
-# Reuse the same alias dict pattern as geo_landing_views for slug resolution.
-_DEPARTAMENTO_SLUG_ALIASES = {
-    "san-andres": "San Andr",
-    "norte-santander": "Norte de Santander",
-    "valle": "Valle del Cauca",
-    "bogota": "Bogotá",
-}
-
-
 def _meta_compact(text):
     return " ".join((text or "").split()).strip()
 
@@ -57,40 +49,13 @@ def _build_base_url(request):
 
 
 def _resolve_departamento(conn, departamento_slug):
-    rows = conn.execute(
-        resolve_schema("""
-            SELECT DISTINCT departamento
-            FROM gold.fct_agg_colegios_ano
-            WHERE departamento IS NOT NULL AND departamento != ''
-            ORDER BY departamento
-        """)
-    ).fetchall()
-    for (departamento,) in rows:
-        if slugify(departamento) == departamento_slug:
-            return departamento
-    alias_fragment = _DEPARTAMENTO_SLUG_ALIASES.get(departamento_slug)
-    if alias_fragment:
-        for (departamento,) in rows:
-            if alias_fragment.lower() in departamento.lower():
-                return departamento
-    return None
+    place = get_gazetteer().departamento(departamento_slug, primary_only=True)
+    return place.name if place else None
 
 
 def _resolve_municipio(conn, departamento, municipio_slug):
-    rows = conn.execute(
-        resolve_schema("""
-            SELECT DISTINCT municipio
-            FROM gold.fct_agg_colegios_ano
-            WHERE departamento = ?
-              AND municipio IS NOT NULL AND municipio != ''
-            ORDER BY municipio
-        """),
-        [departamento],
-    ).fetchall()
-    for (municipio,) in rows:
-        if slugify(municipio) == municipio_slug:
-            return municipio
-    return None
+    place = get_gazetteer().municipio(departamento, municipio_slug, primary_only=True)
+    return place.name if place else None
 
 
 def _fetch_bilingues(conn, latest_year, departamento=None, municipio=None):
@@ -248,7 +213,7 @@ def _render_bilingues(request, *, rows, latest_year, location_name, canonical_pa
     )
 
 
-@cache_page(60 * 60 * 6)
+@compressed_cache_page(60 * 60 * 6)
 def bilingues_nacional_page(request):
     try:
         with get_duckdb_connection() as conn:
@@ -275,7 +240,7 @@ def bilingues_nacional_page(request):
         raise Http404("Error al cargar colegios bilingues")
 
 
-@cache_page(60 * 60 * 6)
+@compressed_cache_page(60 * 60 * 6)
 def bilingues_departamento_page(request, dept):
     try:
         with get_duckdb_connection() as conn:
@@ -295,6 +260,7 @@ def bilingues_departamento_page(request, dept):
                     f"/icfes/departamento/{canonical_slug}/colegios-bilingues/",
                     permanent=True,
                 )
+            add_cache_tags(request, *geo_cache_tags(departamento))
             rows = _fetch_bilingues(conn, latest_year, departamento=departamento)
 
         return _render_bilingues(
@@ -313,7 +279,7 @@ def bilingues_departamento_page(request, dept):
         raise Http404("Error al cargar colegios bilingues")
 
 
-@cache_page(60 * 60 * 6)
+@compressed_cache_page(60 * 60 * 6)
 def bilingues_municipio_page(request, dept, muni):
     try:
         with get_duckdb_connection() as conn:
@@ -338,6 +304,7 @@ def bilingues_municipio_page(request, dept, muni):
                     f"/municipio/{canonical_muni_slug}/colegios-bilingues/",
                     permanent=True,
                 )
+            add_cache_tags(request, *geo_cache_tags(departamento, municipio))
             rows = _fetch_bilingues(
                 conn, latest_year, departamento=departamento, municipio=municipio
             )
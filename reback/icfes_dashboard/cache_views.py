@@ -0,0 +1,54 @@
+"""
+Staff API to purge cached responses by tag (see response_cache).
+"""
+import json
+import logging
+
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.views.decorators.http import require_POST
+
+from .response_cache import geo_cache_tags, purge_cache_tags, school_slug_tag, tags_for_school
+
+logger = logging.getLogger(__name__)
+
+
+@login_required
+@require_POST
+def api_cache_purge(request):
+    """
+    POST /icfes/api/cache/purge/  (solo staff)
+
+    Body JSON (todos opcionales, al menos uno):
+        {"colegio": ["176834000012"], "cascade": true, "slug": [...],
+         "departamento": "...", "municipio": "...", "tags": [...], "edge": true}
+    """
+    if not request.user.is_staff:
+        return JsonResponse({'ok': False, 'error': 'Permiso denegado'}, status=403)
+
+    try:
+        payload = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'ok': False, 'error': 'JSON inválido'}, status=400)
+
+    def _as_list(value):
+        if value is None:
+            return []
+        return value if isinstance(value, list) else [value]
+
+    tags = [str(t) for t in _as_list(payload.get('tags'))]
+    try:
+        for codigo in _as_list(payload.get('colegio')):
+            tags.extend(tags_for_school(codigo, cascade=bool(payload.get('cascade'))))
+    except Exception as e:
+        logger.error("api_cache_purge: school lookup failed: %s", e)
+        return JsonResponse({'ok': False, 'error': 'No se pudo resolver el colegio'}, status=500)
+    tags.extend(school_slug_tag(s) for s in _as_list(payload.get('slug')))
+    tags.extend(geo_cache_tags(payload.get('departamento'), payload.get('municipio')))
+
+    if not tags:
+        return JsonResponse({'ok': False, 'error': 'Sin tags para purgar'}, status=400)
+
+    result = purge_cache_tags(tags, edge=payload.get('edge', True) is not False)
+    logger.info("api_cache_purge by %s: %s", request.user.pk, result['tags'])
+    return JsonResponse({'ok': True, **result})
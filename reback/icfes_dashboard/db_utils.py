@@ -1,11 +1,15 @@
 """
 Utilidades para trabajar con DuckDB en el dashboard ICFES.
 """
+import hashlib
 import logging
 import os
 import subprocess
 import threading
+import time
+from collections import namedtuple
 from contextlib import contextmanager
+from datetime import date, datetime, timezone
 
 import duckdb
 import numpy as np
@@ -115,6 +119,16 @@ def _ensure_db_file():
 # ── Thread-local connection pool ─────────────────────────────────────────────
 
 _thread_local = threading.local()
+_spare_conns = []   # opened by the boot warm-up, adopted by request threads
+_spare_lock = threading.Lock()
+
+
+def _open_conn():
+    local_path = _ensure_db_file()
+    conn = duckdb.connect(local_path, read_only=True)
+    conn.execute("SET memory_limit='3.5GB'")
+    conn.execute("SET threads=2")
+    return conn
 
 
 def _get_thread_conn():
@@ -126,21 +140,30 @@ def _get_thread_conn():
     the lifetime of the worker process.  This eliminates the open/close
     overhead that was occurring on every request (and every sub-query call
     such as _get_cached_years_snapshot / _get_location_pairs).
+    If the boot warm-up pre-opened connections, the thread adopts one of those.
     """
     conn = getattr(_thread_local, 'conn', None)
     if conn is None:
-        local_path = _ensure_db_file()
-        conn = duckdb.connect(local_path, read_only=True)
-        conn.execute("SET memory_limit='3.5GB'")
-        conn.execute("SET threads=2")
+        with _spare_lock:
+            conn = _spare_conns.pop() if _spare_conns else None
+        if conn is None:
+            conn = _open_conn()
+            logger.warning(
+                f"[DuckDB] Thread-local connection opened "
+                f"(thread={threading.current_thread().name}, memory_limit=3.5GB)"
+            )
         _thread_local.conn = conn
-        logger.warning(
-            f"[DuckDB] Thread-local connection opened "
-            f"(thread={threading.current_thread().name}, memory_limit=3.5GB)"
-        )
     return conn
 
 
+def prewarm_connections(count):
+    """Open `count` DuckDB connections up front for request threads to adopt."""
+    opened = [_open_conn() for _ in range(max(0, count))]
+    with _spare_lock:
+        _spare_conns.extend(opened)
+    return len(opened)
+
+
 @contextmanager
 def get_duckdb_connection(read_only=True):
     """
@@ -152,6 +175,115 @@ def get_duckdb_connection(read_only=True):
     yield _get_thread_conn()
 
 
+@contextmanager
+def borrowed_cursor(conn):
+    """
+    Make get_duckdb_connection() in the current (helper) thread yield a cursor
+    of `conn` instead of opening its own connection.
+
+    Cursors share the database instance, buffer pool and memory_limit of the
+    parent connection but run queries independently, so a request can fan
+    its panels out to a thread pool without each pool thread opening (and
+    keeping) a full 3.5GB connection. The cursor is closed on exit.
+    """
+    previous = getattr(_thread_local, 'conn', None)
+    cursor = conn.cursor()
+    _thread_local.conn = cursor
+    try:
+        yield cursor
+    finally:
+        if previous is None:
+            del _thread_local.conn
+        else:
+            _thread_local.conn = previous
+        cursor.close()
+
+
+@contextmanager
+def dedicated_connection():
+    """
+    Make get_duckdb_connection() in the current thread yield a connection
+    opened for this block only and closed on exit. For one-off threads (the
+    boot warm-up) that must not keep a connection the request threads could
+    adopt. Connections to the same file share the database instance, so
+    pages it reads stay warm for them.
+    """
+    previous = getattr(_thread_local, 'conn', None)
+    conn = _open_conn()
+    _thread_local.conn = conn
+    try:
+        yield conn
+    finally:
+        if previous is None:
+            del _thread_local.conn
+        else:
+            _thread_local.conn = previous
+        conn.close()
+
+
+# ── Dataset version ──────────────────────────────────────────────────────────
+
+DatasetVersion = namedtuple('DatasetVersion', ['version', 'updated_at'])
+
+_dataset_version_lock = threading.Lock()
+_dataset_version = None
+_dataset_version_retry_at = 0.0
+_DATASET_VERSION_RETRY_SECONDS = 300
+
+
+def peek_dataset_version():
+    """Return the already-computed DatasetVersion (or None) without touching DuckDB."""
+    return _dataset_version
+
+
+def get_dataset_version():
+    """
+    Return the DatasetVersion of the loaded DuckDB file.
+
+    Computed once per worker process (the file only changes on redeploy, see
+    _ensure_db_file): `updated_at` is MAX(fecha_carga) as an aware UTC
+    datetime, falling back to the file mtime; `version` is a short hash of
+    the file identity plus that timestamp. Used for ETag/Last-Modified and
+    sitemap lastmod instead of querying MAX(fecha_carga) on every request.
+    Returns None if the DB is unavailable (retried after a few minutes).
+    """
+    global _dataset_version, _dataset_version_retry_at
+
+    if _dataset_version is not None:
+        return _dataset_version
+    if time.monotonic() < _dataset_version_retry_at:
+        return None
+
+    with _dataset_version_lock:
+        if _dataset_version is not None:
+            return _dataset_version
+        try:
+            local_path = _ensure_db_file()
+            stat = os.stat(local_path)
+            with get_duckdb_connection() as conn:
+                updated_at = conn.execute(
+                    resolve_schema("SELECT MAX(fecha_carga) FROM gold.fct_agg_colegios_ano")
+                ).fetchone()[0]
+        except Exception as e:
+            logger.warning(f"[DuckDB] Could not compute dataset version: {e}")
+            _dataset_version_retry_at = time.monotonic() + _DATASET_VERSION_RETRY_SECONDS
+            return None
+
+        if isinstance(updated_at, datetime):
+            if updated_at.tzinfo is None:
+                updated_at = updated_at.replace(tzinfo=timezone.utc)
+        elif isinstance(updated_at, date):
+            updated_at = datetime(updated_at.year, updated_at.month, updated_at.day, tzinfo=timezone.utc)
+        else:
+            updated_at = datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc)
+
+        fingerprint = f"{local_path}:{stat.st_size}:{stat.st_mtime_ns}:{updated_at.isoformat()}"
+        version = hashlib.sha1(fingerprint.encode('utf-8')).hexdigest()[:16]
+        _dataset_version = DatasetVersion(version=version, updated_at=updated_at)
+        logger.info(f"[DuckDB] Dataset version {version} (updated_at={updated_at.isoformat()})")
+        return _dataset_version
+
+
 def execute_query(query, params=None):
     """
     Ejecuta una query SQL en DuckDB y retorna un DataFrame.
@@ -6,11 +6,13 @@ from __future__ import annotations
 from io import BytesIO
 from textwrap import fill
 
-from django.http import HttpResponse
-from django.views.decorators.cache import cache_page
+import pandas as pd
+from django.http import HttpResponse, HttpResponsePermanentRedirect
 from django.views.decorators.http import require_http_methods
 
 from .db_utils import execute_query
+from .response_cache import add_cache_tags, compressed_cache_page, school_slug_tag, school_tag
+from .slug_resolver import resolve_slug
 
 
 def _safe_slug(value: str) -> str:
@@ -18,31 +20,34 @@ def _safe_slug(value: str) -> str:
     return "".join(ch for ch in txt if ch.isalnum() or ch in ("-", "_"))
 
 
-def _query_history(slug: str, years: int):
+def _canonical_redirect(request, slug: str, canonical: str):
+    """301 from an alias slug to the canonical PNG under the same prefix (/icfes/ or root)."""
+    path = request.path[: -len(f"{slug}.png")] + f"{canonical}.png"
+    query = request.META.get("QUERY_STRING", "")
+    return HttpResponsePermanentRedirect(f"{path}?{query}" if query else path)
+
+
+def _query_history(codigo: str, years: int):
     query = """
         WITH hist AS (
             SELECT
-                s.slug,
                 CAST(f.ano AS INTEGER) AS ano,
                 f.avg_punt_global,
                 ROW_NUMBER() OVER (
-                    PARTITION BY s.slug
                     ORDER BY CAST(f.ano AS INTEGER) DESC
                 ) AS rn
             FROM gold.fct_agg_colegios_ano f
-            INNER JOIN gold.dim_colegios_slugs s
-                ON s.codigo = f.colegio_bk
-            WHERE s.slug = ?
+            WHERE f.colegio_bk = ?
               AND f.sector IN ('NO OFICIAL', 'NO_OFICIAL')
               AND f.avg_punt_global IS NOT NULL
               AND f.avg_punt_global > 0
         )
-        SELECT slug, ano, avg_punt_global
+        SELECT ano, avg_punt_global
         FROM hist
         WHERE rn <= ?
         ORDER BY ano
     """
-    return execute_query(query, params=[slug, years])
+    return execute_query(query, params=[codigo, years])
 
 
 def _render_png(slug: str, years: int, df):
@@ -84,20 +89,17 @@ def _render_png(slug: str, years: int, df):
     return buffer.getvalue()
 
 
-def _query_social_card_data(slug: str):
+def _query_social_card_data(codigo: str):
     query = """
         WITH school AS (
             SELECT
-                s.codigo AS colegio_bk,
-                s.slug,
+                d.colegio_bk,
                 COALESCE(d.nombre_colegio, '') AS nombre_colegio,
                 COALESCE(d.municipio, '') AS municipio,
                 COALESCE(d.departamento, '') AS departamento,
                 COALESCE(d.sector, '') AS sector
-            FROM gold.dim_colegios_slugs s
-            LEFT JOIN gold.dim_colegios d
-                ON d.colegio_bk = s.codigo
-            WHERE s.slug = ?
+            FROM gold.dim_colegios d
+            WHERE d.colegio_bk = ?
             LIMIT 1
         ),
         latest_score AS (
@@ -116,7 +118,6 @@ def _query_social_card_data(slug: str):
               AND f.avg_punt_global > 0
         )
         SELECT
-            sc.slug,
             sc.nombre_colegio,
             sc.municipio,
             sc.departamento,
@@ -128,7 +129,7 @@ def _query_social_card_data(slug: str):
             ON ls.colegio_bk = sc.colegio_bk
            AND ls.rn = 1
     """
-    return execute_query(query, params=[slug])
+    return execute_query(query, params=[codigo])
 
 
 def _render_social_card_png(slug: str, df):
@@ -205,7 +206,7 @@ def _render_social_card_png(slug: str, df):
     return buffer.getvalue()
 
 
-@cache_page(60 * 60 * 24)  # 24h
+@compressed_cache_page(60 * 60 * 24)  # 24h
 @require_http_methods(["GET"])
 def email_graph_png(request, slug):
     clean_slug = _safe_slug(slug)
@@ -216,7 +217,14 @@ def email_graph_png(request, slug):
         years = 4
     years = min(max(years, 1), 10)
 
-    df = _query_history(clean_slug, years)
+    match = resolve_slug(clean_slug)
+    if match and match.is_alias:
+        return _canonical_redirect(request, slug, match.slug)
+
+    add_cache_tags(request, school_slug_tag(clean_slug))
+    if match:
+        add_cache_tags(request, school_tag(match.codigo))
+    df = _query_history(match.codigo, years) if match else pd.DataFrame()
     png_bytes = _render_png(clean_slug, years, df)
 
     response = HttpResponse(png_bytes, content_type="image/png")
@@ -226,11 +234,18 @@ def email_graph_png(request, slug):
     return response
 
 
-@cache_page(60 * 60 * 24)  # 24h
+@compressed_cache_page(60 * 60 * 24)  # 24h
 @require_http_methods(["GET", "HEAD"])
 def social_card_school_png(request, slug):
     clean_slug = _safe_slug(slug)
-    df = _query_social_card_data(clean_slug)
+    match = resolve_slug(clean_slug)
+    if match and match.is_alias:
+        return _canonical_redirect(request, slug, match.slug)
+
+    add_cache_tags(request, school_slug_tag(clean_slug))
+    if match:
+        add_cache_tags(request, school_tag(match.codigo))
+    df = _query_social_card_data(match.codigo) if match else pd.DataFrame()
     png_bytes = _render_social_card_png(clean_slug, df)
 
     response = HttpResponse(png_bytes, content_type="image/png")
@@ -240,7 +255,7 @@ def social_card_school_png(request, slug):
     return response
 
 
-@cache_page(60 * 60 * 24 * 7)  # 7 days — generic, no school data
+@compressed_cache_page(60 * 60 * 24 * 7)  # 7 days — generic, no school data
 @require_http_methods(["GET", "HEAD"])
 def og_default_image(request):
     """Generic 1200x630 OG image for ranking/category pages (not school-specific)."""
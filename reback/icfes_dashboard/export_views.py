@@ -1,160 +1,349 @@
 """
 Export views for ICFES Dashboard.
 Provides CSV and PDF export functionality for school reports.
+
+Tabular exports stream: CSV in fetchmany batches through
+StreamingHttpResponse, Arrow as an IPC stream of DuckDB record batches, and
+Parquet written by DuckDB itself (COPY ... TO) and served as a file — memory
+stays constant regardless of the number of rows.
+
+PDF reports are built by a Celery worker and cached per dataset version
+(see pdf_reports / tasks); the views only serve or enqueue them.
 """
+import contextlib
 import csv
+import io
 import logging
-from datetime import datetime
-from io import BytesIO
+import os
+import tempfile
 
+from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponse
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import redirect
+from django.urls import reverse
+from django.utils.text import slugify
+
+from reback.users.decorators import subscription_required, user_has_tier
+from . import pdf_reports
+from .db_utils import get_duckdb_connection, resolve_schema
+from .tasks import enqueue_report, generate_pdf_report
 
-from reback.users.decorators import subscription_required
-from .db_utils import get_duckdb_connection
+try:
+    import pyarrow as pa
+except ImportError:  # Arrow IPC export is optional; CSV / Parquet do not need it
+    pa = None
 
 logger = logging.getLogger(__name__)
 
 
+# =============================================================================
+# STREAMING HELPERS
+# =============================================================================
+
+EXPORT_BATCH_ROWS = 2000
+EXPORT_FORMATS = ('csv', 'parquet', 'arrow')
+# Parquet / Arrow: descargas columnar para análisis (plan Institucional)
+COLUMNAR_TIER = 'institutional'
+
+# Fin de stream Arrow IPC (continuation marker + longitud 0)
+_ARROW_EOS = b'\xff\xff\xff\xff\x00\x00\x00\x00'
+
+
+class _Echo:
+    """Pseudo-buffer para csv.writer: devuelve la línea en vez de guardarla."""
+
+    def write(self, value):
+        return value
+
+
+def _export_cursor(sql, params):
+    """Cursor propio (no el de la conexión del hilo) con la query ya ejecutada."""
+    with get_duckdb_connection() as conn:
+        cursor = conn.cursor()
+    cursor.execute(resolve_schema(sql), params)
+    return cursor
+
+
+def stream_csv(cursor, header):
+    """Líneas CSV por lotes de fetchmany: memoria constante sin importar el tamaño."""
+    writer = csv.writer(_Echo())
+    try:
+        yield writer.writerow(header)
+        while True:
+            rows = cursor.fetchmany(EXPORT_BATCH_ROWS)
+            if not rows:
+                break
+            yield ''.join(writer.writerow(row) for row in rows)
+    finally:
+        cursor.close()
+
+
+def stream_arrow(cursor):
+    """Arrow IPC stream (schema + record batches) directo desde DuckDB."""
+    try:
+        reader = cursor.fetch_record_batch(EXPORT_BATCH_ROWS)
+        yield reader.schema.serialize().to_pybytes()
+        for batch in reader:
+            yield batch.serialize().to_pybytes()
+        yield _ARROW_EOS
+    finally:
+        cursor.close()
+
+
+def _csv_response(cursor, header, filename):
+    response = StreamingHttpResponse(stream_csv(cursor, header), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+    return response
+
+
+class _TemporaryExport(io.FileIO):
+    """Archivo temporal que se borra al cerrarlo (FileResponse lo cierra al terminar de enviarlo)."""
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(self.name)
+
+
+def _parquet_response(sql, params, filename):
+    """
+    DuckDB escribe el Parquet (COPY ... TO, sin pasar filas por Python) a un
+    temporal que se sirve con FileResponse; el archivo se borra cuando la
+    respuesta lo cierra (no mientras está abierto: en Windows eso falla).
+    """
+    fd, path = tempfile.mkstemp(suffix='.parquet')
+    os.close(fd)
+    try:
+        with get_duckdb_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(
+                    f"COPY ({resolve_schema(sql)}) TO '{path}' (FORMAT PARQUET, COMPRESSION ZSTD)",
+                    params,
+                )
+            finally:
+                cursor.close()
+    except Exception:
+        os.unlink(path)
+        raise
+    return FileResponse(
+        _TemporaryExport(path, 'rb'), as_attachment=True, filename=f'{filename}.parquet',
+        content_type='application/vnd.apache.parquet',
+    )
+
+
+def _arrow_response(cursor, filename):
+    response = StreamingHttpResponse(stream_arrow(cursor), content_type='application/vnd.apache.arrow.stream')
+    response['Content-Disposition'] = f'attachment; filename="{filename}.arrow"'
+    return response
+
+
+def export_response(request, sql, params, header, filename):
+    """
+    Respuesta de descarga según ?format=csv|parquet|arrow (default csv).
+    Parquet y Arrow requieren plan Institucional.
+    """
+    fmt = (request.GET.get('format') or 'csv').lower()
+    if fmt not in EXPORT_FORMATS:
+        return HttpResponse(f"Formato no soportado: {fmt}", status=400)
+    if fmt != 'csv' and not user_has_tier(request.user, COLUMNAR_TIER):
+        messages.warning(request, 'Las descargas Parquet/Arrow son exclusivas del Plan Institucional.')
+        return redirect('pages:pricing')
+    if fmt == 'arrow' and pa is None:
+        return HttpResponse("Exportación Arrow no disponible en este servidor", status=501)
+
+    if fmt == 'parquet':
+        return _parquet_response(sql, params, filename)
+    cursor = _export_cursor(sql, params)
+    if fmt == 'arrow':
+        return _arrow_response(cursor, filename)
+    return _csv_response(cursor, header, filename)
+
+
 # =============================================================================
 # CSV EXPORTS (Basic Plan)
 # =============================================================================
 
+# Desde fct_colegio_historico (un registro por colegio y año, ya agregado)
+# en lugar de agrupar los 17.7M de filas de fct_icfes_analytics.
+SCHOOL_SEARCH_EXPORT_SQL = """
+    SELECT
+        nombre_colegio AS nombre,
+        departamento,
+        municipio,
+        sector AS naturaleza,
+        ROUND(avg_punt_global, 2) AS puntaje_global,
+        ROUND(avg_punt_lectura_critica, 2) AS lectura,
+        ROUND(avg_punt_matematicas, 2) AS matematicas,
+        ROUND(avg_punt_sociales_ciudadanas, 2) AS sociales,
+        ROUND(avg_punt_c_naturales, 2) AS ciencias,
+        ROUND(avg_punt_ingles, 2) AS ingles,
+        total_estudiantes AS num_estudiantes
+    FROM gold.fct_colegio_historico
+    WHERE CAST(ano AS INTEGER) = ?
+      AND nombre_colegio ILIKE ?
+    ORDER BY avg_punt_global DESC NULLS LAST, nombre_colegio
+"""
+
+# Promedios ponderados por estudiantes = AVG por estudiante de fct_icfes_analytics.
+# El denominador de cada materia solo suma los colegios con ese puntaje (sin
+# NULL), si no los colegios sin dato bajan el promedio.
+RANKING_EXPORT_SQL = """
+    SELECT
+        departamento,
+        ROUND(SUM(avg_punt_global * total_estudiantes)
+              / NULLIF(SUM(total_estudiantes) FILTER (WHERE avg_punt_global IS NOT NULL), 0), 2) AS promedio_global,
+        ROUND(SUM(avg_punt_lectura_critica * total_estudiantes)
+              / NULLIF(SUM(total_estudiantes) FILTER (WHERE avg_punt_lectura_critica IS NOT NULL), 0), 2) AS promedio_lectura,
+        ROUND(SUM(avg_punt_matematicas * total_estudiantes)
+              / NULLIF(SUM(total_estudiantes) FILTER (WHERE avg_punt_matematicas IS NOT NULL), 0), 2) AS promedio_matematicas,
+        ROUND(SUM(avg_punt_sociales_ciudadanas * total_estudiantes)
+              / NULLIF(SUM(total_estudiantes) FILTER (WHERE avg_punt_sociales_ciudadanas IS NOT NULL), 0), 2) AS promedio_sociales,
+        ROUND(SUM(avg_punt_c_naturales * total_estudiantes)
+              / NULLIF(SUM(total_estudiantes) FILTER (WHERE avg_punt_c_naturales IS NOT NULL), 0), 2) AS promedio_ciencias,
+        ROUND(SUM(avg_punt_ingles * total_estudiantes)
+              / NULLIF(SUM(total_estudiantes) FILTER (WHERE avg_punt_ingles IS NOT NULL), 0), 2) AS promedio_ingles,
+        SUM(total_estudiantes) AS total_estudiantes
+    FROM gold.fct_colegio_historico
+    WHERE CAST(ano AS INTEGER) = ?
+      AND departamento IS NOT NULL
+    GROUP BY departamento
+    ORDER BY promedio_global DESC
+"""
+
+
+def _export_year(request):
+    try:
+        return int(request.GET.get('ano', 2024))
+    except (TypeError, ValueError):
+        return None
+
+
 @login_required
 @subscription_required(tier='basic')
 def export_school_search_csv(request):
     """
-    Export school search results to CSV.
+    Export school search results (CSV, or Parquet/Arrow with ?format=).
     Requires Basic subscription or higher.
     """
     query = request.GET.get('query', '')
-    ano = request.GET.get('ano', 2024)
-    
-    logger.info(f"CSV Export: School search - query='{query}', ano={ano}, user={request.user.email}")
-    
-    try:
-        with get_duckdb_connection() as conn:
-            # Query school data
-            sql = """
-                SELECT 
-                    c.cole_nombre_establecimiento as nombre,
-                    c.cole_depto_ubicacion as departamento,
-                    c.cole_mcpio_ubicacion as municipio,
-                    c.cole_naturaleza as naturaleza,
-                    a.punt_global as puntaje_global,
-                    a.punt_lectura_critica as lectura,
-                    a.punt_matematicas as matematicas,
-                    a.punt_sociales_ciudadanas as sociales,
-                    a.punt_ciencias_naturales as ciencias,
-                    a.punt_ingles as ingles,
-                    COUNT(*) as num_estudiantes
-                FROM gold.dim_colegios c
-                LEFT JOIN gold.fct_icfes_analytics a 
-                    ON c.colegio_sk = a.colegio_sk 
-                    AND a.ano = ?
-                WHERE c.cole_nombre_establecimiento ILIKE ?
-                GROUP BY 
-                    c.cole_nombre_establecimiento,
-                    c.cole_depto_ubicacion,
-                    c.cole_mcpio_ubicacion,
-                    c.cole_naturaleza,
-                    a.punt_global,
-                    a.punt_lectura_critica,
-                    a.punt_matematicas,
-                    a.punt_sociales_ciudadanas,
-                    a.punt_ciencias_naturales,
-                    a.punt_ingles
-                ORDER BY a.punt_global DESC NULLS LAST
-                LIMIT 500
-            """
-            
-            results = conn.execute(sql, [ano, f'%{query}%']).fetchall()
-            
-            # Create CSV response
-            response = HttpResponse(content_type='text/csv; charset=utf-8')
-            filename = f"colegios_{query.replace(' ', '_')}_{ano}.csv"
-            response['Content-Disposition'] = f'attachment; filename="{filename}"'
-            
-            # Write CSV
-            writer = csv.writer(response)
-            writer.writerow([
-                'Nombre', 'Departamento', 'Municipio', 'Naturaleza',
-                'Puntaje Global', 'Lectura', 'Matemáticas', 'Sociales', 
-                'Ciencias', 'Inglés', 'Estudiantes'
-            ])
-            
-            for row in results:
-                writer.writerow(row)
-            
-            logger.info(f"CSV Export successful: {len(results)} schools exported")
-            return response
-        
-    except Exception as e:
-        logger.error(f"Error exporting CSV: {e}")
-        raise
+    ano = _export_year(request)
+    if ano is None:
+        return HttpResponse("Parámetro ano inválido", status=400)
+
+    logger.info(f"Export: School search - query='{query}', ano={ano}, user={request.user.email}")
+
+    filename = slugify(f"colegios_{query}_{ano}").replace('-', '_') or f"colegios_{ano}"
+    return export_response(
+        request,
+        SCHOOL_SEARCH_EXPORT_SQL,
+        [ano, f'%{query}%'],
+        [
+            'Nombre', 'Departamento', 'Municipio', 'Naturaleza',
+            'Puntaje Global', 'Lectura', 'Matemáticas', 'Sociales',
+            'Ciencias', 'Inglés', 'Estudiantes'
+        ],
+        filename,
+    )
 
 
 @login_required
 @subscription_required(tier='basic')
 def export_ranking_csv(request):
     """
-    Export departmental ranking to CSV.
+    Export departmental ranking (CSV, or Parquet/Arrow with ?format=).
     Requires Basic subscription or higher.
     """
-    ano = request.GET.get('ano', 2024)
-    
-    logger.info(f"CSV Export: Ranking - ano={ano}, user={request.user.email}")
-    
-    try:
-        with get_duckdb_connection() as conn:
-            sql = """
-                SELECT 
-                    cole_depto_ubicacion as departamento,
-                    ROUND(AVG(punt_global), 2) as promedio_global,
-                    ROUND(AVG(punt_lectura_critica), 2) as promedio_lectura,
-                    ROUND(AVG(punt_matematicas), 2) as promedio_matematicas,
-                    ROUND(AVG(punt_sociales_ciudadanas), 2) as promedio_sociales,
-                    ROUND(AVG(punt_ciencias_naturales), 2) as promedio_ciencias,
-                    ROUND(AVG(punt_ingles), 2) as promedio_ingles,
-                    COUNT(*) as total_estudiantes
-                FROM gold.fct_icfes_analytics
-                WHERE ano = ?
-                GROUP BY cole_depto_ubicacion
-                ORDER BY promedio_global DESC
-            """
-            
-            results = conn.execute(sql, [ano]).fetchall()
-            
-            # Create CSV response
-            response = HttpResponse(content_type='text/csv; charset=utf-8')
-            response['Content-Disposition'] = f'attachment; filename="ranking_departamental_{ano}.csv"'
-            
-            # Write CSV
-            writer = csv.writer(response)
-            writer.writerow([
-                'Departamento', 'Promedio Global', 'Lectura', 'Matemáticas',
-                'Sociales', 'Ciencias', 'Inglés', 'Total Estudiantes'
-            ])
-            
-            for row in results:
-                writer.writerow(row)
-            
-            logger.info(f"CSV Export successful: {len(results)} departments exported")
-            return response
-        
-    except Exception as e:
-        logger.error(f"Error exporting ranking CSV: {e}")
-        raise
+    ano = _export_year(request)
+    if ano is None:
+        return HttpResponse("Parámetro ano inválido", status=400)
+
+    logger.info(f"Export: Ranking - ano={ano}, user={request.user.email}")
+
+    return export_response(
+        request,
+        RANKING_EXPORT_SQL,
+        [ano],
+        [
+            'Departamento', 'Promedio Global', 'Lectura', 'Matemáticas',
+            'Sociales', 'Ciencias', 'Inglés', 'Total Estudiantes'
+        ],
+        f"ranking_departamental_{ano}",
+    )
 
 
 # =============================================================================
 # PDF EXPORTS (Premium Plan)
 # =============================================================================
+# Los PDF se generan en un worker de Celery (tasks.generate_pdf_report) y se
+# cachean por (reporte, parámetros, versión del dataset). Si el PDF ya está en
+# caché se descarga de inmediato; si no, se encola y se responde 202:
+#   - Accept: application/json → {job_id, status, status_url, download_url}
+#     para que el front haga polling a status_url;
+#   - navegador → página "Generando..." con Refresh, que vuelve a pedir la
+#     misma URL hasta que el PDF está listo.
+# Un job en error se responde con 500 (no se reencola en cada Refresh). Sin
+# worker (CELERY_TASK_ALWAYS_EAGER, default en Railway) o sin broker, el PDF
+# se genera dentro del mismo request.
+
+def _pdf_response(report):
+    filename, content = report
+    response = HttpResponse(content, content_type='application/pdf')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def _wants_json(request):
+    return 'application/json' in request.headers.get('Accept', '')
+
+
+def _report_response(request, kind, params):
+    """PDF si ya está generado; si no, encola el job y responde 202."""
+    rid = pdf_reports.report_id(kind, params)
+    report = pdf_reports.get_report(rid)
+    if report is not None:
+        return _pdf_response(report)
+
+    state = pdf_reports.job_status(rid)
+    if state['status'] == pdf_reports.UNKNOWN:
+        try:
+            enqueue_report(kind, params)
+        except Exception:
+            # Sin broker: se genera en este mismo request en lugar de fallar
+            logger.exception(f"PDF Export: no se pudo encolar {kind} {params}, generando en línea")
+            generate_pdf_report(rid, kind, params)
+        # Con CELERY_TASK_ALWAYS_EAGER (o un worker muy rápido) ya puede estar listo
+        report = pdf_reports.get_report(rid)
+        if report is not None:
+            return _pdf_response(report)
+        state = pdf_reports.job_status(rid)
+
+    if state['status'] == pdf_reports.NOT_FOUND:
+        return HttpResponse("Colegio no encontrado", status=404)
+    if state['status'] == pdf_reports.ERROR:
+        # Sin reintento automático: el estado expira con JOB_TTL
+        if _wants_json(request):
+            return JsonResponse({'job_id': rid, **state}, status=500)
+        return HttpResponse(state.get('error', 'Error generando el reporte'), status=500)
+
+    status_url = reverse('icfes_dashboard:export_pdf_status', args=[rid])
+    if _wants_json(request):
+        return JsonResponse({
+            'job_id': rid,
+            'status': state['status'],
+            'status_url': status_url,
+            'download_url': reverse('icfes_dashboard:export_pdf_download', args=[rid]),
+        }, status=202)
+    response = HttpResponse(
+        "<p>Generando el reporte PDF… la descarga empezará automáticamente.</p>",
+        status=202,
+    )
+    response['Refresh'] = '3'
+    return response
+
 
 @login_required
 @subscription_required(tier='premium')
@@ -174,151 +363,7 @@ def export_school_report_pdf(request, colegio_sk):
     logger.info(
         f"PDF Export: School report - colegio_sk={colegio_sk}, ano={report_year}, user={request.user.email}"
     )
-    
-    try:
-        with get_duckdb_connection() as conn:
-            # Get school info
-            school_sql = """
-                SELECT 
-                    cole_nombre_establecimiento,
-                    cole_depto_ubicacion,
-                    cole_mcpio_ubicacion,
-                    cole_naturaleza,
-                    cole_calendario
-                FROM gold.dim_colegios
-                WHERE colegio_sk = ?
-            """
-            school = conn.execute(school_sql, [colegio_sk]).fetchone()
-            
-            if not school:
-                return HttpResponse("Colegio no encontrado", status=404)
-            
-            # Get historical data (last 5 years)
-            history_sql = """
-                SELECT 
-                    ano,
-                    ROUND(AVG(punt_global), 2) as promedio_global,
-                    ROUND(AVG(punt_lectura_critica), 2) as lectura,
-                    ROUND(AVG(punt_matematicas), 2) as matematicas,
-                    ROUND(AVG(punt_sociales_ciudadanas), 2) as sociales,
-                    ROUND(AVG(punt_ciencias_naturales), 2) as ciencias,
-                    ROUND(AVG(punt_ingles), 2) as ingles,
-                    COUNT(*) as estudiantes
-                FROM gold.fct_icfes_analytics
-                WHERE colegio_sk = ?
-                GROUP BY ano
-                ORDER BY ano DESC
-                LIMIT 5
-            """
-            history_params = [colegio_sk]
-            if report_year is not None:
-                history_sql = """
-                    SELECT 
-                        ano,
-                        ROUND(AVG(punt_global), 2) as promedio_global,
-                        ROUND(AVG(punt_lectura_critica), 2) as lectura,
-                        ROUND(AVG(punt_matematicas), 2) as matematicas,
-                        ROUND(AVG(punt_sociales_ciudadanas), 2) as sociales,
-                        ROUND(AVG(punt_ciencias_naturales), 2) as ciencias,
-                        ROUND(AVG(punt_ingles), 2) as ingles,
-                        COUNT(*) as estudiantes
-                    FROM gold.fct_icfes_analytics
-                    WHERE colegio_sk = ?
-                      AND CAST(ano AS INTEGER) <= ?
-                    GROUP BY ano
-                    ORDER BY ano DESC
-                    LIMIT 5
-                """
-                history_params.append(report_year)
-
-            history = conn.execute(history_sql, history_params).fetchall()
-            if report_year is None and history:
-                try:
-                    report_year = int(history[0][0])
-                except (TypeError, ValueError):
-                    report_year = None
-            
-            # Create PDF
-            buffer = BytesIO()
-            doc = SimpleDocTemplate(buffer, pagesize=letter)
-            story = []
-            styles = getSampleStyleSheet()
-            
-            # Title
-            title_style = ParagraphStyle(
-                'CustomTitle',
-                parent=styles['Heading1'],
-                fontSize=18,
-                textColor=colors.HexColor('#1f77b4'),
-                spaceAfter=30,
-            )
-            title = Paragraph(f"Reporte: {school[0]}", title_style)
-            story.append(title)
-            if report_year is not None:
-                subtitle = Paragraph(f"Corte de datos: {report_year}", styles['Normal'])
-                story.append(subtitle)
-                story.append(Spacer(1, 0.15*inch))
-            
-            # School info
-            info_data = [
-                ['Departamento:', school[1]],
-                ['Municipio:', school[2]],
-                ['Naturaleza:', school[3]],
-                ['Calendario:', school[4] or 'N/A'],
-            ]
-            
-            info_table = Table(info_data, colWidths=[2*inch, 4*inch])
-            info_table.setStyle(TableStyle([
-                ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-                ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 0), (-1, -1), 11),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-            ]))
-            story.append(info_table)
-            story.append(Spacer(1, 0.3*inch))
-            
-            # Historical performance
-            if history:
-                story.append(Paragraph("Desempeño Histórico", styles['Heading2']))
-                story.append(Spacer(1, 0.2*inch))
-                
-                history_data = [['Año', 'Global', 'Lectura', 'Matemáticas', 'Sociales', 'Ciencias', 'Inglés', 'Estudiantes']]
-                for row in history:
-                    history_data.append(list(row))
-                
-                history_table = Table(history_data, colWidths=[0.7*inch] * 8)
-                history_table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, 0), 10),
-                    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ]))
-                story.append(history_table)
-            
-            # Footer
-            story.append(Spacer(1, 0.5*inch))
-            footer_text = f"Generado el {datetime.now().strftime('%d/%m/%Y %H:%M')} - ICFES Analytics Platform"
-            footer = Paragraph(footer_text, styles['Normal'])
-            story.append(footer)
-            
-            # Build PDF
-            doc.build(story)
-            
-            # Return response
-            buffer.seek(0)
-            response = HttpResponse(buffer, content_type='application/pdf')
-            response['Content-Disposition'] = f'attachment; filename="reporte_{colegio_sk}.pdf"'
-            
-            logger.info(f"PDF Export successful: {colegio_sk}")
-            return response
-        
-    except Exception as e:
-        logger.error(f"Error exporting PDF: {e}")
-        raise
+    return _report_response(request, 'school', {'colegio_sk': str(colegio_sk), 'ano': report_year})
 
 
 @login_required
@@ -329,85 +374,36 @@ def export_comparison_pdf(request):
     Requires Premium subscription.
     """
     colegio_ids = request.GET.getlist('colegios[]')
-    ano = request.GET.get('ano', 2024)
-    
+    try:
+        ano = int(request.GET.get('ano', 2024))
+    except (TypeError, ValueError):
+        return HttpResponse("Parámetro ano inválido", status=400)
+
     logger.info(f"PDF Export: Comparison - colegios={colegio_ids}, ano={ano}, user={request.user.email}")
-    
-    if not colegio_ids or len(colegio_ids) < 2:
+
+    colegio_ids = sorted(set(colegio_ids))
+    if len(colegio_ids) < 2:
         return HttpResponse("Se requieren al menos 2 colegios para comparar", status=400)
-    
-    try:
-        with get_duckdb_connection() as conn:
-            # Get comparison data
-            placeholders = ','.join(['?' for _ in colegio_ids])
-            sql = f"""
-                SELECT 
-                    c.cole_nombre_establecimiento as nombre,
-                    c.cole_depto_ubicacion as departamento,
-                    ROUND(AVG(a.punt_global), 2) as global,
-                    ROUND(AVG(a.punt_lectura_critica), 2) as lectura,
-                    ROUND(AVG(a.punt_matematicas), 2) as matematicas,
-                    ROUND(AVG(a.punt_sociales_ciudadanas), 2) as sociales,
-                    ROUND(AVG(a.punt_ciencias_naturales), 2) as ciencias,
-                    ROUND(AVG(a.punt_ingles), 2) as ingles,
-                    COUNT(*) as estudiantes
-                FROM gold.dim_colegios c
-                LEFT JOIN gold.fct_icfes_analytics a 
-                    ON c.colegio_sk = a.colegio_sk 
-                    AND a.ano = ?
-                WHERE c.colegio_sk IN ({placeholders})
-                GROUP BY c.cole_nombre_establecimiento, c.cole_depto_ubicacion
-            """
-            
-            results = conn.execute(sql, [ano] + colegio_ids).fetchall()
-            
-            # Create PDF
-            buffer = BytesIO()
-            doc = SimpleDocTemplate(buffer, pagesize=letter)
-            story = []
-            styles = getSampleStyleSheet()
-            
-            # Title
-            title = Paragraph(f"Comparación de Colegios - {ano}", styles['Heading1'])
-            story.append(title)
-            story.append(Spacer(1, 0.3*inch))
-            
-            # Comparison table
-            table_data = [['Colegio', 'Depto', 'Global', 'Lectura', 'Matemáticas', 'Sociales', 'Ciencias', 'Inglés', 'Est.']]
-            for row in results:
-                table_data.append(list(row))
-            
-            comparison_table = Table(table_data, colWidths=[2*inch, 1*inch, 0.6*inch, 0.6*inch, 0.8*inch, 0.6*inch, 0.6*inch, 0.6*inch, 0.5*inch])
-            comparison_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1f77b4')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 9),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('FONTSIZE', (0, 1), (-1, -1), 8),
-            ]))
-            story.append(comparison_table)
-            
-            # Footer
-            story.append(Spacer(1, 0.5*inch))
-            footer_text = f"Generado el {datetime.now().strftime('%d/%m/%Y %H:%M')} - ICFES Analytics Platform"
-            footer = Paragraph(footer_text, styles['Normal'])
-            story.append(footer)
-            
-            # Build PDF
-            doc.build(story)
-            
-            # Return response
-            buffer.seek(0)
-            response = HttpResponse(buffer, content_type='application/pdf')
-            response['Content-Disposition'] = f'attachment; filename="comparacion_{ano}.pdf"'
-            
-            logger.info(f"PDF Export successful: {len(results)} schools compared")
-            return response
-        
-    except Exception as e:
-        logger.error(f"Error exporting comparison PDF: {e}")
-        raise
+
+    return _report_response(request, 'comparison', {'colegios': colegio_ids, 'ano': ano})
+
+
+@login_required
+@subscription_required(tier='premium')
+def export_pdf_status(request, job_id):
+    """Estado de un job de PDF para polling: pending, running, ready, not_found, error o unknown."""
+    state = pdf_reports.job_status(job_id)
+    payload = {'job_id': job_id, **state}
+    if state['status'] == pdf_reports.READY:
+        payload['download_url'] = reverse('icfes_dashboard:export_pdf_download', args=[job_id])
+    return JsonResponse(payload, status=404 if state['status'] == pdf_reports.UNKNOWN else 200)
+
+
+@login_required
+@subscription_required(tier='premium')
+def export_pdf_download(request, job_id):
+    """Descarga de un PDF ya generado."""
+    report = pdf_reports.get_report(job_id)
+    if report is None:
+        return HttpResponse("Reporte no disponible", status=404)
+    return _pdf_response(report)
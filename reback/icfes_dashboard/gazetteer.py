@@ -0,0 +1,236 @@
+"""
+Gazetteer: one place to resolve department / municipality / region names.
+
+Loaded once per dataset version (like school_search / slug_resolver) from
+the DISTINCT location columns of the tables we filter on. Every spelling
+("Bogotá DC", "BOGOTÁ D.C.", "bogota-dc", "BOGOTA"), every slug and the
+known aliases ("valle", "norte-santander", "san-andres") fold to the same
+canonical key through geo_key(), so resolution is a dict lookup.
+
+- Canonical name: the fct_agg_colegios_ano spelling (what the geo landing
+  pages filter on); places only seen in other tables are `primary=False`.
+- variants: every raw spelling seen in any source table. SQL filters use
+  `col IN (variants)` instead of normalizing each row
+  (`strip_accents(upper(trim(col)))`), which kept DuckDB from pruning.
+"""
+import logging
+import threading
+import unicodedata
+from collections import namedtuple
+
+import duckdb
+from django.utils.text import slugify
+
+from .db_utils import get_dataset_version, get_duckdb_connection, resolve_schema
+
+logger = logging.getLogger(__name__)
+
+Place = namedtuple("Place", ["key", "name", "slug", "variants", "primary"])
+
+# (table, departamento column, municipio column or None). First source is primary.
+_SOURCES = (
+    ("fct_agg_colegios_ano", "departamento", "municipio"),
+    ("fct_colegio_historico", "departamento", "municipio"),
+    ("dim_colegios", "departamento", "municipio"),
+    ("fct_potencial_educativo", "departamento", None),
+    ("vw_fct_colegios_region", "departamento", None),
+    ("icfes_master_resumen", "cole_depto_ubicacion", None),
+)
+_REGION_SOURCE = ("vw_fct_colegios_region", "region")
+
+# Folded spelling → canonical key. Prefix rules cover the long official names.
+_DEPARTAMENTO_KEY_PREFIXES = (
+    ("BOGOTA", "BOGOTA"),
+    ("ARCHIPIELAGO DE SAN ANDRES", "SAN ANDRES"),
+    ("SAN ANDRES", "SAN ANDRES"),
+)
+_DEPARTAMENTO_KEY_ALIASES = {
+    "VALLE": "VALLE DEL CAUCA",          # bots usan solo "valle"
+    "NORTE SANTANDER": "NORTE DE SANTANDER",  # bots omiten "de"
+    "GUAJIRA": "LA GUAJIRA",
+}
+_MUNICIPIO_KEY_PREFIXES = (
+    ("BOGOTA", "BOGOTA"),                # "Bogotá D.C.", "bogota-d-c"
+)
+
+
+def fold(value):
+    """Upper-case, strip accents and punctuation, collapse whitespace."""
+    if value is None:
+        return ""
+    s = unicodedata.normalize("NFD", str(value).strip().upper())
+    s = "".join(c for c in s if unicodedata.category(c) != "Mn")
+    s = "".join(ch if ch.isalnum() else " " for ch in s)
+    return " ".join(s.split())
+
+
+def geo_key(value, kind="departamento"):
+    """Canonical key for a name, slug or alias: 'bogota-dc' → 'BOGOTA'."""
+    folded = fold(value)
+    if kind == "departamento":
+        prefixes = _DEPARTAMENTO_KEY_PREFIXES
+        folded = _DEPARTAMENTO_KEY_ALIASES.get(folded, folded)
+    elif kind == "municipio":
+        prefixes = _MUNICIPIO_KEY_PREFIXES
+    else:
+        prefixes = ()
+    for prefix, key in prefixes:
+        if folded.startswith(prefix):
+            return key
+    return folded
+
+
+def _fallback_variants(value):
+    """Spellings derivable from the value itself (unknown to the gazetteer)."""
+    raw = str(value).strip()
+    folded = fold(raw)
+    return sorted({raw, raw.upper(), folded} - {""})
+
+
+class _Builder:
+    def __init__(self):
+        self.names = {}      # key → canonical name
+        self.variants = {}   # key → set of raw spellings
+        self.primary = set()
+
+    def add(self, key, raw, primary):
+        if not key:
+            return
+        self.variants.setdefault(key, set()).add(raw)
+        if key not in self.names or (primary and key not in self.primary):
+            self.names[key] = raw
+        if primary:
+            self.primary.add(key)
+
+    def places(self):
+        return {
+            key: Place(key, name, slugify(name), tuple(sorted(self.variants[key])), key in self.primary)
+            for key, name in self.names.items()
+        }
+
+
+class Gazetteer:
+    """
+    rows: (source_is_primary, departamento, municipio_or_None)
+    region_rows: region names
+    """
+
+    def __init__(self, rows, region_rows=()):
+        departamentos, municipios, municipio_names, regions = _Builder(), _Builder(), _Builder(), _Builder()
+        for primary, departamento, municipio in rows:
+            if not departamento or not str(departamento).strip():
+                continue
+            dep_key = geo_key(departamento)
+            departamentos.add(dep_key, departamento, primary)
+            if municipio and str(municipio).strip():
+                muni_key = geo_key(municipio, "municipio")
+                municipios.add((dep_key, muni_key), municipio, primary)
+                municipio_names.add(muni_key, municipio, primary)
+        for region in region_rows:
+            if region and str(region).strip():
+                regions.add(geo_key(region, "region"), region, True)
+
+        self._departamentos = departamentos.places()
+        self._municipios = municipios.places()
+        self._municipio_names = municipio_names.places()
+        self._regions = regions.places()
+
+    def departamento(self, value, primary_only=False):
+        """Place for any spelling, slug or alias of a department, or None."""
+        place = self._departamentos.get(geo_key(value))
+        if place is None or (primary_only and not place.primary):
+            return None
+        return place
+
+    def municipio(self, departamento, value, primary_only=False):
+        place = self._municipios.get((geo_key(departamento), geo_key(value, "municipio")))
+        if place is None or (primary_only and not place.primary):
+            return None
+        return place
+
+    def departamentos(self):
+        return sorted((p for p in self._departamentos.values() if p.primary), key=lambda p: p.name)
+
+    def municipios(self, departamento):
+        dep_key = geo_key(departamento)
+        return sorted(
+            (p for (d, _), p in self._municipios.items() if d == dep_key and p.primary),
+            key=lambda p: p.name,
+        )
+
+    def canonical_departamento(self, value):
+        place = self.departamento(value)
+        return place.name if place else value
+
+    def departamento_variants(self, value):
+        place = self.departamento(value)
+        return sorted(set(place.variants) | set(_fallback_variants(value))) if place else _fallback_variants(value)
+
+    def municipio_variants(self, value):
+        """Spellings of a municipality name in any department (hierarchy_history has no dept)."""
+        place = self._municipio_names.get(geo_key(value, "municipio"))
+        return sorted(set(place.variants) | set(_fallback_variants(value))) if place else _fallback_variants(value)
+
+    def region_variants(self, value):
+        place = self._regions.get(geo_key(value, "region"))
+        return sorted(set(place.variants) | set(_fallback_variants(value))) if place else _fallback_variants(value)
+
+
+def _fetch_rows(conn):
+    rows = []
+    for position, (table, dep_col, muni_col) in enumerate(_SOURCES):
+        muni_expr = muni_col or "NULL"
+        query = f"SELECT DISTINCT {dep_col}, {muni_expr} FROM gold.{table} WHERE {dep_col} IS NOT NULL"
+        try:
+            result = conn.execute(resolve_schema(query)).fetchall()
+        except duckdb.Error as exc:
+            logger.warning("Gazetteer: skipping %s (%s)", table, exc)
+            continue
+        rows.extend((position == 0, dep, muni) for dep, muni in result)
+
+    table, col = _REGION_SOURCE
+    try:
+        regions = [r[0] for r in conn.execute(
+            resolve_schema(f"SELECT DISTINCT {col} FROM gold.{table} WHERE {col} IS NOT NULL")
+        ).fetchall()]
+    except duckdb.Error as exc:
+        logger.warning("Gazetteer: skipping regions (%s)", exc)
+        regions = []
+    return rows, regions
+
+
+_lock = threading.Lock()
+_gazetteer = None
+_gazetteer_version = None
+
+
+def build_gazetteer():
+    with get_duckdb_connection() as conn:
+        rows, regions = _fetch_rows(conn)
+    return Gazetteer(rows, regions)
+
+
+def get_gazetteer():
+    """Return the process-wide gazetteer, reloading it when the dataset version changes."""
+    global _gazetteer, _gazetteer_version
+    dataset = get_dataset_version()
+    version = dataset.version if dataset else None
+    if _gazetteer is not None and _gazetteer_version == version:
+        return _gazetteer
+    with _lock:
+        if _gazetteer is None or _gazetteer_version != version:
+            gazetteer = build_gazetteer()
+            _gazetteer, _gazetteer_version = gazetteer, version
+            logger.info(
+                "Gazetteer loaded: %s departamentos, %s municipios (dataset=%s)",
+                len(gazetteer.departamentos()), len(gazetteer._municipios), version,
+            )
+    return _gazetteer
+
+
+def departamento_variants(value):
+    return get_gazetteer().departamento_variants(value)
+
+
+def canonical_departamento(value):
+    return get_gazetteer().canonical_departamento(value)
@@ -4,17 +4,17 @@ Uses lightweight aggregate queries from fct_agg_colegios_ano.
 """
 import json
 import logging
-from functools import lru_cache
 
 from django.conf import settings
 from django.http import Http404, HttpResponse
 from django.shortcuts import redirect, render
 from django.utils.text import slugify
-from django.views.decorators.cache import cache_page
 
 from contextlib import contextmanager
 
 from .db_utils import get_duckdb_connection, resolve_schema
+from .gazetteer import get_gazetteer
+from .response_cache import add_cache_tags, compressed_cache_page, geo_cache_tags
 
 
 @contextmanager
@@ -93,83 +93,15 @@ def _build_base_url(request):
     return request.build_absolute_uri("/").rstrip("/")
 
 
-# Aliases para departamentos cuyo nombre completo genera slugs muy largos o poco amigables.
-# Clave: slug alternativo → fragmento identificador del nombre real en la DB.
-_DEPARTAMENTO_SLUG_ALIASES = {
-    "san-andres": "San Andr",       # "Archipiélago de San Andrés, Providencia y Santa Catalina"
-    "norte-santander": "Norte de Santander",  # bots omiten "de"
-    "valle": "Valle del Cauca",     # bots usan solo "valle"
-    "bogota": "Bogotá",             # slugify("Bogotá DC") = "bogota-dc"
-}
-
-_MUNICIPIO_SLUG_ALIASES = {
-    "bogota": "Bogotá",
-    "bogota-dc": "Bogotá",
-    "bogota-d-c": "Bogotá",
-}
-
-
-@lru_cache(maxsize=1)
-def _get_all_departamentos():
-    """Fetch all department names once per process — 33 rows, changes only on redeploy."""
-    query = f"""
-        SELECT DISTINCT departamento
-        FROM gold.fct_agg_colegios_ano
-        WHERE departamento IS NOT NULL AND departamento != ''
-          AND {YEAR_INT_EXPR} IS NOT NULL
-        ORDER BY departamento
-    """
-    with get_duckdb_connection() as conn:
-        rows = conn.execute(resolve_schema(query)).fetchall()
-    return [row[0] for row in rows]
-
-
-@lru_cache(maxsize=64)
-def _get_municipios_for_depto(departamento):
-    """Fetch all municipalities for a department once per process — changes only on redeploy."""
-    query = """
-        SELECT DISTINCT municipio
-        FROM gold.fct_agg_colegios_ano
-        WHERE departamento = ?
-          AND municipio IS NOT NULL
-          AND municipio != ''
-        ORDER BY municipio
-    """
-    with get_duckdb_connection() as conn:
-        rows = conn.execute(resolve_schema(query), [departamento]).fetchall()
-    return [row[0] for row in rows]
-
-
 def _resolve_departamento(conn, departamento_slug):
-    rows = _get_all_departamentos()
-
-    # Primero: match exacto por slug
-    for departamento in rows:
-        if slugify(departamento) == departamento_slug:
-            return departamento
-
-    # Segundo: match por alias conocido
-    alias_fragment = _DEPARTAMENTO_SLUG_ALIASES.get(departamento_slug)
-    if alias_fragment:
-        for departamento in rows:
-            if alias_fragment.lower() in departamento.lower():
-                return departamento
-
-    return None
+    # Slugs, accents and aliases ("valle", "san-andres", "bogota") via the gazetteer.
+    place = get_gazetteer().departamento(departamento_slug, primary_only=True)
+    return place.name if place else None
 
 
 def _resolve_municipio(conn, departamento, municipio_slug):
-    rows = _get_municipios_for_depto(departamento)
-    for municipio in rows:
-        if slugify(municipio) == municipio_slug:
-            return municipio
-
-    alias_fragment = _MUNICIPIO_SLUG_ALIASES.get((municipio_slug or "").strip().lower())
-    if alias_fragment:
-        for municipio in rows:
-            if alias_fragment.lower() in municipio.lower():
-                return municipio
-    return None
+    place = get_gazetteer().municipio(departamento, municipio_slug, primary_only=True)
+    return place.name if place else None
 
 
 def _geo_landing_context(request, departamento, municipio=None, conn=None):
@@ -431,7 +363,7 @@ def _geo_landing_context(request, departamento, municipio=None, conn=None):
     }
 
 
-@cache_page(60 * 60 * 6)
+@compressed_cache_page(60 * 60 * 6)
 def departments_index_page(request):
     try:
         with get_duckdb_connection() as conn:
@@ -584,7 +516,7 @@ def departments_index_page(request):
         )
 
 
-@cache_page(60 * 60 * 24 * 7)
+@compressed_cache_page(60 * 60 * 24 * 7)
 def department_landing_page(request, departamento_slug):
     try:
         with get_duckdb_connection() as conn:
@@ -594,6 +526,7 @@ def department_landing_page(request, departamento_slug):
             canonical_slug = slugify(departamento)
             if canonical_slug != departamento_slug:
                 return redirect(f"/icfes/departamento/{canonical_slug}/", permanent=True)
+            add_cache_tags(request, *geo_cache_tags(departamento))
             # Reuse the same connection — avoids opening a second DuckDB connection
             context = _geo_landing_context(request, departamento=departamento, municipio=None, conn=conn)
         return render(request, "icfes_dashboard/geo_landing_simple.html", context)
@@ -607,7 +540,7 @@ def department_landing_page(request, departamento_slug):
         return redirect("/icfes/departamentos/", permanent=False)
 
 
-@cache_page(60 * 60 * 24 * 7)
+@compressed_cache_page(60 * 60 * 24 * 7)
 def municipality_landing_page(request, departamento_slug, municipio_slug):
     try:
         with get_duckdb_connection() as conn:
@@ -625,6 +558,7 @@ def municipality_landing_page(request, departamento_slug, municipio_slug):
                     f"/icfes/departamento/{canonical_dept}/municipio/{canonical_muni}/",
                     permanent=True,
                 )
+            add_cache_tags(request, *geo_cache_tags(departamento, municipio))
             # Reuse the same connection — avoids opening a second DuckDB connection
             context = _geo_landing_context(
                 request, departamento=departamento, municipio=municipio, conn=conn
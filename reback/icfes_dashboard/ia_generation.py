@@ -0,0 +1,221 @@
+"""
+Motor de generación de análisis narrativos IA para los comandos
+generate_ingles_ia_analisis y generate_ml_ia_analisis.
+
+Antes cada comando llamaba a la API en serie (--departamento ALL: 33
+llamadas con time.sleep(1) entre ellas) y regeneraba aunque los datos del
+prompt no hubieran cambiado. Aquí:
+
+- input_hash(): huella de los datos que alimentan el prompt, del modelo y de
+  la versión de la plantilla. Se guarda en el análisis activo; los comandos
+  omiten los trabajos cuya huella no cambió (salvo --forzar);
+- generate_all(): corre los trabajos con AsyncAnthropic con como mucho
+  `concurrency` llamadas en vuelo, un token bucket de `rpm` solicitudes por
+  minuto y reintentos con backoff exponencial + jitter ante 429, 5xx, 529 y
+  errores de conexión (respeta retry-after cuando la API lo envía). Un
+  trabajo que falla no detiene a los demás;
+- StubClient: cliente local con la misma interfaz (messages.create) que
+  responde con los marcadores ###SECCION### pedidos en el prompt. Lo usan
+  los tests y la opción --stub de los comandos.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import re
+import time
+from collections import namedtuple
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_RPM = 40
+MAX_RETRIES = 5
+BACKOFF_BASE = 2.0     # segundos; el intento n espera ~BACKOFF_BASE * 2**n
+BACKOFF_MAX = 60.0
+RETRY_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+
+Job = namedtuple('Job', ['key', 'prompt', 'input_hash'])
+Result = namedtuple('Result', ['job', 'texto', 'tokens_input', 'tokens_output', 'intentos', 'error'])
+
+
+# ---------------------------------------------------------------------------
+# Huella de los datos del prompt
+# ---------------------------------------------------------------------------
+
+def _json_default(obj):
+    if isinstance(obj, pd.DataFrame):
+        return obj.to_dict(orient='split')
+    if isinstance(obj, pd.Series):
+        return obj.to_dict()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return str(obj)
+
+
+def input_hash(data, model, version=1):
+    """sha1 de los datos del prompt (dicts, records o DataFrames), el modelo y la versión de plantilla."""
+    raw = json.dumps([model, version, data], sort_keys=True, default=_json_default)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+# ---------------------------------------------------------------------------
+# Rate limiting y reintentos
+# ---------------------------------------------------------------------------
+
+class TokenBucket:
+    """`rate` solicitudes por minuto con ráfagas de hasta `burst`."""
+
+    def __init__(self, rate, burst=1):
+        self.per_second = rate / 60.0
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.per_second)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.per_second)
+
+
+def _connection_errors():
+    errors = (ConnectionError, asyncio.TimeoutError)
+    try:
+        import anthropic
+    except ImportError:
+        return errors
+    return errors + (anthropic.APIConnectionError,)
+
+
+def retry_delay(exc, attempt):
+    """Segundos a esperar antes del reintento `attempt` (0, 1, ...) o None si el error no es transitorio."""
+    status = getattr(exc, 'status_code', None)
+    if status is None and not isinstance(exc, _connection_errors()):
+        return None
+    if status is not None and status not in RETRY_STATUS:
+        return None
+
+    response = getattr(exc, 'response', None)
+    retry_after = getattr(response, 'headers', {}).get('retry-after') if response is not None else None
+    try:
+        if retry_after is not None:
+            return min(BACKOFF_MAX, float(retry_after))
+    except ValueError:
+        pass
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+# ---------------------------------------------------------------------------
+# Clientes
+# ---------------------------------------------------------------------------
+
+class StubError(Exception):
+    """Error simulado por StubClient (status_code como los de la API)."""
+
+    def __init__(self, status_code):
+        super().__init__(f'stub: HTTP {status_code}')
+        self.status_code = status_code
+        self.response = None
+
+
+class StubClient:
+    """
+    Cliente local con la interfaz de AsyncAnthropic. Responde una sección
+    corta por cada marcador ###X### del prompt. `fallos`: las primeras N
+    llamadas lanzan StubError(429). Lleva la cuenta de llamadas y del máximo
+    de llamadas simultáneas.
+    """
+
+    def __init__(self, latency=0.0, fallos=0):
+        self.messages = self
+        self.latency = latency
+        self.fallos = fallos
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def create(self, model, max_tokens, messages):
+        self.calls += 1
+        if self.calls <= self.fallos:
+            raise StubError(429)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self.in_flight -= 1
+
+        prompt = messages[-1]['content']
+        markers = list(dict.fromkeys(re.findall(r'###([A-Z]+)###', prompt)))
+        texto = '\n\n'.join(f'###{m}###\nTexto de prueba ({model}) para {m.lower()}.' for m in markers)
+        return SimpleNamespace(
+            content=[SimpleNamespace(text=texto or 'Texto de prueba.')],
+            usage=SimpleNamespace(input_tokens=len(prompt) // 4, output_tokens=len(texto) // 4),
+        )
+
+
+def make_client(stub=False):
+    """AsyncAnthropic sin reintentos propios (los maneja generate_all) o StubClient."""
+    if stub:
+        return StubClient()
+    api_key = getattr(settings, 'ANTHROPIC_API_KEY', '')
+    if not api_key:
+        raise RuntimeError('ANTHROPIC_API_KEY no configurada')
+    import anthropic
+    return anthropic.AsyncAnthropic(api_key=api_key, max_retries=0)
+
+
+# ---------------------------------------------------------------------------
+# Ejecución
+# ---------------------------------------------------------------------------
+
+async def _run_job(job, client, model, max_tokens, semaphore, bucket, max_retries):
+    async with semaphore:
+        for attempt in range(max_retries + 1):
+            await bucket.acquire()
+            try:
+                msg = await client.messages.create(
+                    model=model, max_tokens=max_tokens,
+                    messages=[{'role': 'user', 'content': job.prompt}],
+                )
+            except Exception as e:
+                delay = retry_delay(e, attempt) if attempt < max_retries else None
+                if delay is None:
+                    logger.warning(f'[IA] {job.key}: {e}')
+                    return Result(job, None, None, None, attempt + 1, str(e))
+                logger.info(f'[IA] {job.key}: {e}; reintento en {delay:.1f}s')
+                await asyncio.sleep(delay)
+                continue
+            return Result(job, msg.content[0].text, msg.usage.input_tokens,
+                          msg.usage.output_tokens, attempt + 1, None)
+
+
+async def _generate(jobs, client, model, max_tokens, concurrency, rpm, max_retries):
+    client = client or make_client()
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    bucket = TokenBucket(rpm, burst=concurrency)
+    return await asyncio.gather(*(
+        _run_job(job, client, model, max_tokens, semaphore, bucket, max_retries) for job in jobs
+    ))
+
+
+def generate_all(jobs, model, max_tokens, client=None, concurrency=DEFAULT_CONCURRENCY,
+                 rpm=DEFAULT_RPM, max_retries=MAX_RETRIES):
+    """Genera todos los `jobs`; devuelve un Result por job, en el mismo orden."""
+    if not jobs:
+        return []
+    return asyncio.run(_generate(jobs, client, model, max_tokens, concurrency, rpm, max_retries))
@@ -0,0 +1,160 @@
+"""
+Diff-based IndexNow submission (`manage.py ping_indexnow`).
+
+URLs come from the sitemap sections (sitemap_views.iter_sitemap_entries), so
+IndexNow hears about exactly what the sitemaps publish. Every URL gets a
+content hash: the page data fingerprint when the sitemap query has one
+(school pages), otherwise the loaded dataset version. IndexNowUrl stores the
+hash last accepted for each URL; only new or changed URLs are posted, in
+BATCH_LIMIT chunks sent concurrently with retry and exponential backoff.
+Accepted batches are recorded, failed ones are picked up by the next run.
+"""
+import hashlib
+import json
+import logging
+import random
+import time
+import urllib.request
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .db_utils import get_dataset_version
+from .models import IndexNowUrl
+from .sitemap_views import iter_sitemap_entries
+
+logger = logging.getLogger(__name__)
+
+BATCH_LIMIT = 10_000   # IndexNow max per request
+DEFAULT_CONCURRENCY = 4
+MAX_RETRIES = 4
+BACKOFF_BASE = 2.0     # seconds; attempt n waits ~BACKOFF_BASE * 2**n
+BACKOFF_MAX = 60.0
+RETRY_STATUS = {429, 500, 502, 503, 504}
+RECORD_CHUNK = 5_000
+
+# Current state of one sitemap URL.
+UrlState = namedtuple("UrlState", ["section", "content_hash"])
+BatchResult = namedtuple("BatchResult", ["urls", "status", "attempts", "error"])
+
+
+def content_hash(entry, dataset_version):
+    fingerprint = entry.data if entry.data is not None else dataset_version
+    raw = json.dumps(fingerprint, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def collect(base, sections=None):
+    """{url: UrlState} for the sitemap sections, first section wins for duplicates."""
+    dataset = get_dataset_version()
+    dataset_version = dataset.version if dataset else None
+    current = {}
+    for section, entry in iter_sitemap_entries(base, sections):
+        if entry.loc not in current:
+            current[entry.loc] = UrlState(section, content_hash(entry, dataset_version))
+    return current
+
+
+def diff(current, sections=None, full=False):
+    """
+    (urls to submit, recorded urls of `sections` that left the sitemaps).
+    With `full` every current URL is submitted.
+    """
+    recorded = {url: (section, digest) for url, section, digest in
+                IndexNowUrl.objects.values_list("url", "section", "content_hash")}
+    changed = [
+        url for url, state in current.items()
+        if full or url not in recorded or recorded[url][1] != state.content_hash
+    ]
+    removed = [
+        url for url, (section, _) in recorded.items()
+        if url not in current and (not sections or section in sections)
+    ]
+    return changed, removed
+
+
+def _retry_delay(status, retry_after, attempt):
+    if status is not None and status not in RETRY_STATUS:
+        return None
+    try:
+        if retry_after is not None:
+            return min(BACKOFF_MAX, float(retry_after))
+    except ValueError:
+        pass
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def _post(payload, endpoint, timeout):
+    """(status, retry-after, error text); status None on network errors."""
+    req = urllib.request.Request(
+        endpoint,
+        data=payload,
+        headers={
+            "Content-Type": "application/json; charset=utf-8",
+            "User-Agent": "icfes-analytics-indexnow/1.0",
+        },
+        method="POST",
+    )
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return resp.status, None, None
+    except HTTPError as exc:
+        return exc.code, exc.headers.get("Retry-After"), exc.read().decode(errors="replace")[:200]
+    except (URLError, TimeoutError) as exc:
+        return None, None, str(exc)
+
+
+def submit_batch(urls, key, base, endpoint=None, max_retries=MAX_RETRIES, timeout=30):
+    """POST one batch, retrying 429/5xx and network errors. Returns a BatchResult."""
+    payload = json.dumps({
+        "host": urlparse(base).netloc,
+        "key": key,
+        "keyLocation": f"{base}/{key}.txt",
+        "urlList": urls,
+    }).encode("utf-8")
+    endpoint = endpoint or settings.INDEXNOW_ENDPOINT
+
+    for attempt in range(max_retries + 1):
+        status, retry_after, error = _post(payload, endpoint, timeout)
+        if status in (200, 202):
+            return BatchResult(urls, status, attempt + 1, None)
+        delay = _retry_delay(status, retry_after, attempt) if attempt < max_retries else None
+        if delay is None:
+            return BatchResult(urls, status, attempt + 1, error)
+        logger.info(f"[IndexNow] HTTP {status} ({error}); retry in {delay:.1f}s")
+        time.sleep(delay)
+
+
+def submit(urls, key, base, concurrency=DEFAULT_CONCURRENCY, batch_limit=BATCH_LIMIT, **kwargs):
+    """Submit `urls` in batches of `batch_limit`, `concurrency` at a time. BatchResult per batch, in order."""
+    batches = [urls[i:i + batch_limit] for i in range(0, len(urls), batch_limit)]
+    if not batches:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(batches)))) as pool:
+        return list(pool.map(lambda batch: submit_batch(batch, key, base, **kwargs), batches))
+
+
+def record(accepted, current, removed=()):
+    """Store the hash of every accepted URL and forget the removed ones."""
+    now = timezone.now()
+    rows = [
+        IndexNowUrl(url=url, section=current[url].section, content_hash=current[url].content_hash, submitted_at=now)
+        for url in accepted
+    ]
+    removed = list(removed)
+    with transaction.atomic():
+        IndexNowUrl.objects.bulk_create(
+            rows,
+            batch_size=RECORD_CHUNK,
+            update_conflicts=True,
+            unique_fields=["url"],
+            update_fields=["section", "content_hash", "submitted_at"],
+        )
+        for i in range(0, len(removed), RECORD_CHUNK):
+            IndexNowUrl.objects.filter(url__in=removed[i:i + RECORD_CHUNK]).delete()
@@ -7,13 +7,13 @@ from urllib.parse import urljoin
 
 import duckdb
 from django.conf import settings
-from django.core.cache import cache
 from django.http import Http404
 from django.shortcuts import render
 from django.templatetags.static import static
 from django.utils.text import slugify
 
 from .db_utils import get_duckdb_connection, resolve_schema
+from .response_cache import add_cache_tags, geo_cache_tags, get_cached_response, store_response
 
 logger = logging.getLogger(__name__)
 
@@ -214,13 +214,14 @@ def _load_english_landing_data(departamento=None):
 
 def _render_ingles_page(request, departamento=None, departamento_slug=None):
     use_cache = request.method in {"GET", "HEAD"}
-    cache_key = f"html:ingles_landing:v1:{departamento_slug or 'nacional'}"
+    cache_key = f"html:ingles_landing:v2:{departamento_slug or 'nacional'}"
     if use_cache:
-        cached = cache.get(cache_key)
+        cached = get_cached_response(request, cache_key)
         if cached is not None:
             request._cache_status = "HIT"
             return cached
 
+    add_cache_tags(request, *geo_cache_tags(departamento))
     data = _load_english_landing_data(departamento=departamento)
     latest_year = data["latest_year"]
     kpis = data["kpis"]
@@ -285,7 +286,7 @@ def _render_ingles_page(request, departamento=None, departamento_slug=None):
     }
     response = render(request, "icfes_dashboard/ingles_landing.html", context)
     if use_cache and response.status_code == 200:
-        cache.set(cache_key, response, timeout=60 * 60 * 6)
+        response = store_response(request, cache_key, response, timeout=60 * 60 * 6)
         request._cache_status = "MISS"
     else:
         request._cache_status = "BYPASS"
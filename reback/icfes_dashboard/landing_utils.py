@@ -1,6 +1,8 @@
 """
 Utility functions for school landing pages.
 """
+from bisect import bisect_left, bisect_right
+
 from django.utils.text import slugify
 import re
 
@@ -38,14 +40,19 @@ def calculate_ranking(puntaje, all_scores):
     
     Args:
         puntaje: School's score
-        all_scores: List of all schools' scores
+        all_scores: List of all schools' scores (any order)
     
     Returns:
         dict: {'rank': int, 'total': int, 'percentile': float}
+
+    For repeated lookups use score_distribution.rank_score(), which keeps the
+    sorted distributions per year/subject/scope in memory.
     """
-    sorted_scores = sorted(all_scores, reverse=True)
-    rank = sorted_scores.index(puntaje) + 1 if puntaje in sorted_scores else None
+    sorted_scores = sorted(all_scores)
     total = len(sorted_scores)
+    lo = bisect_left(sorted_scores, puntaje)
+    present = lo < total and sorted_scores[lo] == puntaje
+    rank = total - bisect_right(sorted_scores, puntaje) + 1 if present else None
     percentile = ((total - rank + 1) / total * 100) if rank else None
     
     return {
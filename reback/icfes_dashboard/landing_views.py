@@ -4,7 +4,6 @@ Views for dynamic school landing pages.
 import logging
 import hashlib
 from django.shortcuts import render, get_object_or_404, redirect
-from django.views.decorators.cache import cache_page
 from django.http import Http404, HttpResponse
 
 from icfes_dashboard.db_utils import get_duckdb_connection, resolve_schema
@@ -13,11 +12,16 @@ from icfes_dashboard.landing_utils import (
     calculate_ranking,
     generate_ai_insights
 )
+from icfes_dashboard.response_cache import (
+    add_cache_tags,
+    compressed_cache_page,
+    school_cache_tags,
+)
 
 logger = logging.getLogger(__name__)
 
 
-@cache_page(60 * 60 * 24)  # Cache for 24 hours
+@compressed_cache_page(60 * 60 * 24)  # Cache for 24 hours
 def school_landing_page(request, slug):
     """
     Dynamic landing page for individual schools.
@@ -67,6 +71,9 @@ def school_landing_page(request, slug):
             
             
             codigo = school_found['codigo']
+            add_cache_tags(request, *school_cache_tags(
+                codigo, school_found['departamento'], school_found['municipio'], slug=slug,
+            ))
             
             # Fetch colegio_sk first (needed for comparison and cluster)
             colegio_sk = None
@@ -8,13 +8,15 @@ from urllib.parse import urljoin
 
 import duckdb
 from django.conf import settings
-from django.core.cache import cache
 from django.http import Http404
-from django.shortcuts import render
+from django.shortcuts import redirect, render
 from django.utils.text import slugify
 
 from .db_utils import get_duckdb_connection, resolve_schema
-from .landing_utils import generate_school_slug
+from .response_cache import add_cache_tags, get_cached_response, school_cache_tags, store_response
+from .ml.similar_schools import similar_schools as knn_similar_schools
+from .slug_resolver import get_index as get_slug_index
+from .slug_resolver import resolve_slug
 
 logger = logging.getLogger(__name__)
 
@@ -25,11 +27,6 @@ def _normalize_text(value):
     return str(value).strip().lower()
 
 
-def _extract_municipio_hint(slug):
-    parts = slug.split("-")
-    return parts[-1] if parts else ""
-
-
 def _to_float(value, digits=1):
     if value is None:
         return None
@@ -90,7 +87,37 @@ def _absolute_url(base_url, path):
     return urljoin(f"{base_url}/", path.lstrip("/"))
 
 
-def _find_school_by_slug(conn, slug):
+def _similar_from_index(conn, codigo, year, limit=5):
+    """Precomputed k-NN neighbours → rows shaped like the similar-schools query."""
+    try:
+        neighbors = knn_similar_schools(codigo, ano=year, limit=limit)
+    except Exception as exc:
+        logger.warning("Similar schools index unavailable: %s", exc)
+        return []
+    if not neighbors:
+        return []
+    codes = [code for code, _, _ in neighbors]
+    placeholders = ", ".join("?" for _ in codes)
+    rows = conn.execute(
+        resolve_schema(f"""
+            SELECT codigo_dane, nombre_colegio, municipio, avg_punt_global
+            FROM gold.fct_colegio_historico
+            WHERE ano = ?
+              AND codigo_dane IN ({placeholders})
+        """),
+        [year, *codes],
+    ).fetchall()
+    by_code = {str(row[0]): row for row in rows}
+    slugs = get_slug_index()
+    return [
+        (*by_code[code], slugs.canonical_slug(code) or "")
+        for code in codes
+        if code in by_code
+    ]
+
+
+def _find_school(conn, match):
+    """School row for a resolved slug: point lookups by canonical slug / codigo."""
     school_query = """
         SELECT
             s.codigo,
@@ -109,15 +136,13 @@ def _find_school_by_slug(conn, slug):
     """
 
     try:
-        school_result = conn.execute(resolve_schema(school_query), [slug]).fetchone()
+        school_result = conn.execute(resolve_schema(school_query), [match.slug]).fetchone()
         if school_result:
             return school_result
     except duckdb.CatalogException as exc:
-        logger.warning("dim_colegios_slugs unavailable, using fallback lookup: %s", exc)
+        logger.warning("dim_colegios_slugs unavailable, using dim_colegios: %s", exc)
 
-    municipio_hint = _extract_municipio_hint(slug)
-    # dim_colegios tiene nombres canónicos completos → generate_school_slug produce el slug correcto.
-    # fct_colegio_historico usa abreviaciones (ej: "I.E.") que generan slugs distintos.
+    # Canonical slug generated from the dim_colegios name (school not in the slugs table).
     fallback_query = """
         SELECT
             colegio_bk  AS codigo,
@@ -130,29 +155,18 @@ def _find_school_by_slug(conn, slug):
             email,
             rector
         FROM gold.dim_colegios
-        WHERE nombre_colegio IS NOT NULL
-          AND municipio IS NOT NULL
-          AND sector != 'SINTETICO'
-          AND LOWER(municipio) LIKE ?
+        WHERE colegio_bk = ?
+        LIMIT 1
     """
-    candidates = conn.execute(
-        resolve_schema(fallback_query),
-        [f"%{_normalize_text(municipio_hint)}%"],
-    ).fetchall()
-
-    for candidate in candidates:
-        if generate_school_slug(candidate[1], candidate[2]) == slug:
-            return candidate
-
-    return None
+    return conn.execute(resolve_schema(fallback_query), [match.codigo]).fetchone()
 
 
 def school_landing_page(request, slug):
     use_cache = request.method in {"GET", "HEAD"}
-    cache_key = f"html:school_landing_simple:v1:{slug}"
+    cache_key = f"html:school_landing_simple:v2:{slug}"
 
     if use_cache:
-        cached_response = cache.get(cache_key)
+        cached_response = get_cached_response(request, cache_key)
         if cached_response is not None:
             request._cache_status = "HIT"
             return cached_response
@@ -160,8 +174,15 @@ def school_landing_page(request, slug):
         request._cache_status = "BYPASS"
 
     try:
+        match = resolve_slug(slug)
+        if match is None:
+            raise Http404("Colegio no encontrado")
+        if match.is_alias:
+            request._cache_status = "BYPASS"
+            return redirect("icfes_dashboard:school_landing", slug=match.slug, permanent=True)
+
         with get_duckdb_connection() as conn:
-            school_result = _find_school_by_slug(conn, slug)
+            school_result = _find_school(conn, match)
             if not school_result:
                 raise Http404("Colegio no encontrado")
 
@@ -177,6 +198,9 @@ def school_landing_page(request, slug):
                 "email": school_result[7],
                 "rector": school_result[8],
             }
+            add_cache_tags(request, *school_cache_tags(
+                school["codigo"], school["departamento"], school["municipio"], slug=slug,
+            ))
 
             codigo = school["codigo"]
 
@@ -307,6 +331,10 @@ def school_landing_page(request, slug):
             except Exception:
                 pass
 
+            # k-NN precalculado (build_similar_schools); sin artefacto, el
+            # colegio más cercano en puntaje global del mismo municipio/sector.
+            similar_rows = _similar_from_index(conn, codigo, latest_year) if latest_stats else []
+            from_index = bool(similar_rows)
             similar_query = """
                 SELECT
                     h.codigo_dane,
@@ -324,8 +352,7 @@ def school_landing_page(request, slug):
                 ORDER BY ABS(h.avg_punt_global - ?)
                 LIMIT 5
             """
-            similar_rows = []
-            if latest_stats and latest_stats[1] is not None:
+            if not from_index and latest_stats and latest_stats[1] is not None:
                 similar_rows = conn.execute(
                     resolve_schema(similar_query),
                     [
@@ -337,7 +364,7 @@ def school_landing_page(request, slug):
                     ],
                 ).fetchall()
 
-            if len(similar_rows) < 4 and latest_stats and latest_stats[1] is not None:
+            if not from_index and len(similar_rows) < 4 and latest_stats and latest_stats[1] is not None:
                 similar_dept_query = """
                     SELECT
                         h.codigo_dane,
@@ -1086,7 +1113,7 @@ def school_landing_page(request, slug):
 
             response = render(request, "icfes_dashboard/school_landing_simple.html", context)
             if use_cache and response.status_code == 200:
-                cache.set(cache_key, response, timeout=60 * 60 * 6)
+                response = store_response(request, cache_key, response, timeout=60 * 60 * 6)
                 request._cache_status = "MISS"
             else:
                 request._cache_status = "BYPASS"
@@ -0,0 +1,172 @@
+"""
+Materialized long-tail leaderboards.
+
+deploy/01b_build_leaderboards.py writes every ranking page (sector ×
+nacional/departamento/municipio, general, matemáticas, materia, mejoraron),
+already ordered and with slugs joined, into gold.fct_leaderboards. This
+module loads that table once per dataset version (like gazetteer /
+slug_resolver) into a dict keyed by
+(kind, ano, scope_sector, scope_departamento, scope_municipio), so a
+long-tail page miss is one dict lookup and the sitemaps enumerate the valid
+combinations from the same keys. Sector boards also carry their scope's
+population (schools and students beyond the top 20), which the sitemaps use
+for their thin-content thresholds.
+
+Rows come back in the tuple shape of each page's SQL fallback in
+longtail_landing_views, so the rendering code is shared. When the table is
+missing (DuckDB built before this step), every lookup returns None and the
+pages run their queries as before.
+"""
+import logging
+import threading
+from collections import namedtuple
+
+import duckdb
+
+from .db_utils import get_dataset_version, get_duckdb_connection, resolve_schema
+
+logger = logging.getLogger(__name__)
+
+LeaderboardRow = namedtuple("LeaderboardRow", [
+    "posicion", "ranking_prev", "codigo_dane", "nombre_colegio", "departamento",
+    "municipio", "sector", "slug", "total_estudiantes", "punt_global", "punt_lectura",
+    "punt_matematicas", "punt_naturales", "punt_sociales", "punt_ingles",
+    "punt_global_anterior", "cambio_abs", "cambio_pct", "percentil_sector_pct",
+    "z_score_global", "ranking_nacional",
+])
+
+# Tuple shapes of the SQL fallbacks in longtail_landing_views.
+_SHAPES = {
+    "sector": lambda r: (
+        r.nombre_colegio, r.departamento, r.municipio, r.slug, r.punt_global, r.punt_lectura,
+        r.punt_matematicas, r.punt_naturales, r.punt_sociales, r.punt_ingles, r.posicion,
+        r.ranking_prev, r.cambio_abs, r.cambio_pct, r.percentil_sector_pct,
+        r.total_estudiantes, r.z_score_global,
+    ),
+    "general": lambda r: (
+        r.nombre_colegio, r.departamento, r.municipio, r.sector, r.punt_global,
+        r.total_estudiantes, r.slug,
+    ),
+    "matematicas": lambda r: (
+        r.nombre_colegio, r.departamento, r.municipio, r.sector, r.punt_matematicas,
+        r.punt_global, r.slug,
+    ),
+    "materia:matematicas": lambda r: (
+        r.nombre_colegio, r.departamento, r.municipio, r.sector, r.punt_matematicas,
+        r.punt_global, r.total_estudiantes, r.slug,
+    ),
+    "materia:ingles": lambda r: (
+        r.nombre_colegio, r.departamento, r.municipio, r.sector, r.punt_ingles,
+        r.punt_global, r.total_estudiantes, r.slug,
+    ),
+    "mejoraron": lambda r: (
+        r.nombre_colegio, r.departamento, r.municipio, r.sector, r.cambio_abs, r.punt_global,
+        r.punt_global_anterior, r.total_estudiantes, r.ranking_nacional, r.slug,
+    ),
+}
+
+
+class Leaderboards:
+    """
+    rows: (kind, ano, scope_sector, scope_departamento, scope_municipio,
+    scope_colegios, scope_estudiantes, *LeaderboardRow fields) ordered by key
+    and posicion, as in gold.fct_leaderboards.
+    """
+
+    def __init__(self, rows):
+        self._boards = {}       # key → [LeaderboardRow]
+        self._population = {}   # key → (schools, students) in the whole scope
+        self._years = {}        # kind → set of materialized years
+        for kind, ano, sector, departamento, municipio, colegios, estudiantes, *fields in rows:
+            key = (kind, int(ano), sector or "", departamento or "", municipio or "")
+            self._boards.setdefault(key, []).append(LeaderboardRow(*fields))
+            self._population[key] = (colegios or 0, estudiantes or 0)
+            self._years.setdefault(kind, set()).add(int(ano))
+        for board in self._boards.values():
+            board.sort(key=lambda r: r.posicion)
+
+    def __len__(self):
+        return len(self._boards)
+
+    def years(self, kind):
+        return sorted(self._years.get(kind, ()), reverse=True)
+
+    def board(self, kind, ano, sector="", departamento="", municipio=""):
+        """
+        [LeaderboardRow] for one page; [] if that scope has no schools, None if
+        (kind, ano) was not materialized (caller falls back to SQL).
+        """
+        if int(ano) not in self._years.get(kind, ()):
+            return None
+        return self._boards.get((kind, int(ano), sector or "", departamento or "", municipio or ""), [])
+
+    def rows(self, kind, ano, sector="", departamento="", municipio=""):
+        """Same as board(), shaped like the page's SQL fallback rows."""
+        board = self.board(kind, ano, sector, departamento, municipio)
+        if board is None:
+            return None
+        shape = _SHAPES[kind]
+        return [shape(r) for r in board]
+
+    def scopes(self, kind, ano):
+        """
+        [(sector, departamento, municipio, rows, (schools, students))] of every
+        materialized board of a year; the population counts the whole scope, not
+        only the rows on the board.
+        """
+        return [
+            (*key[2:], board, self._population[key])
+            for key, board in self._boards.items()
+            if key[0] == kind and key[1] == int(ano)
+        ]
+
+
+_lock = threading.Lock()
+_leaderboards = None
+_leaderboards_version = None
+_UNAVAILABLE = object()
+
+
+def build_leaderboards():
+    """Leaderboards from gold.fct_leaderboards, or None if the table does not exist (or predates a column)."""
+    try:
+        with get_duckdb_connection() as conn:
+            rows = conn.execute(resolve_schema("""
+                SELECT
+                    kind, ano, scope_sector, scope_departamento, scope_municipio,
+                    scope_colegios, scope_estudiantes, posicion, ranking_prev, codigo_dane, nombre_colegio, departamento,
+                    municipio, sector, slug, total_estudiantes, punt_global, punt_lectura,
+                    punt_matematicas, punt_naturales, punt_sociales, punt_ingles,
+                    punt_global_anterior, cambio_abs, cambio_pct, percentil_sector_pct,
+                    z_score_global, ranking_nacional
+                FROM gold.fct_leaderboards
+            """)).fetchall()
+    except (duckdb.CatalogException, duckdb.BinderException) as exc:
+        logger.warning("fct_leaderboards unavailable, long-tail pages query on demand: %s", exc)
+        return None
+    return Leaderboards(rows)
+
+
+def get_leaderboards():
+    """Process-wide leaderboards (reloaded when the dataset version changes), or None."""
+    global _leaderboards, _leaderboards_version
+    dataset = get_dataset_version()
+    version = dataset.version if dataset else None
+    if _leaderboards is not None and _leaderboards_version == version:
+        return None if _leaderboards is _UNAVAILABLE else _leaderboards
+    with _lock:
+        if _leaderboards is None or _leaderboards_version != version:
+            leaderboards = build_leaderboards()
+            _leaderboards = leaderboards if leaderboards is not None else _UNAVAILABLE
+            _leaderboards_version = version
+            if leaderboards is not None:
+                logger.info("Leaderboards loaded: %s boards (dataset=%s)", len(leaderboards), version)
+    return None if _leaderboards is _UNAVAILABLE else _leaderboards
+
+
+def leaderboard_rows(kind, ano, sector="", departamento="", municipio=""):
+    """Materialized rows for a page, or None when the caller must run its query."""
+    leaderboards = get_leaderboards()
+    if leaderboards is None:
+        return None
+    return leaderboards.rows(kind, ano, sector, departamento, municipio)
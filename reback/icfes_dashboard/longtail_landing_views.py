@@ -9,9 +9,11 @@ from django.conf import settings
 from django.http import Http404, HttpResponse
 from django.shortcuts import redirect, render
 from django.utils.text import slugify
-from django.views.decorators.cache import cache_page
 
-from .db_utils import get_duckdb_connection, resolve_schema
+from .db_utils import get_dataset_version, get_duckdb_connection, resolve_schema
+from .gazetteer import geo_key
+from .leaderboards import leaderboard_rows
+from .response_cache import add_cache_tags, compressed_cache_page, geo_cache_tags
 
 logger = logging.getLogger(__name__)
 
@@ -97,12 +99,8 @@ def _latest_snapshot(conn):
     latest_year = years[0]
     prev_year = years[1] if len(years) > 1 else None
 
-    updated_query = """
-        SELECT MAX(fecha_carga)
-        FROM gold.fct_agg_colegios_ano
-    """
-    updated_at = conn.execute(resolve_schema(updated_query)).fetchone()[0]
-    updated_date = updated_at.date().isoformat() if updated_at else None
+    dataset = get_dataset_version()
+    updated_date = dataset.updated_at.date().isoformat() if dataset else None
     return latest_year, prev_year, updated_date
 
 
@@ -117,8 +115,9 @@ def _sector_from_slug(sector_slug):
 @lru_cache(maxsize=16)
 def _get_location_pairs(sector_value, year):
     """
-    Cached fetch of all (dept, muni, dept_slug, muni_slug) tuples for a sector+year.
-    Result is stable within a deployment — cached in-process to avoid repeated full scans.
+    Cached {(dept_key, muni_key): (dept, muni)} (plus {(dept_key, None): (dept, None)})
+    for a sector+year, keyed by gazetteer.geo_key so any slug/alias/accent variant
+    resolves with one dict lookup. Names keep the fct_colegio_historico spelling.
     Only ~4 unique combinations exist (2 sectors × 2 recent years).
     """
     query = """
@@ -131,7 +130,12 @@ def _get_location_pairs(sector_value, year):
     """
     with get_duckdb_connection() as conn:
         rows = conn.execute(resolve_schema(query), [str(year), sector_value]).fetchall()
-    return tuple((dept, muni, slugify(dept), slugify(muni)) for (dept, muni) in rows)
+    pairs = {}
+    for dept, muni in rows:
+        dept_key = geo_key(dept)
+        pairs.setdefault((dept_key, None), (dept, None))
+        pairs.setdefault((dept_key, geo_key(muni, "municipio")), (dept, muni))
+    return pairs
 
 
 def _resolve_location(conn, sector_value, year, departamento_slug, municipio_slug=None):
@@ -139,17 +143,12 @@ def _resolve_location(conn, sector_value, year, departamento_slug, municipio_slu
     Resolve slug(s) → real names using in-process cached location pairs.
     Returns (departamento, municipio) — municipio is None when municipio_slug is not given.
     """
-    dept_found = None
-    muni_found = None
-    for (dept, muni, dept_s, muni_s) in _get_location_pairs(sector_value, year):
-        if dept_s != departamento_slug:
-            continue
-        dept_found = dept
-        if municipio_slug is None:
-            break
-        if muni_s == municipio_slug:
-            muni_found = muni
-            break
+    pairs = _get_location_pairs(sector_value, year)
+    dept_key = geo_key(departamento_slug)
+    dept_found, _ = pairs.get((dept_key, None), (None, None))
+    if municipio_slug is None or dept_found is None:
+        return dept_found, None
+    _, muni_found = pairs.get((dept_key, geo_key(municipio_slug, "municipio")), (None, None))
     return dept_found, muni_found
 
 
@@ -159,6 +158,11 @@ def _resolve_departamento(conn, sector_value, year, departamento_slug):
 
 
 def _fetch_top20_rows(conn, latest_year, prev_year, sector_value, departamento=None, municipio=None):
+    # Materialized by deploy/01b_build_leaderboards.py; the query below is the fallback.
+    rows = leaderboard_rows("sector", latest_year, sector_value, departamento or "", municipio or "")
+    if rows is not None:
+        return rows
+
     filters = ["h.sector = ?", "h.total_estudiantes >= 10", "h.nombre_colegio IS NOT NULL"]
     # h.ano is VARCHAR — use string params for the IN clause to avoid CAST errors.
     params = [str(latest_year)]
@@ -428,7 +432,7 @@ def ranking_colegios_hub_page(request):
         raise Http404("Error al cargar la página")
 
 
-@cache_page(60 * 60 * 6, key_prefix='v2')
+@compressed_cache_page(60 * 60 * 6, key_prefix='v2')
 def ranking_colegios_year_page(request, ano):
     try:
         year = int(ano)
@@ -458,7 +462,9 @@ def ranking_colegios_year_page(request, ano):
                 ORDER BY f.avg_punt_global DESC
                 LIMIT 50
             """
-            rows = conn.execute(resolve_schema(query), [str(year)]).fetchall()
+            rows = leaderboard_rows("general", year)
+            if rows is None:
+                rows = conn.execute(resolve_schema(query), [str(year)]).fetchall()
 
         title = f"Mejores colegios ICFES {year} en Colombia | Ranking actualizado"
         description = (
@@ -537,7 +543,7 @@ def ranking_colegios_year_page(request, ano):
         raise Http404("Error al cargar ranking de colegios")
 
 
-@cache_page(60 * 60 * 6)
+@compressed_cache_page(60 * 60 * 6)
 def ranking_matematicas_year_page(request, ano):
     try:
         year = int(ano)
@@ -568,7 +574,9 @@ def ranking_matematicas_year_page(request, ano):
                 ORDER BY f.avg_punt_matematicas DESC
                 LIMIT 50
             """
-            rows = conn.execute(resolve_schema(query), [str(year)]).fetchall()
+            rows = leaderboard_rows("matematicas", year)
+            if rows is None:
+                rows = conn.execute(resolve_schema(query), [str(year)]).fetchall()
 
         title = f"Colegios con mejor matemáticas ICFES {year} | Top Colombia"
         description = (
@@ -646,7 +654,7 @@ def ranking_matematicas_year_page(request, ano):
         raise Http404("Error al cargar ranking de matemáticas")
 
 
-@cache_page(60 * 60 * 12)
+@compressed_cache_page(60 * 60 * 12)
 def historico_nacional_page(request):
     try:
         with get_duckdb_connection() as conn:
@@ -759,7 +767,7 @@ def historico_nacional_page(request):
         raise Http404("Error al cargar histórico nacional")
 
 
-@cache_page(60 * 60 * 6)
+@compressed_cache_page(60 * 60 * 6)
 def ranking_sector_nacional_page(request, sector_slug):
     sector_meta = _sector_from_slug(sector_slug)
     if not sector_meta:
@@ -819,7 +827,7 @@ def ranking_sector_nacional_page(request, sector_slug):
         raise Http404("Error al cargar ranking nacional por sector")
 
 
-@cache_page(60 * 60 * 6)
+@compressed_cache_page(60 * 60 * 6)
 def ranking_sector_departamento_page(request, sector_slug, departamento_slug):
     sector_meta = _sector_from_slug(sector_slug)
     if not sector_meta:
@@ -832,6 +840,12 @@ def ranking_sector_departamento_page(request, sector_slug, departamento_slug):
             departamento = _resolve_departamento(conn, sector_value, latest_year, departamento_slug)
             if not departamento:
                 raise Http404("Departamento no disponible")
+            if slugify(departamento) != departamento_slug:
+                return redirect(
+                    f"/icfes/ranking/sector/{sector_slug}/departamento/{slugify(departamento)}/",
+                    permanent=True,
+                )
+            add_cache_tags(request, *geo_cache_tags(departamento))
 
             rows = _normalize_top_rows(
                 _fetch_top20_rows(
@@ -889,7 +903,7 @@ def ranking_sector_departamento_page(request, sector_slug, departamento_slug):
         raise Http404("Error al cargar ranking departamental por sector")
 
 
-@cache_page(60 * 60 * 6)
+@compressed_cache_page(60 * 60 * 6)
 def ranking_sector_municipio_page(request, sector_slug, departamento_slug, municipio_slug):
     sector_meta = _sector_from_slug(sector_slug)
     if not sector_meta:
@@ -909,6 +923,14 @@ def ranking_sector_municipio_page(request, sector_slug, departamento_slug, munic
             if not municipio:
                 # 410 Gone: municipality has insufficient sector data — tell Google to deindex
                 return HttpResponse(status=410)
+            canonical_dept, canonical_muni = slugify(departamento), slugify(municipio)
+            if canonical_dept != departamento_slug or canonical_muni != municipio_slug:
+                return redirect(
+                    f"/icfes/ranking/sector/{sector_slug}/departamento/{canonical_dept}"
+                    f"/municipio/{canonical_muni}/",
+                    permanent=True,
+                )
+            add_cache_tags(request, *geo_cache_tags(departamento, municipio))
 
             rows = _normalize_top_rows(
                 _fetch_top20_rows(
@@ -1005,7 +1027,7 @@ def ranking_materia_hub_page(request, materia_slug):
         raise Http404("Error al cargar la materia")
 
 
-@cache_page(60 * 60 * 6)
+@compressed_cache_page(60 * 60 * 6)
 def ranking_materia_page(request, materia_slug, ano):
     if materia_slug not in _MATERIA_CONFIG:
         raise Http404("Materia no disponible")
@@ -1044,7 +1066,9 @@ def ranking_materia_page(request, materia_slug, ano):
                 ORDER BY f.{materia_col} DESC
                 LIMIT 100
             """
-            rows = conn.execute(resolve_schema(query), [str(year)]).fetchall()
+            rows = leaderboard_rows(f"materia:{materia_slug}", year)
+            if rows is None:
+                rows = conn.execute(resolve_schema(query), [str(year)]).fetchall()
 
         title = (
             f"Colegios con mejor {materia_label} en ICFES {year} | Top 100 Colombia"
@@ -1154,7 +1178,7 @@ def colegios_mejoraron_hub_page(request):
         raise Http404("Error al cargar la página")
 
 
-@cache_page(60 * 60 * 6)
+@compressed_cache_page(60 * 60 * 6)
 def colegios_mejoraron_page(request, ano):
     try:
         year = int(ano)
@@ -1184,7 +1208,9 @@ def colegios_mejoraron_page(request, ano):
                 ORDER BY mejora DESC
                 LIMIT 100
             """
-            rows = conn.execute(resolve_schema(query), [str(year)]).fetchall()
+            rows = leaderboard_rows("mejoraron", year)
+            if rows is None:
+                rows = conn.execute(resolve_schema(query), [str(year)]).fetchall()
             if not rows:
                 raise Http404("No hay datos de mejora para ese año")
             years = _available_years(conn)
@@ -1267,7 +1293,7 @@ def colegios_mejoraron_page(request, ano):
         raise Http404("Error al cargar colegios que mejoraron")
 
 
-@cache_page(60 * 60 * 24 * 7)
+@compressed_cache_page(60 * 60 * 24 * 7)
 def que_es_icfes_analytics_page(request):
     base_url = _build_base_url(request)
     canonical_url = request.build_absolute_uri(request.path)
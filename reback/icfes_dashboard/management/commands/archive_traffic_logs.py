@@ -0,0 +1,105 @@
+"""
+Management command: archive_traffic_logs
+
+Retención de RailwayTrafficLog: los días con más de --days de antigüedad se
+escriben a Parquet (TRAFFIC_ARCHIVE_DIR, ver icfes_dashboard/traffic_archive.py)
+y se eliminan de Postgres borrando su partición. En Postgres además crea las
+particiones de los próximos --ahead días y reparte en su día las filas que
+cayeron en la partición DEFAULT. Pensado para correr una vez al día; si otra
+ejecución (otro proceso o réplica) tiene el advisory lock, sale sin hacer nada.
+
+Uso:
+    python manage.py archive_traffic_logs               # retención TRAFFIC_RETENTION_DAYS
+    python manage.py archive_traffic_logs --days 14
+    python manage.py archive_traffic_logs --dry-run     # solo lista los días a archivar
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from icfes_dashboard.models import RailwayTrafficLog
+from icfes_dashboard.traffic_archive import archive_day
+from icfes_dashboard.traffic_partitions import (
+    archive_lock,
+    day_bounds,
+    drop_day,
+    ensure_partitions,
+    is_partitioned,
+    partitions,
+    split_default,
+)
+
+
+class Command(BaseCommand):
+    help = "Archive RailwayTrafficLog days older than the retention window to Parquet and drop them"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=settings.TRAFFIC_RETENTION_DAYS,
+            help=f"Days kept in Postgres (default TRAFFIC_RETENTION_DAYS={settings.TRAFFIC_RETENTION_DAYS})",
+        )
+        parser.add_argument(
+            "--ahead",
+            type=int,
+            default=7,
+            help="Daily partitions created ahead of today (default 7)",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            default=False,
+            help="List the days that would be archived without touching anything",
+        )
+
+    def handle(self, *args, **options):
+        if options["days"] < 1:
+            raise CommandError("--days must be at least 1")
+
+        with archive_lock() as acquired:
+            if not acquired:
+                self.stdout.write(self.style.WARNING("Another archive_traffic_logs run holds the lock, skipping"))
+                return
+            self._archive(options)
+
+    def _archive(self, options):
+        today = timezone.localdate()
+        cutoff = today - timedelta(days=options["days"])
+        partitioned = is_partitioned()
+
+        if partitioned and not options["dry_run"]:
+            moved = split_default()
+            created = ensure_partitions(today, today + timedelta(days=options["ahead"]))
+            self.stdout.write(
+                f"Partitions: {len(created)} created ahead, {len(moved)} split from default"
+            )
+
+        if partitioned:
+            days = sorted(day for day in partitions() if day < cutoff)
+        else:
+            days = list(
+                RailwayTrafficLog.objects.filter(timestamp__lt=day_bounds(cutoff)[0])
+                .annotate(day=TruncDate("timestamp"))
+                .order_by("day")
+                .values_list("day", flat=True)
+                .distinct()
+            )
+
+        self.stdout.write(f"Retention: {options['days']} days (archiving before {cutoff}) | {len(days)} days to archive")
+        if options["dry_run"]:
+            for day in days:
+                self.stdout.write(f"  {day}")
+            return
+
+        total = 0
+        for day in days:
+            rows = archive_day(day)
+            drop_day(day)
+            total += rows
+            self.stdout.write(self.style.SUCCESS(f"  ✓ {day}: {rows:,} rows archived"))
+
+        self.stdout.write(self.style.SUCCESS(f"\nDone. {len(days)} days, {total:,} rows archived."))
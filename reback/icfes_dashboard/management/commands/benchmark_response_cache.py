@@ -0,0 +1,136 @@
+"""
+Management command: benchmark_response_cache
+
+Compara el formato anterior de caché (HttpResponse pickled completo + GZip por
+request) con las entradas comprimidas de icfes_dashboard.response_cache:
+bytes ocupados en Redis y tiempo de servir un HIT.
+
+Uso:
+    python manage.py benchmark_response_cache
+    python manage.py benchmark_response_cache --path /icfes/colegio/<slug>/ --path /icfes/api/estadisticas/
+    python manage.py benchmark_response_cache --iterations 500
+"""
+from __future__ import annotations
+
+import pickle
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from django.urls import Resolver404, resolve
+from django.utils.text import compress_string
+
+from icfes_dashboard.response_cache import brotli, build_entry, response_from_entry
+
+DEFAULT_PATHS = [
+    "/icfes/ranking/colegios/2024/",
+    "/icfes/departamentos/",
+    "/icfes/api/estadisticas/",
+    "/icfes/api/anos/",
+    "/icfes/og/default.png",
+]
+
+
+class Command(BaseCommand):
+    help = "Compare pickled-response cache entries with compressed entries (size + hit latency)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--path",
+            action="append",
+            dest="paths",
+            help="URL path to benchmark (repeatable). Default: a sample of landings/APIs",
+        )
+        parser.add_argument(
+            "--iterations",
+            type=int,
+            default=200,
+            help="Simulated cache hits per URL (default: 200)",
+        )
+
+    def handle(self, *args, **options):
+        paths = options["paths"] or DEFAULT_PATHS
+        iterations = max(1, options["iterations"])
+        factory = RequestFactory()
+
+        if brotli is None:
+            self.stdout.write(self.style.WARNING("brotli no instalado: solo se mide gzip"))
+
+        header = f"{'path':<45} {'pickle':>9} {'entry':>9} {'ratio':>6} {'old µs':>8} {'new µs':>8}"
+        self.stdout.write(header)
+        self.stdout.write("-" * len(header))
+
+        total_old = total_new = 0
+        measured = 0
+        for path in paths:
+            response = self._render(factory, path)
+            if response is None:
+                continue
+
+            old_blob = pickle.dumps(response, pickle.HIGHEST_PROTOCOL)
+            new_blob = pickle.dumps(build_entry(response), pickle.HIGHEST_PROTOCOL)
+
+            request = factory.get(path, HTTP_ACCEPT_ENCODING="gzip, deflate, br")
+            old_us = self._time_old_hit(old_blob, iterations)
+            new_us = self._time_new_hit(request, new_blob, iterations)
+
+            ratio = len(new_blob) / len(old_blob) if old_blob else 0
+            self.stdout.write(
+                f"{path[:45]:<45} {len(old_blob):>9,} {len(new_blob):>9,} {ratio:>6.2f} "
+                f"{old_us:>8.1f} {new_us:>8.1f}"
+            )
+            total_old += len(old_blob)
+            total_new += len(new_blob)
+            measured += 1
+
+        if not measured:
+            raise CommandError("No se pudo renderizar ninguna URL")
+
+        saved = 1 - (total_new / total_old) if total_old else 0
+        self.stdout.write("")
+        self.stdout.write(self.style.SUCCESS(
+            f"Redis: {total_old:,} B -> {total_new:,} B ({saved:.0%} menos) en {measured} URLs"
+        ))
+
+    def _render(self, factory, path):
+        try:
+            match = resolve(path)
+        except Resolver404:
+            self.stdout.write(self.style.WARNING(f"{path}: no resuelve, se omite"))
+            return None
+
+        # Skip the cache decorator: we want the raw view output.
+        view = getattr(match.func, "__wrapped__", match.func)
+        request = factory.get(path)
+        request.user = AnonymousUser()
+        try:
+            response = view(request, *match.args, **match.kwargs)
+            if hasattr(response, "render") and callable(response.render):
+                response = response.render()
+        except Exception as exc:
+            self.stdout.write(self.style.WARNING(f"{path}: error renderizando ({exc}), se omite"))
+            return None
+
+        if response.status_code != 200 or response.streaming:
+            self.stdout.write(self.style.WARNING(f"{path}: status {response.status_code}, se omite"))
+            return None
+        return response
+
+    @staticmethod
+    def _time_old_hit(blob, iterations):
+        # Old path: unpickle the full HttpResponse, then GZipMiddleware
+        # compresses the body again on every hit.
+        start = time.perf_counter()
+        for _ in range(iterations):
+            response = pickle.loads(blob)
+            if response.get("Content-Type", "").startswith(("text/", "application/json")):
+                compress_string(response.content)
+        return (time.perf_counter() - start) / iterations * 1e6
+
+    @staticmethod
+    def _time_new_hit(request, blob, iterations):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            response_from_entry(request, pickle.loads(blob))
+        return (time.perf_counter() - start) / iterations * 1e6
@@ -0,0 +1,70 @@
+"""
+Management command: benchmark_what_if
+
+Latencia del motor "qué pasaría si" (icfes_dashboard.ml.what_if) en los
+colegios con más estudiantes: un batch de escenarios por llamada, como
+/api/ml/what-if/. La primera llamada (carga del booster y la población) se
+reporta aparte.
+
+Uso:
+    python manage.py benchmark_what_if
+    python manage.py benchmark_what_if --schools 20 --iterations 200
+    python manage.py benchmark_what_if --escenario internet:20,libros:1 --escenario lectura:2
+"""
+from __future__ import annotations
+
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from icfes_dashboard.ml import what_if
+
+
+class Command(BaseCommand):
+    help = "Benchmark what-if scenario latency on the largest schools"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--schools", type=int, default=10, help="Largest schools to time (default: 10)")
+        parser.add_argument("--iterations", type=int, default=100, help="Calls per school (default: 100)")
+        parser.add_argument(
+            "--escenario",
+            action="append",
+            dest="escenarios",
+            help="Scenario 'palanca:cambio,...' (repeatable). Default: one per lever",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            scenarios = [what_if.parse_scenario(r) for r in options["escenarios"] or what_if.DEFAULT_SCENARIOS]
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        iterations = max(1, options["iterations"])
+
+        t0 = time.perf_counter()
+        engine = what_if.get_engine()
+        if engine is None:
+            raise CommandError("Falta el booster o la población: corre train_icfes_models y build_what_if_population")
+        self.stdout.write(
+            f"Motor cargado en {(time.perf_counter() - t0) * 1000:.0f} ms: "
+            f"{len(engine):,} colegios, {len(engine.X):,} estudiantes ({engine.ano})"
+        )
+
+        sizes = np.diff(engine.row_start)
+        largest = np.argsort(sizes, kind="stable")[::-1][: max(1, options["schools"])]
+
+        header = f"{'colegio':<16} {'estudiantes':>11} {'escenarios':>10} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}"
+        self.stdout.write(header)
+        self.stdout.write("-" * len(header))
+        for pos in largest:
+            codigo = str(engine.codes[pos])
+            timings = []
+            for _ in range(iterations):
+                t1 = time.perf_counter()
+                engine.evaluate(codigo, scenarios)
+                timings.append((time.perf_counter() - t1) * 1000)
+            p50, p95 = np.percentile(timings, [50, 95])
+            self.stdout.write(
+                f"{codigo:<16} {int(sizes[pos]):>11,} {len(scenarios):>10} "
+                f"{p50:>8.2f} {p95:>8.2f} {max(timings):>8.2f}"
+            )
@@ -0,0 +1,69 @@
+"""
+Management command para el SHAP de población completa.
+
+Pasa todas las filas de estudiantes (2014+) por el predictor entrenado
+(artifacts/predictor.ubj) con pred_contribs en un pool de procesos y guarda
+medias y medias absolutas de las contribuciones por colegio, departamento y
+año (ver icfes_dashboard/ml/shap_population.py). Correr después de
+train_icfes_models y de cada actualización del DuckDB.
+
+Uso:
+  python manage.py build_shap_population
+  python manage.py build_shap_population --workers 8 --chunk-rows 100000
+  python manage.py build_shap_population --model /data/predictor.ubj
+"""
+import logging
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from icfes_dashboard.ml.shap_population import (
+    SHAP_CHUNK_ROWS,
+    build_shap_population,
+    output_dir,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Calcula SHAP para todos los estudiantes y lo agrega por colegio, departamento y año'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Procesos para pred_contribs (default: núcleos de la máquina; 0 = en este proceso)',
+        )
+        parser.add_argument(
+            '--chunk-rows', type=int, default=SHAP_CHUNK_ROWS,
+            help=f'Filas por bloque enviado a cada worker (default {SHAP_CHUNK_ROWS:,})',
+        )
+        parser.add_argument('--model', help='Booster a usar (default artifacts/predictor.ubj)')
+
+    def handle(self, *args, **options):
+        if options['chunk_rows'] <= 0:
+            raise CommandError('--chunk-rows debe ser positivo')
+
+        self.stdout.write(
+            f'\n🧮 SHAP de población completa: {options["workers"]} workers, '
+            f'bloques de {options["chunk_rows"]:,} filas'
+        )
+        try:
+            manifest = build_shap_population(
+                workers=options['workers'],
+                chunk_rows=options['chunk_rows'],
+                model_path=options['model'],
+            )
+        except (FileNotFoundError, ValueError) as e:
+            raise CommandError(f'Predictor o encoding spec no disponibles ({e}); corre train_icfes_models primero')
+        except Exception as e:
+            logger.exception('build_shap_population falló')
+            raise CommandError(str(e))
+
+        segundos = manifest['segundos']
+        self.stdout.write(self.style.SUCCESS(
+            f'   ✅ {manifest["filas"]:,} estudiantes → {manifest["grupos"]:,} colegio-año, '
+            f'{manifest["colegios"]:,} colegios | {segundos:.0f}s '
+            f'({manifest["filas"] / max(segundos, 0.1):,.0f} filas/s)'
+        ))
+        self.stdout.write(f'   Tablas en {output_dir()}')
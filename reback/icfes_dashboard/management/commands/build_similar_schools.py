@@ -0,0 +1,78 @@
+"""
+Management command para construir el índice k-NN de colegios similares.
+
+Lee fct_colegio_historico (puntajes por área, sector, tamaño) + NBI municipal,
+calcula los top-k vecinos por colegio y año (ver icfes_dashboard/ml/similar_schools.py)
+y guarda el artefacto que leen la landing del colegio y /api/colegio/<sk>/similares/.
+Correr después de cada actualización del DuckDB.
+
+Uso:
+  python manage.py build_similar_schools
+  python manage.py build_similar_schools --k 20 --desde 2018
+  python manage.py build_similar_schools --output /data/similar_schools.npz
+"""
+import logging
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from icfes_dashboard.db_utils import execute_query, get_dataset_version
+from icfes_dashboard.ml.similar_schools import (
+    DEFAULT_K,
+    build_arrays,
+    index_path,
+    save_index,
+)
+
+logger = logging.getLogger(__name__)
+
+SQL_SIMILAR_SCHOOLS = """
+SELECT
+    CAST(h.codigo_dane AS VARCHAR)      AS codigo_dane,
+    CAST(h.ano AS INTEGER)              AS ano,
+    h.sector,
+    h.total_estudiantes,
+    h.avg_punt_matematicas,
+    h.avg_punt_lectura_critica,
+    h.avg_punt_c_naturales,
+    h.avg_punt_sociales_ciudadanas,
+    h.avg_punt_ingles,
+    n.pct_nbi_total
+FROM gold.fct_colegio_historico h
+LEFT JOIN gold.dim_municipio_nbi n
+    ON CAST(n.codigo_municipio AS VARCHAR) = SUBSTRING(CAST(h.codigo_dane AS VARCHAR), 1, 5)
+WHERE CAST(h.ano AS INTEGER) >= ?
+  AND h.avg_punt_global IS NOT NULL
+  AND h.avg_punt_global > 0
+QUALIFY ROW_NUMBER() OVER (PARTITION BY h.codigo_dane, h.ano ORDER BY h.total_estudiantes DESC) = 1
+"""
+
+
+class Command(BaseCommand):
+    help = 'Construye el índice k-NN de colegios similares (top-k por colegio y año)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--k', type=int, default=DEFAULT_K, help=f'Vecinos por colegio-año (default {DEFAULT_K})')
+        parser.add_argument('--desde', type=int, default=2014, help='Primer año a indexar (default 2014)')
+        parser.add_argument('--output', help=f'Ruta del artefacto (default {index_path()})')
+
+    def handle(self, *args, **options):
+        k = options['k']
+        if not 1 <= k <= 50:
+            raise CommandError('--k debe estar entre 1 y 50')
+        t0 = time.time()
+
+        self.stdout.write(f'📥 Cargando colegio-año desde {options["desde"]}...')
+        df = execute_query(SQL_SIMILAR_SCHOOLS, params=[options['desde']])
+        if df.empty:
+            raise CommandError('fct_colegio_historico no devolvió filas')
+        self.stdout.write(f'   → {len(df):,} filas en {time.time()-t0:.1f}s')
+
+        self.stdout.write(f'🧭 Calculando top-{k} vecinos por año...')
+        t1 = time.time()
+        arrays = build_arrays(df, k=k)
+        self.stdout.write(f'   → {len(arrays["codes"]):,} colegios en {time.time()-t1:.1f}s')
+
+        dataset = get_dataset_version()
+        path = save_index(arrays, options.get('output'), dataset_version=dataset.version if dataset else '')
+        self.stdout.write(self.style.SUCCESS(f'✅ Índice guardado en {path} ({time.time()-t0:.1f}s)'))
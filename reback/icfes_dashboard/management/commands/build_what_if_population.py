@@ -0,0 +1,61 @@
+"""
+Management command para la población del motor "qué pasaría si".
+
+Codifica con el encoding spec del último entrenamiento a los estudiantes de
+un año (el último por defecto), ordenados por colegio, y guarda la matriz que
+cargan los workers web para /api/ml/what-if/ (ver icfes_dashboard/ml/what_if.py).
+Correr después de train_icfes_models y de cada actualización del DuckDB.
+
+Uso:
+  python manage.py build_what_if_population
+  python manage.py build_what_if_population --ano 2023
+  python manage.py build_what_if_population --output /data/what_if_population.npz
+"""
+import logging
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from icfes_dashboard.db_utils import get_dataset_version
+from icfes_dashboard.ml.train_models import load_encoding_spec
+from icfes_dashboard.ml.what_if import (
+    build_population,
+    latest_year,
+    population_path,
+    save_population,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Guarda los estudiantes codificados por colegio para el motor what-if'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ano', type=int, help='Año de la población (default: el último)')
+        parser.add_argument('--output', help=f'Ruta del artefacto (default {population_path()})')
+
+    def handle(self, *args, **options):
+        t0 = time.time()
+        try:
+            spec = load_encoding_spec()
+        except (FileNotFoundError, ValueError) as e:
+            raise CommandError(f'Encoding spec no disponible ({e}); corre train_icfes_models primero')
+
+        ano = options['ano'] or latest_year()
+        if ano is None:
+            raise CommandError('icfes_silver.icfes no devolvió estudiantes')
+
+        self.stdout.write(f'📥 Codificando estudiantes de {ano}...')
+        try:
+            arrays = build_population(spec, ano)
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(
+            f'   → {len(arrays["X"]):,} estudiantes, {len(arrays["codes"]):,} colegios '
+            f'en {time.time()-t0:.1f}s'
+        )
+
+        dataset = get_dataset_version()
+        path = save_population(arrays, options.get('output'), dataset_version=dataset.version if dataset else '')
+        self.stdout.write(self.style.SUCCESS(f'✅ Población guardada en {path} ({time.time()-t0:.1f}s)'))
@@ -4,6 +4,8 @@ from django.conf import settings
 import duckdb
 import os
 
+from icfes_dashboard.response_cache import geo_cache_tags, purge_cache_tags
+
 class Command(BaseCommand):
     help = 'Backfills municipality aggregation data for Tuluá to fix 2015-2024 gap caused by accent in source data'
 
@@ -57,6 +59,10 @@ class Command(BaseCommand):
             self.stdout.write(self.style.SUCCESS(f"Successfully backfilled Tuluá data. Records > 2014: {post_count}"))
             
             conn.close()
+
+            # Drop cached Tuluá / Valle pages instead of waiting out the 7-day TTL
+            result = purge_cache_tags(geo_cache_tags('VALLE DEL CAUCA', 'TULUA'))
+            self.stdout.write(f"Purged cache tags: {', '.join(result['tags'])}")
             
         except Exception as e:
             self.stdout.write(self.style.ERROR(f"Error: {e}"))
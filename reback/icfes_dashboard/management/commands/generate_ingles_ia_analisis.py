@@ -10,6 +10,8 @@ Modos:
 
 Diseño:
   - Cada análisis archiva el anterior al regenerar (historial disponible)
+  - Llamadas concurrentes con rate limit y reintentos (icfes_dashboard/ia_generation.py)
+  - Se omiten los análisis cuyos datos de entrada no cambiaron (input_hash)
   - Secciones parseadas individualmente para render selectivo en frontend
   - Solo requiere ANTHROPIC_API_KEY durante el deploy, no en runtime web
 
@@ -20,6 +22,8 @@ Uso:
     python manage.py generate_ingles_ia_analisis --departamento ALL  # los 33
     python manage.py generate_ingles_ia_analisis --dry-run
     python manage.py generate_ingles_ia_analisis --forzar
+    python manage.py generate_ingles_ia_analisis --departamento ALL --concurrency 8 --rpm 50
+    python manage.py generate_ingles_ia_analisis --departamento ALL --stub  # sin API
 """
 
 import re
@@ -28,11 +32,21 @@ import logging
 from django.core.management.base import BaseCommand, CommandError
 from django.conf import settings
 
+from icfes_dashboard.ia_generation import (
+    DEFAULT_CONCURRENCY,
+    DEFAULT_RPM,
+    Job,
+    generate_all,
+    input_hash,
+    make_client,
+)
+
 logger = logging.getLogger(__name__)
 
 MODEL_IA   = "claude-sonnet-4-6"
 MAX_TOKENS = 4096
 ANO_DEFAULT = 2024
+PROMPT_VERSION = 1   # subir al cambiar las plantillas: invalida las huellas guardadas
 
 
 # ---------------------------------------------------------------------------
@@ -117,115 +131,145 @@ def _get_duckdb_data_nacional(ano: int) -> dict:
 
 def _get_duckdb_data_depto(ano: int, departamento: str) -> dict:
     """Datos para análisis de un departamento específico + benchmark nacional."""
-    from icfes_dashboard.db_utils import execute_query
+    return _get_duckdb_data_deptos(ano, [departamento])[departamento]
 
-    data = {}
 
-    # KPIs del departamento vs nacional
-    df_depto = execute_query(f"""
+def _registros(df, columnas) -> dict:
+    """{DEPTO: [records]} con `columnas`, conservando el orden de `df`."""
+    return {
+        depto: grupo[columnas].to_dict(orient='records')
+        for depto, grupo in df.groupby('depto', sort=False)
+    }
+
+
+def _primera_fila(df, columnas) -> dict:
+    """{DEPTO: dict} de la primera fila de cada departamento (como iloc[0].to_dict())."""
+    return {
+        depto: grupo[columnas].iloc[0].to_dict()
+        for depto, grupo in df.groupby('depto', sort=False)
+    }
+
+
+def _get_duckdb_data_deptos(ano: int, departamentos: list) -> dict:
+    """
+    {departamento: datos} para varios departamentos con un puñado de
+    consultas agrupadas por departamento (antes ~10 consultas por cada uno).
+    Cada entrada es igual a la que daba la consulta individual.
+    """
+    from icfes_dashboard.db_utils import execute_query
+
+    # KPIs por departamento + nacional (fila de total del GROUPING SETS)
+    df_kpis = execute_query("""
         SELECT
+            UPPER(cole_depto_ubicacion)                     AS depto,
+            GROUPING(UPPER(cole_depto_ubicacion))           AS es_total,
             ROUND(AVG(avg_ingles), 2)                       AS promedio_depto,
             COUNT(DISTINCT cole_cod_dane_establecimiento)    AS total_colegios,
             SUM(estudiantes)                                 AS total_estudiantes,
             ROUND(MIN(avg_ingles), 1)                       AS minimo,
             ROUND(MAX(avg_ingles), 1)                       AS maximo
         FROM gold.icfes_master_resumen
-        WHERE CAST(ano AS INTEGER) = {ano}
+        WHERE CAST(ano AS INTEGER) = ?
           AND avg_ingles > 0 AND estudiantes >= 5
-          AND UPPER(cole_depto_ubicacion) = UPPER('{departamento}')
-    """)
-    df_nacional = execute_query(f"""
-        SELECT ROUND(AVG(avg_ingles), 2) AS promedio_nacional
-        FROM gold.icfes_master_resumen
-        WHERE CAST(ano AS INTEGER) = {ano} AND avg_ingles > 0 AND estudiantes >= 5
-    """)
-    data['kpis'] = {
-        **df_depto.iloc[0].to_dict(),
-        'promedio_nacional': float(df_nacional.iloc[0]['promedio_nacional']),
-    }
-
-    # Ranking del departamento en el año
-    df_ranking = execute_query(f"""
+        GROUP BY GROUPING SETS ((UPPER(cole_depto_ubicacion)), ())
+    """, [ano])
+    total = df_kpis[df_kpis['es_total'] == 1]
+    promedio_nacional = float(total.iloc[0]['promedio_depto']) if not total.empty else None
+    kpis_cols = ['promedio_depto', 'total_colegios', 'total_estudiantes', 'minimo', 'maximo']
+    kpis = _primera_fila(df_kpis[df_kpis['es_total'] == 0], kpis_cols)
+
+    # Ranking de departamentos en el año
+    df_ranking = execute_query("""
         SELECT UPPER(cole_depto_ubicacion) AS depto,
                ROUND(AVG(avg_ingles), 2)   AS promedio
         FROM gold.icfes_master_resumen
-        WHERE CAST(ano AS INTEGER) = {ano} AND avg_ingles > 0
+        WHERE CAST(ano AS INTEGER) = ? AND avg_ingles > 0
         GROUP BY cole_depto_ubicacion
         ORDER BY promedio DESC
-    """)
+    """, [ano])
     ranking_list = df_ranking['depto'].str.upper().tolist()
-    data['ranking_nacional'] = (
-        ranking_list.index(departamento.upper()) + 1 if departamento.upper() in ranking_list else None
-    )
-    data['total_departamentos'] = len(ranking_list)
 
-    # Tendencia histórica del departamento
-    data['tendencia'] = execute_query(f"""
-        SELECT CAST(ano AS INTEGER) AS ano,
-               ROUND(AVG(avg_ingles), 2) AS promedio_depto
+    # Tendencia histórica por departamento + nacional
+    df_tendencia = execute_query("""
+        SELECT UPPER(cole_depto_ubicacion)           AS depto,
+               GROUPING(UPPER(cole_depto_ubicacion)) AS es_total,
+               CAST(ano AS INTEGER)                  AS ano,
+               ROUND(AVG(avg_ingles), 2)             AS promedio
         FROM gold.icfes_master_resumen
-        WHERE CAST(ano AS INTEGER) BETWEEN {ano-4} AND {ano}
+        WHERE CAST(ano AS INTEGER) BETWEEN ? AND ?
           AND avg_ingles > 0
-          AND UPPER(cole_depto_ubicacion) = UPPER('{departamento}')
-        GROUP BY ano ORDER BY ano
-    """).to_dict(orient='records')
-
-    # Tendencia nacional para comparar
-    data['tendencia_nacional'] = execute_query(f"""
-        SELECT CAST(ano AS INTEGER) AS ano,
-               ROUND(AVG(avg_ingles), 2) AS promedio_nacional
-        FROM gold.icfes_master_resumen
-        WHERE CAST(ano AS INTEGER) BETWEEN {ano-4} AND {ano} AND avg_ingles > 0
-        GROUP BY ano ORDER BY ano
-    """).to_dict(orient='records')
+        GROUP BY GROUPING SETS ((UPPER(cole_depto_ubicacion), CAST(ano AS INTEGER)), (CAST(ano AS INTEGER)))
+        ORDER BY ano
+    """, [ano - 4, ano])
+    tendencia = _registros(
+        df_tendencia[df_tendencia['es_total'] == 0].rename(columns={'promedio': 'promedio_depto'}),
+        ['ano', 'promedio_depto'],
+    )
+    tendencia_nacional = (
+        df_tendencia[df_tendencia['es_total'] == 1]
+        .rename(columns={'promedio': 'promedio_nacional'})[['ano', 'promedio_nacional']]
+        .to_dict(orient='records')
+    )
 
-    # Cluster al que pertenece
-    df_cluster = execute_query(f"""
-        SELECT cluster_label, promedio_reciente, tendencia_pendiente,
-               cambio_abs, n_colegios_activos
+    # Clusters: la tabla completa (33 filas) se reparte en memoria
+    df_clusters = execute_query("""
+        SELECT departamento, UPPER(departamento) AS depto, cluster_label,
+               promedio_reciente, tendencia_pendiente, cambio_abs, n_colegios_activos
         FROM gold.fct_clusters_depto_ingles
-        WHERE UPPER(departamento) = UPPER('{departamento}')
-        LIMIT 1
     """)
-    data['cluster'] = df_cluster.iloc[0].to_dict() if not df_cluster.empty else {}
-
-    # Otros departamentos en el mismo cluster
-    if data['cluster']:
-        df_mismo_cluster = execute_query(f"""
-            SELECT departamento, promedio_reciente, tendencia_pendiente
-            FROM gold.fct_clusters_depto_ingles
-            WHERE cluster_label = '{data["cluster"]["cluster_label"]}'
-              AND UPPER(departamento) != UPPER('{departamento}')
-            ORDER BY promedio_reciente DESC
-        """)
-        data['cluster_pares'] = df_mismo_cluster.to_dict(orient='records')
-    else:
-        data['cluster_pares'] = []
-
-    # Predicciones 2025 para colegios de este departamento
-    data['prediccion'] = {
-        'top_mejora': execute_query(f"""
-            SELECT nombre_colegio, avg_ingles_actual, avg_ingles_predicho, cambio_predicho
-            FROM gold.fct_prediccion_ingles
-            WHERE UPPER(departamento) = UPPER('{departamento}')
-            ORDER BY cambio_predicho DESC LIMIT 5
-        """).to_dict(orient='records'),
-        'top_riesgo': execute_query(f"""
-            SELECT nombre_colegio, avg_ingles_actual, avg_ingles_predicho, cambio_predicho
-            FROM gold.fct_prediccion_ingles
-            WHERE UPPER(departamento) = UPPER('{departamento}')
-            ORDER BY cambio_predicho ASC LIMIT 5
-        """).to_dict(orient='records'),
-        'distribucion': execute_query(f"""
-            SELECT tendencia, COUNT(*) AS n_colegios,
-                   ROUND(COUNT(*)*100.0/SUM(COUNT(*)) OVER(), 1) AS pct
-            FROM gold.fct_prediccion_ingles
-            WHERE UPPER(departamento) = UPPER('{departamento}')
-            GROUP BY tendencia
-        """).to_dict(orient='records'),
-    }
-
-    return data
+    cluster_cols = ['cluster_label', 'promedio_reciente', 'tendencia_pendiente', 'cambio_abs', 'n_colegios_activos']
+    clusters = _primera_fila(df_clusters, cluster_cols)
+    pares_ordenados = df_clusters.sort_values('promedio_reciente', ascending=False, kind='stable')
+
+    # Predicciones 2025: top 5 de mejora y de riesgo por departamento en una pasada
+    df_pred = execute_query("""
+        SELECT UPPER(departamento) AS depto,
+               nombre_colegio, avg_ingles_actual, avg_ingles_predicho, cambio_predicho,
+               ROW_NUMBER() OVER (PARTITION BY UPPER(departamento) ORDER BY cambio_predicho DESC) AS rank_mejora,
+               ROW_NUMBER() OVER (PARTITION BY UPPER(departamento) ORDER BY cambio_predicho ASC)  AS rank_riesgo
+        FROM gold.fct_prediccion_ingles
+        QUALIFY rank_mejora <= 5 OR rank_riesgo <= 5
+    """)
+    pred_cols = ['nombre_colegio', 'avg_ingles_actual', 'avg_ingles_predicho', 'cambio_predicho']
+    top_mejora = _registros(df_pred[df_pred['rank_mejora'] <= 5].sort_values(['depto', 'rank_mejora']), pred_cols)
+    top_riesgo = _registros(df_pred[df_pred['rank_riesgo'] <= 5].sort_values(['depto', 'rank_riesgo']), pred_cols)
+    distribucion = _registros(execute_query("""
+        SELECT UPPER(departamento) AS depto, tendencia, COUNT(*) AS n_colegios,
+               ROUND(COUNT(*)*100.0/SUM(COUNT(*)) OVER (PARTITION BY UPPER(departamento)), 1) AS pct
+        FROM gold.fct_prediccion_ingles
+        GROUP BY UPPER(departamento), tendencia
+        ORDER BY depto, tendencia
+    """), ['tendencia', 'n_colegios', 'pct'])
+
+    resultado = {}
+    for departamento in departamentos:
+        depto = departamento.upper()
+        cluster = clusters.get(depto, {})
+        pares = []
+        if cluster:
+            mismo = pares_ordenados[
+                (pares_ordenados['cluster_label'] == cluster['cluster_label'])
+                & (pares_ordenados['depto'] != depto)
+            ]
+            pares = mismo[['departamento', 'promedio_reciente', 'tendencia_pendiente']].to_dict(orient='records')
+        resultado[departamento] = {
+            'kpis': {
+                **kpis.get(depto, dict.fromkeys(kpis_cols)),
+                'promedio_nacional': promedio_nacional,
+            },
+            'ranking_nacional': ranking_list.index(depto) + 1 if depto in ranking_list else None,
+            'total_departamentos': len(ranking_list),
+            'tendencia': tendencia.get(depto, []),
+            'tendencia_nacional': tendencia_nacional,
+            'cluster': cluster,
+            'cluster_pares': pares,
+            'prediccion': {
+                'top_mejora': top_mejora.get(depto, []),
+                'top_riesgo': top_riesgo.get(depto, []),
+                'distribucion': distribucion.get(depto, []),
+            },
+        }
+    return resultado
 
 
 # ---------------------------------------------------------------------------
@@ -396,18 +440,12 @@ def _parse_sections(text: str) -> dict:
 # 4. Guardar en PostgreSQL
 # ---------------------------------------------------------------------------
 
-def _guardar(tipo: str, parametro: str, ano: int,
-             analisis_md: str, sections: dict,
-             tokens_input: int, tokens_output: int):
+def _nuevo(tipo: str, parametro: str, ano: int,
+           analisis_md: str, sections: dict,
+           tokens_input: int, tokens_output: int, input_hash: str = ''):
     from icfes_dashboard.models import InglesAnalisisIA
 
-    # Archivar activos anteriores
-    InglesAnalisisIA.objects.filter(
-        tipo=tipo, parametro=parametro,
-        ano_referencia=ano, estado=InglesAnalisisIA.ESTADO_ACTIVO,
-    ).update(estado=InglesAnalisisIA.ESTADO_ARCHIVADO)
-
-    return InglesAnalisisIA.objects.create(
+    return InglesAnalisisIA(
         tipo=tipo, parametro=parametro, ano_referencia=ano,
         estado=InglesAnalisisIA.ESTADO_ACTIVO,
         analisis_md=analisis_md,
@@ -419,9 +457,36 @@ def _guardar(tipo: str, parametro: str, ano: int,
         modelo_ia=MODEL_IA,
         tokens_input=tokens_input,
         tokens_output=tokens_output,
+        input_hash=input_hash,
     )
 
 
+def _guardar(tipo: str, parametro: str, ano: int,
+             analisis_md: str, sections: dict,
+             tokens_input: int, tokens_output: int, input_hash: str = ''):
+    return _guardar_lote(ano, [
+        _nuevo(tipo, parametro, ano, analisis_md, sections, tokens_input, tokens_output, input_hash)
+    ])[0]
+
+
+def _guardar_lote(ano: int, objs: list):
+    """Archiva los activos de cada (tipo, parametro) y crea los nuevos en una sola transacción."""
+    from django.db import transaction
+    from django.db.models import Q
+    from icfes_dashboard.models import InglesAnalisisIA
+
+    if not objs:
+        return []
+    claves = Q()
+    for obj in objs:
+        claves |= Q(tipo=obj.tipo, parametro=obj.parametro)
+    with transaction.atomic():
+        InglesAnalisisIA.objects.filter(
+            claves, ano_referencia=ano, estado=InglesAnalisisIA.ESTADO_ACTIVO,
+        ).update(estado=InglesAnalisisIA.ESTADO_ARCHIVADO)
+        return InglesAnalisisIA.objects.bulk_create(objs)
+
+
 # ---------------------------------------------------------------------------
 # 5. Management Command
 # ---------------------------------------------------------------------------
@@ -437,9 +502,17 @@ class Command(BaseCommand):
         )
         parser.add_argument('--dry-run', action='store_true')
         parser.add_argument('--forzar', action='store_true',
-                            help='Regenera aunque ya exista análisis activo')
+                            help='Regenera aunque los datos del análisis activo no hayan cambiado')
+        parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                            help=f'Llamadas simultáneas a la API (default {DEFAULT_CONCURRENCY})')
+        parser.add_argument('--rpm', type=int, default=DEFAULT_RPM,
+                            help=f'Máximo de solicitudes por minuto (default {DEFAULT_RPM})')
+        parser.add_argument('--stub', action='store_true',
+                            help='Usa el cliente local de prueba en vez de la API')
 
     def handle(self, *args, **options):
+        from icfes_dashboard.models import InglesAnalisisIA
+
         ano        = options['ano']
         depto_arg  = options['departamento'].strip().upper()
         dry_run    = options['dry_run']
@@ -452,90 +525,82 @@ class Command(BaseCommand):
             df_deptos = execute_query(
                 "SELECT DISTINCT departamento FROM gold.fct_clusters_depto_ingles ORDER BY departamento"
             )
-            departamentos = df_deptos['departamento'].tolist()
-            self.stdout.write(f"\nGenerando análisis para {len(departamentos)} departamentos (año {ano})...\n")
-            for i, depto in enumerate(departamentos, 1):
-                self.stdout.write(f"  [{i:02d}/{len(departamentos)}] {depto}...")
-                self._generar(ano, depto, dry_run, forzar)
-                if not dry_run and i < len(departamentos):
-                    time.sleep(1)  # evitar rate-limit de la API
-            self.stdout.write(self.style.SUCCESS(f"\nOK: {len(departamentos)} análisis departamentales generados."))
-
+            tipo, parametros = InglesAnalisisIA.TIPO_DEPARTAMENTO, df_deptos['departamento'].tolist()
+            self.stdout.write(f"\nGenerando análisis para {len(parametros)} departamentos (año {ano})...\n")
         elif depto_arg:
-            # Un solo departamento
-            self._generar(ano, depto_arg, dry_run, forzar)
-
+            tipo, parametros = InglesAnalisisIA.TIPO_DEPARTAMENTO, [depto_arg]
         else:
-            # Nacional
-            self._generar_nacional(ano, dry_run, forzar)
-
-    def _get_client(self):
-        if not getattr(settings, 'ANTHROPIC_API_KEY', None):
-            raise CommandError("ANTHROPIC_API_KEY no configurada en settings.")
-        import anthropic
-        return anthropic.Anthropic(api_key=settings.ANTHROPIC_API_KEY)
-
-    def _llamar_api(self, client, prompt: str):
-        msg = client.messages.create(
-            model=MODEL_IA, max_tokens=MAX_TOKENS,
-            messages=[{"role": "user", "content": prompt}]
-        )
-        return msg.content[0].text, msg.usage.input_tokens, msg.usage.output_tokens
-
-    def _generar_nacional(self, ano: int, dry_run: bool, forzar: bool):
-        from icfes_dashboard.models import InglesAnalisisIA
-
-        self.stdout.write(f"\nAnálisis NACIONAL — año {ano}")
-
-        existe = InglesAnalisisIA.objects.filter(
-            tipo=InglesAnalisisIA.TIPO_NACIONAL, parametro='',
-            ano_referencia=ano, estado=InglesAnalisisIA.ESTADO_ACTIVO,
-        ).exists()
-        if existe and not forzar:
-            self.stdout.write(self.style.WARNING("  Ya existe. Usa --forzar para regenerar."))
-            return
-
-        data   = _get_duckdb_data_nacional(ano)
-        prompt = _build_prompt_nacional(data, ano)
+            tipo, parametros = InglesAnalisisIA.TIPO_NACIONAL, ['']
+            self.stdout.write(f"\nAnálisis NACIONAL — año {ano}")
 
+        jobs = self._jobs(tipo, parametros, ano, forzar)
         if dry_run:
-            self.stdout.write(prompt[:1500] + "\n[...DRY RUN - no se llamó API]")
+            for job in jobs:
+                if tipo == InglesAnalisisIA.TIPO_NACIONAL:
+                    self.stdout.write(job.prompt[:1500] + "\n[...DRY RUN - no se llamó API]")
+                else:
+                    self.stdout.write(f"  {job.key}: prompt OK ({len(job.prompt)} chars) [DRY RUN]")
             return
+        if not jobs:
+            return
+        if not options['stub'] and not getattr(settings, 'ANTHROPIC_API_KEY', None):
+            raise CommandError("ANTHROPIC_API_KEY no configurada en settings.")
 
-        client = self._get_client()
-        texto, t_in, t_out = self._llamar_api(client, prompt)
-        sections = _parse_sections(texto)
-        _guardar(InglesAnalisisIA.TIPO_NACIONAL, '', ano, texto, sections, t_in, t_out)
-        self.stdout.write(self.style.SUCCESS(f"  OK — {t_in}in/{t_out}out tokens"))
-
-    def _generar(self, ano: int, departamento: str, dry_run: bool, forzar: bool):
+        inicio = time.perf_counter()
+        resultados = generate_all(
+            jobs, MODEL_IA, MAX_TOKENS,
+            client=make_client(stub=True) if options['stub'] else None,
+            concurrency=options['concurrency'], rpm=options['rpm'],
+        )
+        nuevos = []
+        for r in resultados:
+            nombre = r.job.key or 'nacional'
+            if r.error:
+                self.stdout.write(self.style.ERROR(f"  {nombre}: error API — {r.error}"))
+                continue
+            nuevos.append(_nuevo(tipo, r.job.key, ano, r.texto, _parse_sections(r.texto),
+                                 r.tokens_input, r.tokens_output, r.job.input_hash))
+            self.stdout.write(f"  {nombre}: OK — {r.tokens_input}in/{r.tokens_output}out tokens")
+        _guardar_lote(ano, nuevos)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"\nOK: {len(nuevos)}/{len(jobs)} análisis generados en {time.perf_counter() - inicio:.1f}s."
+        ))
+
+    def _jobs(self, tipo: str, parametros: list, ano: int, forzar: bool) -> list:
+        """Un Job por parámetro cuyos datos cambiaron desde el análisis activo (todos con --forzar)."""
         from icfes_dashboard.models import InglesAnalisisIA
 
-        existe = InglesAnalisisIA.objects.filter(
-            tipo=InglesAnalisisIA.TIPO_DEPARTAMENTO, parametro=departamento,
+        activos = dict(InglesAnalisisIA.objects.filter(
+            tipo=tipo, parametro__in=parametros,
             ano_referencia=ano, estado=InglesAnalisisIA.ESTADO_ACTIVO,
-        ).exists()
-        if existe and not forzar:
-            self.stdout.write(self.style.WARNING(f"  {departamento}: ya existe. Omitiendo."))
-            return
-
-        try:
-            data   = _get_duckdb_data_depto(ano, departamento)
-            prompt = _build_prompt_depto(data, ano, departamento)
-        except Exception as e:
-            self.stdout.write(self.style.ERROR(f"  {departamento}: error obteniendo datos — {e}"))
-            return
-
-        if dry_run:
-            self.stdout.write(f"  {departamento}: prompt OK ({len(prompt)} chars) [DRY RUN]")
-            return
-
-        try:
-            client = self._get_client()
-            texto, t_in, t_out = self._llamar_api(client, prompt)
-            sections = _parse_sections(texto)
-            _guardar(InglesAnalisisIA.TIPO_DEPARTAMENTO, departamento, ano,
-                     texto, sections, t_in, t_out)
-            self.stdout.write(f"  {departamento}: OK — {t_in}in/{t_out}out tokens")
-        except Exception as e:
-            self.stdout.write(self.style.ERROR(f"  {departamento}: error API — {e}"))
+        ).values_list('parametro', 'input_hash'))
+
+        datos = {}
+        if tipo == InglesAnalisisIA.TIPO_DEPARTAMENTO:
+            try:
+                datos = _get_duckdb_data_deptos(ano, parametros)
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"  Error obteniendo datos departamentales — {e}"))
+                return []
+
+        jobs = []
+        for parametro in parametros:
+            nombre = parametro or 'nacional'
+            try:
+                if tipo == InglesAnalisisIA.TIPO_NACIONAL:
+                    data   = _get_duckdb_data_nacional(ano)
+                    prompt = _build_prompt_nacional(data, ano)
+                else:
+                    data   = datos[parametro]
+                    prompt = _build_prompt_depto(data, ano, parametro)
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"  {nombre}: error obteniendo datos — {e}"))
+                continue
+
+            huella = input_hash(data, MODEL_IA, PROMPT_VERSION)
+            if not forzar and activos.get(parametro) == huella:
+                self.stdout.write(self.style.WARNING(f"  {nombre}: datos sin cambios. Omitiendo (--forzar para regenerar)."))
+                continue
+            jobs.append(Job(parametro, prompt, huella))
+        return jobs
@@ -3,11 +3,15 @@ Management command: generate_ml_ia_analisis
 
 Lee los resultados de los modelos ML desde DuckDB y genera un análisis
 narrativo con Claude sonnet-4-6. Guarda en PostgreSQL (MlAnalisisIA).
+Varios años se generan en paralelo (icfes_dashboard/ia_generation.py) y
+los años cuyos datos no cambiaron desde el análisis activo se omiten.
 
 Uso:
     python manage.py generate_ml_ia_analisis
     python manage.py generate_ml_ia_analisis --ano 2024
     python manage.py generate_ml_ia_analisis --forzar
+    python manage.py generate_ml_ia_analisis --ano 2022 2023 2024 --concurrency 3
+    python manage.py generate_ml_ia_analisis --stub   # sin API
 """
 import re
 import logging
@@ -15,11 +19,21 @@ import logging
 from django.core.management.base import BaseCommand
 from django.conf import settings
 
+from icfes_dashboard.ia_generation import (
+    DEFAULT_CONCURRENCY,
+    DEFAULT_RPM,
+    Job,
+    generate_all,
+    input_hash,
+    make_client,
+)
+
 logger = logging.getLogger(__name__)
 
 MODEL_IA   = 'claude-sonnet-4-6'
 MAX_TOKENS = 4096
 DEFAULT_ANO = 2024
+PROMPT_VERSION = 1   # subir al cambiar la plantilla: invalida las huellas guardadas
 
 
 # ---------------------------------------------------------------------------
@@ -140,7 +154,7 @@ def _build_prompt(data: dict, ano: int) -> str:
     # Formatear SHAP
     shap_lines = '\n'.join(
         f"  {int(r['rank'])}. {r['label']}: {r['shap_pts']:.1f} pts SHAP"
-        for _, r in shap_df.iterrows()
+        for r in shap_df.to_dict(orient='records')
     )
     model_r2  = float(shap_df.iloc[0]['model_r2']) if not shap_df.empty else 0
     model_mae = float(shap_df.iloc[0]['model_mae']) if not shap_df.empty else 0
@@ -157,25 +171,25 @@ def _build_prompt(data: dict, ano: int) -> str:
         f"  - {r['cluster_name']} ({int(r['n_colegios'])} colegios): "
         f"puntaje={r['avg_global']}, NBI={r['pct_nbi']}%, internet={r['pct_internet']}%, "
         f"estrato_prom={r['avg_estrato']:.1f}. Descripción: {r['cluster_descripcion']}"
-        for _, r in clust_df.iterrows()
+        for r in clust_df.to_dict(orient='records')
     )
 
     # Riesgo
     riesgo_stats_lines = '\n'.join(
         f"  - {r['nivel_riesgo']}: {int(r['n'])} colegios"
-        for _, r in riesgo_df.iterrows()
+        for r in riesgo_df.to_dict(orient='records')
     )
     riesgo_top_lines = '\n'.join(
         f"  {i+1}. {r['nombre_colegio']} ({r['departamento']}, {r['sector']}): "
         f"prob={r['prob_pct']}%"
-        for i, (_, r) in enumerate(riesgo_top.iterrows())
+        for i, r in enumerate(riesgo_top.to_dict(orient='records'))
     )
 
     # B1
     b1_lines = '\n'.join(
         f"  {i+1}. {r['nombre_colegio']} ({r['departamento']}, {r['sector']}): "
         f"B1={r['pct_b1_real']}%, exceso=+{r['exceso_b1']} pp sobre lo esperado"
-        for i, (_, r) in enumerate(b1_top.iterrows())
+        for i, r in enumerate(b1_top.to_dict(orient='records'))
     )
 
     # Palancas accionables: impacto máximo por variable
@@ -184,7 +198,7 @@ def _build_prompt(data: dict, ano: int) -> str:
         palancas_lines = '\n'.join(
             f"  - {r['icono']} {r['feature_label']}: +{r['delta_promedio']} pts promedio "
             f"({int(r['n_colegios'])} colegios con esta oportunidad)"
-            for _, r in palancas_nac.iterrows()
+            for r in palancas_nac.to_dict(orient='records')
         )
 
     # Partial dependence de binarias (internet, computador)
@@ -325,16 +339,11 @@ def _parse_sections(text: str) -> dict:
 # 5. Guardado en PostgreSQL
 # ---------------------------------------------------------------------------
 
-def _guardar(ano: int, analisis_md: str, sections: dict,
-             tokens_in: int, tokens_out: int):
+def _nuevo(ano: int, analisis_md: str, sections: dict,
+           tokens_in: int, tokens_out: int, input_hash: str = ''):
     from icfes_dashboard.models import MlAnalisisIA
 
-    # Archivar análisis activos anteriores
-    MlAnalisisIA.objects.filter(
-        ano_referencia=ano, estado=MlAnalisisIA.ESTADO_ACTIVO
-    ).update(estado=MlAnalisisIA.ESTADO_ARCHIVADO)
-
-    return MlAnalisisIA.objects.create(
+    return MlAnalisisIA(
         ano_referencia=ano,
         estado=MlAnalisisIA.ESTADO_ACTIVO,
         analisis_md=analisis_md,
@@ -346,9 +355,30 @@ def _guardar(ano: int, analisis_md: str, sections: dict,
         modelo_ia=MODEL_IA,
         tokens_input=tokens_in,
         tokens_output=tokens_out,
+        input_hash=input_hash,
     )
 
 
+def _guardar(ano: int, analisis_md: str, sections: dict,
+             tokens_in: int, tokens_out: int, input_hash: str = ''):
+    return _guardar_lote([_nuevo(ano, analisis_md, sections, tokens_in, tokens_out, input_hash)])[0]
+
+
+def _guardar_lote(objs: list):
+    """Archiva los activos de los años de `objs` y crea los nuevos en una sola transacción."""
+    from django.db import transaction
+    from icfes_dashboard.models import MlAnalisisIA
+
+    if not objs:
+        return []
+    with transaction.atomic():
+        MlAnalisisIA.objects.filter(
+            ano_referencia__in=[obj.ano_referencia for obj in objs],
+            estado=MlAnalisisIA.ESTADO_ACTIVO,
+        ).update(estado=MlAnalisisIA.ESTADO_ARCHIVADO)
+        return MlAnalisisIA.objects.bulk_create(objs)
+
+
 # ---------------------------------------------------------------------------
 # Management command
 # ---------------------------------------------------------------------------
@@ -357,73 +387,86 @@ class Command(BaseCommand):
     help = 'Genera análisis narrativo IA de los modelos ML y lo guarda en PostgreSQL'
 
     def add_arguments(self, parser):
-        parser.add_argument('--ano', type=int, default=DEFAULT_ANO)
+        parser.add_argument('--ano', type=int, nargs='+', default=[DEFAULT_ANO],
+                            help='Uno o varios años de referencia')
         parser.add_argument('--forzar', action='store_true',
-                            help='Regenerar aunque ya exista análisis activo')
+                            help='Regenerar aunque los datos del análisis activo no hayan cambiado')
+        parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                            help=f'Llamadas simultáneas a la API (default {DEFAULT_CONCURRENCY})')
+        parser.add_argument('--rpm', type=int, default=DEFAULT_RPM,
+                            help=f'Máximo de solicitudes por minuto (default {DEFAULT_RPM})')
+        parser.add_argument('--stub', action='store_true',
+                            help='Usa el cliente local de prueba en vez de la API')
 
     def handle(self, *args, **options):
         from icfes_dashboard.models import MlAnalisisIA
 
-        ano    = options['ano']
+        anos   = options['ano']
         forzar = options['forzar']
 
-        self.stdout.write(f'\nGenerando análisis IA — Modelos ML (año {ano})\n')
-
-        # Verificar si ya existe
-        if not forzar:
-            exists = MlAnalisisIA.objects.filter(
-                ano_referencia=ano, estado=MlAnalisisIA.ESTADO_ACTIVO
-            ).exists()
-            if exists:
-                self.stdout.write(self.style.WARNING(
-                    '  Ya existe análisis activo. Usa --forzar para regenerar.'
-                ))
-                return
+        self.stdout.write(f'\nGenerando análisis IA — Modelos ML (años {", ".join(map(str, anos))})\n')
 
         # Verificar API key
-        if not getattr(settings, 'ANTHROPIC_API_KEY', ''):
+        if not options['stub'] and not getattr(settings, 'ANTHROPIC_API_KEY', ''):
             self.stdout.write(self.style.ERROR(
                 '  ERROR: ANTHROPIC_API_KEY no configurada.'
             ))
             return
 
-        # 1. Extraer datos
-        self.stdout.write('  1/4 Extrayendo datos de DuckDB...')
+        activos = dict(MlAnalisisIA.objects.filter(
+            ano_referencia__in=anos, estado=MlAnalisisIA.ESTADO_ACTIVO,
+        ).values_list('ano_referencia', 'input_hash'))
+
+        # 1. Extraer datos: las tablas gold de ML no dependen del año de
+        #    referencia, así que una sola extracción sirve para todos los años
+        self.stdout.write('  1/3 Extrayendo datos de DuckDB...')
         try:
-            data = _get_ml_data(ano)
-            self.stdout.write(
-                f"       SHAP: {len(data['shap'])} features | "
-                f"Clusters: {len(data['clusters'])} | "
-                f"Riesgo top: {len(data['riesgo_top'])}"
-            )
+            data = _get_ml_data(anos[0])
         except Exception as e:
             self.stdout.write(self.style.ERROR(f'  ERROR extrayendo datos: {e}'))
             return
+        self.stdout.write(
+            f"       SHAP: {len(data['shap'])} features | "
+            f"Clusters: {len(data['clusters'])} | "
+            f"Riesgo top: {len(data['riesgo_top'])}"
+        )
 
-        # 2. Construir prompt
-        self.stdout.write('  2/4 Construyendo prompt...')
-        prompt = _build_prompt(data, ano)
-
-        # 3. Llamar API
-        self.stdout.write(f'  3/4 Llamando a {MODEL_IA}...')
-        try:
-            analisis_md, tokens_in, tokens_out = _llamar_api(prompt)
-            self.stdout.write(
-                f'       Tokens: {tokens_in} entrada / {tokens_out} salida'
-            )
-        except Exception as e:
-            self.stdout.write(self.style.ERROR(f'  ERROR en API: {e}'))
+        # Prompts; se omiten los años cuyos datos no cambiaron
+        huella = input_hash(data, MODEL_IA, PROMPT_VERSION)
+        jobs = []
+        for ano in anos:
+            if not forzar and activos.get(ano) == huella:
+                self.stdout.write(self.style.WARNING(
+                    f'  {ano}: datos sin cambios desde el análisis activo. Usa --forzar para regenerar.'
+                ))
+                continue
+            jobs.append(Job(ano, _build_prompt(data, ano), huella))
+        if not jobs:
             return
 
-        # 4. Parsear y guardar
-        self.stdout.write('  4/4 Parseando secciones y guardando...')
-        sections = _parse_sections(analisis_md)
-        obj = _guardar(ano, analisis_md, sections, tokens_in, tokens_out)
-
-        self.stdout.write(self.style.SUCCESS(
-            f'\n  OK: MlAnalisisIA id={obj.pk} guardado '
-            f'({tokens_out} tokens, {len(analisis_md)} chars)\n'
-        ))
-        for key in ['shap', 'clusters', 'riesgo', 'oportunidad', 'palancas']:
-            n = len(sections.get(key, ''))
-            self.stdout.write(f'     {key}: {n} chars')
+        # 2. Llamar API
+        self.stdout.write(f'  2/3 Llamando a {MODEL_IA} ({len(jobs)} análisis)...')
+        resultados = generate_all(
+            jobs, MODEL_IA, MAX_TOKENS,
+            client=make_client(stub=True) if options['stub'] else None,
+            concurrency=options['concurrency'], rpm=options['rpm'],
+        )
+
+        # 3. Parsear y guardar
+        self.stdout.write('  3/3 Parseando secciones y guardando...')
+        nuevos = []
+        for r in resultados:
+            if r.error:
+                self.stdout.write(self.style.ERROR(f'  {r.job.key}: ERROR en API: {r.error}'))
+                continue
+            sections = _parse_sections(r.texto)
+            nuevos.append(_nuevo(r.job.key, r.texto, sections,
+                                 r.tokens_input, r.tokens_output, r.job.input_hash))
+        for obj in _guardar_lote(nuevos):
+            self.stdout.write(self.style.SUCCESS(
+                f'\n  OK: MlAnalisisIA {obj.ano_referencia} guardado '
+                f'({obj.tokens_input} entrada / {obj.tokens_output} salida, {len(obj.analisis_md)} chars)'
+            ))
+            for key in ['shap', 'clusters', 'riesgo', 'oportunidad', 'palancas']:
+                n = len(getattr(obj, f'{key}_narrative'))
+                self.stdout.write(f'     {key}: {n} chars')
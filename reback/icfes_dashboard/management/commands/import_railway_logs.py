@@ -1,12 +1,9 @@
-import json
 from pathlib import Path
 
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
-from django.utils.dateparse import parse_datetime
 
-from icfes_dashboard.models import RailwayTrafficLog
-from icfes_dashboard.traffic_utils import classify_bot, extract_path_fields
+from icfes_dashboard.traffic_import import CHUNK_BYTES, ORM_BATCH_SIZE, import_file
 
 
 class Command(BaseCommand):
@@ -14,11 +11,23 @@ class Command(BaseCommand):
 
     def add_arguments(self, parser):
         parser.add_argument("--input", required=True, help="Path to JSONL exported from Railway.")
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="Parser processes (default: CPU count; 0 parses in this process).",
+        )
+        parser.add_argument(
+            "--chunk-mb",
+            type=float,
+            default=CHUNK_BYTES / 1024 / 1024,
+            help=f"Bytes of the file parsed and loaded per COPY, in MB (default: {CHUNK_BYTES // 1024 // 1024}).",
+        )
         parser.add_argument(
             "--batch-size",
             type=int,
-            default=1000,
-            help="Bulk insert batch size (default: 1000).",
+            default=ORM_BATCH_SIZE,
+            help=f"bulk_create batch size on non-Postgres databases (default: {ORM_BATCH_SIZE}).",
         )
         parser.add_argument(
             "--allow-disabled",
@@ -36,81 +45,17 @@ class Command(BaseCommand):
         if not input_path.exists():
             raise CommandError(f"Input file not found: {input_path}")
 
-        batch_size = options["batch_size"]
-        created = 0
-        read = 0
-        skipped = 0
-        to_insert = []
-
-        with input_path.open("r", encoding="utf-8") as fh:
-            for line in fh:
-                line = line.strip()
-                if not line:
-                    continue
-                read += 1
-
-                try:
-                    record = json.loads(line)
-                except json.JSONDecodeError:
-                    skipped += 1
-                    continue
-
-                request_id = str(record.get("requestId", "")).strip()
-                timestamp = parse_datetime(str(record.get("timestamp", "")))
-                path = str(record.get("path", "")).strip()
-                http_status = record.get("httpStatus")
-
-                if not request_id or not timestamp or http_status is None:
-                    skipped += 1
-                    continue
-
-                fields = extract_path_fields(path)
-
-                user_agent = str(record.get("clientUa", "")).strip()
-
-                to_insert.append(
-                    RailwayTrafficLog(
-                        request_id=request_id,
-                        timestamp=timestamp,
-                        method=str(record.get("method", "")).strip(),
-                        path=path,
-                        host=str(record.get("host", "")).strip(),
-                        http_status=int(http_status),
-                        total_duration_ms=record.get("totalDuration"),
-                        upstream_rq_duration_ms=record.get("upstreamRqDuration"),
-                        tx_bytes=record.get("txBytes"),
-                        rx_bytes=record.get("rxBytes"),
-                        client_ua=user_agent,
-                        src_ip=record.get("srcIp") or None,
-                        edge_region=str(record.get("edgeRegion", "")).strip(),
-                        upstream_errors=str(record.get("upstreamErrors", "")).strip(),
-                        bot_category=classify_bot(user_agent),
-                        school_slug=fields["school_slug"],
-                        utm_source=fields["utm_source"],
-                        utm_medium=fields["utm_medium"],
-                        utm_campaign=fields["utm_campaign"],
-                    )
-                )
-
-                if len(to_insert) >= batch_size:
-                    created += self._flush(to_insert, batch_size)
-                    to_insert = []
-
-        if to_insert:
-            created += self._flush(to_insert, batch_size)
+        stats = import_file(
+            input_path,
+            workers=options["workers"],
+            chunk_bytes=max(1, int(options["chunk_mb"] * 1024 * 1024)),
+            batch_size=options["batch_size"],
+        )
 
         self.stdout.write(
             self.style.SUCCESS(
-                f"Import complete | read={read} inserted={created} skipped={skipped}"
+                f"Import complete | read={stats.read} inserted={stats.inserted} "
+                f"duplicates={stats.parsed - stats.inserted} skipped={stats.skipped} | "
+                f"{stats.seconds:.1f}s, {stats.read / max(stats.seconds, 1e-9):,.0f} rows/s"
             )
         )
-
-    @staticmethod
-    def _flush(batch, batch_size):
-        before = len(batch)
-        RailwayTrafficLog.objects.bulk_create(
-            batch,
-            batch_size=batch_size,
-            ignore_conflicts=True,
-        )
-        return before
@@ -0,0 +1,79 @@
+"""
+Management command: purge_cache_tags
+
+Invalida solo las páginas/JSON/PNG cacheados que dependen de un colegio o
+geografía (Redis + edge vía Surrogate-Key), sin vaciar todo el caché.
+
+Uso:
+    python manage.py purge_cache_tags --colegio 176834000012
+    python manage.py purge_cache_tags --colegio 176834000012 --cascade
+    python manage.py purge_cache_tags --departamento "Valle del Cauca" --municipio Tuluá
+    python manage.py purge_cache_tags --slug colegio-san-jose-tulua
+    python manage.py purge_cache_tags --dataset
+    python manage.py purge_cache_tags --tag depto:antioquia --no-edge
+"""
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand, CommandError
+
+from icfes_dashboard.db_utils import get_dataset_version
+from icfes_dashboard.response_cache import (
+    dataset_tag,
+    geo_cache_tags,
+    purge_cache_tags,
+    school_slug_tag,
+    tags_for_school,
+)
+
+
+class Command(BaseCommand):
+    help = "Purge cached responses by tag (school, department, municipality, dataset)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--colegio", action="append", default=[], help="codigo_dane (repeatable)")
+        parser.add_argument(
+            "--cascade",
+            action="store_true",
+            default=False,
+            help="With --colegio, also purge its department/municipality pages",
+        )
+        parser.add_argument("--slug", action="append", default=[], help="School slug (repeatable)")
+        parser.add_argument("--departamento", help="Department name or slug")
+        parser.add_argument("--municipio", help="Municipality (requires --departamento)")
+        parser.add_argument(
+            "--dataset",
+            action="store_true",
+            default=False,
+            help="Purge everything cached for the currently loaded dataset version",
+        )
+        parser.add_argument("--tag", action="append", default=[], help="Raw tag (repeatable)")
+        parser.add_argument(
+            "--no-edge",
+            action="store_true",
+            default=False,
+            help="Only purge Redis, skip the edge purge request",
+        )
+
+    def handle(self, *args, **options):
+        if options["municipio"] and not options["departamento"]:
+            raise CommandError("--municipio requiere --departamento")
+
+        tags = list(options["tag"])
+        for codigo in options["colegio"]:
+            tags.extend(tags_for_school(codigo, cascade=options["cascade"]))
+        tags.extend(school_slug_tag(slug) for slug in options["slug"])
+        tags.extend(geo_cache_tags(options["departamento"], options["municipio"]))
+        if options["dataset"]:
+            dataset = get_dataset_version()
+            if dataset is None:
+                raise CommandError("No se pudo calcular la versión del dataset (¿DuckDB disponible?)")
+            tags.append(dataset_tag(dataset.version))
+
+        if not tags:
+            raise CommandError("Indica al menos un --colegio, --slug, --departamento, --dataset o --tag")
+
+        result = purge_cache_tags(tags, edge=not options["no_edge"])
+        for tag in result["tags"]:
+            self.stdout.write(f"  {tag}")
+        edge = "edge purgado" if result["edge"] else "edge no purgado"
+        self.stdout.write(self.style.SUCCESS(f"{len(result['tags'])} tags invalidados ({edge})"))
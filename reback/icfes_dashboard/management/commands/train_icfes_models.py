@@ -1,25 +1,53 @@
 """
 Management command para entrenar los modelos ICFES ML:
   - Modelo 1: XGBoost predictor de punt_global + SHAP via pred_contribs
-  - Modelo 3: K-Means clustering de colegios + PCA 2D
+  - Modelo 3: K-Means (MiniBatch, en caliente) clustering de colegios + PCA 2D
 
 Uso:
   python manage.py train_icfes_models
   python manage.py train_icfes_models --only predictor
   python manage.py train_icfes_models --only clustering
+  python manage.py train_icfes_models --only predictor --streaming
+  python manage.py train_icfes_models --compare
+  python manage.py train_icfes_models --only clustering --cold-start
+
+--streaming entrena el predictor por bloques desde DuckDB sobre un DMatrix de
+memoria externa (ver ml/streaming.py) en vez de cargar todas las filas en un
+DataFrame. --compare entrena el predictor en ambos modos, cada uno en su propio
+proceso, y reporta RSS pico y tiempo de cada uno.
+
+El clustering reutiliza la matriz por colegio en caché (Parquet por versión
+del dataset), no reentrena si los datos no cambiaron y, si cambiaron, arranca
+de los centroides anteriores conservando ids y nombres (ver ml/clustering.py).
+--cold-start ignora ese estado.
 """
+import argparse
+import json
 import logging
+import os
+import subprocess
+import sys
+import tempfile
 import time
 
-from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
 
 from icfes_dashboard.db_utils import execute_query
+from icfes_dashboard.ml.clustering import load_cluster_features
+from icfes_dashboard.ml.streaming import STREAM_BATCH_ROWS
 from icfes_dashboard.ml.train_models import (
     save_metadata,
     train_clustering,
     train_predictor,
+    train_predictor_streaming,
 )
 
+try:
+    import resource
+except ImportError:  # Windows: sin getrusage, el reporte omite el RSS
+    resource = None
+
 logger = logging.getLogger(__name__)
 
 SQL_PREDICTOR = """
@@ -95,8 +123,33 @@ class Command(BaseCommand):
             choices=['predictor', 'clustering'],
             help='Entrenar solo uno de los modelos (por defecto entrena ambos)',
         )
+        parser.add_argument(
+            '--streaming',
+            action='store_true',
+            help='Predictor por bloques + DMatrix de memoria externa (no carga el DataFrame completo)',
+        )
+        parser.add_argument(
+            '--batch-rows',
+            type=int,
+            default=STREAM_BATCH_ROWS,
+            help=f'Filas por bloque en --streaming (default: {STREAM_BATCH_ROWS:,})',
+        )
+        parser.add_argument(
+            '--compare',
+            action='store_true',
+            help='Entrena el predictor en modo memoria y streaming y compara RSS pico y tiempo',
+        )
+        parser.add_argument(
+            '--cold-start',
+            action='store_true',
+            help='Clustering desde cero, ignorando centroides y nombres del ajuste anterior',
+        )
+        parser.add_argument('--report-json', help=argparse.SUPPRESS)   # uso interno de --compare
 
     def handle(self, *args, **options):
+        if options['compare']:
+            return self._compare(options['batch_rows'])
+
         only = options.get('only')
         t0 = time.time()
 
@@ -109,14 +162,21 @@ class Command(BaseCommand):
 
         # ── MODELO 1: XGBoost Predictor ───────────────────────────────────────
         if only in (None, 'predictor'):
-            self.stdout.write('\n📥 Cargando datos para el predictor (2014-2024)...')
-            t1 = time.time()
-            df_pred = execute_query(SQL_PREDICTOR)
-            self.stdout.write(f'   → {len(df_pred):,} filas cargadas en {time.time()-t1:.1f}s')
+            t_pred = time.time()
+            if options['streaming']:
+                self.stdout.write('\n🤖 Entrenando XGBoost + SHAP en streaming (2014-2024)...')
+                t1 = time.time()
+                predictor_result = train_predictor_streaming(SQL_PREDICTOR, options['batch_rows'])
+            else:
+                self.stdout.write('\n📥 Cargando datos para el predictor (2014-2024)...')
+                t1 = time.time()
+                df_pred = execute_query(SQL_PREDICTOR)
+                self.stdout.write(f'   → {len(df_pred):,} filas cargadas en {time.time()-t1:.1f}s')
 
-            self.stdout.write('\n🤖 Entrenando XGBoost + SHAP...')
-            t1 = time.time()
-            predictor_result = train_predictor(df_pred)
+                self.stdout.write('\n🤖 Entrenando XGBoost + SHAP...')
+                t1 = time.time()
+                predictor_result = train_predictor(df_pred)
+                del df_pred
             elapsed = time.time() - t1
             self.stdout.write(
                 self.style.SUCCESS(
@@ -125,23 +185,36 @@ class Command(BaseCommand):
                     f'{elapsed:.0f}s'
                 )
             )
+            if options.get('report_json'):
+                self._write_report(options['report_json'], options['streaming'],
+                                   predictor_result, time.time() - t_pred)
 
         # ── MODELO 3: K-Means Clustering ──────────────────────────────────────
         if only in (None, 'clustering'):
             self.stdout.write('\n📥 Cargando datos para clustering de colegios (2024)...')
             t1 = time.time()
-            df_colegios = execute_query(SQL_CLUSTERING)
-            self.stdout.write(f'   → {len(df_colegios):,} colegios cargados en {time.time()-t1:.1f}s')
+            df_colegios, data_key, cache_hit = load_cluster_features(SQL_CLUSTERING)
+            origen = 'caché Parquet' if cache_hit else 'DuckDB'
+            self.stdout.write(f'   → {len(df_colegios):,} colegios cargados desde {origen} en {time.time()-t1:.1f}s')
 
-            self.stdout.write('\n🔵 Entrenando K-Means + PCA...')
+            self.stdout.write('\n🔵 Entrenando MiniBatchKMeans + PCA...')
             t1 = time.time()
-            clustering_result = train_clustering(df_colegios)
+            clustering_result = train_clustering(df_colegios, data_key, cold_start=options['cold_start'])
             elapsed = time.time() - t1
+            if clustering_result['skipped']:
+                detalle = 'sin cambios en los datos, ajuste anterior conservado'
+            else:
+                arranque = 'en caliente' if clustering_result['warm_start'] else 'desde cero'
+                tiempos = clustering_result['tiempos']
+                detalle = (
+                    f'{arranque}, {clustering_result["reasignados"]:,} reasignados  |  '
+                    f'k-means {tiempos["kmeans"]}s, PCA {tiempos["pca"]}s'
+                )
             self.stdout.write(
                 self.style.SUCCESS(
                     f'   ✅ Silhouette={clustering_result["silhouette"]}  |  '
                     f'{clustering_result["n_colegios"]:,} colegios  |  '
-                    f'{elapsed:.1f}s'
+                    f'{elapsed:.1f}s  |  {detalle}'
                 )
             )
 
@@ -154,3 +227,60 @@ class Command(BaseCommand):
             self.style.SUCCESS(f'\n🏁 Entrenamiento completo en {total/60:.1f} minutos.')
         )
         self.stdout.write('   Artefactos guardados en: icfes_dashboard/ml/artifacts/')
+
+    # ── Comparación memoria vs streaming ──────────────────────────────────────
+
+    @staticmethod
+    def _peak_rss_mb():
+        if resource is None:
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reporta KB, macOS bytes
+        return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+    def _write_report(self, path, streaming, result, wall_s):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'modo': 'streaming' if streaming else 'memoria',
+                'wall_s': round(wall_s, 1),
+                'peak_rss_mb': self._peak_rss_mb(),
+                **result,
+            }, f)
+
+    def _compare(self, batch_rows):
+        """
+        Cada modo corre en un subproceso: ru_maxrss es el pico del proceso
+        completo, así que medirlos en el mismo proceso mezclaría los picos.
+        Los artefactos SHAP quedan los del último modo (streaming).
+        """
+        reports = []
+        with tempfile.TemporaryDirectory(prefix='icfes-train-compare-') as tmp:
+            for streaming in (False, True):
+                report_path = os.path.join(tmp, f'{int(streaming)}.json')
+                cmd = [
+                    sys.executable, str(settings.BASE_DIR / 'manage.py'), 'train_icfes_models', '--only', 'predictor',
+                    '--batch-rows', str(batch_rows), '--report-json', report_path,
+                ]
+                if streaming:
+                    cmd.append('--streaming')
+                self.stdout.write(f"\n▶ {'streaming' if streaming else 'memoria'}: {' '.join(cmd[1:])}")
+                if subprocess.run(cmd).returncode != 0:
+                    raise CommandError(f"El entrenamiento en modo {'streaming' if streaming else 'memoria'} falló")
+                with open(report_path, encoding='utf-8') as f:
+                    reports.append(json.load(f))
+
+        header = f"{'modo':<10} {'filas':>12} {'tiempo s':>9} {'RSS pico MB':>12} {'MAE':>7} {'R²':>7}"
+        self.stdout.write('\n' + header)
+        self.stdout.write('-' * len(header))
+        for r in reports:
+            rss = f"{r['peak_rss_mb']:,.0f}" if r['peak_rss_mb'] is not None else 'n/d'
+            self.stdout.write(
+                f"{r['modo']:<10} {r['n_rows']:>12,} {r['wall_s']:>9.1f} {rss:>12} "
+                f"{r['mae']:>7} {r['r2']:>7}"
+            )
+        memoria, stream = reports
+        if memoria['peak_rss_mb'] and stream['peak_rss_mb']:
+            self.stdout.write(self.style.SUCCESS(
+                f"\nRSS pico: {stream['peak_rss_mb'] / memoria['peak_rss_mb']:.0%} del modo memoria | "
+                f"tiempo: {stream['wall_s'] / memoria['wall_s']:.2f}x"
+            ))
@@ -0,0 +1,275 @@
+"""
+Management command: warm_cache
+
+Calienta el caché después de un deploy: enumera URLs desde nuestros propios
+sitemaps, las ordena por hits recientes en RailwayTrafficLog y pide las top N
+con concurrencia acotada. Reporta distribución de latencia y tasa de llenado
+del caché (X-Cache HIT/MISS/BYPASS).
+
+Sin --base las peticiones van in-process (django.test.Client, llena Redis).
+Con --base van por HTTP contra un servidor corriendo (llena Redis y además
+calienta los lru_cache / conexiones DuckDB de los workers que responden).
+
+El descubrimiento sigue a checks/smoke_test_prod.py (sitemap index → sub-
+sitemaps → <loc>) pero no lo importa: ese script depende de `requests` (sale
+si no está instalado), toma solo una muestra por sub-sitemap y no es un
+paquete importable; aquí se necesitan todas las URLs para ordenarlas por
+tráfico y el modo in-process.
+
+Tras un deploy lo lanza el hook when_ready de gunicorn (gunicorn.conf.py),
+que vuelca su salida y su código de salida al log de gunicorn.
+
+Uso:
+    python manage.py warm_cache --dry-run
+    python manage.py warm_cache --top 300 --concurrency 4
+    python manage.py warm_cache --base http://127.0.0.1:8000 --wait 300
+    python manage.py warm_cache --post-deploy     # hook de gunicorn (respeta CACHE_WARM_ON_DEPLOY)
+"""
+from __future__ import annotations
+
+import math
+import os
+import threading
+import time
+import urllib.request
+import xml.etree.ElementTree as ET
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError
+from django.db.models import Count
+from django.http.request import validate_host
+from django.test import Client
+from django.utils import timezone
+
+from icfes_dashboard.models import RailwayTrafficLog
+
+SITEMAP_NS = {"sm": "http://www.sitemaps.org/schemas/sitemap/0.9"}
+USER_AGENT = "icfes-cache-warmer/1.0"
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def _percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class Command(BaseCommand):
+    help = "Warm response caches from sitemaps ranked by recent traffic"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--base", default="", help="Warm over HTTP against this base URL")
+        parser.add_argument("--top", type=int, default=500, help="How many URLs to warm (default: 500)")
+        parser.add_argument("--days", type=int, default=7, help="Traffic window for ranking (default: 7)")
+        parser.add_argument("--concurrency", type=int, default=4, help="Parallel requests (default: 4)")
+        parser.add_argument("--timeout", type=int, default=60, help="Per-request timeout, HTTP mode (default: 60)")
+        parser.add_argument(
+            "--wait",
+            type=int,
+            default=0,
+            help="HTTP mode: wait up to N seconds for /health/ before starting",
+        )
+        parser.add_argument("--path", action="append", default=[], help="Extra path to warm first (repeatable)")
+        parser.add_argument("--dry-run", action="store_true", default=False, help="Only print the ranked URLs")
+        parser.add_argument(
+            "--post-deploy",
+            action="store_true",
+            default=False,
+            help="Deploy hook: no-op unless CACHE_WARM_ON_DEPLOY, defaults --base to 127.0.0.1:$PORT",
+        )
+
+    def handle(self, *args, **options):
+        base = options["base"].rstrip("/")
+        if options["post_deploy"]:
+            if not getattr(settings, "CACHE_WARM_ON_DEPLOY", False):
+                self.stdout.write("CACHE_WARM_ON_DEPLOY desactivado, nada que hacer")
+                return
+            base = base or f"http://127.0.0.1:{os.environ.get('PORT', '8000')}"
+            options["wait"] = options["wait"] or 300
+
+        self._base = base
+        self._timeout = options["timeout"]
+        self._clients = threading.local()
+        self._opener = urllib.request.build_opener(_NoRedirect)
+        # Same host (and https) as real traffic, so cache keys match.
+        self._host = getattr(settings, "CANONICAL_HOST", "") or urlparse(
+            getattr(settings, "PUBLIC_SITE_URL", "") or ""
+        ).hostname or ""
+        if not base and self._host and not validate_host(self._host, settings.ALLOWED_HOSTS):
+            self._host = ""
+
+        if base and options["wait"]:
+            self._wait_ready(options["wait"])
+
+        sitemap_paths = self._sitemap_paths()
+        if not sitemap_paths and not options["path"]:
+            raise CommandError("No se encontraron URLs en los sitemaps")
+        ranked = self._rank(sitemap_paths, options["days"])
+        paths = list(dict.fromkeys(options["path"] + ranked))[: max(1, options["top"])]
+        self.stdout.write(
+            f"{len(sitemap_paths)} URLs en sitemaps → calentando {len(paths)} "
+            f"({'HTTP ' + base if base else 'in-process'}, concurrencia {options['concurrency']})"
+        )
+
+        if options["dry_run"]:
+            for path in paths:
+                self.stdout.write(f"  {path}")
+            return
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, options["concurrency"])) as pool:
+            results = list(pool.map(self._warm_one, paths))
+        self._report(results, time.perf_counter() - start)
+
+    # ── Discovery ────────────────────────────────────────────────────────────
+
+    def _sitemap_paths(self):
+        status, _, _, body = self._fetch("/sitemap.xml", compressed=False)
+        if status != 200:
+            self.stdout.write(self.style.WARNING(f"/sitemap.xml respondió {status}"))
+            return []
+
+        paths = []
+        for sitemap_loc in self._locs(body):
+            status, _, _, sub_body = self._fetch(urlparse(sitemap_loc).path, compressed=False)
+            if status != 200:
+                self.stdout.write(self.style.WARNING(f"{sitemap_loc} respondió {status}"))
+                continue
+            paths.extend(urlparse(loc).path for loc in self._locs(sub_body))
+        return list(dict.fromkeys(paths))
+
+    @staticmethod
+    def _locs(body):
+        try:
+            root = ET.fromstring(body)
+        except ET.ParseError:
+            return []
+        return [el.text.strip() for el in root.findall(".//sm:loc", SITEMAP_NS) if el.text]
+
+    def _rank(self, sitemap_paths, days):
+        """Traffic-ranked sitemap URLs first, the rest in sitemap order."""
+        known = set(sitemap_paths)
+        since = timezone.now() - timedelta(days=days)
+        try:
+            top = (
+                RailwayTrafficLog.objects.filter(timestamp__gte=since, method="GET", http_status__in=[200, 304])
+                .values("path")
+                .annotate(hits=Count("id"))
+                .order_by("-hits")[: len(known) or 1000]
+            )
+            hot = [row["path"] for row in top if row["path"] in known]
+        except DatabaseError as exc:
+            self.stdout.write(self.style.WARNING(f"Sin ranking por tráfico ({exc}); se usa orden del sitemap"))
+            hot = []
+        self.stdout.write(f"{len(hot)} URLs del sitemap con tráfico en los últimos {days} días")
+        return list(dict.fromkeys(hot + sitemap_paths))
+
+    # ── Requests ─────────────────────────────────────────────────────────────
+
+    def _headers(self, compressed):
+        headers = {"User-Agent": USER_AGENT}
+        if compressed:
+            headers["Accept-Encoding"] = "gzip, br"
+        token = getattr(settings, "CACHE_WARM_TOKEN", "")
+        if token:
+            headers["X-Cache-Warm"] = token
+        return headers
+
+    def _fetch(self, path, compressed=True):
+        """Return (status, ms, cache_status, body)."""
+        headers = self._headers(compressed)
+        t0 = time.perf_counter()
+        if not self._base:
+            meta = {f"HTTP_{k.upper().replace('-', '_')}": v for k, v in headers.items()}
+            if self._host:
+                meta["HTTP_HOST"] = self._host
+            try:
+                response = self._client().get(path, secure=True, **meta)
+            except Exception as exc:
+                return 0, (time.perf_counter() - t0) * 1000, f"ERR {exc}", b""
+            ms = (time.perf_counter() - t0) * 1000
+            cache_status = getattr(response.wsgi_request, "_cache_status", None) or response.get("X-Cache", "-")
+            body = b"" if response.streaming else response.content
+            return response.status_code, ms, cache_status, body
+
+        if self._host:
+            headers["Host"] = self._host
+            headers["X-Forwarded-Proto"] = "https"
+        request = urllib.request.Request(f"{self._base}{path}", headers=headers)
+        try:
+            with self._opener.open(request, timeout=self._timeout) as resp:
+                body = resp.read()
+                status, cache_status = resp.status, resp.headers.get("X-Cache", "-")
+        except HTTPError as exc:
+            status, cache_status, body = exc.code, exc.headers.get("X-Cache", "-"), b""
+        except (URLError, OSError) as exc:
+            return 0, (time.perf_counter() - t0) * 1000, f"ERR {exc}", b""
+        return status, (time.perf_counter() - t0) * 1000, cache_status, body
+
+    def _client(self):
+        # django.test.Client keeps per-instance state: one per worker thread.
+        client = getattr(self._clients, "client", None)
+        if client is None:
+            client = self._clients.client = Client()
+        return client
+
+    def _warm_one(self, path):
+        status, ms, cache_status, _ = self._fetch(path)
+        return path, status, ms, cache_status
+
+    def _wait_ready(self, seconds):
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            status, _, _, _ = self._fetch("/health/", compressed=False)
+            if status == 200:
+                return
+            time.sleep(5)
+        raise CommandError(f"{self._base}/health/ no respondió 200 en {seconds}s")
+
+    # ── Report ───────────────────────────────────────────────────────────────
+
+    def _report(self, results, elapsed):
+        statuses = Counter(status for _, status, _, _ in results)
+        cache_counts = Counter(cache for _, status, _, cache in results if status == 200)
+        latencies = sorted(ms for _, status, ms, _ in results if status)
+
+        self.stdout.write("")
+        self.stdout.write(f"Total: {len(results)} URLs en {elapsed:.1f}s")
+        self.stdout.write("Status: " + ", ".join(f"{s or 'ERR'}={n}" for s, n in sorted(statuses.items())))
+        if latencies:
+            self.stdout.write(
+                f"Latencia ms: p50={_percentile(latencies, 50):.0f} p90={_percentile(latencies, 90):.0f} "
+                f"p99={_percentile(latencies, 99):.0f} max={latencies[-1]:.0f}"
+            )
+
+        ok = statuses.get(200, 0)
+        if ok:
+            filled = cache_counts.get("MISS", 0)
+            already = cache_counts.get("HIT", 0) + cache_counts.get("NOT_MODIFIED", 0)
+            self.stdout.write(
+                f"Caché: {filled} llenadas (MISS), {already} ya calientes (HIT), "
+                f"{cache_counts.get('BYPASS', 0)} no cacheables — "
+                f"fill rate {(filled + already) / ok:.0%}"
+            )
+
+        slowest = sorted((r for r in results if r[1]), key=lambda r: r[2], reverse=True)[:10]
+        if slowest:
+            self.stdout.write("Más lentas:")
+            for path, status, ms, cache_status in slowest:
+                self.stdout.write(f"  {ms:>7.0f}ms  {status}  {cache_status:<6} {path}")
+
+        failures = [r for r in results if r[1] == 0 or r[1] >= 500]
+        if failures:
+            self.stdout.write(self.style.WARNING(f"{len(failures)} URLs fallaron"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Warm-up completo"))
@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('icfes_dashboard', '0007_railwaytrafficlog'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inglesanalisisia',
+            name='input_hash',
+            field=models.CharField(blank=True, default='', max_length=40),
+        ),
+        migrations.AddField(
+            model_name='mlanalisisia',
+            name='input_hash',
+            field=models.CharField(blank=True, default='', max_length=40),
+        ),
+    ]
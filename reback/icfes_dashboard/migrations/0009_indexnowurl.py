@@ -0,0 +1,25 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("icfes_dashboard", "0008_ia_input_hash"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="IndexNowUrl",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("url", models.CharField(max_length=500, unique=True)),
+                ("section", models.CharField(db_index=True, max_length=64)),
+                ("content_hash", models.CharField(max_length=40)),
+                ("submitted_at", models.DateTimeField()),
+            ],
+            options={
+                "verbose_name": "IndexNow URL",
+                "verbose_name_plural": "IndexNow URLs",
+            },
+        ),
+    ]
@@ -0,0 +1,119 @@
+"""
+RailwayTrafficLog: drop the per-column B-tree indexes and, on PostgreSQL,
+turn the table into one range-partitioned by day on `timestamp`.
+
+The partitioned table gets PRIMARY KEY (id, timestamp), a BRIN index on
+timestamp, one partition per day that has rows plus the next few days, and
+a DEFAULT partition for anything outside them. Existing rows are copied
+over. An index on (request_id, timestamp) is added afterwards on every
+backend for the importer's request_id lookups (see traffic_import).
+`archive_traffic_logs` keeps the partitions going from here (see
+icfes_dashboard/traffic_partitions.py).
+
+Other backends (SQLite in dev/tests) keep a plain table.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db import migrations, models
+from django.db.migrations.exceptions import IrreversibleError
+from django.utils import timezone
+
+TABLE = "icfes_dashboard_railwaytrafficlog"
+DAYS_AHEAD = 7
+
+
+def _bound(day):
+    return datetime.combine(day, time.min, tzinfo=timezone.get_default_timezone()).isoformat()
+
+
+def partition_table(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    tz = timezone.get_default_timezone_name()
+    legacy = f"{TABLE}_unpartitioned"
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE {TABLE} RENAME TO {legacy}')
+        cursor.execute(f'CREATE TABLE {TABLE} (LIKE {legacy} INCLUDING DEFAULTS) PARTITION BY RANGE ("timestamp")')
+        cursor.execute(f'CREATE SEQUENCE {TABLE}_pid_seq OWNED BY {TABLE}.id')
+        cursor.execute(f"ALTER TABLE {TABLE} ALTER COLUMN id SET DEFAULT nextval('{TABLE}_pid_seq')")
+        cursor.execute(f'CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT')
+
+        cursor.execute(f'SELECT DISTINCT ("timestamp" AT TIME ZONE %s)::date FROM {legacy}', [tz])
+        today = timezone.localdate()
+        days = {row[0] for row in cursor.fetchall()}
+        days.update(today + timedelta(days=i) for i in range(DAYS_AHEAD + 1))
+        for day in sorted(days):
+            cursor.execute(
+                f"CREATE TABLE {TABLE}_p{day:%Y%m%d} PARTITION OF {TABLE} "
+                f"FOR VALUES FROM ('{_bound(day)}') TO ('{_bound(day + timedelta(days=1))}')"
+            )
+
+        cursor.execute(f'INSERT INTO {TABLE} SELECT * FROM {legacy}')
+        cursor.execute(f"SELECT setval('{TABLE}_pid_seq', COALESCE(MAX(id), 0) + 1, false) FROM {TABLE}")
+        cursor.execute(f'DROP TABLE {legacy}')
+
+        cursor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY (id, "timestamp")')
+        cursor.execute(f'CREATE INDEX railway_log_timestamp_brin ON {TABLE} USING brin ("timestamp")')
+
+
+def unpartition_table(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        raise IrreversibleError("RailwayTrafficLog partitioning cannot be reverted")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("icfes_dashboard", "0009_indexnowurl"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(model_name="railwaytrafficlog", name="icfes_dashb_timesta_67563d_idx"),
+        migrations.RemoveIndex(model_name="railwaytrafficlog", name="icfes_dashb_timesta_8b7d03_idx"),
+        migrations.RemoveIndex(model_name="railwaytrafficlog", name="icfes_dashb_timesta_3886c3_idx"),
+        migrations.AlterField(
+            model_name="railwaytrafficlog",
+            name="bot_category",
+            field=models.CharField(
+                choices=[
+                    ("human_or_other", "Human/Other"),
+                    ("seo_bot", "SEO Bot"),
+                    ("ai_bot", "AI Bot"),
+                    ("social_bot", "Social Bot"),
+                    ("other_bot", "Other Bot"),
+                    ("unknown", "Unknown"),
+                ],
+                default="unknown",
+                max_length=24,
+            ),
+        ),
+        migrations.AlterField(model_name="railwaytrafficlog", name="http_status", field=models.IntegerField()),
+        migrations.AlterField(model_name="railwaytrafficlog", name="path", field=models.TextField()),
+        migrations.AlterField(model_name="railwaytrafficlog", name="request_id", field=models.CharField(max_length=64)),
+        migrations.AlterField(
+            model_name="railwaytrafficlog",
+            name="school_slug",
+            field=models.CharField(blank=True, default="", max_length=255),
+        ),
+        migrations.AlterField(model_name="railwaytrafficlog", name="timestamp", field=models.DateTimeField()),
+        migrations.AlterField(
+            model_name="railwaytrafficlog",
+            name="utm_campaign",
+            field=models.CharField(blank=True, default="", max_length=128),
+        ),
+        migrations.AlterField(
+            model_name="railwaytrafficlog",
+            name="utm_medium",
+            field=models.CharField(blank=True, default="", max_length=128),
+        ),
+        migrations.AlterField(
+            model_name="railwaytrafficlog",
+            name="utm_source",
+            field=models.CharField(blank=True, default="", max_length=128),
+        ),
+        migrations.RunPython(partition_table, unpartition_table),
+        migrations.AddIndex(
+            model_name="railwaytrafficlog",
+            index=models.Index(fields=["request_id", "timestamp"], name="railway_log_request_ts_idx"),
+        ),
+    ]
@@ -0,0 +1,142 @@
+"""
+Estado incremental del clustering de colegios (train_models.train_clustering).
+
+Antes cada deploy re-agregaba icfes_silver (estrato 2024 por colegio), ajustaba
+K-Means desde cero y renombraba los clusters por ranking de puntaje: los ids
+podían barajarse entre corridas. Ahora:
+
+- la matriz por colegio (SQL_CLUSTERING) se guarda en
+  artifacts/cluster_features_<clave>.parquet, con clave = hash(versión del
+  dataset, SQL); mientras el DuckDB no cambie no se vuelve a consultar;
+- artifacts/cluster_state.json guarda los centroides (en unidades de las
+  features, no escaladas), nombres por id, componentes PCA y la clave de
+  datos del último ajuste. Con la misma clave no se reentrena;
+- con datos nuevos, MiniBatchKMeans arranca de los centroides anteriores y
+  se ajusta con partial_fit; los clusters resultantes se emparejan con los
+  anteriores (asignación húngara sobre distancias entre centroides), así el
+  id y el nombre de cada arquetipo se conservan;
+- artifacts/cluster_assignments.parquet: colegio_bk → cluster_id estable.
+"""
+import glob
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from sklearn.cluster import MiniBatchKMeans
+
+from ..db_utils import execute_query, get_dataset_version
+from .streaming import read_parquet, write_parquet
+
+logger = logging.getLogger(__name__)
+
+ARTIFACTS_DIR = Path(__file__).parent / 'artifacts'
+STATE_FILE = 'cluster_state.json'
+ASSIGNMENTS_FILE = 'cluster_assignments.parquet'
+MINIBATCH_SIZE = 1024
+WARM_EPOCHS = 10     # pasadas de partial_fit sobre todos los colegios al calentar
+
+
+def _features_path(key):
+    return ARTIFACTS_DIR / f'cluster_features_{key}.parquet'
+
+
+def features_key(sql):
+    """Clave de la matriz por colegio: versión del dataset + SQL. None sin DuckDB."""
+    dataset = get_dataset_version()
+    if dataset is None:
+        return None
+    raw = json.dumps([dataset.version, sql])
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:16]
+
+
+def load_cluster_features(sql):
+    """
+    (DataFrame por colegio, clave, cache_hit). Lee el Parquet de la clave
+    actual o ejecuta `sql` y lo guarda, borrando los de claves anteriores.
+    """
+    key = features_key(sql)
+    path = _features_path(key) if key else None
+    if path is not None and path.exists():
+        return read_parquet(path), key, True
+
+    df = execute_query(sql)
+    if path is not None:
+        ARTIFACTS_DIR.mkdir(exist_ok=True)
+        write_parquet(df, path)
+        for old in glob.glob(str(_features_path('*'))):
+            if Path(old) != path:
+                os.remove(old)
+        logger.info(f'[Clustering] Features guardadas: {path}')
+    return df, key, False
+
+
+def load_state():
+    path = ARTIFACTS_DIR / STATE_FILE
+    if not path.exists():
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_state(state):
+    path = ARTIFACTS_DIR / STATE_FILE
+    tmp = path.with_name(path.name + '.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def load_assignments():
+    """{colegio_bk: cluster_id} del ajuste anterior ({} si no hay)."""
+    path = ARTIFACTS_DIR / ASSIGNMENTS_FILE
+    if not path.exists():
+        return {}
+    df = read_parquet(path)
+    return dict(zip(df['colegio_bk'], df['cluster_id'].astype(int)))
+
+
+def save_assignments(df):
+    write_parquet(df[['colegio_bk', 'cluster_id']].reset_index(drop=True), ARTIFACTS_DIR / ASSIGNMENTS_FILE)
+
+
+def fit_minibatch(X, n_clusters, init=None, seed=42):
+    """
+    MiniBatchKMeans sobre X escalada. Sin `init`: k-means++ con varios
+    arranques. Con `init` (centroides anteriores ya escalados): un solo
+    arranque desde ahí y WARM_EPOCHS pasadas de partial_fit en orden aleatorio fijo.
+    """
+    if init is None:
+        km = MiniBatchKMeans(n_clusters=n_clusters, batch_size=MINIBATCH_SIZE, n_init=10, random_state=seed)
+        return km.fit(X)
+
+    km = MiniBatchKMeans(n_clusters=n_clusters, batch_size=MINIBATCH_SIZE, init=init, n_init=1, random_state=seed)
+    rng = np.random.default_rng(seed)
+    for _ in range(WARM_EPOCHS):
+        order = rng.permutation(len(X))
+        for start in range(0, len(X), MINIBATCH_SIZE):
+            km.partial_fit(X[order[start:start + MINIBATCH_SIZE]])
+    return km
+
+
+def match_clusters(previous, current):
+    """
+    stable[i] = id anterior que corresponde al cluster nuevo i, minimizando
+    la distancia total entre centroides (ambos en el mismo espacio escalado).
+    """
+    cost = np.linalg.norm(current[:, None, :] - previous[None, :, :], axis=2)
+    rows, cols = linear_sum_assignment(cost)
+    stable = np.empty(len(current), dtype=int)
+    stable[rows] = cols
+    return stable
+
+
+def align_components(components, previous):
+    """Signos de los componentes PCA alineados con el ajuste anterior (el scatter no se voltea)."""
+    if previous is None or np.shape(previous) != components.shape:
+        return np.ones(len(components))
+    dots = np.einsum('ij,ij->i', components, np.asarray(previous))
+    return np.where(dots < 0, -1.0, 1.0)
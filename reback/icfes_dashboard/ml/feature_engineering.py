@@ -2,6 +2,9 @@
 Encodings y mapeos de features categóricas para el modelo ICFES.
 Todas las funciones son puras — sin efectos secundarios.
 """
+import hashlib
+import json
+
 import numpy as np
 import pandas as pd
 
@@ -128,55 +131,174 @@ FEATURE_ICONS = {
 }
 
 
-def encode_features(df: pd.DataFrame) -> pd.DataFrame:
+# ── Spec de encoding ───────────────────────────────────────────────────────────
+# Cada columna de texto se codifica a (códigos, valores únicos) una sola vez por
+# bloque; los valores únicos (unas decenas) se traducen con el mapeo a un lookup
+# array y el resultado es lookup[códigos] en el dtype compacto de la feature.
+# Sin Series de objetos ni copias float64 por fila.
+#
+# feature → (mapeo, normalización, valor por defecto, dtype). Mapeo None =
+# numérica. 'median' = mediana del dataset de entrenamiento (redondeada en las
+# features enteras), que queda fija en el spec.
+ENCODING = {
+    'fami_estratovivienda':         (ESTRATO_MAP, None, 0, 'int8'),
+    'fami_educacionmadre':          (EDU_MAP, None, 'median', 'int8'),
+    'fami_educacionpadre':          (EDU_MAP, None, 'median', 'int8'),
+    'fami_tieneinternet':           (BINARY_MAP, 'strip', 0, 'int8'),
+    'fami_tienecomputador':         (BINARY_MAP, 'strip', 0, 'int8'),
+    'fami_numlibros':               (LIBROS_MAP, None, 1, 'int8'),
+    'fami_personashogar':           (None, None, 4, 'float32'),
+    'fami_situacioneconomica':      (SITUACION_ECO_MAP, None, 3, 'int8'),
+    'cole_naturaleza':              (NATURALEZA_MAP, 'strip_upper', 0, 'int8'),
+    'cole_area_ubicacion':          (AREA_MAP, 'strip_upper', 1, 'int8'),
+    'estu_genero':                  (GENERO_MAP, 'strip', 0, 'int8'),
+    'estu_horassemanatrabaja':      (HORAS_TRABAJO_MAP, None, 0, 'int8'),
+    'estu_dedicacionlecturadiaria': (HORAS_LECTURA_MAP, None, 1, 'int8'),
+    'ano':                          (None, None, 2020, 'int16'),
+    'pct_nbi_total':                (None, None, 'median', 'float32'),
+}
+
+ENCODING_SPEC_VERSION = 1
+
+MEDIAN_FEATURES = [col for col in FEATURE_COLS if ENCODING[col][2] == 'median']
+
+
+def _spec_checksum(features) -> str:
+    raw = json.dumps(features, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:16]
+
+
+def build_encoding_spec(fills: dict) -> dict:
     """
-    Convierte columnas categóricas a numéricas e imputa valores faltantes.
-    Devuelve un DataFrame con exactamente las columnas FEATURE_COLS, todas numéricas.
+    Spec serializable (JSON) con todo lo necesario para codificar: mapeos,
+    normalización, valor de imputación y dtype de cada feature. Entrenamiento
+    y serving codifican con el mismo spec → misma transformación.
+    `fills` trae el valor de las features 'median'.
     """
-    out = pd.DataFrame(index=df.index)
+    features = []
+    for name in FEATURE_COLS:
+        mapping, how, default, dtype = ENCODING[name]
+        fill = fills[name] if default == 'median' else default
+        fill = float(fill) if dtype == 'float32' else int(np.floor(float(fill) + 0.5))
+        features.append({
+            'name': name,
+            'mapping': dict(mapping) if mapping is not None else None,
+            'normalize': how,
+            'fill': fill,
+            'dtype': dtype,
+        })
+    return {
+        'version': ENCODING_SPEC_VERSION,
+        'features': features,
+        'checksum': _spec_checksum(features),
+    }
 
-    out['fami_estratovivienda'] = (
-        df['fami_estratovivienda'].map(ESTRATO_MAP).fillna(0).astype(float)
-    )
-    out['fami_educacionmadre'] = (
-        df['fami_educacionmadre'].map(EDU_MAP).fillna(df['fami_educacionmadre'].map(EDU_MAP).median()).astype(float)
-    )
-    out['fami_educacionpadre'] = (
-        df['fami_educacionpadre'].map(EDU_MAP).fillna(df['fami_educacionpadre'].map(EDU_MAP).median()).astype(float)
-    )
-    out['fami_tieneinternet'] = (
-        df['fami_tieneinternet'].str.strip().map(BINARY_MAP).fillna(0).astype(float)
-    )
-    out['fami_tienecomputador'] = (
-        df['fami_tienecomputador'].str.strip().map(BINARY_MAP).fillna(0).astype(float)
-    )
-    out['fami_numlibros'] = (
-        df['fami_numlibros'].map(LIBROS_MAP).fillna(1).astype(float)
-    )
-    out['fami_personashogar'] = (
-        pd.to_numeric(df['fami_personashogar'], errors='coerce').fillna(4).astype(float)
-    )
-    out['fami_situacioneconomica'] = (
-        df['fami_situacioneconomica'].map(SITUACION_ECO_MAP).fillna(3).astype(float)
-    )
-    out['cole_naturaleza'] = (
-        df['cole_naturaleza'].str.strip().str.upper().map(NATURALEZA_MAP).fillna(0).astype(float)
-    )
-    out['cole_area_ubicacion'] = (
-        df['cole_area_ubicacion'].str.strip().str.upper().map(AREA_MAP).fillna(1).astype(float)
-    )
-    out['estu_genero'] = (
-        df['estu_genero'].str.strip().map(GENERO_MAP).fillna(0).astype(float)
-    )
-    out['estu_horassemanatrabaja'] = (
-        df['estu_horassemanatrabaja'].map(HORAS_TRABAJO_MAP).fillna(0).astype(float)
-    )
-    out['estu_dedicacionlecturadiaria'] = (
-        df['estu_dedicacionlecturadiaria'].map(HORAS_LECTURA_MAP).fillna(1).astype(float)
+
+def fit_encoding_spec(df: pd.DataFrame) -> dict:
+    """Spec con las medianas de df (valores ya mapeados, como el encoding original)."""
+    fills = {}
+    for name in MEDIAN_FEATURES:
+        mapping = ENCODING[name][0]
+        values = df[name].map(mapping) if mapping is not None else pd.to_numeric(df[name], errors='coerce')
+        median = values.median()
+        fills[name] = float(median) if pd.notna(median) else 0.0
+    return build_encoding_spec(fills)
+
+
+def validate_encoding_spec(spec: dict) -> dict:
+    """El spec tal cual si es de esta versión, trae todas las features y su checksum cuadra; si no, ValueError."""
+    if spec.get('version') != ENCODING_SPEC_VERSION:
+        raise ValueError(f"encoding spec v{spec.get('version')} != v{ENCODING_SPEC_VERSION}")
+    if [f['name'] for f in spec['features']] != FEATURE_COLS:
+        raise ValueError('encoding spec con features distintas a FEATURE_COLS')
+    if spec.get('checksum') != _spec_checksum(spec['features']):
+        raise ValueError('encoding spec con checksum inválido')
+    return spec
+
+
+# ── Encoding vectorizado ───────────────────────────────────────────────────────
+
+def _normalize(value, how):
+    if not isinstance(value, str):
+        return None
+    if how == 'strip':
+        return value.strip()
+    if how == 'strip_upper':
+        return value.strip().upper()
+    return value
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _column_codes(column):
+    """(códigos int, valores únicos) de una columna Arrow o pandas; nulos → -1."""
+    if hasattr(column, 'dictionary_encode'):          # pyarrow.Array
+        encoded = column.dictionary_encode()
+        codes = encoded.indices.fill_null(-1).to_numpy(zero_copy_only=False)
+        return codes, encoded.dictionary.to_pylist()
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        return column.cat.codes.to_numpy(), list(column.cat.categories)
+    codes, uniques = pd.factorize(column, use_na_sentinel=True)
+    return codes, list(uniques)
+
+
+def _is_numeric(column):
+    if hasattr(column, 'type'):                       # pyarrow.Array
+        import pyarrow.types as pat
+        return pat.is_integer(column.type) or pat.is_floating(column.type) or pat.is_decimal(column.type)
+    return pd.api.types.is_numeric_dtype(column)
+
+
+def _numeric_values(column):
+    if hasattr(column, 'type'):
+        return column.cast('double').to_numpy(zero_copy_only=False)
+    return pd.to_numeric(column, errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def encode_column(column, feature: dict) -> np.ndarray:
+    """Una columna (Arrow o pandas) → array del dtype de la feature, con su fill para nulos y valores fuera del mapeo."""
+    mapping, how, fill = feature['mapping'], feature['normalize'], feature['fill']
+    if mapping is None and _is_numeric(column):
+        values = np.array(_numeric_values(column), dtype=np.float64)   # copia: no tocar el origen
+        values[np.isnan(values)] = fill
+        return values.astype(feature['dtype'])
+
+    codes, uniques = _column_codes(column)
+    if mapping is None:
+        lookup = [_to_float(u) for u in uniques]
+    else:
+        lookup = [mapping.get(_normalize(u, how), np.nan) for u in uniques]
+    table = np.array(lookup + [np.nan], dtype=np.float64)   # código -1 → último slot
+    table[np.isnan(table)] = fill
+    return table.astype(feature['dtype'])[codes]
+
+
+def _batch_column(batch, name):
+    return batch.column(name) if hasattr(batch, 'schema') else batch[name]
+
+
+def encode_features(df: pd.DataFrame, spec: dict = None) -> pd.DataFrame:
+    """
+    Convierte columnas categóricas a numéricas e imputa valores faltantes.
+    Devuelve un DataFrame con exactamente las columnas FEATURE_COLS en dtypes
+    compactos (int8 / int16 / float32, ver ENCODING). Sin spec, las medianas
+    se calculan sobre df (fit_encoding_spec).
+    """
+    spec = spec or fit_encoding_spec(df)
+    return pd.DataFrame(
+        {f['name']: encode_column(df[f['name']], f) for f in spec['features']},
+        index=df.index,
     )
-    out['ano'] = pd.to_numeric(df['ano'], errors='coerce').fillna(2020).astype(float)
-    out['pct_nbi_total'] = pd.to_numeric(df['pct_nbi_total'], errors='coerce').fillna(
-        df['pct_nbi_total'].astype(float).median() if 'pct_nbi_total' in df.columns else 30.0
-    ).astype(float)
 
-    return out[FEATURE_COLS]
+
+def encode_batch(batch, spec: dict) -> np.ndarray:
+    """Bloque (pyarrow.RecordBatch o DataFrame) → matriz float32 (n, len(FEATURE_COLS)) para XGBoost."""
+    out = np.empty((len(batch), len(FEATURE_COLS)), dtype=np.float32)
+    for j, feature in enumerate(spec['features']):
+        out[:, j] = encode_column(_batch_column(batch, feature['name']), feature)
+    return out
@@ -0,0 +1,269 @@
+"""
+SHAP de población completa: contribuciones de cada estudiante agregadas por
+colegio, departamento y año.
+
+train_predictor solo explica una muestra de 50K filas, suficiente para la
+importancia global pero no para explicar un colegio concreto. Aquí:
+
+- DuckDB entrega todas las filas de estudiantes por bloques (iter_batches),
+  cada una con el id denso de su grupo (colegio_bk, departamento, ano)
+  calculado en la misma consulta;
+- el padre codifica cada bloque con el encoding spec del entrenamiento y lo
+  manda a un pool de procesos (spawn) que corre pred_contribs con el booster
+  guardado (artifacts/predictor.ubj) y devuelve sumas por grupo
+  (shap_worker.chunk_sums);
+- el padre acumula las sumas en arreglos fijos por grupo, en orden de envío
+  (el resultado no depende del reparto entre procesos), y escribe tablas
+  Parquet compactas con medias y medias absolutas:
+
+    shap_colegio_ano.parquet       colegio_bk, departamento, ano
+    shap_departamento_ano.parquet  departamento, ano
+    shap_colegio.parquet           colegio_bk, departamento (todos los años)
+
+  columnas: n, puntaje_real, puntaje_predicho, base, shap_<feature>,
+  abs_<feature>. Las contribuciones son aditivas: base + Σ shap_<feature> =
+  puntaje_predicho en cada fila de cada tabla.
+
+Uso: python manage.py build_shap_population [--workers N] [--chunk-rows N]
+"""
+import json
+import logging
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+from ..db_utils import get_duckdb_connection, resolve_schema
+from . import shap_worker
+from .feature_engineering import FEATURE_COLS, encode_batch
+from .streaming import iter_batches, write_parquet
+from .train_models import ARTIFACTS_DIR, PREDICTOR_MODEL_FILE, load_encoding_spec, load_predictor
+
+logger = logging.getLogger(__name__)
+
+SHAP_CHUNK_ROWS = 200_000
+MANIFEST_FILE = 'shap_population.json'
+TABLES = {
+    'colegio_ano': ('shap_colegio_ano.parquet', ['colegio_bk', 'departamento', 'ano']),
+    'departamento_ano': ('shap_departamento_ano.parquet', ['departamento', 'ano']),
+    'colegio': ('shap_colegio.parquet', ['colegio_bk', 'departamento']),
+}
+GROUP_KEYS = TABLES['colegio_ano'][1]
+
+# Mismas features y filtros que SQL_PREDICTOR (train_icfes_models), más las
+# claves de agregación. colegio_bk con el prefijo 'c' de fct_ml_palancas_colegio.
+SQL_SHAP_POPULATION = """
+SELECT
+    f.punt_global,
+    f.fami_estratovivienda,
+    f.fami_educacionmadre,
+    f.fami_educacionpadre,
+    f.fami_tieneinternet,
+    f.fami_tienecomputador,
+    f.fami_numlibros,
+    f.fami_personashogar,
+    f.fami_situacioneconomica,
+    f.cole_naturaleza,
+    f.cole_area_ubicacion,
+    f.estu_genero,
+    f.estu_horassemanatrabaja,
+    f.estu_dedicacionlecturadiaria,
+    CAST(f.ano AS INTEGER) AS ano,
+    n.pct_nbi_total,
+    'c' || f.cole_cod_dane_establecimiento AS colegio_bk,
+    f.cole_depto_ubicacion AS departamento
+FROM icfes_silver.icfes f
+LEFT JOIN gold.dim_municipio_nbi n
+    ON CAST(n.codigo_municipio AS VARCHAR) = SUBSTRING(f.cole_cod_dane_establecimiento, 1, 5)
+WHERE CAST(f.ano AS INTEGER) >= 2014
+  AND f.punt_global IS NOT NULL
+  AND f.punt_global > 0
+"""
+
+
+def output_dir():
+    return Path(getattr(settings, 'SHAP_POPULATION_DIR', '') or ARTIFACTS_DIR)
+
+
+def table_path(name):
+    """Ruta del Parquet `name` ('colegio_ano', 'departamento_ano' o 'colegio')."""
+    return output_dir() / TABLES[name][0]
+
+
+def _keys_sql(sql):
+    keys = ', '.join(GROUP_KEYS)
+    return f"SELECT DISTINCT {keys} FROM ({sql}) t"
+
+
+def _grouped_sql(sql):
+    """`sql` con la columna _grupo: posición de su clave en el ORDER BY de group_keys()."""
+    keys = ', '.join(GROUP_KEYS)
+    join = ' AND '.join(f's.{k} IS NOT DISTINCT FROM g.{k}' for k in GROUP_KEYS)
+    return f"""
+        WITH src AS ({sql}),
+        grupos AS (
+            SELECT {keys}, ROW_NUMBER() OVER (ORDER BY {keys}) - 1 AS _grupo
+            FROM ({_keys_sql('SELECT * FROM src')})
+        )
+        SELECT s.*, g._grupo
+        FROM src s
+        JOIN grupos g ON {join}
+    """
+
+
+def group_keys(sql):
+    """DataFrame de claves (colegio_bk, departamento, ano); la fila i es el grupo i."""
+    keys = ', '.join(GROUP_KEYS)
+    with get_duckdb_connection() as conn:
+        cursor = conn.cursor()
+    try:
+        return cursor.execute(resolve_schema(
+            f"SELECT * FROM ({_keys_sql(sql)}) ORDER BY {keys}"
+        )).fetchdf()
+    finally:
+        cursor.close()
+
+
+def _column(batch, name):
+    column = batch.column(name) if hasattr(batch, 'schema') else batch[name]
+    return np.asarray(column)
+
+
+class _Accumulator:
+    """Sumas por grupo (float64) de los resultados de chunk_sums."""
+
+    def __init__(self, n_groups):
+        n_features = len(FEATURE_COLS)
+        self.counts = np.zeros(n_groups, dtype=np.int64)
+        self.sums = np.zeros((n_groups, n_features + 1), dtype=np.float64)
+        self.abs_sums = np.zeros((n_groups, n_features), dtype=np.float64)
+        self.y_sums = np.zeros(n_groups, dtype=np.float64)
+
+    def add(self, result):
+        ids, counts, sums, abs_sums, y_sums = result
+        # ids únicos dentro del bloque: la suma con índice avanzado es segura
+        self.counts[ids] += counts
+        self.sums[ids] += sums
+        self.abs_sums[ids] += abs_sums
+        self.y_sums[ids] += y_sums
+
+    @property
+    def rows(self):
+        return int(self.counts.sum())
+
+
+def _iter_chunks(sql, spec, chunk_rows):
+    for batch in iter_batches(_grouped_sql(sql), chunk_rows):
+        yield (
+            encode_batch(batch, spec),
+            _column(batch, '_grupo').astype(np.int64),
+            _column(batch, 'punt_global').astype(np.float64),
+        )
+
+
+def accumulate(sql, spec, model_path, n_groups, workers, chunk_rows=SHAP_CHUNK_ROWS):
+    """Recorre `sql` completo y devuelve el _Accumulator. workers=0 corre en este proceso."""
+    acc = _Accumulator(n_groups)
+    started = time.perf_counter()
+
+    def progress():
+        elapsed = time.perf_counter() - started
+        logger.info(f'[SHAP/población] {acc.rows:,} filas | {acc.rows / max(elapsed, 1e-9):,.0f} filas/s')
+
+    if workers <= 0:
+        shap_worker.init_worker(model_path, nthread=os.cpu_count() or 1)
+        for X, groups, y in _iter_chunks(sql, spec, chunk_rows):
+            acc.add(shap_worker.chunk_sums(X, groups, y, FEATURE_COLS))
+            progress()
+        return acc
+
+    pool = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=shap_worker.init_worker,
+        initargs=(str(model_path), 1),
+    )
+    pending = deque()
+    with pool:
+        for X, groups, y in _iter_chunks(sql, spec, chunk_rows):
+            # como mucho 2 bloques en vuelo por worker: memoria acotada en el padre
+            if len(pending) >= 2 * workers:
+                acc.add(pending.popleft().result())
+                progress()
+            pending.append(pool.submit(shap_worker.chunk_sums, X, groups, y, FEATURE_COLS))
+        while pending:
+            acc.add(pending.popleft().result())
+            progress()
+    return acc
+
+
+def build_tables(keys, acc):
+    """{'colegio_ano' | 'departamento_ano' | 'colegio': DataFrame de medias} a partir de las sumas."""
+    shap_cols = [f'shap_{f}' for f in FEATURE_COLS]
+    abs_cols = [f'abs_{f}' for f in FEATURE_COLS]
+    sums = pd.concat([
+        keys.reset_index(drop=True),
+        pd.DataFrame({
+            'n': acc.counts,
+            'puntaje_real': acc.y_sums,
+            'puntaje_predicho': acc.sums.sum(axis=1),
+            'base': acc.sums[:, -1],
+        }),
+        pd.DataFrame(acc.sums[:, :-1], columns=shap_cols),
+        pd.DataFrame(acc.abs_sums, columns=abs_cols),
+    ], axis=1)
+    sums = sums[sums['n'] > 0]
+    value_cols = ['puntaje_real', 'puntaje_predicho', 'base'] + shap_cols + abs_cols
+
+    tables = {}
+    for name, (_, by) in TABLES.items():
+        frame = sums if 'colegio_bk' not in by else sums[sums['colegio_bk'].notna()]
+        grouped = frame.groupby(by, dropna=False, sort=True)[['n'] + value_cols].sum().reset_index()
+        means = grouped[value_cols].div(grouped['n'], axis=0).astype(np.float32)
+        tables[name] = pd.concat([grouped[by + ['n']], means], axis=1)
+    return tables
+
+
+def build_shap_population(sql=SQL_SHAP_POPULATION, workers=None, chunk_rows=SHAP_CHUNK_ROWS,
+                          model_path=None, spec_path=None):
+    """
+    Calcula y escribe las tablas de SHAP por colegio/departamento/año.
+    Devuelve el manifiesto: {'filas', 'grupos', 'colegios', 'segundos', ...}.
+    """
+    started = time.perf_counter()
+    spec = load_encoding_spec(spec_path)
+    model_path = Path(model_path) if model_path else ARTIFACTS_DIR / PREDICTOR_MODEL_FILE
+    load_predictor(model_path, spec)   # ValueError si no corresponde al encoding spec
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    keys = group_keys(sql)
+    logger.info(f'[SHAP/población] {len(keys):,} grupos colegio-departamento-año | {workers} workers')
+    acc = accumulate(sql, spec, model_path, len(keys), workers, chunk_rows)
+    tables = build_tables(keys, acc)
+
+    out = output_dir()
+    out.mkdir(parents=True, exist_ok=True)
+    for name, df in tables.items():
+        write_parquet(df, table_path(name))
+        logger.info(f'[SHAP/población] {TABLES[name][0]}: {len(df):,} filas')
+
+    manifest = {
+        'fecha': datetime.now().strftime('%Y-%m-%d %H:%M'),
+        'filas': acc.rows,
+        'grupos': int((acc.counts > 0).sum()),
+        'colegios': len(tables['colegio']),
+        'encoding_spec': spec['checksum'],
+        'workers': workers,
+        'segundos': round(time.perf_counter() - started, 1),
+    }
+    with open(out / MANIFEST_FILE, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
@@ -0,0 +1,44 @@
+"""
+Proceso worker del SHAP de población completa (ver shap_population).
+
+Solo importa numpy y xgboost: los procesos se crean con spawn y no cargan
+Django ni DuckDB. Cada worker carga el booster una vez (init_worker) y
+reduce cada bloque de estudiantes a sumas por grupo, de modo que al padre
+vuelven unas pocas filas por colegio y no la matriz de contribuciones.
+"""
+import numpy as np
+import xgboost as xgb
+
+_model = None
+
+
+def init_worker(model_path, nthread=1):
+    """Initializer del pool: carga el booster con `nthread` hilos por proceso."""
+    global _model
+    _model = xgb.Booster(model_file=str(model_path))
+    _model.set_param({'nthread': nthread})
+
+
+def chunk_sums(X, groups, y, feature_names):
+    """
+    pred_contribs de un bloque agregadas por grupo.
+
+    X: (n, F) float32 codificado; groups: (n,) id de grupo; y: (n,) puntaje real.
+    Devuelve (ids, conteos, suma de contribuciones (G, F+1, bias al final),
+    suma de |contribuciones| (G, F), suma de y). La predicción de cada fila es
+    la suma de su fila de contribuciones, así que no hace falta predict aparte.
+    """
+    contribs = _model.predict(
+        xgb.DMatrix(X, missing=np.nan, feature_names=feature_names), pred_contribs=True,
+    )
+    ids, inverse = np.unique(groups, return_inverse=True)
+    n = len(ids)
+    sums = np.empty((n, contribs.shape[1]), dtype=np.float64)
+    abs_sums = np.empty((n, contribs.shape[1] - 1), dtype=np.float64)
+    for j in range(contribs.shape[1]):
+        sums[:, j] = np.bincount(inverse, weights=contribs[:, j], minlength=n)
+        if j < abs_sums.shape[1]:
+            abs_sums[:, j] = np.bincount(inverse, weights=np.abs(contribs[:, j]), minlength=n)
+    counts = np.bincount(inverse, minlength=n)
+    y_sums = np.bincount(inverse, weights=y, minlength=n)
+    return ids, counts, sums, abs_sums, y_sums
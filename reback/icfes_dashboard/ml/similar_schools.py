@@ -0,0 +1,290 @@
+"""
+Índice k-NN de "colegios similares".
+
+El batch (`python manage.py build_similar_schools`) arma, por año, un vector
+por colegio con los cinco puntajes por área + contexto (sector, tamaño, NBI
+municipal), lo estandariza (z-score dentro del año) y calcula los top-k
+vecinos con NumPy por bloques. El resultado se guarda en
+ml/artifacts/similar_schools.npz (settings.SIMILAR_SCHOOLS_INDEX_PATH).
+
+Las vistas solo hacen lookup: codigo_dane → fila → vecinos precalculados.
+Con pesos personalizados (usuarios autenticados) se recalcula en caliente la
+distancia contra los ~20k colegios de ese año: una sola operación vectorizada.
+"""
+import logging
+import math
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+ARTIFACTS_DIR = Path(__file__).parent / 'artifacts'
+DEFAULT_K = 10
+_BLOCK_ROWS = 256    # filas por bloque → matriz de distancias de 256 × ~20k float32 (~20 MB)
+
+SUBJECT_FEATURES = (
+    'avg_punt_matematicas',
+    'avg_punt_lectura_critica',
+    'avg_punt_c_naturales',
+    'avg_punt_sociales_ciudadanas',
+    'avg_punt_ingles',
+)
+CONTEXT_FEATURES = ('sector_oficial', 'log_estudiantes', 'pct_nbi')
+FEATURES = SUBJECT_FEATURES + CONTEXT_FEATURES
+
+# Pesos por defecto: el desempeño manda, el contexto desempata.
+DEFAULT_WEIGHTS = {
+    'avg_punt_matematicas': 1.0,
+    'avg_punt_lectura_critica': 1.0,
+    'avg_punt_c_naturales': 1.0,
+    'avg_punt_sociales_ciudadanas': 1.0,
+    'avg_punt_ingles': 1.0,
+    'sector_oficial': 1.0,
+    'log_estudiantes': 0.5,
+    'pct_nbi': 0.75,
+}
+
+# Nombres cortos aceptados en ?weights=matematicas:2,ingles:0
+WEIGHT_ALIASES = {
+    'matematicas': 'avg_punt_matematicas',
+    'lectura': 'avg_punt_lectura_critica',
+    'naturales': 'avg_punt_c_naturales',
+    'sociales': 'avg_punt_sociales_ciudadanas',
+    'ingles': 'avg_punt_ingles',
+    'sector': 'sector_oficial',
+    'tamano': 'log_estudiantes',
+    'nbi': 'pct_nbi',
+}
+_MAX_WEIGHT = 10.0
+
+
+def index_path():
+    return Path(getattr(settings, 'SIMILAR_SCHOOLS_INDEX_PATH', '') or ARTIFACTS_DIR / 'similar_schools.npz')
+
+
+def parse_weights(raw):
+    """
+    '?weights=matematicas:2,ingles:0' → vector de pesos (orden FEATURES).
+    Lo no mencionado conserva el peso por defecto. ValueError si es inválido.
+    """
+    weights = dict(DEFAULT_WEIGHTS)
+    for part in (raw or '').split(','):
+        if not part.strip():
+            continue
+        name, sep, value = part.partition(':')
+        feature = WEIGHT_ALIASES.get(name.strip().lower(), name.strip())
+        if not sep or feature not in weights:
+            raise ValueError(f'peso desconocido: {part.strip()}')
+        weight = float(value)
+        if not math.isfinite(weight) or not 0 <= weight <= _MAX_WEIGHT:
+            raise ValueError(f'peso fuera de rango [0, {_MAX_WEIGHT:g}]: {part.strip()}')
+        weights[feature] = weight
+    if not any(weights.values()):
+        raise ValueError('al menos un peso debe ser mayor que 0')
+    return np.array([weights[f] for f in FEATURES], dtype=np.float32)
+
+
+# ── Batch ─────────────────────────────────────────────────────────────────────
+
+def feature_matrix(df):
+    """
+    df: una fila por colegio-año con codigo_dane, ano, sector,
+    total_estudiantes, pct_nbi_total y los puntajes de SUBJECT_FEATURES.
+    Devuelve la matriz z-score por año (float32, orden FEATURES). Los faltantes
+    quedan en la media del año (z = 0): no acercan ni alejan.
+    """
+    raw = np.column_stack([
+        *(df[col].to_numpy(dtype=np.float64, na_value=np.nan) for col in SUBJECT_FEATURES),
+        (df['sector'].fillna('').str.upper() == 'OFICIAL').to_numpy(dtype=np.float64),
+        np.log1p(df['total_estudiantes'].fillna(0).to_numpy(dtype=np.float64).clip(min=0)),
+        df['pct_nbi_total'].to_numpy(dtype=np.float64, na_value=np.nan),
+    ])
+    years = df['ano'].to_numpy()
+    out = np.zeros_like(raw)
+    for year in np.unique(years):
+        rows = years == year
+        block = raw[rows]
+        mean = np.nanmean(block, axis=0)
+        std = np.nanstd(block, axis=0)
+        std[~np.isfinite(std) | (std == 0)] = 1.0
+        z = (block - np.where(np.isfinite(mean), mean, 0.0)) / std
+        out[rows] = np.nan_to_num(z, nan=0.0)
+    return out.astype(np.float32)
+
+
+def top_k_neighbors(features, k=DEFAULT_K, weights=None):
+    """
+    Top-k vecinos (distancia euclidiana ponderada) de cada fila contra todas
+    las demás. Por bloques: |a|² + |b|² − 2·a·bᵀ en BLAS, argpartition, sin
+    bucles por colegio. Devuelve (índices int32, distancias float32), n × k;
+    si hay menos de k vecinos, se rellena con -1 / inf.
+    """
+    n = len(features)
+    w = np.sqrt(weights if weights is not None else parse_weights(''), dtype=np.float32)
+    x = features * w
+    sq = np.einsum('ij,ij->i', x, x)
+    kk = min(k, n - 1)
+    idx = np.full((n, k), -1, dtype=np.int32)
+    dist = np.full((n, k), np.inf, dtype=np.float32)
+    if kk <= 0:
+        return idx, dist
+    for start in range(0, n, _BLOCK_ROWS):
+        stop = min(start + _BLOCK_ROWS, n)
+        d2 = sq[start:stop, None] + sq[None, :] - 2.0 * (x[start:stop] @ x.T)
+        d2[np.arange(stop - start), np.arange(start, stop)] = np.inf   # sin sí mismo
+        part = np.argpartition(d2, kk - 1, axis=1)[:, :kk]
+        part_d = np.take_along_axis(d2, part, axis=1)
+        order = np.argsort(part_d, axis=1, kind='stable')
+        idx[start:stop, :kk] = np.take_along_axis(part, order, axis=1)
+        dist[start:stop, :kk] = np.sqrt(np.maximum(np.take_along_axis(part_d, order, axis=1), 0))
+    return idx, dist
+
+
+def build_arrays(df, k=DEFAULT_K, weights=None):
+    """
+    Arrays del artefacto. Las filas quedan ordenadas por (codigo, año) para
+    que los años de un colegio sean un slice contiguo; los vecinos apuntan a
+    filas globales del mismo año.
+    """
+    df = df.assign(codigo_dane=df['codigo_dane'].astype(str), ano=df['ano'].astype(int))
+    df = df.sort_values(['codigo_dane', 'ano'], kind='stable').reset_index(drop=True)
+    weights = weights if weights is not None else parse_weights('')
+    features = feature_matrix(df)
+    years = df['ano'].to_numpy(dtype=np.int16)
+    neighbors = np.full((len(df), k), -1, dtype=np.int32)
+    distances = np.full((len(df), k), np.inf, dtype=np.float32)
+    for year in np.unique(years):
+        rows = np.flatnonzero(years == year)
+        local_idx, local_dist = top_k_neighbors(features[rows], k=k, weights=weights)
+        neighbors[rows] = np.where(local_idx >= 0, rows[np.maximum(local_idx, 0)], -1)
+        distances[rows] = local_dist
+        logger.info('[SimilarSchools] %s: %s colegios', year, len(rows))
+
+    codes, row_code = np.unique(df['codigo_dane'].to_numpy(dtype=str), return_inverse=True)
+    return {
+        'codes': codes,
+        'row_code': row_code.astype(np.int32),
+        'row_year': years,
+        'features': features,
+        'neighbors': neighbors,
+        'distances': distances,
+        'weights': weights,
+        'feature_names': np.array(FEATURES),
+    }
+
+
+def save_index(arrays, path=None, dataset_version=''):
+    path = Path(path or index_path())
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + '.tmp.npz')
+    np.savez_compressed(tmp, dataset_version=np.array(dataset_version or ''), **arrays)
+    os.replace(tmp, path)   # los workers nunca leen un archivo a medio escribir
+    logger.info('[SimilarSchools] Guardado: %s', path)
+    return path
+
+
+# ── Serving ───────────────────────────────────────────────────────────────────
+
+class SimilarSchoolsIndex:
+    def __init__(self, arrays):
+        self.codes = arrays['codes']
+        self.row_code = arrays['row_code']
+        self.row_year = arrays['row_year']
+        self.features = arrays['features']
+        self.neighbors = arrays['neighbors']
+        self.distances = arrays['distances']
+        self.weights = arrays['weights']
+        self.dataset_version = str(arrays.get('dataset_version', ''))
+        self._positions = {str(code): i for i, code in enumerate(self.codes)}
+        # row_code está ordenado: los años de cada colegio son un slice contiguo
+        self._row_start = np.searchsorted(self.row_code, np.arange(len(self.codes) + 1))
+        self._year_rows = {int(y): np.flatnonzero(self.row_year == y) for y in np.unique(self.row_year)}
+
+    def __len__(self):
+        return len(self.codes)
+
+    def _row(self, codigo, ano=None):
+        pos = self._positions.get(str(codigo))
+        if pos is None:
+            return None
+        start, stop = self._row_start[pos], self._row_start[pos + 1]
+        years = self.row_year[start:stop]
+        if ano is None:
+            return int(stop - 1)           # último año disponible
+        hit = np.flatnonzero(years == int(ano))
+        return int(start + hit[0]) if len(hit) else None
+
+    def _result(self, rows, dists):
+        return [
+            (str(self.codes[self.row_code[r]]), int(self.row_year[r]), round(float(d), 4))
+            for r, d in zip(rows, dists)
+            if r >= 0 and np.isfinite(d)
+        ]
+
+    def neighbors_of(self, codigo, ano=None, limit=5):
+        """[(codigo, ano, distancia)] precalculados; [] si el colegio/año no está."""
+        row = self._row(codigo, ano)
+        if row is None:
+            return []
+        return self._result(self.neighbors[row, :limit], self.distances[row, :limit])
+
+    def weighted_neighbors_of(self, codigo, weights, ano=None, limit=5):
+        """Vecinos con pesos propios, calculados en el momento contra el mismo año."""
+        row = self._row(codigo, ano)
+        if row is None:
+            return []
+        candidates = self._year_rows[int(self.row_year[row])]
+        diff = self.features[candidates] - self.features[row]
+        d2 = (diff * diff) @ np.asarray(weights, dtype=np.float32)
+        d2[candidates == row] = np.inf
+        limit = min(limit, len(candidates) - 1)
+        if limit <= 0:
+            return []
+        best = np.argpartition(d2, limit - 1)[:limit]
+        best = best[np.argsort(d2[best], kind='stable')]
+        return self._result(candidates[best], np.sqrt(d2[best]))
+
+
+def load_index(path=None):
+    with np.load(path or index_path()) as data:
+        return SimilarSchoolsIndex({name: data[name] for name in data.files})
+
+
+_lock = threading.Lock()
+_index = None
+_index_mtime = None
+
+
+def get_index():
+    """Índice del proceso (recargado si el batch reescribe el archivo); None si no existe."""
+    global _index, _index_mtime
+    path = index_path()
+    try:
+        mtime = path.stat().st_mtime
+    except OSError:
+        return None
+    if _index is not None and _index_mtime == mtime:
+        return _index
+    with _lock:
+        if _index is None or _index_mtime != mtime:
+            index = load_index(path)
+            _index, _index_mtime = index, mtime
+            logger.info(
+                'Similar schools index loaded: %s colegios, %s filas (dataset=%s)',
+                len(index), len(index.row_code), index.dataset_version,
+            )
+    return _index
+
+
+def similar_schools(codigo, ano=None, limit=5, weights=None):
+    """[(codigo, ano, distancia)] o [] si el índice no se ha construido."""
+    index = get_index()
+    if index is None:
+        return []
+    if weights is not None:
+        return index.weighted_neighbors_of(codigo, weights, ano=ano, limit=limit)
+    return index.neighbors_of(codigo, ano=ano, limit=limit)
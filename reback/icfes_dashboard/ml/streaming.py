@@ -0,0 +1,182 @@
+"""
+Lectura por bloques para entrenar el predictor sin cargar todo en RAM.
+
+El modo en memoria (train_predictor) trae ~todas las filas de estudiantes
+2014-2024 a un DataFrame, las codifica con Series de objetos, copia para el
+split y otra vez para los DMatrix. Aquí:
+
+- DuckDB entrega record batches de Arrow (o bloques de DataFrame si pyarrow
+  no está instalado) desde un cursor propio;
+- cada bloque se codifica con lookups de códigos a float32
+  (feature_engineering.encode_batch) según el encoding spec, cuyas medianas
+  se calculan antes en DuckDB (fit_encoding_spec_sql);
+- FeatureBatchIter alimenta un DMatrix de memoria externa de XGBoost, que
+  pagina a disco (cache_prefix) en vez de materializar la matriz;
+- el split train/test es determinístico por hash de la fila, calculado en
+  DuckDB: la misma fila cae siempre del mismo lado, sin importar el orden en
+  que el scan paralelo entregue los bloques.
+"""
+import logging
+import os
+
+import duckdb
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+from ..db_utils import get_duckdb_connection, resolve_schema
+from .feature_engineering import (
+    ENCODING,
+    FEATURE_COLS,
+    MEDIAN_FEATURES,
+    build_encoding_spec,
+    encode_batch,
+)
+
+try:
+    import pyarrow  # noqa: F401
+    HAS_ARROW = True
+except ImportError:
+    HAS_ARROW = False
+
+logger = logging.getLogger(__name__)
+
+STREAM_BATCH_ROWS = 500_000
+TEST_BUCKETS = 15            # hash(fila) % 100 < 15 → test (15%, como test_size=0.15)
+_DUCKDB_VECTOR = 2048        # filas por vector de DuckDB (fetch_df_chunk)
+
+
+def split_sql(sql, test):
+    """`sql` restringido al lado train o test del split por hash."""
+    op = '<' if test else '>='
+    return f"""
+        SELECT * EXCLUDE (_row)
+        FROM (SELECT t AS _row, t.* FROM ({sql}) t)
+        WHERE hash(_row) % 100 {op} {TEST_BUCKETS}
+    """
+
+
+def iter_batches(sql, batch_rows=STREAM_BATCH_ROWS):
+    """Bloques de `sql` en un cursor propio: RecordBatch de Arrow, o DataFrame sin pyarrow."""
+    with get_duckdb_connection() as conn:
+        cursor = conn.cursor()
+    try:
+        cursor.execute(resolve_schema(sql))
+        if HAS_ARROW:
+            yield from cursor.fetch_record_batch(batch_rows)
+            return
+        vectors = max(1, batch_rows // _DUCKDB_VECTOR)
+        while True:
+            chunk = cursor.fetch_df_chunk(vectors)
+            if chunk.empty:
+                return
+            yield chunk
+    finally:
+        cursor.close()
+
+
+def _weighted_median(values, counts):
+    """Mediana (como pandas: promedio de los dos centrales si n es par) de valores con frecuencia."""
+    order = np.argsort(values)
+    values, counts = np.asarray(values, dtype=float)[order], np.asarray(counts)[order]
+    n = counts.sum()
+    if n == 0:
+        return np.nan
+    cum = np.cumsum(counts)
+    lo = values[np.searchsorted(cum, (n - 1) // 2, side='right')]
+    hi = values[np.searchsorted(cum, n // 2, side='right')]
+    return (lo + hi) / 2
+
+
+def fit_encoding_spec_sql(sql):
+    """
+    Encoding spec con las medianas de todo `sql`, como fit_encoding_spec
+    sobre un DataFrame: mediana de los valores ya mapeados (categóricas, vía
+    conteos por categoría en DuckDB) o de la columna numérica.
+    """
+    fills = {}
+    with get_duckdb_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            for name in MEDIAN_FEATURES:
+                mapping = ENCODING[name][0]
+                if mapping is None:
+                    value = cursor.execute(resolve_schema(
+                        f"SELECT median(CAST({name} AS DOUBLE)) FROM ({sql}) t"
+                    )).fetchone()[0]
+                else:
+                    rows = cursor.execute(resolve_schema(
+                        f"SELECT {name}, COUNT(*) FROM ({sql}) t WHERE {name} IS NOT NULL GROUP BY 1"
+                    )).fetchall()
+                    mapped = [(mapping[v], c) for v, c in rows if v in mapping]
+                    value = _weighted_median([v for v, _ in mapped], [c for _, c in mapped]) if mapped else None
+                fills[name] = float(value) if value is not None and not np.isnan(value) else 0.0
+        finally:
+            cursor.close()
+    return build_encoding_spec(fills)
+
+
+class FeatureBatchIter(xgb.DataIter):
+    """
+    Iterador de XGBoost sobre los bloques codificados de `sql` (que trae las
+    FEATURE_COLS y punt_global). Con cache_prefix el DMatrix es de memoria
+    externa; XGBoost llama reset() cada vez que necesita otra pasada.
+    """
+
+    def __init__(self, sql, spec, batch_rows=STREAM_BATCH_ROWS, cache_prefix=None):
+        self._sql = sql
+        self._spec = spec
+        self._batch_rows = batch_rows
+        self._batches = None
+        self.n_rows = 0
+        super().__init__(cache_prefix=cache_prefix)
+
+    def reset(self):
+        self._batches = None
+
+    def next(self, input_data):
+        if self._batches is None:
+            self._batches = iter_batches(self._sql, self._batch_rows)
+            self.n_rows = 0
+        batch = next(self._batches, None)
+        if batch is None:
+            self._batches = None
+            return False
+        X = encode_batch(batch, self._spec)
+        y = batch.column('punt_global') if hasattr(batch, 'schema') else batch['punt_global']
+        y = np.asarray(y, dtype=np.float32)
+        self.n_rows += len(y)
+        input_data(data=X, label=y, feature_names=FEATURE_COLS)
+        return True
+
+
+def sample_features(sql, spec, rows, seed=42):
+    """Muestra reproducible (reservoir) de `sql`, codificada, como DataFrame de FEATURE_COLS."""
+    sampled = f"SELECT * FROM ({sql}) t USING SAMPLE reservoir({int(rows)} ROWS) REPEATABLE ({int(seed)})"
+    blocks = [encode_batch(batch, spec) for batch in iter_batches(sampled)]
+    data = np.vstack(blocks) if blocks else np.empty((0, len(FEATURE_COLS)), dtype=np.float32)
+    return pd.DataFrame(data, columns=FEATURE_COLS)
+
+
+def write_parquet(df, path):
+    """DataFrame → Parquet (zstd) vía DuckDB en memoria; reemplazo atómico."""
+    tmp = path.with_name(path.name + '.tmp')
+    con = duckdb.connect()
+    try:
+        con.register('tabla', df)
+        con.execute(f"COPY tabla TO '{_sql_path(tmp)}' (FORMAT PARQUET, COMPRESSION ZSTD)")
+    finally:
+        con.close()
+    os.replace(tmp, path)
+
+
+def read_parquet(path):
+    con = duckdb.connect()
+    try:
+        return con.execute(f"SELECT * FROM read_parquet('{_sql_path(path)}')").fetchdf()
+    finally:
+        con.close()
+
+
+def _sql_path(path):
+    return str(path).replace("'", "''")
@@ -1,29 +1,41 @@
 """
 Pipeline de entrenamiento para los dos modelos ICFES ML:
   1. XGBoost predictor de puntaje global + SHAP nativo (pred_contribs)
-  2. K-Means clustering de colegios + PCA 2D para visualización
+  2. K-Means (MiniBatch, arranque en caliente) de colegios + PCA 2D para visualización
 
 Los artefactos se guardan como JSON en icfes_dashboard/ml/artifacts/.
 """
 import json
 import logging
+import os
+import tempfile
+import time
 from datetime import datetime
 from pathlib import Path
 
 import numpy as np
 import pandas as pd
 import xgboost as xgb
-from sklearn.cluster import KMeans
 from sklearn.decomposition import PCA
 from sklearn.metrics import mean_absolute_error, r2_score, silhouette_score
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
 
+from . import clustering
 from .feature_engineering import (
     FEATURE_COLS,
     FEATURE_ICONS,
     FEATURE_LABELS,
     encode_features,
+    fit_encoding_spec,
+    validate_encoding_spec,
+)
+from .streaming import (
+    STREAM_BATCH_ROWS,
+    FeatureBatchIter,
+    fit_encoding_spec_sql,
+    sample_features,
+    split_sql,
 )
 
 logger = logging.getLogger(__name__)
@@ -49,21 +61,43 @@ CLUSTER_NAMES_BY_RANK = [
 
 N_CLUSTERS = 5
 
+ENCODING_SPEC_FILE = 'encoding_spec.json'
+PREDICTOR_MODEL_FILE = 'predictor.ubj'
+
 
 # ══════════════════════════════════════════════════════════════════════════════
 # MODELO 1: XGBoost Predictor + SHAP nativo
 # ══════════════════════════════════════════════════════════════════════════════
 
+PREDICTOR_PARAMS = {
+    'objective':        'reg:squarederror',
+    'tree_method':      'hist',
+    'max_depth':        6,
+    'learning_rate':    0.1,
+    'subsample':        0.8,
+    'colsample_bytree': 0.8,
+    'seed':             42,
+    'nthread':          -1,
+    'verbosity':        0,
+}
+NUM_BOOST_ROUND = 300
+SHAP_SAMPLE_ROWS = 50_000
+
+
 def train_predictor(df: pd.DataFrame) -> dict:
     """
     Entrena XGBoost sobre df, calcula SHAP vía pred_contribs nativo,
     y guarda:
+      - artifacts/encoding_spec.json (mismo encoding para serving)
+      - artifacts/predictor.ubj (booster, para SHAP de población completa)
       - artifacts/shap_importances.json
       - artifacts/shap_partial_estrato.json
-    Devuelve: {'mae': float, 'r2': float, 'n_rows': int}
+    Devuelve: {'mae': float, 'r2': float, 'n_rows': int, 'encoding_spec': checksum}
     """
     logger.info(f'[Predictor] Preparando features sobre {len(df):,} filas...')
-    X = encode_features(df)
+    spec = fit_encoding_spec(df)
+    X = encode_features(df, spec)
+    _save_json(ENCODING_SPEC_FILE, spec)
     y = df['punt_global'].astype(float)
 
     # Eliminar filas con target nulo
@@ -78,22 +112,11 @@ def train_predictor(df: pd.DataFrame) -> dict:
     dtrain = xgb.DMatrix(X_train, label=y_train, feature_names=FEATURE_COLS)
     dtest  = xgb.DMatrix(X_test,  label=y_test,  feature_names=FEATURE_COLS)
 
-    params = {
-        'objective':        'reg:squarederror',
-        'n_estimators':     300,
-        'max_depth':        6,
-        'learning_rate':    0.1,
-        'subsample':        0.8,
-        'colsample_bytree': 0.8,
-        'seed':             42,
-        'nthread':          -1,
-        'verbosity':        0,
-    }
     logger.info('[Predictor] Entrenando XGBoost...')
     model = xgb.train(
-        params,
+        PREDICTOR_PARAMS,
         dtrain,
-        num_boost_round=300,
+        num_boost_round=NUM_BOOST_ROUND,
         evals=[(dtest, 'test')],
         verbose_eval=50,
     )
@@ -103,11 +126,22 @@ def train_predictor(df: pd.DataFrame) -> dict:
     mae    = round(float(mean_absolute_error(y_test, y_pred)), 2)
     r2     = round(float(r2_score(y_test, y_pred)), 4)
     logger.info(f'[Predictor] MAE={mae} | R²={r2}')
+    _save_model(model, spec)
+
+    sample_size = min(SHAP_SAMPLE_ROWS, len(X_train))
+    _save_explanations(model, X_train.sample(sample_size, random_state=42))
+
+    return {'mae': mae, 'r2': r2, 'n_rows': len(X), 'encoding_spec': spec['checksum']}
+
 
+def _save_explanations(model, X_sample: pd.DataFrame) -> None:
+    """
+    SHAP (pred_contribs) y partial dependence de estrato sobre X_sample:
+      - artifacts/shap_importances.json
+      - artifacts/shap_partial_estrato.json
+    """
     # ── SHAP via pred_contribs (TreeSHAP nativo en XGBoost) ──────────────────
-    logger.info('[Predictor] Calculando SHAP sobre muestra de 50K filas...')
-    sample_size = min(50_000, len(X_train))
-    X_sample    = X_train.sample(sample_size, random_state=42)
+    logger.info(f'[Predictor] Calculando SHAP sobre muestra de {len(X_sample):,} filas...')
     d_sample    = xgb.DMatrix(X_sample, feature_names=FEATURE_COLS)
 
     # pred_contribs devuelve (n_samples, n_features + 1): última col = bias
@@ -148,7 +182,49 @@ def train_predictor(df: pd.DataFrame) -> dict:
     ]
     _save_json('shap_partial_estrato.json', partial_data)
 
-    return {'mae': mae, 'r2': r2, 'n_rows': len(X)}
+
+def train_predictor_streaming(sql: str, batch_rows: int = STREAM_BATCH_ROWS) -> dict:
+    """
+    Igual que train_predictor (mismos parámetros y artefactos), pero sin
+    DataFrame: lee `sql` (SQL_PREDICTOR) por bloques desde DuckDB, codifica
+    a float32 y entrena sobre un DMatrix de memoria externa. Split
+    determinístico por hash de fila (ver ml.streaming).
+    Devuelve: {'mae': float, 'r2': float, 'n_rows': int, 'encoding_spec': checksum}
+    """
+    logger.info('[Predictor/stream] Calculando medianas de imputación...')
+    spec = fit_encoding_spec_sql(sql)
+    _save_json(ENCODING_SPEC_FILE, spec)
+
+    with tempfile.TemporaryDirectory(prefix='icfes-xgb-') as cache_dir:
+        train_iter = FeatureBatchIter(split_sql(sql, test=False), spec, batch_rows,
+                                      cache_prefix=os.path.join(cache_dir, 'train'))
+        test_iter = FeatureBatchIter(split_sql(sql, test=True), spec, batch_rows,
+                                     cache_prefix=os.path.join(cache_dir, 'test'))
+        dtrain = xgb.DMatrix(train_iter, missing=np.nan)
+        dtest  = xgb.DMatrix(test_iter, missing=np.nan)
+        logger.info(f'[Predictor/stream] {dtrain.num_row():,} filas train | {dtest.num_row():,} test')
+
+        logger.info('[Predictor/stream] Entrenando XGBoost (memoria externa)...')
+        model = xgb.train(
+            PREDICTOR_PARAMS,
+            dtrain,
+            num_boost_round=NUM_BOOST_ROUND,
+            evals=[(dtest, 'test')],
+            verbose_eval=50,
+        )
+
+        y_test = dtest.get_label()
+        y_pred = model.predict(dtest)
+        n_rows = dtrain.num_row() + dtest.num_row()
+
+    mae = round(float(mean_absolute_error(y_test, y_pred)), 2)
+    r2  = round(float(r2_score(y_test, y_pred)), 4)
+    logger.info(f'[Predictor/stream] MAE={mae} | R²={r2}')
+    _save_model(model, spec)
+
+    _save_explanations(model, sample_features(split_sql(sql, test=False), spec, SHAP_SAMPLE_ROWS))
+
+    return {'mae': mae, 'r2': r2, 'n_rows': n_rows, 'encoding_spec': spec['checksum']}
 
 
 # ══════════════════════════════════════════════════════════════════════════════
@@ -161,16 +237,36 @@ CLUSTER_FEATURES = [
 ]
 
 
-def train_clustering(df_colegios: pd.DataFrame) -> dict:
+def train_clustering(df_colegios: pd.DataFrame, data_key: str = None, cold_start: bool = False) -> dict:
     """
-    Agrupa colegios en N_CLUSTERS arquetipos usando K-Means sobre
+    Agrupa colegios en N_CLUSTERS arquetipos usando MiniBatchKMeans sobre
     métricas normalizadas. PCA 2D para scatter de visualización.
+    Arranca de los centroides del ajuste anterior y conserva ids y nombres
+    de los clusters (ver ml.clustering); si `data_key` coincide con la del
+    ajuste anterior no reentrena.
     Guarda:
       - artifacts/cluster_profiles.json
       - artifacts/cluster_schools.json
-    Devuelve: {'silhouette': float, 'n_colegios': int}
+      - artifacts/cluster_assignments.parquet
+      - artifacts/cluster_state.json
+    Devuelve: {'silhouette', 'n_colegios', 'warm_start', 'reasignados', 'skipped', 'tiempos'}
     """
+    state = None if cold_start else clustering.load_state()
+    compatible = (
+        state is not None
+        and state.get('features') == CLUSTER_FEATURES
+        and len(state.get('centroids', [])) == N_CLUSTERS
+    )
+    outputs = [ARTIFACTS_DIR / 'cluster_profiles.json', ARTIFACTS_DIR / 'cluster_schools.json']
+    if compatible and data_key and state.get('data_key') == data_key and all(p.exists() for p in outputs):
+        logger.info('[Clustering] Sin cambios en los datos: se conserva el ajuste anterior.')
+        return {
+            'silhouette': state['silhouette'], 'n_colegios': state['n_colegios'],
+            'warm_start': False, 'reasignados': 0, 'skipped': True, 'tiempos': {},
+        }
+
     logger.info(f'[Clustering] {len(df_colegios):,} colegios recibidos.')
+    tiempos = {}
 
     df = df_colegios.copy()
     df = df.dropna(subset=['avg_global'])
@@ -185,27 +281,52 @@ def train_clustering(df_colegios: pd.DataFrame) -> dict:
     scaler = StandardScaler()
     X_scaled = scaler.fit_transform(X_raw)
 
-    # ── K-Means ───────────────────────────────────────────────────────────────
-    logger.info(f'[Clustering] Ajustando K-Means con K={N_CLUSTERS}...')
-    km = KMeans(n_clusters=N_CLUSTERS, random_state=42, n_init=20)
-    df['cluster_id'] = km.fit_predict(X_scaled)
+    # ── MiniBatchKMeans (caliente desde los centroides anteriores) ────────────
+    t = time.perf_counter()
+    if compatible:
+        logger.info(f'[Clustering] MiniBatchKMeans K={N_CLUSTERS} desde los centroides anteriores...')
+        init = scaler.transform(pd.DataFrame(state['centroids'], columns=CLUSTER_FEATURES))
+        km = clustering.fit_minibatch(X_scaled, N_CLUSTERS, init=init)
+        stable = clustering.match_clusters(init, km.cluster_centers_)
+    else:
+        logger.info(f'[Clustering] MiniBatchKMeans K={N_CLUSTERS} desde cero...')
+        km = clustering.fit_minibatch(X_scaled, N_CLUSTERS)
+        stable = np.arange(N_CLUSTERS)
+    df['cluster_id'] = stable[km.predict(X_scaled)]
+    centers = np.empty_like(km.cluster_centers_)
+    centers[stable] = km.cluster_centers_
+    tiempos['kmeans'] = round(time.perf_counter() - t, 2)
 
     sil = round(float(silhouette_score(X_scaled, df['cluster_id'])), 3)
     logger.info(f'[Clustering] Silhouette score: {sil}')
 
     # ── PCA 2D ────────────────────────────────────────────────────────────────
+    t = time.perf_counter()
     pca = PCA(n_components=2, random_state=42)
     pcs = pca.fit_transform(X_scaled)
+    signs = clustering.align_components(pca.components_, state.get('pca_components') if compatible else None)
+    pcs *= signs
+    components = pca.components_ * signs[:, None]
     df['pc1'] = np.round(pcs[:, 0], 3)
     df['pc2'] = np.round(pcs[:, 1], 3)
     var_exp = np.round(pca.explained_variance_ratio_ * 100, 1)
+    tiempos['pca'] = round(time.perf_counter() - t, 2)
     logger.info(f'[Clustering] PCA varianza explicada: PC1={var_exp[0]}%, PC2={var_exp[1]}%')
 
-    # ── Asignar nombres a clusters por puntaje promedio desc ─────────────────
-    cluster_avgs = df.groupby('cluster_id')['avg_global'].mean().sort_values(ascending=False)
-    rank_to_name = {}
-    for rank, cid in enumerate(cluster_avgs.index):
-        rank_to_name[cid] = CLUSTER_NAMES_BY_RANK[rank]
+    # ── Nombres: los del ajuste anterior, o por puntaje promedio desc ────────
+    if compatible:
+        rank_to_name = {cid: info for cid, info in enumerate(state['names'])}
+    else:
+        cluster_avgs = df.groupby('cluster_id')['avg_global'].mean().reindex(range(N_CLUSTERS))
+        order = cluster_avgs.sort_values(ascending=False, na_position='last').index
+        rank_to_name = {cid: CLUSTER_NAMES_BY_RANK[rank] for rank, cid in enumerate(order)}
+
+    previous = clustering.load_assignments() if compatible else {}
+    reasignados = 0
+    if 'colegio_bk' in df and previous:
+        before = df['colegio_bk'].map(previous)
+        reasignados = int((before.notna() & (before != df['cluster_id'])).sum())
+        logger.info(f'[Clustering] {reasignados:,} colegios cambiaron de cluster.')
 
     # ── Perfiles de cluster ───────────────────────────────────────────────────
     profiles = []
@@ -238,6 +359,7 @@ def train_clustering(df_colegios: pd.DataFrame) -> dict:
     for _, row in df.iterrows():
         info = rank_to_name[int(row['cluster_id'])]
         scatter.append({
+            'colegio_bk': str(row.get('colegio_bk', '')),
             'pc1':        float(row['pc1']),
             'pc2':        float(row['pc2']),
             'cluster_id': int(row['cluster_id']),
@@ -253,7 +375,22 @@ def train_clustering(df_colegios: pd.DataFrame) -> dict:
     _save_json('cluster_schools.json', scatter)
     logger.info(f'[Clustering] {len(scatter)} colegios guardados en scatter.')
 
-    return {'silhouette': sil, 'n_colegios': len(df)}
+    if 'colegio_bk' in df:
+        clustering.save_assignments(df)
+    clustering.save_state({
+        'data_key':       data_key,
+        'features':       CLUSTER_FEATURES,
+        'centroids':      scaler.inverse_transform(centers).round(6).tolist(),
+        'names':          [rank_to_name[cid] for cid in range(N_CLUSTERS)],
+        'pca_components': components.round(6).tolist(),
+        'silhouette':     sil,
+        'n_colegios':     len(df),
+    })
+
+    return {
+        'silhouette': sil, 'n_colegios': len(df), 'warm_start': compatible,
+        'reasignados': reasignados, 'skipped': False, 'tiempos': tiempos,
+    }
 
 
 # ── Helper ────────────────────────────────────────────────────────────────────
@@ -265,6 +402,36 @@ def _save_json(filename: str, data) -> None:
     logger.info(f'[Artifacts] Guardado: {path}')
 
 
+def _save_model(model, spec: dict) -> None:
+    """Booster en UBJ, marcado con el checksum del encoding spec con que se entrenó."""
+    model.set_attr(encoding_spec=spec['checksum'])
+    path = ARTIFACTS_DIR / PREDICTOR_MODEL_FILE
+    model.save_model(path)
+    logger.info(f'[Artifacts] Guardado: {path}')
+
+
+def load_predictor(path=None, spec: dict = None):
+    """
+    Booster del último entrenamiento. Con `spec`, ValueError si el booster
+    se entrenó con otro encoding (las columnas no significarían lo mismo).
+    """
+    path = Path(path) if path else ARTIFACTS_DIR / PREDICTOR_MODEL_FILE
+    model = xgb.Booster(model_file=str(path))
+    if spec is not None and model.attr('encoding_spec') != spec['checksum']:
+        raise ValueError(
+            f'{path.name} se entrenó con el encoding {model.attr("encoding_spec")}, '
+            f'no con {spec["checksum"]}'
+        )
+    return model
+
+
+def load_encoding_spec(path=None) -> dict:
+    """Encoding spec del último entrenamiento (ValueError si no es válido para este código)."""
+    path = Path(path) if path else ARTIFACTS_DIR / ENCODING_SPEC_FILE
+    with open(path, encoding='utf-8') as f:
+        return validate_encoding_spec(json.load(f))
+
+
 def save_metadata(predictor_result: dict, clustering_result: dict) -> None:
     meta = {
         'fecha_entrenamiento': datetime.now().strftime('%Y-%m-%d %H:%M'),
@@ -273,10 +440,11 @@ def save_metadata(predictor_result: dict, clustering_result: dict) -> None:
             'mae':   predictor_result['mae'],
             'r2':    predictor_result['r2'],
             'n_rows_entrenamiento': predictor_result['n_rows'],
+            'encoding_spec': predictor_result.get('encoding_spec'),
             'periodo': '2014-2024',
         },
         'modelo_clustering': {
-            'tipo': f'K-Means (K={N_CLUSTERS}) + PCA 2D',
+            'tipo': f'MiniBatchKMeans (K={N_CLUSTERS}) + PCA 2D',
             'silhouette': clustering_result['silhouette'],
             'n_colegios': clustering_result['n_colegios'],
             'ano': '2024',
@@ -0,0 +1,304 @@
+"""
+Motor "qué pasaría si" sobre los estudiantes de un colegio.
+
+fct_ml_palancas_colegio solo trae las tres palancas que el batch precalculó.
+Aquí el predictor responde escenarios arbitrarios en el request:
+
+- el batch (`python manage.py build_what_if_population`) codifica con el
+  encoding spec a los estudiantes de un año (el último por defecto) y guarda
+  la matriz float32 ordenada por colegio en ml/artifacts/what_if_population.npz
+  (settings.WHAT_IF_POPULATION_PATH): los estudiantes de un colegio son un
+  slice contiguo. La base de producción no tiene icfes_silver, por eso la
+  población viaja como artefacto;
+- cada worker carga una vez el booster (artifacts/predictor.ubj), el spec y
+  la matriz (get_engine, recargados si el batch reescribe los archivos);
+- un escenario mueve palancas sobre esa matriz ('internet:20' = 20 puntos
+  porcentuales más de estudiantes con internet; 'libros:1' = un nivel más de
+  libros en casa) y todos los escenarios de un request se predicen en una sola
+  llamada a inplace_predict: la matriz base más solo las filas que cada
+  escenario cambia.
+
+Las palancas de proporción eligen a qué estudiantes cambiar con un orden
+pseudoaleatorio fijo por fila: el mismo escenario da siempre el mismo número.
+"""
+import logging
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+from ..db_utils import get_duckdb_connection, resolve_schema
+from .feature_engineering import FEATURE_COLS, FEATURE_ICONS, FEATURE_LABELS, encode_batch
+from .streaming import STREAM_BATCH_ROWS, iter_batches
+from .train_models import ARTIFACTS_DIR, PREDICTOR_MODEL_FILE, load_encoding_spec, load_predictor
+
+logger = logging.getLogger(__name__)
+
+MAX_SCENARIOS = 20
+_ORDER_SEED = 20240101
+
+# nombre corto → (feature, tipo). 'proporcion': puntos porcentuales de
+# estudiantes que pasan a tener (o dejan de tener) la variable binaria;
+# 'nivel': niveles que sube (o baja) la variable ordinal, acotada a su escala.
+LEVERS = {
+    'internet': ('fami_tieneinternet', 'proporcion'),
+    'computador': ('fami_tienecomputador', 'proporcion'),
+    'libros': ('fami_numlibros', 'nivel'),
+    'lectura': ('estu_dedicacionlecturadiaria', 'nivel'),
+    'trabajo': ('estu_horassemanatrabaja', 'nivel'),
+}
+_LIMITS = {'proporcion': 100, 'nivel': 4}
+
+# Sin ?escenario=: cada palanca por separado, en un paso razonable.
+DEFAULT_SCENARIOS = ['internet:20', 'computador:20', 'libros:1', 'lectura:1', 'trabajo:-1']
+
+# Mismas features que SQL_PREDICTOR (train_icfes_models) para un año, por colegio.
+SQL_WHAT_IF_POPULATION = """
+SELECT
+    'c' || f.cole_cod_dane_establecimiento AS colegio_bk,
+    f.punt_global,
+    f.fami_estratovivienda,
+    f.fami_educacionmadre,
+    f.fami_educacionpadre,
+    f.fami_tieneinternet,
+    f.fami_tienecomputador,
+    f.fami_numlibros,
+    f.fami_personashogar,
+    f.fami_situacioneconomica,
+    f.cole_naturaleza,
+    f.cole_area_ubicacion,
+    f.estu_genero,
+    f.estu_horassemanatrabaja,
+    f.estu_dedicacionlecturadiaria,
+    CAST(f.ano AS INTEGER) AS ano,
+    n.pct_nbi_total
+FROM icfes_silver.icfes f
+LEFT JOIN gold.dim_municipio_nbi n
+    ON CAST(n.codigo_municipio AS VARCHAR) = SUBSTRING(f.cole_cod_dane_establecimiento, 1, 5)
+WHERE f.punt_global IS NOT NULL
+  AND f.punt_global > 0
+  AND f.cole_cod_dane_establecimiento IS NOT NULL
+"""
+
+
+def population_path():
+    return Path(getattr(settings, 'WHAT_IF_POPULATION_PATH', '') or ARTIFACTS_DIR / 'what_if_population.npz')
+
+
+def parse_scenario(raw):
+    """
+    'internet:20,libros:1' → {'internet': 20, 'libros': 1}.
+    ValueError si la palanca no existe, el valor no es entero o está fuera de rango.
+    """
+    scenario = {}
+    for part in (raw or '').split(','):
+        if not part.strip():
+            continue
+        name, sep, value = part.partition(':')
+        name = name.strip().lower()
+        if not sep or name not in LEVERS:
+            raise ValueError(f'palanca desconocida: {part.strip()}')
+        try:
+            amount = int(value.strip().lstrip('+'))
+        except ValueError:
+            raise ValueError(f'valor inválido: {part.strip()}') from None
+        limit = _LIMITS[LEVERS[name][1]]
+        if not -limit <= amount <= limit:
+            raise ValueError(f'{name} fuera de rango [-{limit}, {limit}]')
+        scenario[name] = amount
+    if not scenario:
+        raise ValueError('escenario vacío')
+    return scenario
+
+
+def format_scenario(scenario):
+    return ','.join(f'{name}:{amount:+d}' for name, amount in scenario.items())
+
+
+# ── Batch ─────────────────────────────────────────────────────────────────────
+
+def _column(batch, name):
+    return batch.column(name) if hasattr(batch, 'schema') else batch[name]
+
+
+def latest_year(sql=SQL_WHAT_IF_POPULATION):
+    with get_duckdb_connection() as conn:
+        cursor = conn.cursor()
+    try:
+        return cursor.execute(resolve_schema(f"SELECT MAX(CAST(ano AS INTEGER)) FROM ({sql}) t")).fetchone()[0]
+    finally:
+        cursor.close()
+
+
+def build_population(spec, ano, sql=SQL_WHAT_IF_POPULATION, batch_rows=STREAM_BATCH_ROWS):
+    """
+    Arrays del artefacto para el año `ano`: codes (colegio_bk), row_start
+    (los estudiantes del colegio i son X[row_start[i]:row_start[i+1]]),
+    X (float32 codificado, orden FEATURE_COLS) e y (puntaje real).
+    """
+    ordered = f"SELECT * FROM ({sql}) t WHERE CAST(ano AS INTEGER) = {int(ano)} ORDER BY colegio_bk"
+    blocks, targets, codes = [], [], []
+    for batch in iter_batches(ordered, batch_rows):
+        blocks.append(encode_batch(batch, spec))
+        targets.append(np.asarray(_column(batch, 'punt_global'), dtype=np.float32))
+        codes.append(np.asarray(_column(batch, 'colegio_bk'), dtype=str))
+    if not blocks:
+        raise ValueError(f'sin estudiantes para {ano}')
+
+    row_codes = np.concatenate(codes)
+    starts = np.flatnonzero(np.r_[True, row_codes[1:] != row_codes[:-1]])
+    return {
+        'codes': row_codes[starts],
+        'row_start': np.append(starts, len(row_codes)).astype(np.int64),
+        'X': np.vstack(blocks),
+        'y': np.concatenate(targets),
+        'ano': np.array(int(ano)),
+        'encoding_spec': np.array(spec['checksum']),
+    }
+
+
+def save_population(arrays, path=None, dataset_version=''):
+    path = Path(path or population_path())
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + '.tmp.npz')
+    np.savez(tmp, dataset_version=np.array(dataset_version or ''), **arrays)
+    os.replace(tmp, path)   # los workers nunca leen un archivo a medio escribir
+    logger.info('[WhatIf] Guardado: %s', path)
+    return path
+
+
+# ── Serving ───────────────────────────────────────────────────────────────────
+
+class WhatIfEngine:
+    def __init__(self, model, spec, arrays):
+        if str(arrays['encoding_spec']) != spec['checksum']:
+            raise ValueError(
+                f'la población se codificó con {arrays["encoding_spec"]}, no con {spec["checksum"]}'
+            )
+        self.model = model
+        self.codes = arrays['codes']
+        self.row_start = arrays['row_start']
+        self.X = arrays['X']
+        self.y = arrays['y']
+        self.ano = int(arrays['ano'])
+        self.dataset_version = str(arrays.get('dataset_version', ''))
+        self._positions = {str(code): i for i, code in enumerate(self.codes)}
+        # orden fijo para elegir qué estudiantes cambian en las palancas de proporción
+        self._order = np.random.default_rng(_ORDER_SEED).random(len(self.X))
+        self._levers = {}
+        for name, (feature, kind) in LEVERS.items():
+            mapping = next(f['mapping'] for f in spec['features'] if f['name'] == feature)
+            values = list(mapping.values()) if mapping else [0, 1]
+            self._levers[name] = (FEATURE_COLS.index(feature), kind, min(values), max(values))
+
+    def __len__(self):
+        return len(self.codes)
+
+    def students(self, codigo):
+        """slice de los estudiantes del colegio, o None."""
+        pos = self._positions.get(str(codigo))
+        if pos is None:
+            return None
+        return slice(int(self.row_start[pos]), int(self.row_start[pos + 1]))
+
+    def apply(self, X, order, scenario):
+        """(matriz con el escenario aplicado, máscara de estudiantes que cambiaron)."""
+        out = X.copy()
+        changed = np.zeros(len(X), dtype=bool)
+        for name, amount in scenario.items():
+            j, kind, lo, hi = self._levers[name]
+            if kind == 'nivel':
+                new = np.clip(out[:, j] + amount, lo, hi)
+                changed |= new != out[:, j]
+                out[:, j] = new
+                continue
+            target = hi if amount > 0 else lo
+            eligible = np.flatnonzero(out[:, j] != target)
+            n_flip = min(len(eligible), int(round(abs(amount) / 100 * len(X))))
+            flip = eligible[np.argsort(order[eligible], kind='stable')[:n_flip]]
+            out[flip, j] = target
+            changed[flip] = True
+        return out, changed
+
+    def evaluate(self, codigo, scenarios):
+        """
+        Predicción media del colegio hoy y bajo cada escenario, en una sola
+        pasada del booster. Solo se predicen las filas que el escenario
+        cambia; el resto conserva su predicción base. None si el colegio no
+        está en la población.
+        """
+        rows = self.students(codigo)
+        if rows is None:
+            return None
+        X, order = self.X[rows], self._order[rows]
+        variants = [self.apply(X, order, scenario) for scenario in scenarios]
+        stacked = np.vstack([X] + [scenario_X[changed] for scenario_X, changed in variants])
+        preds = self.model.inplace_predict(stacked).astype(np.float64)
+        base_preds, offset = preds[:len(X)], len(X)
+        base_sum = base_preds.sum()
+
+        results = []
+        for scenario, (_, changed) in zip(scenarios, variants):
+            n_changed = int(changed.sum())
+            new = preds[offset:offset + n_changed]
+            offset += n_changed
+            mean = (base_sum - base_preds[changed].sum() + new.sum()) / len(X)
+            results.append({
+                'escenario': format_scenario(scenario),
+                'palancas': [
+                    {
+                        'palanca': name,
+                        'feature': LEVERS[name][0],
+                        'label': FEATURE_LABELS[LEVERS[name][0]],
+                        'icono': FEATURE_ICONS[LEVERS[name][0]],
+                        'cambio': amount,
+                    }
+                    for name, amount in scenario.items()
+                ],
+                'puntaje_predicho': float(mean),
+                'delta_pts': float(mean - base_sum / len(X)),
+                'estudiantes_afectados': n_changed,
+            })
+        return {
+            'ano': self.ano,
+            'n_estudiantes': len(X),
+            'puntaje_real': float(self.y[rows].mean()),
+            'puntaje_predicho': float(base_sum / len(X)),
+            'escenarios': results,
+        }
+
+
+def load_engine(path=None, model_path=None, spec_path=None):
+    spec = load_encoding_spec(spec_path)
+    model = load_predictor(model_path or ARTIFACTS_DIR / PREDICTOR_MODEL_FILE, spec)
+    model.set_param({'nthread': 1})   # un hilo por request; gunicorn ya reparte entre requests
+    with np.load(path or population_path()) as data:
+        arrays = {name: data[name] for name in data.files}
+    return WhatIfEngine(model, spec, arrays)
+
+
+_lock = threading.Lock()
+_engine = None
+_engine_key = None
+
+
+def get_engine():
+    """Motor del proceso (recargado si el batch reescribe población o booster); None si faltan."""
+    global _engine, _engine_key
+    try:
+        key = (population_path().stat().st_mtime, (ARTIFACTS_DIR / PREDICTOR_MODEL_FILE).stat().st_mtime)
+    except OSError:
+        return None
+    if _engine is not None and _engine_key == key:
+        return _engine
+    with _lock:
+        if _engine is None or _engine_key != key:
+            engine = load_engine()
+            _engine, _engine_key = engine, key
+            logger.info(
+                'What-if engine loaded: %s colegios, %s estudiantes (%s, dataset=%s)',
+                len(engine), len(engine.X), engine.ano, engine.dataset_version,
+            )
+    return _engine
@@ -120,6 +120,13 @@ class RailwayTrafficLog(models.Model):
     """
     Raw traffic logs imported from Railway JSONL.
     Stored in Postgres to avoid writes/locks on DuckDB.
+
+    On PostgreSQL the table is range-partitioned by day on `timestamp` with a
+    BRIN index on it (migration 0010, see traffic_partitions); days older than
+    TRAFFIC_RETENTION_DAYS are moved to Parquet by `archive_traffic_logs`.
+    A partitioned table's unique keys must include `timestamp`, so request_id
+    is not UNIQUE: the importer skips request_ids already stored around the
+    same time (traffic_import.REQUEST_ID_WINDOW) using the index below.
     """
     BOT_CATEGORY_CHOICES = [
         ("human_or_other", "Human/Other"),
@@ -130,12 +137,12 @@ class RailwayTrafficLog(models.Model):
         ("unknown", "Unknown"),
     ]
 
-    request_id = models.CharField(max_length=64, unique=True)
-    timestamp = models.DateTimeField(db_index=True)
+    request_id = models.CharField(max_length=64)
+    timestamp = models.DateTimeField()
     method = models.CharField(max_length=12, blank=True, default="")
-    path = models.TextField(db_index=True)
+    path = models.TextField()
     host = models.CharField(max_length=255, blank=True, default="")
-    http_status = models.IntegerField(db_index=True)
+    http_status = models.IntegerField()
     total_duration_ms = models.IntegerField(null=True, blank=True)
     upstream_rq_duration_ms = models.IntegerField(null=True, blank=True)
     tx_bytes = models.BigIntegerField(null=True, blank=True)
@@ -149,30 +156,18 @@ class RailwayTrafficLog(models.Model):
         max_length=24,
         choices=BOT_CATEGORY_CHOICES,
         default="unknown",
-        db_index=True,
     )
-    school_slug = models.CharField(max_length=255, blank=True, default="", db_index=True)
-    utm_source = models.CharField(max_length=128, blank=True, default="", db_index=True)
-    utm_medium = models.CharField(max_length=128, blank=True, default="", db_index=True)
-    utm_campaign = models.CharField(max_length=128, blank=True, default="", db_index=True)
+    school_slug = models.CharField(max_length=255, blank=True, default="")
+    utm_source = models.CharField(max_length=128, blank=True, default="")
+    utm_medium = models.CharField(max_length=128, blank=True, default="")
+    utm_campaign = models.CharField(max_length=128, blank=True, default="")
 
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ["-timestamp"]
         indexes = [
-            models.Index(
-                fields=["timestamp", "http_status"],
-                name="icfes_dashb_timesta_67563d_idx",
-            ),
-            models.Index(
-                fields=["timestamp", "bot_category"],
-                name="icfes_dashb_timesta_8b7d03_idx",
-            ),
-            models.Index(
-                fields=["timestamp", "school_slug"],
-                name="icfes_dashb_timesta_3886c3_idx",
-            ),
+            models.Index(fields=["request_id", "timestamp"], name="railway_log_request_ts_idx"),
         ]
         verbose_name = "Railway traffic log"
         verbose_name_plural = "Railway traffic logs"
@@ -181,6 +176,25 @@ class RailwayTrafficLog(models.Model):
         return f"{self.timestamp.isoformat()} {self.method} {self.path} ({self.http_status})"
 
 
+class IndexNowUrl(models.Model):
+    """
+    Last URL set submitted to IndexNow (`manage.py ping_indexnow`), one row
+    per sitemap URL with the content hash it had when it was accepted.
+    Only URLs that are new or whose hash changed are submitted again.
+    """
+    url = models.CharField(max_length=500, unique=True)
+    section = models.CharField(max_length=64, db_index=True)
+    content_hash = models.CharField(max_length=40)
+    submitted_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "IndexNow URL"
+        verbose_name_plural = "IndexNow URLs"
+
+    def __str__(self):
+        return f"{self.url} ({self.submitted_at:%Y-%m-%d})"
+
+
 class FactIcfesAnalytics(models.Model):
     """
     Modelo analítico principal de desempeño ICFES por estudiante.
@@ -644,6 +658,8 @@ class InglesAnalisisIA(models.Model):
     fecha_generacion = models.DateTimeField(auto_now_add=True)
     tokens_input    = models.IntegerField(null=True, blank=True)
     tokens_output   = models.IntegerField(null=True, blank=True)
+    # Huella de los datos del prompt (ia_generation.input_hash): sin cambios → no se regenera
+    input_hash      = models.CharField(max_length=40, blank=True, default='')
 
     class Meta:
         # No unique_together — permitimos múltiples versiones por (tipo, parametro, año)
@@ -689,6 +705,7 @@ class MlAnalisisIA(models.Model):
     fecha_generacion = models.DateTimeField(auto_now_add=True)
     tokens_input     = models.IntegerField(null=True, blank=True)
     tokens_output    = models.IntegerField(null=True, blank=True)
+    input_hash       = models.CharField(max_length=40, blank=True, default='')  # ia_generation.input_hash
 
     class Meta:
         indexes = [models.Index(fields=['ano_referencia', 'estado'])]
@@ -0,0 +1,284 @@
+"""
+PDF reports (school report and school comparison), built off the web thread.
+
+The export views used to aggregate fct_icfes_analytics and render the PDF
+inside a gunicorn thread; a few concurrent downloads were enough to starve
+the site. Now:
+
+- the builders read the pre-aggregated gold.fct_colegio_historico (one row
+  per school and year) and return (filename, bytes);
+- they run in a Celery task (icfes_dashboard.tasks.generate_pdf_report);
+- the result is cached per report_id = hash(kind, params, dataset version),
+  so a report is built once per school/year/dataset and a redeploy with a
+  new DuckDB file invalidates every report at once;
+- the job state lives in the cache next to the report, so the views and the
+  polling endpoint do not depend on the Celery result backend.
+
+Job states: pending → running → (ready | not_found | error).
+"""
+import hashlib
+import json
+import logging
+from datetime import datetime
+from io import BytesIO
+
+from django.core.cache import cache
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+
+from .db_utils import get_dataset_version, get_duckdb_connection, resolve_schema
+
+logger = logging.getLogger(__name__)
+
+REPORT_CACHE_TTL = 60 * 60 * 24 * 7   # report_id already includes the dataset version
+JOB_TTL = 60 * 30                     # CELERY_TASK_TIME_LIMIT
+
+PENDING, RUNNING, READY, NOT_FOUND, ERROR, UNKNOWN = (
+    'pending', 'running', 'ready', 'not_found', 'error', 'unknown',
+)
+_ACTIVE = (PENDING, RUNNING)
+
+SCHOOL_INFO_SQL = """
+    SELECT
+        cole_nombre_establecimiento,
+        cole_depto_ubicacion,
+        cole_mcpio_ubicacion,
+        cole_naturaleza,
+        cole_calendario
+    FROM gold.dim_colegios
+    WHERE colegio_sk = ?
+"""
+
+# Last 5 years up to the report year (all years when it is NULL).
+SCHOOL_HISTORY_SQL = """
+    SELECT
+        CAST(ano AS INTEGER) AS ano,
+        ROUND(avg_punt_global, 2) AS promedio_global,
+        ROUND(avg_punt_lectura_critica, 2) AS lectura,
+        ROUND(avg_punt_matematicas, 2) AS matematicas,
+        ROUND(avg_punt_sociales_ciudadanas, 2) AS sociales,
+        ROUND(avg_punt_c_naturales, 2) AS ciencias,
+        ROUND(avg_punt_ingles, 2) AS ingles,
+        total_estudiantes AS estudiantes
+    FROM gold.fct_colegio_historico
+    WHERE colegio_sk = ?
+      AND (CAST(? AS INTEGER) IS NULL OR CAST(ano AS INTEGER) <= CAST(? AS INTEGER))
+    QUALIFY ROW_NUMBER() OVER (PARTITION BY ano ORDER BY total_estudiantes DESC NULLS LAST) = 1
+    ORDER BY ano DESC
+    LIMIT 5
+"""
+
+COMPARISON_SQL = """
+    SELECT
+        c.cole_nombre_establecimiento AS nombre,
+        c.cole_depto_ubicacion AS departamento,
+        ROUND(h.avg_punt_global, 2) AS global,
+        ROUND(h.avg_punt_lectura_critica, 2) AS lectura,
+        ROUND(h.avg_punt_matematicas, 2) AS matematicas,
+        ROUND(h.avg_punt_sociales_ciudadanas, 2) AS sociales,
+        ROUND(h.avg_punt_c_naturales, 2) AS ciencias,
+        ROUND(h.avg_punt_ingles, 2) AS ingles,
+        h.total_estudiantes AS estudiantes
+    FROM gold.dim_colegios c
+    LEFT JOIN gold.fct_colegio_historico h
+        ON h.colegio_sk = c.colegio_sk
+        AND CAST(h.ano AS INTEGER) = ?
+    WHERE c.colegio_sk IN ({placeholders})
+    QUALIFY ROW_NUMBER() OVER (
+        PARTITION BY c.colegio_sk ORDER BY h.total_estudiantes DESC NULLS LAST
+    ) = 1
+    ORDER BY global DESC NULLS LAST, nombre
+"""
+
+
+# =============================================================================
+# CACHE / JOB STATE
+# =============================================================================
+
+def report_id(kind, params):
+    """Stable id of a report for the loaded dataset: hash(kind, params, version)."""
+    dataset = get_dataset_version()
+    version = dataset.version if dataset else 'none'
+    raw = json.dumps([kind, version, params], sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:20]
+
+
+def _report_key(rid):
+    return f'pdf-report:{rid}'
+
+
+def _job_key(rid):
+    return f'pdf-job:{rid}'
+
+
+def get_report(rid):
+    """(filename, pdf bytes) or None."""
+    return cache.get(_report_key(rid))
+
+
+def store_report(rid, filename, content):
+    cache.set(_report_key(rid), (filename, content), REPORT_CACHE_TTL)
+    cache.delete(_job_key(rid))
+
+
+def set_job_status(rid, status, error=None):
+    state = {'status': status}
+    if error:
+        state['error'] = error
+    cache.set(_job_key(rid), state, JOB_TTL)
+
+
+def job_status(rid):
+    """{'status': ..., ['error': ...]}; 'ready' when the PDF is cached."""
+    if cache.get(_report_key(rid)) is not None:
+        return {'status': READY}
+    return cache.get(_job_key(rid)) or {'status': UNKNOWN}
+
+
+def claim_job(rid):
+    """
+    Mark the report as pending. False if it is already queued or running
+    (so concurrent clicks enqueue a single task). Finished jobs in error can
+    be claimed again.
+    """
+    state = cache.get(_job_key(rid))
+    if state and state['status'] in _ACTIVE:
+        return False
+    if state:
+        cache.delete(_job_key(rid))
+    return cache.add(_job_key(rid), {'status': PENDING}, JOB_TTL)
+
+
+def release_job(rid):
+    cache.delete(_job_key(rid))
+
+
+# =============================================================================
+# BUILDERS
+# =============================================================================
+
+def _footer(styles):
+    footer_text = f"Generado el {datetime.now().strftime('%d/%m/%Y %H:%M')} - ICFES Analytics Platform"
+    return Paragraph(footer_text, styles['Normal'])
+
+
+def build_school_report(colegio_sk, ano=None):
+    """(filename, pdf bytes) of the school report, or None if the school does not exist."""
+    with get_duckdb_connection() as conn:
+        school = conn.execute(resolve_schema(SCHOOL_INFO_SQL), [colegio_sk]).fetchone()
+        if not school:
+            return None
+        history = conn.execute(resolve_schema(SCHOOL_HISTORY_SQL), [colegio_sk, ano, ano]).fetchall()
+
+    report_year = ano
+    if report_year is None and history:
+        report_year = history[0][0]
+
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter)
+    story = []
+    styles = getSampleStyleSheet()
+
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=18,
+        textColor=colors.HexColor('#1f77b4'),
+        spaceAfter=30,
+    )
+    story.append(Paragraph(f"Reporte: {school[0]}", title_style))
+    if report_year is not None:
+        story.append(Paragraph(f"Corte de datos: {report_year}", styles['Normal']))
+        story.append(Spacer(1, 0.15*inch))
+
+    info_data = [
+        ['Departamento:', school[1]],
+        ['Municipio:', school[2]],
+        ['Naturaleza:', school[3]],
+        ['Calendario:', school[4] or 'N/A'],
+    ]
+    info_table = Table(info_data, colWidths=[2*inch, 4*inch])
+    info_table.setStyle(TableStyle([
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 11),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+    ]))
+    story.append(info_table)
+    story.append(Spacer(1, 0.3*inch))
+
+    if history:
+        story.append(Paragraph("Desempeño Histórico", styles['Heading2']))
+        story.append(Spacer(1, 0.2*inch))
+
+        history_data = [['Año', 'Global', 'Lectura', 'Matemáticas', 'Sociales', 'Ciencias', 'Inglés', 'Estudiantes']]
+        history_data.extend(list(row) for row in history)
+
+        history_table = Table(history_data, colWidths=[0.7*inch] * 8)
+        history_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ]))
+        story.append(history_table)
+
+    story.append(Spacer(1, 0.5*inch))
+    story.append(_footer(styles))
+    doc.build(story)
+
+    return f"reporte_{colegio_sk}.pdf", buffer.getvalue()
+
+
+def build_comparison_report(colegios, ano):
+    """(filename, pdf bytes) comparing `colegios` (colegio_sk list) in year `ano`."""
+    placeholders = ','.join('?' for _ in colegios)
+    with get_duckdb_connection() as conn:
+        results = conn.execute(
+            resolve_schema(COMPARISON_SQL.format(placeholders=placeholders)),
+            [ano] + list(colegios),
+        ).fetchall()
+
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter)
+    story = []
+    styles = getSampleStyleSheet()
+
+    story.append(Paragraph(f"Comparación de Colegios - {ano}", styles['Heading1']))
+    story.append(Spacer(1, 0.3*inch))
+
+    table_data = [['Colegio', 'Depto', 'Global', 'Lectura', 'Matemáticas', 'Sociales', 'Ciencias', 'Inglés', 'Est.']]
+    table_data.extend(list(row) for row in results)
+
+    comparison_table = Table(table_data, colWidths=[2*inch, 1*inch, 0.6*inch, 0.6*inch, 0.8*inch, 0.6*inch, 0.6*inch, 0.6*inch, 0.5*inch])
+    comparison_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1f77b4')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 9),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('FONTSIZE', (0, 1), (-1, -1), 8),
+    ]))
+    story.append(comparison_table)
+
+    story.append(Spacer(1, 0.5*inch))
+    story.append(_footer(styles))
+    doc.build(story)
+
+    return f"comparacion_{ano}.pdf", buffer.getvalue()
+
+
+BUILDERS = {
+    'school': build_school_report,
+    'comparison': build_comparison_report,
+}
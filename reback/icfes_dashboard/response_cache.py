@@ -0,0 +1,372 @@
+"""
+Compressed response cache for public pages, JSON APIs and PNG cards.
+
+Instead of pickling whole HttpResponse objects into Redis (uncompressed body,
+every header, cookies) each entry is a small dict: status, content type, a few
+headers and the body already compressed once with gzip and brotli. Hits are
+served with the best Content-Encoding the client accepts, so GZipMiddleware
+skips them (it never recompresses a response that already has a
+Content-Encoding header).
+
+Entries can be tagged with what they depend on (school, department,
+municipality; the dataset version is always recorded) so a single school or
+geography can be purged without flushing Redis or waiting out 7-day TTLs.
+Tags use per-tag version tokens: purging bumps the token, and entries stored
+under an older token are treated as misses. The same tags are emitted as
+Surrogate-Key / Cache-Tag headers for the edge.
+"""
+import gzip
+import hashlib
+import hmac
+import json
+import logging
+import time
+import urllib.request
+import uuid
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import patch_response_headers, patch_vary_headers
+from django.utils.text import slugify
+from django.utils.translation import get_language
+
+from .db_utils import get_duckdb_connection, peek_dataset_version, resolve_schema
+
+try:
+    import brotli
+except ImportError:  # brotli only ships with requirements/production.txt
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+ENTRY_VERSION = 2
+GZIP_LEVEL = 9       # paid once at store time, never per hit
+BROTLI_QUALITY = 11
+MIN_COMPRESS_BYTES = 200  # same floor as django.middleware.gzip
+
+_COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/xml",
+    "application/javascript",
+    "image/svg+xml",
+)
+
+# Headers worth replaying on a hit. Everything else (Set-Cookie, Vary,
+# Content-Length, Content-Encoding) is either per-request or recomputed.
+_REPLAY_HEADERS = (
+    "Cache-Control",
+    "Content-Disposition",
+    "Content-Language",
+    "Expires",
+    "Last-Modified",
+    "X-Email-Graph",
+    "X-Social-Card",
+)
+
+
+def is_cache_warm_request(request):
+    """True for requests sent by manage.py warm_cache with the shared token."""
+    token = getattr(settings, "CACHE_WARM_TOKEN", "")
+    sent = request.META.get("HTTP_X_CACHE_WARM", "")
+    return bool(token and sent) and hmac.compare_digest(sent, token)
+
+
+def _is_compressible(content_type):
+    ctype = (content_type or "").split(";", 1)[0].strip().lower()
+    return ctype.startswith(_COMPRESSIBLE_TYPES)
+
+
+def _accepted_encodings(request):
+    header = request.META.get("HTTP_ACCEPT_ENCODING", "") or ""
+    accepted = set()
+    for part in header.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        if params.replace(" ", "").lower() in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(token)
+    return accepted
+
+
+# ── Tags ─────────────────────────────────────────────────────────────────────
+
+_TAG_KEY_PREFIX = "resp:tag:"
+_INITIAL_TAG_TOKEN = "0"
+
+
+def school_tag(codigo_dane):
+    return f"colegio:{codigo_dane}"
+
+
+def school_slug_tag(slug):
+    return f"slug:{slug}"
+
+
+def departamento_tag(departamento):
+    return f"depto:{slugify(departamento)}"
+
+
+def municipio_tag(departamento, municipio):
+    return f"muni:{slugify(departamento)}:{slugify(municipio)}"
+
+
+def dataset_tag(version):
+    return f"dataset:{version}"
+
+
+def geo_cache_tags(departamento=None, municipio=None):
+    tags = []
+    if departamento:
+        tags.append(departamento_tag(departamento))
+        if municipio:
+            tags.append(municipio_tag(departamento, municipio))
+    return tags
+
+
+def school_cache_tags(codigo_dane=None, departamento=None, municipio=None, slug=None):
+    tags = []
+    if codigo_dane:
+        tags.append(school_tag(codigo_dane))
+    if slug:
+        tags.append(school_slug_tag(slug))
+    return tags + geo_cache_tags(departamento, municipio)
+
+
+def tags_for_school(codigo_dane, cascade=False):
+    """
+    Tags for one school: its codigo_dane and every slug it is served under.
+    With cascade=True also its department and municipality pages (they list
+    the school).
+    """
+    with get_duckdb_connection() as conn:
+        rows = conn.execute(
+            resolve_schema("""
+                SELECT slug, departamento, municipio
+                FROM gold.dim_colegios_slugs
+                WHERE codigo = ?
+            """),
+            [str(codigo_dane)],
+        ).fetchall()
+    tags = [school_tag(codigo_dane)]
+    for slug, departamento, municipio in rows:
+        tags.append(school_slug_tag(slug))
+        if cascade:
+            tags.extend(geo_cache_tags(departamento, municipio))
+    return list(dict.fromkeys(tags))
+
+
+def add_cache_tags(request, *tags):
+    """Declare what the response being built depends on (read at store time)."""
+    current = getattr(request, "_cache_tags", None)
+    if current is None:
+        current = request._cache_tags = []
+    for tag in tags:
+        if tag and tag not in current:
+            current.append(tag)
+
+
+def _tag_tokens(tags):
+    if not tags:
+        return {}
+    found = cache.get_many([_TAG_KEY_PREFIX + tag for tag in tags])
+    return {tag: found.get(_TAG_KEY_PREFIX + tag, _INITIAL_TAG_TOKEN) for tag in tags}
+
+
+def tag_tokens(tags):
+    """{tag: current token}; one get_many, none for an empty list."""
+    return _tag_tokens(list(tags))
+
+
+def token_purged_at(token):
+    """Unix time of the purge that produced `token` ("<ts>-<random>"); 0 if never purged."""
+    head, sep, _ = str(token).partition("-")
+    return int(head) if sep and head.isdigit() else 0
+
+
+def _entry_is_fresh(entry):
+    dataset = peek_dataset_version()
+    if dataset is not None and entry.get("dataset") not in (None, dataset.version):
+        return False
+    tags = entry.get("tags")
+    return not tags or _tag_tokens(list(tags)) == tags
+
+
+def purge_edge_tags(tags):
+    """
+    Ask the edge to drop objects carrying these surrogate keys.
+
+    EDGE_PURGE_URL receives {"tags": [...]} (Cloudflare purge_cache format)
+    with EDGE_PURGE_TOKEN as bearer token. No-op when not configured.
+    """
+    url = getattr(settings, "EDGE_PURGE_URL", "")
+    if not url or not tags:
+        return False
+    req = urllib.request.Request(
+        url,
+        data=json.dumps({"tags": list(tags)}).encode("utf-8"),
+        headers={
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {getattr(settings, 'EDGE_PURGE_TOKEN', '')}",
+        },
+        method="POST",
+    )
+    try:
+        with urllib.request.urlopen(req, timeout=10) as resp:
+            return 200 <= resp.status < 300
+    except Exception as exc:
+        logger.warning("Edge purge failed for %s: %s", tags, exc)
+        return False
+
+
+def purge_cache_tags(tags, edge=True):
+    """
+    Invalidate every cached entry tagged with any of `tags`.
+
+    Returns {"tags": [...], "edge": bool}. Entries themselves are left to
+    expire; they are ignored from now on because their token is stale.
+    """
+    tags = [t for t in dict.fromkeys(tags) if t]
+    if tags:
+        # The purge time travels in the token: conditional GET derives the
+        # Last-Modified of a tagged page from its own tags only.
+        token = f"{int(time.time())}-{uuid.uuid4().hex[:8]}"
+        cache.set_many({_TAG_KEY_PREFIX + tag: token for tag in tags}, timeout=None)
+        logger.info("Purged cache tags: %s", ", ".join(tags))
+    return {"tags": tags, "edge": purge_edge_tags(tags) if edge else False}
+
+
+# ── Entries ──────────────────────────────────────────────────────────────────
+
+def build_entry(response, tags=None):
+    """Turn a rendered 200 response into a compact, picklable cache entry."""
+    body = response.content
+    content_type = response.get("Content-Type", "")
+    dataset = peek_dataset_version()
+    tags = list(tags or ())
+    if dataset is not None:
+        tags.append(dataset_tag(dataset.version))
+    entry = {
+        "v": ENTRY_VERSION,
+        "status": response.status_code,
+        "content_type": content_type,
+        "headers": [(h, response[h]) for h in _REPLAY_HEADERS if response.has_header(h)],
+        "size": len(body),
+        "dataset": dataset.version if dataset else None,
+        "tags": _tag_tokens(tags),
+    }
+    if len(body) >= MIN_COMPRESS_BYTES and _is_compressible(content_type):
+        entry["gzip"] = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+        if brotli is not None:
+            entry["br"] = brotli.compress(body, quality=BROTLI_QUALITY)
+    else:
+        # Tiny bodies and already-compressed formats (PNG) are kept as-is.
+        entry["identity"] = body
+    return entry
+
+
+def response_from_entry(request, entry):
+    """Build an HttpResponse from a cache entry honouring Accept-Encoding."""
+    accepted = _accepted_encodings(request)
+    encoding = None
+    if "identity" in entry:
+        body = entry["identity"]
+    elif entry.get("br") is not None and "br" in accepted:
+        body, encoding = entry["br"], "br"
+    elif "gzip" in accepted or "*" in accepted:
+        body, encoding = entry["gzip"], "gzip"
+    else:
+        body = gzip.decompress(entry["gzip"])
+
+    response = HttpResponse(body, status=entry["status"], content_type=entry["content_type"])
+    for header, value in entry["headers"]:
+        response[header] = value
+    if encoding:
+        response["Content-Encoding"] = encoding
+    if "identity" not in entry:
+        patch_vary_headers(response, ("Accept-Encoding",))
+    _set_surrogate_headers(response, entry)
+    # Tokens the entry was validated against, for conditional_get's ETag
+    response.cache_tag_tokens = dict(entry.get("tags") or {})
+    return response
+
+
+def _set_surrogate_headers(response, entry):
+    tags = list(entry.get("tags") or ())
+    if tags:
+        response["Surrogate-Key"] = " ".join(tags)   # Fastly-style
+        response["Cache-Tag"] = ",".join(tags)       # Cloudflare-style
+
+
+def response_cache_key(prefix, request):
+    """Key on absolute URL + language, like django's cache_page does."""
+    url = request.build_absolute_uri()
+    digest = hashlib.md5(url.encode("utf-8"), usedforsecurity=False).hexdigest()
+    return f"resp:{prefix}:{digest}:{get_language() or ''}"
+
+
+def get_cached_response(request, key):
+    entry = cache.get(key)
+    if not isinstance(entry, dict) or entry.get("v") != ENTRY_VERSION:
+        return None
+    if not _entry_is_fresh(entry):
+        return None
+    return response_from_entry(request, entry)
+
+
+def store_response(request, key, response, timeout):
+    """
+    Store `response` and return the response that should go to the client.
+
+    On a cacheable response the returned object is rebuilt from the entry, so
+    the MISS path is also served pre-compressed.
+    """
+    if (
+        response.status_code != 200
+        or response.streaming
+        or response.has_header("Content-Encoding")
+        or response.has_header("Vary")
+        or response.cookies
+        or "private" in response.get("Cache-Control", "")
+    ):
+        return response
+    entry = build_entry(response, tags=getattr(request, "_cache_tags", None))
+    cache.set(key, entry, timeout=timeout)
+    return response_from_entry(request, entry)
+
+
+def compressed_cache_page(timeout, key_prefix="default"):
+    """
+    Drop-in replacement for django's @cache_page that stores compressed
+    entries instead of pickled HttpResponse objects.
+    """
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrapped(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                request._cache_status = "BYPASS"
+                return view_func(request, *args, **kwargs)
+
+            key = response_cache_key(key_prefix, request)
+            cached = get_cached_response(request, key)
+            if cached is not None:
+                request._cache_status = "HIT"
+                return cached
+
+            response = view_func(request, *args, **kwargs)
+            if hasattr(response, "render") and callable(response.render):
+                response = response.render()
+            if response.status_code == 200 and not response.streaming:
+                patch_response_headers(response, timeout)
+            served = store_response(request, key, response, timeout)
+            request._cache_status = "MISS" if served is not response else "BYPASS"
+            return served
+
+        return _wrapped
+
+    return decorator
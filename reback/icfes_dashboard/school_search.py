@@ -0,0 +1,317 @@
+"""
+In-process school search index for the autocomplete endpoints.
+
+Built once per dataset version from dim_colegios + the latest
+fct_colegio_historico row + dim_colegios_slugs (~20k schools, a few MB).
+Replaces `nombre_colegio ILIKE '%q%'` full scans on every keystroke.
+
+- Accent/case/punctuation folding: "Bogota" == "Bogotá", "I.E." == "IE".
+- Abbreviations expanded on both sides: "I.E." -> "institucion educativa".
+- Token postings (frozensets, intersected in C) for exact/prefix matches; the
+  last token is a prefix while the user types.
+- Typo fallback: trigrams over the token vocabulary ("esperansa" -> "esperanza").
+- Doc ids are assigned by school size, so broad queries keep the lowest
+  ids (biggest schools) as candidates without sorting everything.
+"""
+import heapq
+import logging
+import math
+import re
+import threading
+import unicodedata
+from bisect import bisect_left
+from collections import Counter
+
+from .db_utils import get_dataset_version, get_duckdb_connection, resolve_schema
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LIMIT = 20
+_MAX_CANDIDATES = 200      # broad queries ("colegio") keep the biggest schools only
+_MAX_PREFIX_TOKENS = 200   # cap on tokens a trailing prefix can expand to
+
+_ABBREVIATIONS = {
+    "ie": "institucion educativa",
+    "iet": "institucion educativa tecnica",
+    "ier": "institucion educativa rural",
+    "ied": "institucion educativa distrital",
+    "iem": "institucion educativa municipal",
+    "ce": "centro educativo",
+    "cer": "centro educativo rural",
+    "ens": "escuela normal superior",
+    "col": "colegio",
+    "inst": "institucion",
+    "tec": "tecnico",
+    "nal": "nacional",
+    "dptal": "departamental",
+    "sta": "santa",
+    "sto": "santo",
+    "ntra": "nuestra",
+    "sra": "senora",
+}
+_STOPWORDS = frozenset({"de", "del", "la", "el", "los", "las", "y", "en"})
+_DOTTED_ABBR_RE = re.compile(r"\b(?:[a-z]\.){2,}")
+_NON_ALNUM_RE = re.compile(r"[^a-z0-9]+")
+
+
+def normalize(text):
+    """Fold accents/case/punctuation and expand abbreviations → list of tokens."""
+    if not text:
+        return []
+    text = unicodedata.normalize("NFD", str(text).lower())
+    text = "".join(ch for ch in text if unicodedata.category(ch) != "Mn")
+    text = _DOTTED_ABBR_RE.sub(lambda m: m.group(0).replace(".", "") + " ", text)
+    tokens = []
+    for token in _NON_ALNUM_RE.sub(" ", text).split():
+        tokens.extend(_ABBREVIATIONS.get(token, token).split())
+    return [t for t in tokens if t not in _STOPWORDS]
+
+
+def _trigrams(tokens):
+    grams = set()
+    for token in tokens:
+        padded = f" {token} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class SchoolSearchIndex:
+    """
+    rows: iterables of
+    (codigo_dane, nombre, nombre_historico, departamento, municipio, sector,
+     colegio_sk, total_estudiantes, slug)
+    """
+
+    def __init__(self, rows):
+        rows = sorted(rows, key=lambda r: -(r[7] or 0))   # doc id == size rank
+        self.docs = []
+        self.names = []
+        self.static_scores = []
+        postings = {}
+
+        for doc_id, row in enumerate(rows):
+            codigo, nombre, nombre_hist, departamento, municipio, sector, colegio_sk, estudiantes, slug = row
+            self.docs.append({
+                "codigo_dane": str(codigo) if codigo is not None else "",
+                "nombre_colegio": nombre or nombre_hist or "",
+                "nombre_historico": nombre_hist or nombre or "",
+                "departamento": departamento or "",
+                "municipio": municipio or "",
+                "sector": sector or "",
+                "colegio_sk": colegio_sk,
+                "total_estudiantes": int(estudiantes or 0),
+                "slug": slug or "",
+            })
+            name_tokens = normalize(nombre or nombre_hist)
+            # Both spellings (dim "Institución Educativa" / fct "I.E.") are searchable;
+            # municipality lets "san jose medellin" work.
+            tokens = set(name_tokens) | set(normalize(nombre_hist)) | set(normalize(municipio))
+            self.names.append(" ".join(name_tokens))
+            self.static_scores.append(math.log1p(estudiantes or 0) / 10)
+            for token in tokens:
+                postings.setdefault(token, []).append(doc_id)
+
+        self.postings = {t: frozenset(ids) for t, ids in postings.items()}
+        self.sorted_tokens = sorted(self.postings)
+        self.vocab_trigrams = {}
+        for token in self.sorted_tokens:
+            for gram in _trigrams([token]):
+                self.vocab_trigrams.setdefault(gram, []).append(token)
+        self.codes = sorted((doc["codigo_dane"], doc_id) for doc_id, doc in enumerate(self.docs) if doc["codigo_dane"])
+        # Size tiers: broad matches are cut to the biggest schools without sorting everything.
+        n = len(self.docs)
+        self._tiers = [frozenset(range(size)) for size in (1000, 4000, 16000) if size < n]
+        self._prefix_cache = {}
+
+    def __len__(self):
+        return len(self.docs)
+
+    # ── Candidate generation ────────────────────────────────────────────────
+
+    def _prefix_tokens(self, prefix):
+        start = bisect_left(self.sorted_tokens, prefix)
+        out = []
+        for token in self.sorted_tokens[start:start + _MAX_PREFIX_TOKENS]:
+            if not token.startswith(prefix):
+                break
+            out.append(token)
+        return out
+
+    def _prefix_set(self, prefix):
+        cached = self._prefix_cache.get(prefix)
+        if cached is not None:
+            return cached
+        tokens = self._prefix_tokens(prefix)
+        if len(tokens) == 1:
+            ids = self.postings[tokens[0]]
+        else:
+            ids = frozenset().union(*(self.postings[t] for t in tokens))
+        if len(prefix) <= 3:   # "colegio s…": short prefixes are few and expensive to union
+            self._prefix_cache[prefix] = ids
+        return ids
+
+    def _token_candidates(self, tokens):
+        """AND of all tokens; the last one matches as a prefix."""
+        exact = tokens[:-1]
+        if any(t not in self.postings for t in exact):
+            return []
+        # Set operations run in C; smallest set first keeps the intersection cheap.
+        sets = sorted([self._prefix_set(tokens[-1]), *(self.postings[t] for t in exact)], key=len)
+        # Broad query: intersect within the biggest schools only, starting at the
+        # first tier expected to hold enough matches. Name tokens are correlated
+        # ("institucion educativa"), so the estimate sits between independence
+        # and full overlap.
+        n = len(self.docs)
+        independent = math.prod(len(s) / n for s in sets)
+        density = math.sqrt(independent * len(sets[0]) / n)
+        for tier in self._tiers:
+            if len(tier) * density >= 2 * _MAX_CANDIDATES:
+                ids = tier.intersection(*sets)
+                if len(ids) >= _MAX_CANDIDATES:
+                    return sorted(ids)[:_MAX_CANDIDATES]
+        ids = sets[0].intersection(*sets[1:])
+        return sorted(ids)[:_MAX_CANDIDATES]   # smallest id == biggest school
+
+    def _correct(self, tokens):
+        """Replace unknown tokens with the closest vocabulary token (trigram Dice >= 0.5)."""
+        fixed = []
+        for i, token in enumerate(tokens):
+            is_last = i == len(tokens) - 1
+            if token in self.postings or (is_last and self._prefix_tokens(token)):
+                fixed.append(token)
+                continue
+            grams = _trigrams([token])
+            shared = Counter()
+            for gram in grams:
+                shared.update(self.vocab_trigrams.get(gram, ()))
+            best, best_score = None, 0.5
+            for candidate, n in shared.items():
+                score = 2 * n / (len(grams) + len(candidate))   # a token has len(token) trigrams
+                if score > best_score or (
+                    score == best_score and best and len(self.postings[candidate]) > len(self.postings[best])
+                ):
+                    best, best_score = candidate, score
+            if best:
+                fixed.append(best)
+        return fixed
+
+    def _code_candidates(self, digits):
+        start = bisect_left(self.codes, (digits, -1))
+        out = []
+        for code, doc_id in self.codes[start:start + _MAX_CANDIDATES]:
+            if not code.startswith(digits):
+                break
+            out.append(doc_id)
+        return out
+
+    # ── Public API ──────────────────────────────────────────────────────────
+
+    def search(self, query, limit=DEFAULT_LIMIT, with_results=False):
+        """
+        Top `limit` docs for `query`. with_results=True skips schools that have
+        no fct_colegio_historico row (no colegio_sk for the dashboard).
+        """
+        query = (query or "").strip()
+        if query.isdigit():
+            ids = self._code_candidates(query)
+            if with_results:
+                ids = [i for i in ids if self.docs[i]["colegio_sk"] is not None]
+            return [self.docs[i] for i in sorted(ids)[:limit]]
+
+        tokens = normalize(query)
+        if not tokens:
+            return []
+        candidates = self._token_candidates(tokens)
+        if not candidates:
+            tokens = self._correct(tokens)
+            candidates = self._token_candidates(tokens) if tokens else []
+        if with_results:
+            candidates = [i for i in candidates if self.docs[i]["colegio_sk"] is not None]
+
+        # Every candidate contains all tokens; rank by phrase position, then size.
+        phrase = " ".join(tokens)
+
+        def score(doc_id):
+            name = self.names[doc_id]
+            prefix = 2.0 if name.startswith(phrase) else (1.0 if phrase in name else 0.0)
+            return prefix + self.static_scores[doc_id]
+
+        best = heapq.nlargest(limit, candidates, key=lambda i: (score(i), -i))
+        return [self.docs[i] for i in best]
+
+
+_INDEX_SQL = """
+    WITH latest AS (
+        SELECT
+            CAST(codigo_dane AS VARCHAR) AS codigo_dane,
+            colegio_sk,
+            nombre_colegio,
+            departamento,
+            municipio,
+            sector,
+            total_estudiantes
+        FROM gold.fct_colegio_historico
+        QUALIFY ROW_NUMBER() OVER (
+            PARTITION BY codigo_dane ORDER BY CAST(ano AS INTEGER) DESC
+        ) = 1
+    ),
+    dim AS (
+        SELECT
+            CAST(colegio_bk AS VARCHAR) AS codigo_dane,
+            ANY_VALUE(nombre_colegio) AS nombre_colegio,
+            ANY_VALUE(departamento)   AS departamento,
+            ANY_VALUE(municipio)      AS municipio,
+            ANY_VALUE(sector)         AS sector
+        FROM gold.dim_colegios
+        WHERE nombre_colegio IS NOT NULL
+          AND COALESCE(sector, '') != 'SINTETICO'
+        GROUP BY 1
+    ),
+    slugs AS (
+        SELECT CAST(codigo AS VARCHAR) AS codigo_dane, MIN(slug) AS slug
+        FROM gold.dim_colegios_slugs
+        GROUP BY 1
+    )
+    SELECT
+        COALESCE(d.codigo_dane, l.codigo_dane)    AS codigo_dane,
+        d.nombre_colegio,
+        l.nombre_colegio                          AS nombre_historico,
+        COALESCE(d.departamento, l.departamento)  AS departamento,
+        COALESCE(d.municipio, l.municipio)        AS municipio,
+        COALESCE(l.sector, d.sector)              AS sector,
+        l.colegio_sk,
+        l.total_estudiantes,
+        s.slug
+    FROM dim d
+    FULL OUTER JOIN latest l ON l.codigo_dane = d.codigo_dane
+    LEFT JOIN slugs s ON s.codigo_dane = COALESCE(d.codigo_dane, l.codigo_dane)
+"""
+
+_index_lock = threading.Lock()
+_index = None
+_index_version = None
+
+
+def build_index():
+    with get_duckdb_connection() as conn:
+        rows = conn.execute(resolve_schema(_INDEX_SQL)).fetchall()
+    return SchoolSearchIndex(rows)
+
+
+def get_index():
+    """Return the process-wide index, (re)building it when the dataset version changes."""
+    global _index, _index_version
+    dataset = get_dataset_version()
+    version = dataset.version if dataset else None
+    if _index is not None and _index_version == version:
+        return _index
+    with _index_lock:
+        if _index is None or _index_version != version:
+            index = build_index()
+            _index, _index_version = index, version
+            logger.info("School search index built: %s schools (dataset=%s)", len(index), version)
+    return _index
+
+
+def search_schools(query, limit=DEFAULT_LIMIT, with_results=False):
+    return get_index().search(query, limit=limit, with_results=with_results)
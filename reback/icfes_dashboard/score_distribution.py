@@ -0,0 +1,215 @@
+"""
+Rank / percentile service over precomputed score distributions.
+
+Built once per dataset version (like school_search / gazetteer) from every
+fct_colegio_historico row: for each (subject, scope) one float array holding
+the school scores sorted by (year, scope key, score), plus the slice of each
+(year, key). "Rank and percentile of score X in scope Y" is a binary search
+on that slice — no SQL window, no sorting per request — so it also answers
+hypothetical scores ("what if my school scored 290?").
+
+Scopes: nacional, departamento, municipio (keyed by department + municipality)
+and sector. Department/municipality keys go through gazetteer.geo_key and
+sector keys through gazetteer.fold (plus the ranking URL slugs), so any
+spelling or slug works: 'no-oficial', 'no_oficial' and 'privados' all key
+'NO OFICIAL'.
+
+Semantics match landing_utils.calculate_ranking / RANK() OVER (ORDER BY score
+DESC): rank = 1 + schools strictly above X; percentile = % of schools at or
+below X.
+"""
+import logging
+import threading
+from bisect import bisect_right
+from collections import namedtuple
+
+import numpy as np
+
+from .db_utils import get_dataset_version, get_duckdb_connection, resolve_schema
+from .gazetteer import fold, geo_key
+
+logger = logging.getLogger(__name__)
+
+Ranking = namedtuple("Ranking", ["rank", "total", "percentile"])
+
+# Public subject name → fct_colegio_historico column
+SUBJECTS = {
+    "global": "avg_punt_global",
+    "matematicas": "avg_punt_matematicas",
+    "lectura": "avg_punt_lectura_critica",
+    "naturales": "avg_punt_c_naturales",
+    "sociales": "avg_punt_sociales_ciudadanas",
+    "ingles": "avg_punt_ingles",
+}
+SCOPES = ("nacional", "departamento", "municipio", "sector")
+
+# Sector slugs of the ranking pages (/icfes/ranking/sector/<slug>/) → sector key
+_SECTOR_ALIASES = {
+    "OFICIALES": "OFICIAL",
+    "PRIVADO": "NO OFICIAL",
+    "PRIVADOS": "NO OFICIAL",
+}
+
+
+def sector_key(sector):
+    """Canonical sector key: 'no-oficial' → 'NO OFICIAL'."""
+    folded = fold(sector)
+    return _SECTOR_ALIASES.get(folded, folded)
+
+
+def _scope_key(scope, departamento=None, municipio=None, sector=None):
+    if scope == "nacional":
+        return ""
+    if scope == "departamento":
+        return geo_key(departamento) if departamento else None
+    if scope == "municipio":
+        if not departamento or not municipio:
+            return None
+        return f"{geo_key(departamento)}|{geo_key(municipio, 'municipio')}"
+    if scope == "sector":
+        return sector_key(sector) if sector else None
+    raise ValueError(f"unknown scope: {scope}")
+
+
+def _key_ids(scope, rows):
+    """(key id per row, key names); id -1 when the row has no key for this scope."""
+    ids, names, positions, seen = [], [], {}, {}
+    for _, sector, departamento, municipio, *_ in rows:
+        raw = (sector, departamento, municipio)
+        key_id = seen.get(raw)
+        if key_id is None:
+            key = _scope_key(scope, departamento=departamento, municipio=municipio, sector=sector)
+            if key is None:
+                key_id = -1
+            else:
+                key_id = positions.setdefault(key, len(names))
+                if key_id == len(names):
+                    names.append(key)
+            seen[raw] = key_id
+        ids.append(key_id)
+    return np.array(ids, dtype=np.int64), names
+
+
+class ScoreDistributions:
+    """
+    rows: (ano, sector, departamento, municipio, *scores) with scores in
+    SUBJECTS order; NULL / non-positive scores are left out of that subject.
+    """
+
+    def __init__(self, rows):
+        rows = list(rows)
+        self.years = sorted({int(r[0]) for r in rows})
+        years = np.array([int(r[0]) for r in rows], dtype=np.int32)
+        scores = np.array(
+            [[np.nan if v is None else float(v) for v in r[4:]] for r in rows], dtype=np.float64,
+        ).reshape(len(rows), len(SUBJECTS))
+        keys, key_names = {}, {}
+        for scope in SCOPES:
+            keys[scope], key_names[scope] = _key_ids(scope, rows)
+        self.sectors = sorted(key_names["sector"])
+
+        self._scores = {}    # (scope, subject) → sorted float array
+        self._slices = {}    # (scope, subject) → {(year, key): (start, stop)}
+        for column, subject in enumerate(SUBJECTS):
+            valid = np.isfinite(scores[:, column]) & (scores[:, column] > 0)
+            for scope in SCOPES:
+                ok = valid & (keys[scope] >= 0)
+                key_ids = keys[scope][ok]
+                sub_years = years[ok]
+                sub_scores = scores[ok, column]
+                order = np.lexsort((sub_scores, key_ids, sub_years))
+                sub_years, key_ids, sub_scores = sub_years[order], key_ids[order], sub_scores[order]
+                # Group boundaries: wherever (year, key) changes.
+                change = np.flatnonzero((np.diff(sub_years) != 0) | (np.diff(key_ids) != 0)) + 1
+                starts = np.concatenate(([0], change)) if len(sub_scores) else np.array([], dtype=int)
+                stops = np.concatenate((change, [len(sub_scores)])) if len(sub_scores) else starts
+                names = key_names[scope]
+                self._scores[(scope, subject)] = sub_scores
+                self._slices[(scope, subject)] = {
+                    (int(sub_years[s]), names[key_ids[s]]): (int(s), int(e))
+                    for s, e in zip(starts, stops)
+                }
+
+    @property
+    def latest_year(self):
+        return self.years[-1] if self.years else None
+
+    def distribution(self, ano, subject="global", scope="nacional", key=""):
+        """Sorted scores of one (year, subject, scope, key) as a read-only view, or None."""
+        bounds = self._slices.get((scope, subject), {}).get((int(ano), key))
+        if bounds is None:
+            return None
+        return self._scores[(scope, subject)][bounds[0]:bounds[1]]
+
+    def rank(self, score, ano, subject="global", scope="nacional", key=""):
+        """Ranking(rank, total, percentile) of `score` in one scope, or None."""
+        bounds = self._slices.get((scope, subject), {}).get((int(ano), key))
+        if bounds is None:
+            return None
+        start, stop = bounds
+        total = stop - start
+        at_or_below = bisect_right(self._scores[(scope, subject)], float(score), start, stop) - start
+        return Ranking(total - at_or_below + 1, total, round(100.0 * at_or_below / total, 1))
+
+    def ranks(self, score, ano, subject="global", departamento=None, municipio=None, sector=None):
+        """{scope: Ranking} for every scope the arguments allow (nacional always)."""
+        out = {}
+        for scope in SCOPES:
+            key = _scope_key(scope, departamento=departamento, municipio=municipio, sector=sector)
+            if key is None:
+                continue
+            ranking = self.rank(score, ano, subject, scope, key)
+            if ranking is not None:
+                out[scope] = ranking
+        return out
+
+
+_INDEX_SQL = f"""
+    SELECT
+        CAST(ano AS INTEGER) AS ano,
+        sector,
+        departamento,
+        municipio,
+        {", ".join(SUBJECTS.values())}
+    FROM gold.fct_colegio_historico
+    WHERE avg_punt_global IS NOT NULL
+"""
+
+_lock = threading.Lock()
+_distributions = None
+_distributions_version = None
+
+
+def build_distributions():
+    with get_duckdb_connection() as conn:
+        rows = conn.execute(resolve_schema(_INDEX_SQL)).fetchall()
+    return ScoreDistributions(rows)
+
+
+def get_distributions():
+    """Return the process-wide distributions, rebuilding them when the dataset version changes."""
+    global _distributions, _distributions_version
+    dataset = get_dataset_version()
+    version = dataset.version if dataset else None
+    if _distributions is not None and _distributions_version == version:
+        return _distributions
+    with _lock:
+        if _distributions is None or _distributions_version != version:
+            distributions = build_distributions()
+            _distributions, _distributions_version = distributions, version
+            logger.info(
+                "Score distributions built: years %s, %s municipio slices (dataset=%s)",
+                distributions.years, len(distributions._slices[("municipio", "global")]), version,
+            )
+    return _distributions
+
+
+def rank_score(score, ano=None, subject="global", departamento=None, municipio=None, sector=None):
+    """{scope: Ranking} for a real or hypothetical score; ano defaults to the latest year."""
+    distributions = get_distributions()
+    ano = ano or distributions.latest_year
+    if ano is None:
+        return {}
+    return distributions.ranks(
+        score, ano, subject, departamento=departamento, municipio=municipio, sector=sector,
+    )
@@ -1,4 +1,5 @@
 import math
+from collections import namedtuple
 from datetime import datetime, timezone
 from urllib.parse import urlparse, urlunparse
 from xml.sax.saxutils import escape
@@ -7,12 +8,21 @@ from django.conf import settings
 from django.http import HttpResponse
 from django.utils.text import slugify
 
-from .db_utils import get_duckdb_connection, resolve_schema
-from .views_potencial import DEPT_NAME_CANONICAL
+from .db_utils import get_dataset_version, get_duckdb_connection, resolve_schema
+from .gazetteer import canonical_departamento
+from .leaderboards import get_leaderboards
+from .slug_resolver import get_index as get_slug_index
 
 
 SITEMAP_PAGE_SIZE = 40000
 
+# One <url> of a sitemap. `data` fingerprints the page content when the
+# enumeration query already has it (school pages); None = the page depends
+# on the whole dataset. Used by `manage.py ping_indexnow` to diff URLs.
+SitemapEntry = namedtuple(
+    "SitemapEntry", ["loc", "lastmod", "changefreq", "priority", "data"], defaults=(None,)
+)
+
 
 def _base_url(request):
     configured = getattr(settings, "PUBLIC_SITE_URL", "").strip()
@@ -35,29 +45,41 @@ def _format_lastmod(value):
     return datetime.now(timezone.utc).date().isoformat()
 
 
-def _dataset_lastmod_iso(conn):
-    query = """
-        SELECT MAX(fecha_carga)
-        FROM gold.fct_agg_colegios_ano
-    """
-    value = conn.execute(resolve_schema(query)).fetchone()[0]
-    return _format_lastmod(value)
+def _dataset_lastmod_iso():
+    # Computed once per loaded DuckDB file, not per sitemap request.
+    dataset = get_dataset_version()
+    return _format_lastmod(dataset.updated_at if dataset else None)
+
+
+def _today_iso():
+    return datetime.now(timezone.utc).date().isoformat()
+
+
+def _urlset(entries):
+    xml = ["<?xml version=\"1.0\" encoding=\"UTF-8\"?>"]
+    xml.append("<urlset xmlns=\"http://www.sitemaps.org/schemas/sitemap/0.9\">")
+    for entry in entries:
+        xml.append("  <url>")
+        xml.append(f"    <loc>{escape(entry.loc)}</loc>")
+        xml.append(f"    <lastmod>{entry.lastmod}</lastmod>")
+        xml.append(f"    <changefreq>{entry.changefreq}</changefreq>")
+        xml.append(f"    <priority>{entry.priority}</priority>")
+        xml.append("  </url>")
+    xml.append("</urlset>")
+    return HttpResponse("\n".join(xml), content_type="application/xml")
 
 
 def _sector_slug_rows():
     return [("OFICIAL", "oficiales"), ("NO OFICIAL", "privados")]
 
 
-def _indexable_school_count(conn):
-    """
-    Keep school sitemap aligned with school_landing_page robots logic:
-    noindex when latest total_estudiantes < 5 (thin_content).
-    """
-    query = """
+_INDEXABLE_SCHOOLS_CTE = """
         WITH latest_school AS (
             SELECT
                 h.codigo_dane,
                 h.total_estudiantes,
+                h.ano,
+                h.avg_punt_global,
                 ROW_NUMBER() OVER (
                     PARTITION BY h.codigo_dane
                     ORDER BY CAST(h.ano AS INTEGER) DESC
@@ -65,7 +87,17 @@ def _indexable_school_count(conn):
             FROM gold.fct_colegio_historico h
             WHERE h.codigo_dane IS NOT NULL
         )
-        SELECT COUNT(*)
+"""
+
+
+def _indexable_school_count(conn):
+    """
+    Keep school sitemap aligned with school_landing_page robots logic:
+    noindex when latest total_estudiantes < 5 (thin_content).
+    """
+    query = f"""
+        {_INDEXABLE_SCHOOLS_CTE}
+        SELECT COUNT(DISTINCT s.codigo)
         FROM gold.dim_colegios_slugs s
         JOIN latest_school ls
           ON ls.codigo_dane = s.codigo
@@ -115,9 +147,8 @@ def sitemap_index(request):
     return HttpResponse("\n".join(xml), content_type="application/xml")
 
 
-def sitemap_static(request):
-    base = _base_url(request)
-    lastmod = datetime.now(timezone.utc).date().isoformat()
+def _static_entries(base):
+    lastmod = _today_iso()
     # (url, changefreq, priority)
     urls = [
         (f"{base}/",                                "monthly", "1.0"),
@@ -129,42 +160,22 @@ def sitemap_static(request):
         (f"{base}/icfes/colegios-bilingues/",         "yearly",  "0.7"),
         (f"{base}/icfes/que-es-icfes-analytics/",     "yearly",  "0.8"),
     ]
-
-    xml = ["<?xml version=\"1.0\" encoding=\"UTF-8\"?>"]
-    xml.append("<urlset xmlns=\"http://www.sitemaps.org/schemas/sitemap/0.9\">")
-    for loc, changefreq, priority in urls:
-        xml.append("  <url>")
-        xml.append(f"    <loc>{escape(loc)}</loc>")
-        xml.append(f"    <lastmod>{lastmod}</lastmod>")
-        xml.append(f"    <changefreq>{changefreq}</changefreq>")
-        xml.append(f"    <priority>{priority}</priority>")
-        xml.append("  </url>")
-    xml.append("</urlset>")
-
-    return HttpResponse("\n".join(xml), content_type="application/xml")
+    return [SitemapEntry(loc, lastmod, changefreq, priority) for loc, changefreq, priority in urls]
 
 
-def sitemap_icfes(request, page):
-    if page < 1:
-        return HttpResponse(status=404)
+def sitemap_static(request):
+    return _urlset(_static_entries(_base_url(request)))
 
-    base = _base_url(request)
-    limit = SITEMAP_PAGE_SIZE
-    offset = (page - 1) * limit
 
-    query = """
-        WITH latest_school AS (
-            SELECT
-                h.codigo_dane,
-                h.total_estudiantes,
-                ROW_NUMBER() OVER (
-                    PARTITION BY h.codigo_dane
-                    ORDER BY CAST(h.ano AS INTEGER) DESC
-                ) AS rn
-            FROM gold.fct_colegio_historico h
-            WHERE h.codigo_dane IS NOT NULL
-        )
-        SELECT s.slug, s.created_at
+def _school_entries(base, limit=None, offset=0):
+    """
+    One entry per school, under its canonical slug (slug_resolver): extra
+    slugs-table rows 301 to it, and a slug shared by two schools gets the
+    codigo suffix for all but one of them.
+    """
+    query = f"""
+        {_INDEXABLE_SCHOOLS_CTE}
+        SELECT s.codigo, s.slug, s.created_at, ls.ano, ls.total_estudiantes, ls.avg_punt_global
         FROM gold.dim_colegios_slugs s
         JOIN latest_school ls
           ON ls.codigo_dane = s.codigo
@@ -172,33 +183,40 @@ def sitemap_icfes(request, page):
         WHERE s.slug IS NOT NULL
           AND s.slug != ''
           AND COALESCE(ls.total_estudiantes, 0) >= 5
-        ORDER BY s.slug
-        LIMIT ? OFFSET ?
+        QUALIFY ROW_NUMBER() OVER (PARTITION BY s.codigo ORDER BY LENGTH(s.slug), s.slug) = 1
+        ORDER BY s.slug, s.codigo
     """
+    params = []
+    if limit is not None:
+        query += " LIMIT ? OFFSET ?"
+        params = [limit, offset]
     with get_duckdb_connection() as conn:
-        rows = conn.execute(resolve_schema(query), [limit, offset]).fetchall()
+        rows = conn.execute(resolve_schema(query), params).fetchall()
+
+    index = get_slug_index()
+    return [
+        SitemapEntry(
+            f"{base}/icfes/colegio/{index.canonical_slug(codigo) or slug}/",
+            _format_lastmod(created_at), "monthly", "0.6",
+            data=[str(ano), total_estudiantes, avg_punt_global],
+        )
+        for codigo, slug, created_at, ano, total_estudiantes, avg_punt_global in rows
+    ]
 
-    if not rows:
-        return HttpResponse(status=404)
 
-    xml = ["<?xml version=\"1.0\" encoding=\"UTF-8\"?>"]
-    xml.append("<urlset xmlns=\"http://www.sitemaps.org/schemas/sitemap/0.9\">")
-    for slug, created_at in rows:
-        loc = f"{base}/icfes/colegio/{slug}/"
-        xml.append("  <url>")
-        xml.append(f"    <loc>{escape(loc)}</loc>")
-        xml.append(f"    <lastmod>{_format_lastmod(created_at)}</lastmod>")
-        xml.append("    <changefreq>monthly</changefreq>")
-        xml.append("    <priority>0.6</priority>")
-        xml.append("  </url>")
-    xml.append("</urlset>")
+def sitemap_icfes(request, page):
+    if page < 1:
+        return HttpResponse(status=404)
 
-    return HttpResponse("\n".join(xml), content_type="application/xml")
+    limit = SITEMAP_PAGE_SIZE
+    entries = _school_entries(_base_url(request), limit=limit, offset=(page - 1) * limit)
+    if not entries:
+        return HttpResponse(status=404)
+    return _urlset(entries)
 
 
-def sitemap_departamentos(request):
-    base = _base_url(request)
-    lastmod = datetime.now(timezone.utc).date().isoformat()
+def _departamento_entries(base):
+    lastmod = _today_iso()
 
     dept_query = """
         SELECT DISTINCT departamento
@@ -211,33 +229,19 @@ def sitemap_departamentos(request):
     with get_duckdb_connection() as conn:
         dept_rows = conn.execute(resolve_schema(dept_query)).fetchall()
 
-    xml = ["<?xml version=\"1.0\" encoding=\"UTF-8\"?>"]
-    xml.append("<urlset xmlns=\"http://www.sitemaps.org/schemas/sitemap/0.9\">")
-
-    xml.append("  <url>")
-    xml.append(f"    <loc>{escape(f'{base}/icfes/departamentos/')}</loc>")
-    xml.append(f"    <lastmod>{lastmod}</lastmod>")
-    xml.append("    <changefreq>weekly</changefreq>")
-    xml.append("    <priority>0.7</priority>")
-    xml.append("  </url>")
-
+    entries = [SitemapEntry(f"{base}/icfes/departamentos/", lastmod, "weekly", "0.7")]
     for (departamento,) in dept_rows:
         dept_slug = slugify(departamento)
-        loc = f"{base}/icfes/departamento/{dept_slug}/"
-        xml.append("  <url>")
-        xml.append(f"    <loc>{escape(loc)}</loc>")
-        xml.append(f"    <lastmod>{lastmod}</lastmod>")
-        xml.append("    <changefreq>monthly</changefreq>")
-        xml.append("    <priority>0.65</priority>")
-        xml.append("  </url>")
+        entries.append(SitemapEntry(f"{base}/icfes/departamento/{dept_slug}/", lastmod, "monthly", "0.65"))
+    return entries
 
-    xml.append("</urlset>")
-    return HttpResponse("\n".join(xml), content_type="application/xml")
 
+def sitemap_departamentos(request):
+    return _urlset(_departamento_entries(_base_url(request)))
 
-def sitemap_municipios(request):
-    base = _base_url(request)
-    lastmod = datetime.now(timezone.utc).date().isoformat()
+
+def _municipio_entries(base):
+    lastmod = _today_iso()
 
     muni_query = """
         SELECT DISTINCT departamento, municipio
@@ -252,27 +256,21 @@ def sitemap_municipios(request):
     with get_duckdb_connection() as conn:
         muni_rows = conn.execute(resolve_schema(muni_query)).fetchall()
 
-    xml = ["<?xml version=\"1.0\" encoding=\"UTF-8\"?>"]
-    xml.append("<urlset xmlns=\"http://www.sitemaps.org/schemas/sitemap/0.9\">")
-
+    entries = []
     for departamento, municipio in muni_rows:
         dept_slug = slugify(departamento)
         muni_slug = slugify(municipio)
         loc = f"{base}/icfes/departamento/{dept_slug}/municipio/{muni_slug}/"
-        xml.append("  <url>")
-        xml.append(f"    <loc>{escape(loc)}</loc>")
-        xml.append(f"    <lastmod>{lastmod}</lastmod>")
-        xml.append("    <changefreq>monthly</changefreq>")
-        xml.append("    <priority>0.55</priority>")
-        xml.append("  </url>")
+        entries.append(SitemapEntry(loc, lastmod, "monthly", "0.55"))
+    return entries
 
-    xml.append("</urlset>")
-    return HttpResponse("\n".join(xml), content_type="application/xml")
 
+def sitemap_municipios(request):
+    return _urlset(_municipio_entries(_base_url(request)))
 
-def sitemap_longtail(request):
-    base = _base_url(request)
-    lastmod = datetime.now(timezone.utc).date().isoformat()
+
+def _longtail_entries(base):
+    lastmod = _today_iso()
 
     years_query = """
         SELECT DISTINCT CAST(ano AS INTEGER) AS ano
@@ -285,37 +283,15 @@ def sitemap_longtail(request):
 
     years = [int(row[0]) for row in year_rows if row[0] is not None]
 
-    xml = ["<?xml version=\"1.0\" encoding=\"UTF-8\"?>"]
-    xml.append("<urlset xmlns=\"http://www.sitemaps.org/schemas/sitemap/0.9\">")
-
-    historic_url = f"{base}/icfes/historico/puntaje-global/"
-    xml.append("  <url>")
-    xml.append(f"    <loc>{escape(historic_url)}</loc>")
-    xml.append(f"    <lastmod>{lastmod}</lastmod>")
-    xml.append("    <changefreq>weekly</changefreq>")
-    xml.append("    <priority>0.8</priority>")
-    xml.append("  </url>")
-
+    entries = [SitemapEntry(f"{base}/icfes/historico/puntaje-global/", lastmod, "weekly", "0.8")]
     for year in years:
-        ranking_general = f"{base}/icfes/ranking/colegios/{year}/"
-        ranking_math = f"{base}/icfes/ranking/matematicas/{year}/"
-
-        xml.append("  <url>")
-        xml.append(f"    <loc>{escape(ranking_general)}</loc>")
-        xml.append(f"    <lastmod>{lastmod}</lastmod>")
-        xml.append("    <changefreq>monthly</changefreq>")
-        xml.append("    <priority>0.75</priority>")
-        xml.append("  </url>")
+        entries.append(SitemapEntry(f"{base}/icfes/ranking/colegios/{year}/", lastmod, "monthly", "0.75"))
+        entries.append(SitemapEntry(f"{base}/icfes/ranking/matematicas/{year}/", lastmod, "monthly", "0.75"))
+    return entries
 
-        xml.append("  <url>")
-        xml.append(f"    <loc>{escape(ranking_math)}</loc>")
-        xml.append(f"    <lastmod>{lastmod}</lastmod>")
-        xml.append("    <changefreq>monthly</changefreq>")
-        xml.append("    <priority>0.75</priority>")
-        xml.append("  </url>")
 
-    xml.append("</urlset>")
-    return HttpResponse("\n".join(xml), content_type="application/xml")
+def sitemap_longtail(request):
+    return _urlset(_longtail_entries(_base_url(request)))
 
 
 def sitemap_geo(request):
@@ -341,33 +317,24 @@ def sitemap_ranking_sector_index(request):
     return HttpResponse("\n".join(xml), content_type="application/xml")
 
 
-def sitemap_ranking_sector_nacional(request):
-    base = _base_url(request)
-    with get_duckdb_connection() as conn:
-        lastmod = _dataset_lastmod_iso(conn)
+def _ranking_sector_nacional_entries(base):
+    lastmod = _dataset_lastmod_iso()
+    return [
+        SitemapEntry(f"{base}/icfes/ranking/sector/{sector_slug}/colombia/", lastmod, "weekly", "0.9")
+        for _, sector_slug in _sector_slug_rows()
+    ]
 
-    xml = ["<?xml version=\"1.0\" encoding=\"UTF-8\"?>"]
-    xml.append("<urlset xmlns=\"http://www.sitemaps.org/schemas/sitemap/0.9\">")
-    for _, sector_slug in _sector_slug_rows():
-        loc = f"{base}/icfes/ranking/sector/{sector_slug}/colombia/"
-        xml.append("  <url>")
-        xml.append(f"    <loc>{escape(loc)}</loc>")
-        xml.append(f"    <lastmod>{lastmod}</lastmod>")
-        xml.append("    <changefreq>weekly</changefreq>")
-        xml.append("    <priority>0.9</priority>")
-        xml.append("  </url>")
-    xml.append("</urlset>")
-    return HttpResponse("\n".join(xml), content_type="application/xml")
+
+def sitemap_ranking_sector_nacional(request):
+    return _urlset(_ranking_sector_nacional_entries(_base_url(request)))
 
 
-def sitemap_ranking_sector_departamentos(request):
-    base = _base_url(request)
+def _sector_departamento_rows():
     with get_duckdb_connection() as conn:
-        lastmod = _dataset_lastmod_iso(conn)
         latest_year_query = "SELECT MAX(CAST(ano AS INTEGER)) FROM gold.fct_agg_colegios_ano"
         latest_year = conn.execute(resolve_schema(latest_year_query)).fetchone()[0]
         if latest_year is None:
-            return HttpResponse(status=404)
+            return None
 
         query = """
             SELECT DISTINCT sector, departamento
@@ -378,36 +345,66 @@ def sitemap_ranking_sector_departamentos(request):
               AND departamento != ''
             ORDER BY sector, departamento
         """
-        rows = conn.execute(resolve_schema(query), [latest_year]).fetchall()
+        return conn.execute(resolve_schema(query), [latest_year]).fetchall()
 
-    sector_to_slug = dict(_sector_slug_rows())
 
-    xml = ["<?xml version=\"1.0\" encoding=\"UTF-8\"?>"]
-    xml.append("<urlset xmlns=\"http://www.sitemaps.org/schemas/sitemap/0.9\">")
+def _materialized_sector_scopes(municipal):
+    """
+    (sector, departamento[, municipio]) rows from the materialized leaderboards
+    (same boards the pages serve), or None to fall back to the SQL below.
+    """
+    leaderboards = get_leaderboards()
+    years = leaderboards.years("sector") if leaderboards else []
+    if not years:
+        return None
+    rows = []
+    for sector, departamento, municipio, _, (schools, students) in leaderboards.scopes("sector", years[0]):
+        if not departamento or bool(municipio) != municipal:
+            continue
+        if municipal:
+            # Same thin-content thresholds as the SQL, on the whole municipio rather
+            # than the top-20 board: >= 2 schools and >= 20 students.
+            if schools < 2 or students < 20:
+                continue
+            rows.append((sector, departamento, municipio))
+        else:
+            rows.append((sector, departamento))
+    return sorted(rows)
+
+
+def _ranking_sector_departamento_entries(base):
+    lastmod = _dataset_lastmod_iso()
+    rows = _materialized_sector_scopes(municipal=False)
+    if rows is None:
+        rows = _sector_departamento_rows()
+        if rows is None:
+            return None
+
+    sector_to_slug = dict(_sector_slug_rows())
+    entries = []
     for sector, departamento in rows:
         sector_slug = sector_to_slug.get(sector)
         if not sector_slug:
             continue
         dep_slug = slugify(departamento)
         loc = f"{base}/icfes/ranking/sector/{sector_slug}/departamento/{dep_slug}/"
-        xml.append("  <url>")
-        xml.append(f"    <loc>{escape(loc)}</loc>")
-        xml.append(f"    <lastmod>{lastmod}</lastmod>")
-        xml.append("    <changefreq>monthly</changefreq>")
-        xml.append("    <priority>0.85</priority>")
-        xml.append("  </url>")
-    xml.append("</urlset>")
-    return HttpResponse("\n".join(xml), content_type="application/xml")
+        entries.append(SitemapEntry(loc, lastmod, "monthly", "0.85"))
+    return entries
 
 
-def sitemap_ranking_sector_municipios(request):
-    base = _base_url(request)
+def sitemap_ranking_sector_departamentos(request):
+    entries = _ranking_sector_departamento_entries(_base_url(request))
+    if entries is None:
+        return HttpResponse(status=404)
+    return _urlset(entries)
+
+
+def _sector_municipio_rows():
     with get_duckdb_connection() as conn:
-        lastmod = _dataset_lastmod_iso(conn)
         latest_year_query = "SELECT MAX(CAST(ano AS INTEGER)) FROM gold.fct_agg_colegios_ano"
         latest_year = conn.execute(resolve_schema(latest_year_query)).fetchone()[0]
         if latest_year is None:
-            return HttpResponse(status=404)
+            return None
 
         # Use fct_colegio_historico (same source as the view) and enforce
         # minimum thresholds to avoid thin-content pages: >= 2 schools and >= 20 students.
@@ -424,12 +421,19 @@ def sitemap_ranking_sector_municipios(request):
                AND SUM(total_estudiantes) >= 20
             ORDER BY sector, departamento, municipio
         """
-        rows = conn.execute(resolve_schema(query), [latest_year]).fetchall()
+        return conn.execute(resolve_schema(query), [latest_year]).fetchall()
 
-    sector_to_slug = dict(_sector_slug_rows())
 
-    xml = ["<?xml version=\"1.0\" encoding=\"UTF-8\"?>"]
-    xml.append("<urlset xmlns=\"http://www.sitemaps.org/schemas/sitemap/0.9\">")
+def _ranking_sector_municipio_entries(base):
+    lastmod = _dataset_lastmod_iso()
+    rows = _materialized_sector_scopes(municipal=True)
+    if rows is None:
+        rows = _sector_municipio_rows()
+        if rows is None:
+            return None
+
+    sector_to_slug = dict(_sector_slug_rows())
+    entries = []
     for sector, departamento, municipio in rows:
         sector_slug = sector_to_slug.get(sector)
         if not sector_slug:
@@ -440,22 +444,20 @@ def sitemap_ranking_sector_municipios(request):
             f"{base}/icfes/ranking/sector/{sector_slug}/departamento/"
             f"{dep_slug}/municipio/{muni_slug}/"
         )
-        xml.append("  <url>")
-        xml.append(f"    <loc>{escape(loc)}</loc>")
-        xml.append(f"    <lastmod>{lastmod}</lastmod>")
-        xml.append("    <changefreq>monthly</changefreq>")
-        xml.append("    <priority>0.8</priority>")
-        xml.append("  </url>")
-    xml.append("</urlset>")
-    return HttpResponse("\n".join(xml), content_type="application/xml")
+        entries.append(SitemapEntry(loc, lastmod, "monthly", "0.8"))
+    return entries
 
 
-def sitemap_materias(request):
-    """Sitemap for /icfes/materia/{materia}/{ano}/ pages."""
-    base = _base_url(request)
+def sitemap_ranking_sector_municipios(request):
+    entries = _ranking_sector_municipio_entries(_base_url(request))
+    if entries is None:
+        return HttpResponse(status=404)
+    return _urlset(entries)
 
+
+def _materia_entries(base):
+    lastmod = _dataset_lastmod_iso()
     with get_duckdb_connection() as conn:
-        lastmod = _dataset_lastmod_iso(conn)
         years_rows = conn.execute(
             resolve_schema("""
                 SELECT DISTINCT CAST(ano AS INTEGER) AS ano
@@ -467,28 +469,21 @@ def sitemap_materias(request):
 
     years = [int(r[0]) for r in years_rows if r[0] is not None]
     materias = ["matematicas", "ingles"]
+    return [
+        SitemapEntry(f"{base}/icfes/materia/{materia}/{year}/", lastmod, "monthly", "0.7")
+        for materia in materias
+        for year in years
+    ]
 
-    xml = ["<?xml version=\"1.0\" encoding=\"UTF-8\"?>"]
-    xml.append("<urlset xmlns=\"http://www.sitemaps.org/schemas/sitemap/0.9\">")
-    for materia in materias:
-        for year in years:
-            loc = f"{base}/icfes/materia/{materia}/{year}/"
-            xml.append("  <url>")
-            xml.append(f"    <loc>{escape(loc)}</loc>")
-            xml.append(f"    <lastmod>{lastmod}</lastmod>")
-            xml.append("    <changefreq>monthly</changefreq>")
-            xml.append("    <priority>0.7</priority>")
-            xml.append("  </url>")
-    xml.append("</urlset>")
-    return HttpResponse("\n".join(xml), content_type="application/xml")
 
+def sitemap_materias(request):
+    """Sitemap for /icfes/materia/{materia}/{ano}/ pages."""
+    return _urlset(_materia_entries(_base_url(request)))
 
-def sitemap_mejoraron(request):
-    """Sitemap for /icfes/colegios-que-mas-mejoraron/{ano}/ pages."""
-    base = _base_url(request)
 
+def _mejoraron_entries(base):
+    lastmod = _dataset_lastmod_iso()
     with get_duckdb_connection() as conn:
-        lastmod = _dataset_lastmod_iso(conn)
         years_rows = conn.execute(
             resolve_schema("""
                 SELECT DISTINCT CAST(ano AS INTEGER) AS ano
@@ -499,27 +494,20 @@ def sitemap_mejoraron(request):
         ).fetchall()
 
     years = [int(r[0]) for r in years_rows if r[0] is not None]
+    return [
+        SitemapEntry(f"{base}/icfes/colegios-que-mas-mejoraron/{year}/", lastmod, "monthly", "0.7")
+        for year in years
+    ]
 
-    xml = ["<?xml version=\"1.0\" encoding=\"UTF-8\"?>"]
-    xml.append("<urlset xmlns=\"http://www.sitemaps.org/schemas/sitemap/0.9\">")
-    for year in years:
-        loc = f"{base}/icfes/colegios-que-mas-mejoraron/{year}/"
-        xml.append("  <url>")
-        xml.append(f"    <loc>{escape(loc)}</loc>")
-        xml.append(f"    <lastmod>{lastmod}</lastmod>")
-        xml.append("    <changefreq>monthly</changefreq>")
-        xml.append("    <priority>0.7</priority>")
-        xml.append("  </url>")
-    xml.append("</urlset>")
-    return HttpResponse("\n".join(xml), content_type="application/xml")
 
+def sitemap_mejoraron(request):
+    """Sitemap for /icfes/colegios-que-mas-mejoraron/{ano}/ pages."""
+    return _urlset(_mejoraron_entries(_base_url(request)))
 
-def sitemap_bilingues(request):
-    """Sitemap for /icfes/colegios-bilingues/ and geographic sub-pages."""
-    base = _base_url(request)
 
+def _bilingue_entries(base):
+    lastmod = _dataset_lastmod_iso()
     with get_duckdb_connection() as conn:
-        lastmod = _dataset_lastmod_iso(conn)
         geo_rows = conn.execute(
             resolve_schema("""
                 SELECT DISTINCT d.departamento, d.municipio
@@ -534,16 +522,8 @@ def sitemap_bilingues(request):
             """)
         ).fetchall()
 
-    xml = ["<?xml version=\"1.0\" encoding=\"UTF-8\"?>"]
-    xml.append("<urlset xmlns=\"http://www.sitemaps.org/schemas/sitemap/0.9\">")
-
     # Nacional
-    xml.append("  <url>")
-    xml.append(f"    <loc>{escape(f'{base}/icfes/colegios-bilingues/')}</loc>")
-    xml.append(f"    <lastmod>{lastmod}</lastmod>")
-    xml.append("    <changefreq>monthly</changefreq>")
-    xml.append("    <priority>0.75</priority>")
-    xml.append("  </url>")
+    entries = [SitemapEntry(f"{base}/icfes/colegios-bilingues/", lastmod, "monthly", "0.75")]
 
     seen_depts = set()
     for departamento, municipio in geo_rows:
@@ -553,28 +533,19 @@ def sitemap_bilingues(request):
         if dept_slug not in seen_depts:
             seen_depts.add(dept_slug)
             loc = f"{base}/icfes/departamento/{dept_slug}/colegios-bilingues/"
-            xml.append("  <url>")
-            xml.append(f"    <loc>{escape(loc)}</loc>")
-            xml.append(f"    <lastmod>{lastmod}</lastmod>")
-            xml.append("    <changefreq>monthly</changefreq>")
-            xml.append("    <priority>0.65</priority>")
-            xml.append("  </url>")
+            entries.append(SitemapEntry(loc, lastmod, "monthly", "0.65"))
 
         loc = f"{base}/icfes/departamento/{dept_slug}/municipio/{muni_slug}/colegios-bilingues/"
-        xml.append("  <url>")
-        xml.append(f"    <loc>{escape(loc)}</loc>")
-        xml.append(f"    <lastmod>{lastmod}</lastmod>")
-        xml.append("    <changefreq>monthly</changefreq>")
-        xml.append("    <priority>0.6</priority>")
-        xml.append("  </url>")
+        entries.append(SitemapEntry(loc, lastmod, "monthly", "0.6"))
+    return entries
 
-    xml.append("</urlset>")
-    return HttpResponse("\n".join(xml), content_type="application/xml")
+
+def sitemap_bilingues(request):
+    """Sitemap for /icfes/colegios-bilingues/ and geographic sub-pages."""
+    return _urlset(_bilingue_entries(_base_url(request)))
 
 
-def sitemap_cuadrante(request):
-    """Sitemap for /icfes/cuadrante/{cuadrante}/ and /icfes/cuadrante/{cuadrante}/{depto}/ pages."""
-    base = _base_url(request)
+def _cuadrante_entries(base):
     cuadrantes = ["estrella", "consolidada", "emergente", "alerta"]
     priorities = {
         "estrella":    "0.80",
@@ -583,8 +554,8 @@ def sitemap_cuadrante(request):
         "alerta":      "0.65",
     }
 
+    lastmod = _dataset_lastmod_iso()
     with get_duckdb_connection() as conn:
-        lastmod = _dataset_lastmod_iso(conn)
         depto_rows = conn.execute(
             resolve_schema("""
                 SELECT DISTINCT departamento
@@ -598,38 +569,24 @@ def sitemap_cuadrante(request):
 
     deptos = [r[0] for r in depto_rows if r[0]]
 
-    xml = ["<?xml version=\"1.0\" encoding=\"UTF-8\"?>"]
-    xml.append("<urlset xmlns=\"http://www.sitemaps.org/schemas/sitemap/0.9\">")
-
+    entries = []
     for cuadrante in cuadrantes:
-        prio = priorities[cuadrante]
         # National page
-        loc = f"{base}/icfes/cuadrante/{cuadrante}/"
-        xml.append("  <url>")
-        xml.append(f"    <loc>{escape(loc)}</loc>")
-        xml.append(f"    <lastmod>{lastmod}</lastmod>")
-        xml.append("    <changefreq>yearly</changefreq>")
-        xml.append(f"    <priority>{prio}</priority>")
-        xml.append("  </url>")
+        entries.append(SitemapEntry(f"{base}/icfes/cuadrante/{cuadrante}/", lastmod, "yearly", priorities[cuadrante]))
         # Department pages
         for depto in deptos:
-            depto_slug = slugify(depto)
-            loc = f"{base}/icfes/cuadrante/{cuadrante}/{depto_slug}/"
-            xml.append("  <url>")
-            xml.append(f"    <loc>{escape(loc)}</loc>")
-            xml.append(f"    <lastmod>{lastmod}</lastmod>")
-            xml.append("    <changefreq>yearly</changefreq>")
-            xml.append("    <priority>0.60</priority>")
-            xml.append("  </url>")
+            loc = f"{base}/icfes/cuadrante/{cuadrante}/{slugify(depto)}/"
+            entries.append(SitemapEntry(loc, lastmod, "yearly", "0.60"))
+    return entries
 
-    xml.append("</urlset>")
-    return HttpResponse("\n".join(xml), content_type="application/xml")
 
+def sitemap_cuadrante(request):
+    """Sitemap for /icfes/cuadrante/{cuadrante}/ and /icfes/cuadrante/{cuadrante}/{depto}/ pages."""
+    return _urlset(_cuadrante_entries(_base_url(request)))
 
-def sitemap_motivacional(request):
-    """Sitemap for /icfes/bandas-motivacionales/ — nacional + 33 departamentos."""
-    base = _base_url(request)
-    lastmod = datetime.now(timezone.utc).date().isoformat()
+
+def _motivacional_entries(base):
+    lastmod = _today_iso()
 
     query = """
         SELECT DISTINCT departamento
@@ -641,38 +598,23 @@ def sitemap_motivacional(request):
     with get_duckdb_connection() as conn:
         rows = conn.execute(resolve_schema(query)).fetchall()
 
-    xml = ["<?xml version=\"1.0\" encoding=\"UTF-8\"?>"]
-    xml.append("<urlset xmlns=\"http://www.sitemaps.org/schemas/sitemap/0.9\">")
-
     # Nacional
-    xml.append("  <url>")
-    xml.append(f"    <loc>{escape(f'{base}/icfes/bandas-motivacionales/')}</loc>")
-    xml.append(f"    <lastmod>{lastmod}</lastmod>")
-    xml.append("    <changefreq>monthly</changefreq>")
-    xml.append("    <priority>0.75</priority>")
-    xml.append("  </url>")
-
+    entries = [SitemapEntry(f"{base}/icfes/bandas-motivacionales/", lastmod, "monthly", "0.75")]
     # Por departamento
     for (departamento,) in rows:
-        dept_slug = slugify(departamento)
-        loc = f"{base}/icfes/bandas-motivacionales/{dept_slug}/"
-        xml.append("  <url>")
-        xml.append(f"    <loc>{escape(loc)}</loc>")
-        xml.append(f"    <lastmod>{lastmod}</lastmod>")
-        xml.append("    <changefreq>monthly</changefreq>")
-        xml.append("    <priority>0.65</priority>")
-        xml.append("  </url>")
+        loc = f"{base}/icfes/bandas-motivacionales/{slugify(departamento)}/"
+        entries.append(SitemapEntry(loc, lastmod, "monthly", "0.65"))
+    return entries
 
-    xml.append("</urlset>")
-    return HttpResponse("\n".join(xml), content_type="application/xml")
 
+def sitemap_motivacional(request):
+    """Sitemap for /icfes/bandas-motivacionales/ — nacional + 33 departamentos."""
+    return _urlset(_motivacional_entries(_base_url(request)))
 
-def sitemap_potencial(request):
-    """Sitemap for /icfes/supero-prediccion/ — schools that exceeded ML prediction."""
-    base = _base_url(request)
 
+def _potencial_entries(base):
+    lastmod = _dataset_lastmod_iso()
     with get_duckdb_connection() as conn:
-        lastmod = _dataset_lastmod_iso(conn)
         depto_rows = conn.execute(
             resolve_schema("""
                 SELECT DISTINCT COALESCE(s.departamento, p.departamento) AS dep
@@ -688,7 +630,7 @@ def sitemap_potencial(request):
     # Normalize known variant names (e.g. "BOGOTÁ" → "Bogotá DC") then
     # deduplicate by slug, preferring title-case over ALL-CAPS
     raw = sorted(
-        [DEPT_NAME_CANONICAL.get(r[0], r[0]) for r in depto_rows if r[0]],
+        [canonical_departamento(r[0]) for r in depto_rows if r[0]],
         key=lambda x: (x == x.upper(), x),
     )
     seen: set = set()
@@ -700,28 +642,49 @@ def sitemap_potencial(request):
             deptos.append(d)
     sectors = [("oficial", "0.65"), ("privado", "0.65")]
 
-    xml = ["<?xml version=\"1.0\" encoding=\"UTF-8\"?>"]
-    xml.append("<urlset xmlns=\"http://www.sitemaps.org/schemas/sitemap/0.9\">")
-
-    def add_url(loc, priority, changefreq="yearly"):
-        xml.append("  <url>")
-        xml.append(f"    <loc>{escape(loc)}</loc>")
-        xml.append(f"    <lastmod>{lastmod}</lastmod>")
-        xml.append(f"    <changefreq>{changefreq}</changefreq>")
-        xml.append(f"    <priority>{priority}</priority>")
-        xml.append("  </url>")
-
     # Nacional — todos
-    add_url(f"{base}/icfes/supero-prediccion/", "0.80")
+    entries = [SitemapEntry(f"{base}/icfes/supero-prediccion/", lastmod, "yearly", "0.80")]
     # Nacional por sector
     for s_slug, prio in sectors:
-        add_url(f"{base}/icfes/supero-prediccion/{s_slug}/", prio)
+        entries.append(SitemapEntry(f"{base}/icfes/supero-prediccion/{s_slug}/", lastmod, "yearly", prio))
 
     for depto in deptos:
         depto_slug = slugify(depto)
-        add_url(f"{base}/icfes/supero-prediccion/{depto_slug}/", "0.65")
+        entries.append(SitemapEntry(f"{base}/icfes/supero-prediccion/{depto_slug}/", lastmod, "yearly", "0.65"))
         for s_slug, _ in sectors:
-            add_url(f"{base}/icfes/supero-prediccion/{depto_slug}/{s_slug}/", "0.55")
+            loc = f"{base}/icfes/supero-prediccion/{depto_slug}/{s_slug}/"
+            entries.append(SitemapEntry(loc, lastmod, "yearly", "0.55"))
+    return entries
 
-    xml.append("</urlset>")
-    return HttpResponse("\n".join(xml), content_type="application/xml")
+
+def sitemap_potencial(request):
+    """Sitemap for /icfes/supero-prediccion/ — schools that exceeded ML prediction."""
+    return _urlset(_potencial_entries(_base_url(request)))
+
+
+# Every <url> the sitemaps publish, by section (sitemap-<section>.xml).
+# sitemap-geo.xml is an alias of departamentos and sitemap-icfes-<n>.xml pages
+# the "icfes" section.
+SITEMAP_SECTIONS = {
+    "static": _static_entries,
+    "icfes": _school_entries,
+    "departamentos": _departamento_entries,
+    "municipios": _municipio_entries,
+    "longtail": _longtail_entries,
+    "ranking-sector-nacional": _ranking_sector_nacional_entries,
+    "ranking-sector-departamentos": _ranking_sector_departamento_entries,
+    "ranking-sector-municipios": _ranking_sector_municipio_entries,
+    "materias": _materia_entries,
+    "mejoraron": _mejoraron_entries,
+    "bilingues": _bilingue_entries,
+    "cuadrante": _cuadrante_entries,
+    "potencial": _potencial_entries,
+    "motivacional": _motivacional_entries,
+}
+
+
+def iter_sitemap_entries(base, sections=None):
+    """(section, SitemapEntry) for every URL of the given sections (default: all)."""
+    for section in sections or SITEMAP_SECTIONS:
+        for entry in SITEMAP_SECTIONS[section](base) or []:
+            yield section, entry
@@ -0,0 +1,173 @@
+"""
+In-memory slug → school resolver.
+
+Built once per dataset version (like school_search). Every slug lookup —
+school landing, social cards, email graphs — is a dict hit instead of a
+`dim_colegios_slugs` query plus a `LOWER(municipio) LIKE` scan that ran
+generate_school_slug() on every candidate row.
+
+- Canonical slug per school: its dim_colegios_slugs row (shortest if it has
+  several), else generate_school_slug() on the dim_colegios name. When two
+  schools would get the same canonical slug, the first claim keeps it
+  (slugs-table rows before generated slugs, then lowest codigo) and the
+  others get "<slug>-<codigo>".
+- Aliases (→ 301 to the canonical slug): other slugs-table rows, slugs
+  generated from dim_colegios names and from every historical
+  fct_colegio_historico name ("I.E. ..." spellings), and the name-only slug
+  without the municipality suffix. Aliases claimed by two schools are dropped.
+"""
+import logging
+import threading
+from collections import namedtuple
+
+import duckdb
+from django.utils.text import slugify
+
+from .db_utils import get_dataset_version, get_duckdb_connection, resolve_schema
+from .landing_utils import generate_school_slug
+
+logger = logging.getLogger(__name__)
+
+# codigo is the DANE code as a string.
+SlugMatch = namedtuple("SlugMatch", ["codigo", "slug", "is_alias"])
+
+_AMBIGUOUS = -1
+
+
+class SlugIndex:
+    """
+    slug_rows: (codigo, slug) from dim_colegios_slugs.
+    name_rows: (codigo, nombre_colegio, municipio) from dim_colegios, canonical names first.
+    historical_rows: (codigo, nombre_colegio, municipio) from fct_colegio_historico.
+    """
+
+    def __init__(self, slug_rows, name_rows, historical_rows=()):
+        self.codes = []
+        self.canonical = []      # position → canonical slug
+        self._positions = {}     # codigo → position
+        self._slugs = {}         # slug → position (or _AMBIGUOUS)
+        self.collisions = 0      # canonical slugs suffixed with the codigo
+
+        slug_rows = sorted(
+            ((str(codigo), slug) for codigo, slug in slug_rows if slug),
+            key=lambda r: (len(r[1]), r[1], r[0]),
+        )
+        for codigo, slug in slug_rows:
+            if codigo not in self._positions:
+                self._position(codigo, slug)
+
+        name_rows = list(name_rows)
+        generated = {}
+        for codigo, nombre, municipio in name_rows:
+            generated.setdefault(str(codigo), generate_school_slug(nombre, municipio))
+        for codigo, slug in sorted(generated.items()):
+            if codigo not in self._positions:
+                self._position(codigo, slug)
+
+        # Other slugs-table rows of a school redirect to its canonical slug.
+        for codigo, slug in slug_rows:
+            self._add_alias(slug, self._positions[codigo])
+
+        seen = set()
+        for codigo, nombre, municipio in [*name_rows, *historical_rows]:
+            codigo = str(codigo)
+            if (codigo, nombre, municipio) in seen or codigo not in self._positions:
+                continue
+            seen.add((codigo, nombre, municipio))
+            pos = self._positions[codigo]
+            self._add_alias(generate_school_slug(nombre, municipio), pos)
+            self._add_alias(slugify(nombre or ""), pos)
+
+        self.alias_count = sum(
+            1 for slug, pos in self._slugs.items()
+            if pos != _AMBIGUOUS and self.canonical[pos] != slug
+        )
+
+    def _position(self, codigo, slug):
+        if slug in self._slugs:
+            # Already another school's canonical slug
+            slug = f"{slug}-{codigo}"
+            self.collisions += 1
+        pos = self._positions[codigo] = len(self.codes)
+        self.codes.append(codigo)
+        self.canonical.append(slug)
+        self._slugs[slug] = pos
+        return pos
+
+    def _add_alias(self, slug, pos):
+        if not slug:
+            return
+        current = self._slugs.get(slug)
+        if current is None:
+            self._slugs[slug] = pos
+        elif current != pos and current != _AMBIGUOUS and self.canonical[current] != slug:
+            self._slugs[slug] = _AMBIGUOUS
+
+    def __len__(self):
+        return len(self.codes)
+
+    def resolve(self, slug):
+        pos = self._slugs.get(slug)
+        if pos is None or pos == _AMBIGUOUS:
+            return None
+        canonical = self.canonical[pos]
+        return SlugMatch(self.codes[pos], canonical, canonical != slug)
+
+    def canonical_slug(self, codigo):
+        pos = self._positions.get(str(codigo))
+        return self.canonical[pos] if pos is not None else None
+
+
+_index_lock = threading.Lock()
+_index = None
+_index_version = None
+
+
+def build_index():
+    with get_duckdb_connection() as conn:
+        try:
+            slug_rows = conn.execute(
+                resolve_schema("SELECT codigo, slug FROM gold.dim_colegios_slugs")
+            ).fetchall()
+        except duckdb.CatalogException as exc:
+            logger.warning("dim_colegios_slugs unavailable, slugs generated from names: %s", exc)
+            slug_rows = []
+        # dim_colegios tiene nombres canónicos completos → generate_school_slug produce el slug correcto.
+        # fct_colegio_historico usa abreviaciones (ej: "I.E.") → slugs históricos, solo como alias.
+        name_rows = conn.execute(resolve_schema("""
+            SELECT colegio_bk, nombre_colegio, municipio
+            FROM gold.dim_colegios
+            WHERE nombre_colegio IS NOT NULL
+              AND municipio IS NOT NULL
+              AND sector != 'SINTETICO'
+        """)).fetchall()
+        historical_rows = conn.execute(resolve_schema("""
+            SELECT DISTINCT codigo_dane, nombre_colegio, municipio
+            FROM gold.fct_colegio_historico
+            WHERE nombre_colegio IS NOT NULL
+              AND municipio IS NOT NULL
+        """)).fetchall()
+    return SlugIndex(slug_rows, name_rows, historical_rows)
+
+
+def get_index():
+    """Return the process-wide index, (re)building it when the dataset version changes."""
+    global _index, _index_version
+    dataset = get_dataset_version()
+    version = dataset.version if dataset else None
+    if _index is not None and _index_version == version:
+        return _index
+    with _index_lock:
+        if _index is None or _index_version != version:
+            index = build_index()
+            _index, _index_version = index, version
+            logger.info(
+                "Slug index built: %s schools, %s aliases, %s slug collisions (dataset=%s)",
+                len(index), index.alias_count, index.collisions, version,
+            )
+    return _index
+
+
+def resolve_slug(slug):
+    """SlugMatch(codigo, canonical slug, is_alias) or None."""
+    return get_index().resolve(slug)
@@ -444,6 +444,45 @@ document.addEventListener('DOMContentLoaded', function () {
       }
     });
   }
+
+  // PDF: se genera en background. 202 → polling a status_url hasta que esté listo.
+  const btnPDFExport = document.getElementById('btn-export-school-pdf');
+  if (btnPDFExport) {
+    btnPDFExport.addEventListener('click', async function (e) {
+      e.preventDefault();
+      if (btnPDFExport.classList.contains('disabled')) return;
+      const label = btnPDFExport.innerHTML;
+      btnPDFExport.classList.add('disabled');
+      btnPDFExport.innerHTML = '<span class="spinner-border spinner-border-sm me-1"></span>Generando PDF…';
+      try {
+        const resp = await fetch(btnPDFExport.href, { headers: { Accept: 'application/json' } });
+        if (resp.redirected || resp.status === 200) {
+          window.location = resp.redirected ? resp.url : btnPDFExport.href;
+          return;
+        }
+        if (resp.status !== 202) throw new Error(`HTTP ${resp.status}`);
+        const job = await resp.json();
+        for (let i = 0; i < 60; i++) {
+          await new Promise(r => setTimeout(r, 2000));
+          const state = await (await fetch(job.status_url)).json();
+          if (state.status === 'ready') {
+            window.location = state.download_url;
+            return;
+          }
+          if (state.status === 'error' || state.status === 'not_found' || state.status === 'unknown') {
+            throw new Error(state.error || state.status);
+          }
+        }
+        throw new Error('timeout');
+      } catch (err) {
+        console.error('[PDF] export falló:', err);
+        alert('No se pudo generar el PDF. Intenta de nuevo en unos minutos.');
+      } finally {
+        btnPDFExport.classList.remove('disabled');
+        btnPDFExport.innerHTML = label;
+      }
+    });
+  }
 });
 
 // ──────────────────────────────────────────────────────────────
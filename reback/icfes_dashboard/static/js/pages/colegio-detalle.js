@@ -33,16 +33,35 @@ document.addEventListener('DOMContentLoaded', function () {
     }
 });
 
+/**
+ * Secciones del colegio desde /bundle/: una sola petición para toda la página.
+ * Resuelve con los datos de la sección o con {error, status} si falló.
+ */
+const SCHOOL_BUNDLE_SECTIONS = 'resumen,historico,similares,ingles,niveles_historico';
+let _cdBundle = null;
+
+function schoolSection(sk, name) {
+    if (!_cdBundle) {
+        _cdBundle = fetch(`/icfes/api/colegio/${sk}/bundle/?sections=${SCHOOL_BUNDLE_SECTIONS}&limit=5`)
+            .then(r => {
+                if (!r.ok) throw new Error('Colegio no encontrado');
+                return r.json();
+            });
+    }
+    return _cdBundle.then(bundle => {
+        if (name in bundle.sections) return bundle.sections[name];
+        const err = bundle.errors[name] || {};
+        return { error: err.error || 'Sección no disponible', status: err.status };
+    });
+}
+
 /**
  * Carga el resumen general del colegio
  */
 function loadSchoolSummary(sk) {
-    fetch(`/icfes/api/colegio/${sk}/resumen/`)
-        .then(response => {
-            if (!response.ok) throw new Error('Colegio no encontrado');
-            return response.json();
-        })
+    schoolSection(sk, 'resumen')
         .then(data => {
+            if (data.error) throw new Error('Colegio no encontrado');
             // -- Info Básica --
             const info = data.info_basica;
             document.getElementById('school-name').textContent = info.nombre_colegio;
@@ -140,8 +159,7 @@ function loadSchoolSummary(sk) {
  * Carga el gráfico histórico
  */
 function loadHistoricalChart(sk) {
-    fetch(`/icfes/api/colegio/${sk}/historico/`)
-        .then(r => r.json())
+    schoolSection(sk, 'historico')
         .then(data => {
             // Data viene ordenada por ano DESC desde la API, la invertimos para el gráfico
             const dataAsc = [...data].reverse();
@@ -183,8 +201,7 @@ function loadHistoricalChart(sk) {
  * Carga colegios similares
  */
 function loadSimilarSchools(sk) {
-    fetch(`/icfes/api/colegio/${sk}/similares/?limit=5`)
-        .then(r => r.json())
+    schoolSection(sk, 'similares')
         .then(data => {
             const tbody = document.getElementById('similar-schools-list');
             tbody.innerHTML = '';
@@ -219,11 +236,7 @@ function loadSimilarSchools(sk) {
  * Carga Perfil de Bilingüismo (Inglés)
  */
 function loadInglesProfile(sk) {
-    fetch(`/icfes/api/colegio/${sk}/ingles/`)
-        .then(r => {
-            if (!r.ok) throw new Error('Ingles no encontrado');
-            return r.json();
-        })
+    schoolSection(sk, 'ingles')
         .then(data => {
             if (data.error) {
                 console.error("Ingles data missing:", data.error);
@@ -286,8 +299,7 @@ let _cdNivelesChart = null;
 let _cdCurrentMat  = 'mat';
 
 function loadNivelesHistorico(sk) {
-    fetch(`/icfes/api/colegio/${sk}/niveles-historico/`)
-        .then(r => r.json())
+    schoolSection(sk, 'niveles_historico')
         .then(data => {
             _cdNivelesData = Array.isArray(data) ? data : [];
             // No renderizar aquí: el tab está oculto y ApexCharts
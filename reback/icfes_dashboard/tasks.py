@@ -0,0 +1,100 @@
+"""
+Celery tasks of the dashboard: PDF reports (see pdf_reports).
+
+Run a worker next to the web process:
+
+    celery -A config worker -l info
+
+With CELERY_TASK_ALWAYS_EAGER (local / test settings) the tasks run inline
+in the calling thread, so the same code paths work without a broker.
+"""
+import logging
+
+from celery import shared_task
+
+from . import pdf_reports
+from .db_utils import get_duckdb_connection, resolve_schema
+from .models import CampaignProspect
+from .slug_resolver import resolve_slug
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(ignore_result=True)
+def generate_pdf_report(report_id, kind, params):
+    """Build one report and leave it in the cache under `report_id`."""
+    if pdf_reports.get_report(report_id) is not None:
+        pdf_reports.release_job(report_id)
+        return
+    pdf_reports.set_job_status(report_id, pdf_reports.RUNNING)
+    try:
+        built = pdf_reports.BUILDERS[kind](**params)
+    except Exception:
+        logger.exception("[PDF] %s report failed (params=%s)", kind, params)
+        pdf_reports.set_job_status(report_id, pdf_reports.ERROR, "Error generando el reporte")
+        return
+    if built is None:
+        pdf_reports.set_job_status(report_id, pdf_reports.NOT_FOUND, "Colegio no encontrado")
+        return
+    filename, content = built
+    pdf_reports.store_report(report_id, filename, content)
+    logger.info("[PDF] %s report ready: %s (%s bytes)", kind, filename, len(content))
+
+
+def enqueue_report(kind, params):
+    """
+    report_id of the report, queueing its task unless it is cached or
+    already queued. Broker errors propagate (the job is released first).
+    """
+    rid = pdf_reports.report_id(kind, params)
+    if pdf_reports.get_report(rid) is not None:
+        return rid
+    if pdf_reports.claim_job(rid):
+        try:
+            generate_pdf_report.delay(rid, kind, params)
+        except Exception:
+            pdf_reports.release_job(rid)
+            raise
+    return rid
+
+
+def campaign_colegio_sks(slugs):
+    """colegio_sk of the schools behind the prospect slugs (unknown slugs are skipped)."""
+    codigos = set()
+    for slug in slugs:
+        match = resolve_slug(slug)
+        if match is not None:
+            codigos.add(str(match.codigo))
+    if not codigos:
+        return []
+    placeholders = ','.join('?' for _ in codigos)
+    with get_duckdb_connection() as conn:
+        rows = conn.execute(resolve_schema(f"""
+            SELECT DISTINCT colegio_sk
+            FROM gold.dim_colegios
+            WHERE colegio_bk IN ({placeholders})
+            ORDER BY colegio_sk
+        """), sorted(codigos)).fetchall()
+    return [str(r[0]) for r in rows]
+
+
+@shared_task(ignore_result=True)
+def pregenerate_campaign_reports(campaign_id, ano=None):
+    """Queue the school report of every prospect of a campaign; returns how many were queued."""
+    slugs = (
+        CampaignProspect.objects
+        .filter(campaign_id=campaign_id)
+        .exclude(slug='')
+        .values_list('slug', flat=True)
+    )
+    colegio_sks = campaign_colegio_sks(slugs.iterator())
+    queued = 0
+    for colegio_sk in colegio_sks:
+        params = {'colegio_sk': colegio_sk, 'ano': ano}
+        if pdf_reports.get_report(pdf_reports.report_id('school', params)) is None:
+            enqueue_report('school', params)
+            queued += 1
+    logger.info(
+        "[PDF] Campaign %s: %s schools, %s reports queued", campaign_id, len(colegio_sks), queued,
+    )
+    return queued
@@ -1,3 +1,1795 @@
-from django.test import TestCase
+import contextlib
+import gzip
+import io
+import json
+import os
+import threading
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+import pytest
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.test import override_settings
+
+from icfes_dashboard import db_utils
+from icfes_dashboard import export_views
+from icfes_dashboard import gazetteer
+from icfes_dashboard import leaderboards
+from icfes_dashboard import pdf_reports
+from icfes_dashboard import response_cache
+from icfes_dashboard import school_search
+from icfes_dashboard import score_distribution
+from icfes_dashboard import slug_resolver
+from icfes_dashboard import tasks
+from icfes_dashboard import views_dashboard_bundle
+from icfes_dashboard import views_school_bundle
+from icfes_dashboard import warmup
+from icfes_dashboard.landing_utils import calculate_ranking
+from icfes_dashboard.ml import feature_engineering
+from icfes_dashboard.ml import similar_schools
+from icfes_dashboard.ml import streaming
+from icfes_dashboard.ml import train_models
+from reback.middleware import conditional_get
+
+LOCMEM_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+@pytest.fixture
+def rf():
+    return RequestFactory()
+
+
+class TestResponseCache:
+    html = "<html><body>" + "colegio " * 200 + "</body></html>"
+
+    def test_entry_is_smaller_than_body(self):
+        entry = response_cache.build_entry(HttpResponse(self.html))
+        assert "identity" not in entry
+        assert len(entry["gzip"]) < len(self.html)
+        assert gzip.decompress(entry["gzip"]).decode() == self.html
+
+    def test_serves_best_accepted_encoding(self, rf):
+        entry = response_cache.build_entry(HttpResponse(self.html))
+
+        gz = response_cache.response_from_entry(rf.get("/", HTTP_ACCEPT_ENCODING="gzip"), entry)
+        assert gz["Content-Encoding"] == "gzip"
+        assert "Accept-Encoding" in gz["Vary"]
+
+        plain = response_cache.response_from_entry(rf.get("/"), entry)
+        assert not plain.has_header("Content-Encoding")
+        assert plain.content.decode() == self.html
+
+        if response_cache.brotli is not None:
+            br = response_cache.response_from_entry(
+                rf.get("/", HTTP_ACCEPT_ENCODING="gzip, br"), entry,
+            )
+            assert br["Content-Encoding"] == "br"
+
+    def test_binary_bodies_stored_as_identity(self):
+        entry = response_cache.build_entry(HttpResponse(b"\x89PNG" * 100, content_type="image/png"))
+        assert entry["identity"].startswith(b"\x89PNG")
+        assert "gzip" not in entry
+
+    @override_settings(CACHES=LOCMEM_CACHE)
+    def test_decorator_hit_and_miss(self, rf):
+        calls = []
+
+        @response_cache.compressed_cache_page(60, key_prefix="test")
+        def view(request):
+            calls.append(1)
+            return HttpResponse(self.html)
+
+        first = rf.get("/icfes/x/", HTTP_ACCEPT_ENCODING="gzip")
+        view(first)
+        second = rf.get("/icfes/x/", HTTP_ACCEPT_ENCODING="gzip")
+        response = view(second)
+
+        assert len(calls) == 1
+        assert first._cache_status == "MISS"
+        assert second._cache_status == "HIT"
+        assert gzip.decompress(response.content).decode() == self.html
+
+    @override_settings(CACHES=LOCMEM_CACHE)
+    def test_errors_are_not_cached(self, rf):
+        @response_cache.compressed_cache_page(60, key_prefix="test")
+        def view(request):
+            return HttpResponse("nope", status=500)
+
+        request = rf.get("/icfes/broken/")
+        view(request)
+        assert request._cache_status == "BYPASS"
+        assert response_cache.get_cached_response(
+            request, response_cache.response_cache_key("test", request),
+        ) is None
+
+
+class TestDatasetConditionalGet:
+    dataset = db_utils.DatasetVersion(
+        version="abc123", updated_at=datetime(2025, 1, 1, tzinfo=timezone.utc),
+    )
+
+    @pytest.fixture
+    def middleware(self, monkeypatch):
+        from django.core.cache import cache
+
+        with override_settings(CACHES=LOCMEM_CACHE):
+            cache.clear()
+            yield self._middleware(monkeypatch)
+
+    def _middleware(self, monkeypatch):
+        monkeypatch.setattr(conditional_get, "peek_dataset_version", lambda: self.dataset)
+        monkeypatch.setattr(conditional_get, "get_dataset_version", lambda: self.dataset)
+        calls = []
+
+        def view(request):
+            calls.append(request.path)
+            return HttpResponse("<html>ok</html>")
+
+        return conditional_get.DatasetConditionalGetMiddleware(view), calls
+
+    def test_sets_validators_then_answers_304(self, rf, middleware):
+        mw, calls = middleware
+        first = mw(rf.get("/icfes/departamentos/"))
+        assert first.status_code == 200
+        assert first["ETag"].startswith('"abc123-')
+
+        second = mw(rf.get("/icfes/departamentos/", HTTP_IF_NONE_MATCH=f"W/{first['ETag']}"))
+        assert second.status_code == 304
+        assert len(calls) == 1
+
+    def test_any_worker_answers_304_before_the_view(self, rf, middleware):
+        mw, calls = middleware
+        first = mw(rf.get("/icfes/colegio/colegio-a/?ano=2024"))
+
+        def view(request):
+            raise AssertionError("the view must not run for a validated URL")
+
+        other_worker = conditional_get.DatasetConditionalGetMiddleware(view)
+        response = other_worker(rf.get("/icfes/colegio/colegio-a/?ano=2024", HTTP_IF_NONE_MATCH=first["ETag"]))
+        assert response.status_code == 304
+        assert response["ETag"] == first["ETag"]
+        assert len(calls) == 1
+
+    def test_private_paths_untouched(self, rf, middleware):
+        mw, _ = middleware
+        response = mw(rf.get("/icfes/mi-colegio/"))
+        assert not response.has_header("ETag")
+
+    def test_login_protected_dashboards_never_short_circuit(self, rf, middleware):
+        mw, calls = middleware
+        for path in ("/icfes/colegio/", "/icfes/cuadrante/"):
+            response = mw(rf.get(path, HTTP_IF_NONE_MATCH="*"))
+            assert response.status_code == 200
+            assert not response.has_header("ETag")
+        assert calls == ["/icfes/colegio/", "/icfes/cuadrante/"]
+        mw(rf.get("/icfes/colegio/ie-san-jose-medellin/"))
+        assert mw(rf.get("/icfes/colegio/ie-san-jose-medellin/", HTTP_IF_NONE_MATCH="*")).status_code == 304
+        assert len(calls) == 3
+
+    def test_validators_are_the_same_on_every_worker(self, rf, middleware):
+        mw, _ = middleware
+        response = mw(rf.get("/icfes/departamentos/"))
+        assert response["Last-Modified"] == "Wed, 01 Jan 2025 00:00:00 GMT"
+
+    @override_settings(CACHES=LOCMEM_CACHE)
+    def test_tag_purge_rotates_only_the_tagged_pages(self, rf, monkeypatch):
+        from django.core.cache import cache
+
+        cache.clear()
+        monkeypatch.setattr(conditional_get, "peek_dataset_version", lambda: self.dataset)
+        monkeypatch.setattr(conditional_get, "get_dataset_version", lambda: self.dataset)
+
+        def view(request):
+            if request.path.startswith("/icfes/colegio/"):
+                response_cache.add_cache_tags(request, response_cache.school_tag("111"))
+            return HttpResponse("<html>ok</html>")
+
+        mw = conditional_get.DatasetConditionalGetMiddleware(view)
+        school = mw(rf.get("/icfes/colegio/colegio-a/"))
+        listing = mw(rf.get("/icfes/departamentos/"))
+
+        response_cache.purge_cache_tags([response_cache.school_tag("111")], edge=False)
+
+        reads = []
+        get_many = cache.get_many
+        monkeypatch.setattr(cache, "get_many", lambda keys: reads.append(keys) or get_many(keys))
+        assert mw(rf.get("/icfes/departamentos/", HTTP_IF_NONE_MATCH=listing["ETag"])).status_code == 304
+        assert reads == []                       # untagged: no tag-token round trip
+
+        fresh = mw(rf.get("/icfes/colegio/colegio-a/", HTTP_IF_NONE_MATCH=school["ETag"]))
+        assert fresh.status_code == 200
+        assert reads[0] == ["resp:tag:colegio:111"]
+        assert fresh["ETag"] != school["ETag"]
+        assert fresh["Last-Modified"] != school["Last-Modified"]
+
+
+class TestCacheTags:
+    @override_settings(CACHES=LOCMEM_CACHE)
+    def test_purge_invalidates_only_tagged_entries(self, rf):
+        html = "<html>" + "x" * 500 + "</html>"
+
+        @response_cache.compressed_cache_page(60, key_prefix="test-tags")
+        def view(request, codigo):
+            response_cache.add_cache_tags(
+                request, *response_cache.school_cache_tags(codigo, "Valle del Cauca", "Tuluá"),
+            )
+            return HttpResponse(html)
+
+        view(rf.get("/icfes/colegio/a/"), "111")
+        view(rf.get("/icfes/colegio/b/"), "222")
+
+        hit = rf.get("/icfes/colegio/a/")
+        response = view(hit, "111")
+        assert hit._cache_status == "HIT"
+        assert "colegio:111" in response["Surrogate-Key"]
+        assert "muni:valle-del-cauca:tulua" in response["Surrogate-Key"]
+
+        response_cache.purge_cache_tags([response_cache.school_tag("111")], edge=False)
+
+        purged = rf.get("/icfes/colegio/a/")
+        view(purged, "111")
+        untouched = rf.get("/icfes/colegio/b/")
+        view(untouched, "222")
+        assert purged._cache_status == "MISS"
+        assert untouched._cache_status == "HIT"
+
+
+class TestCacheWarm:
+    @pytest.mark.django_db
+    def test_dry_run_ranks_sitemap_urls_by_recent_traffic(self, monkeypatch):
+        from django.core.management import call_command
+        from django.utils import timezone as dj_timezone
+
+        from icfes_dashboard.management.commands import warm_cache
+        from icfes_dashboard.models import RailwayTrafficLog
+
+        ns = 'xmlns="http://www.sitemaps.org/schemas/sitemap/0.9"'
+        bodies = {
+            "/sitemap.xml": f"<sitemapindex {ns}><sitemap><loc>https://x/sitemap-a.xml</loc></sitemap></sitemapindex>",
+            "/sitemap-a.xml": f"<urlset {ns}>" + "".join(
+                f"<url><loc>https://x{path}</loc></url>" for path in ("/a/", "/b/", "/c/")
+            ) + "</urlset>",
+        }
+        monkeypatch.setattr(
+            warm_cache.Command, "_fetch",
+            lambda self, path, compressed=True: (200, 1.0, "-", bodies[path].encode()),
+        )
+
+        now = dj_timezone.now()
+        hits = [("/c/", 1), ("/c/", 2), ("/c/", 3), ("/b/", 1), ("/a/", 10), ("/a/", 10), ("/a/", 10),
+                ("/a/", 10), ("/not-in-sitemap/", 1), ("/not-in-sitemap/", 1), ("/not-in-sitemap/", 1),
+                ("/not-in-sitemap/", 1)]
+        RailwayTrafficLog.objects.bulk_create([
+            RailwayTrafficLog(request_id=f"r{i}", timestamp=now - timedelta(days=days), path=path,
+                              http_status=200, method="GET", bot_category="human_or_other")
+            for i, (path, days) in enumerate(hits)
+        ])
+
+        out = io.StringIO()
+        call_command("warm_cache", "--dry-run", "--top", "3", "--path", "/extra/", stdout=out)
+
+        # Extra paths first, then sitemap URLs with traffic in the last 7 days, then the rest.
+        assert [line.strip() for line in out.getvalue().splitlines() if line.startswith("  ")] == [
+            "/extra/", "/c/", "/b/",
+        ]
+        assert "3 URLs en sitemaps → calentando 3" in out.getvalue()
+
+    @pytest.mark.django_db
+    @override_settings(CACHES=LOCMEM_CACHE, CACHE_WARM_TOKEN="s3cret", TRAFFIC_ANALYTICS_ENABLED=True)
+    def test_warm_requests_skip_rate_limit_and_traffic_logging(self, rf):
+        from django.core.cache import cache
+
+        from icfes_dashboard.models import RailwayTrafficLog
+        from reback.middleware.perf_logging import CacheDebugHeaderMiddleware
+        from reback.middleware.rate_limit import RateLimitMiddleware
+        from reback.middleware.traffic_ingest import TrafficIngestMiddleware
+
+        def view(request):
+            return HttpResponse("ok")
+
+        def chain(request):
+            return CacheDebugHeaderMiddleware(RateLimitMiddleware(TrafficIngestMiddleware(view)))(request)
+
+        cache.set("rl:127.0.0.1", 100, 60)           # this IP is already over the limit
+        warm = chain(rf.get("/icfes/colegio/a/", HTTP_X_CACHE_WARM="s3cret"))
+        forged = chain(rf.get("/icfes/colegio/a/", HTTP_X_CACHE_WARM="guess"))
+
+        assert warm.status_code == 200
+        assert warm["X-Cache"] == "BYPASS"
+        assert forged.status_code == 429
+        assert not RailwayTrafficLog.objects.exists()
+
+        chain(rf.get("/icfes/", HTTP_X_CACHE_WARM="guess"))
+        assert list(RailwayTrafficLog.objects.values_list("path", flat=True)) == ["/icfes/"]
+
+    def test_gunicorn_hook_logs_the_warmers_output_and_failure(self, monkeypatch):
+        import runpy
+        import subprocess
+        from pathlib import Path
+        from types import SimpleNamespace
+
+        started = []
+
+        class Popen:
+            def __init__(self, command, **kwargs):
+                started.append(command)
+                self.stdout = iter(["10 URLs en sitemaps\n", "CommandError: /health/ no respondió 200\n"])
+
+            def wait(self):
+                return 1
+
+        class Thread:
+            def __init__(self, target, **kwargs):
+                self.target = target
+
+            def start(self):
+                self.target()
+
+        monkeypatch.setattr(subprocess, "Popen", Popen)
+        monkeypatch.setattr(threading, "Thread", Thread)
+        monkeypatch.setenv("DJANGO_SETTINGS_MODULE", "config.settings.railway")
+        logged = []
+        log = SimpleNamespace(
+            info=lambda msg, *args: logged.append(("info", msg % args)),
+            error=lambda msg, *args: logged.append(("error", msg % args)),
+        )
+
+        hooks = runpy.run_path(str(Path(__file__).resolve().parent.parent / "gunicorn.conf.py"))
+        hooks["when_ready"](SimpleNamespace(log=log))
+
+        assert started[0][-3:] == ["warm_cache", "--post-deploy", "--settings=config.settings.railway"]
+        assert logged == [
+            ("info", "[warm_cache] 10 URLs en sitemaps"),
+            ("info", "[warm_cache] CommandError: /health/ no respondió 200"),
+            ("error", "[warm_cache] failed with exit status 1"),
+        ]
+
+
+class TestWorkerWarmup:
+    def test_health_is_503_until_warm(self, rf, monkeypatch):
+        from config.urls import health_check
+
+        assert health_check(rf.get("/health/")).status_code == 200
+
+        monkeypatch.setattr(warmup, "_started", True)
+        monkeypatch.setattr(warmup, "_ready", threading.Event())
+        assert health_check(rf.get("/health/")).status_code == 503
+
+        warmup._ready.set()
+        assert health_check(rf.get("/health/")).status_code == 200
+
+    def test_failed_warmup_retries_then_reports_degraded(self, rf, monkeypatch):
+        from config.urls import health_check
+
+        attempts = []
+
+        def fail(threads):
+            attempts.append(threads)
+            raise RuntimeError("duckdb file missing")
+
+        monkeypatch.setattr(warmup, "_started", True)
+        monkeypatch.setattr(warmup, "_ready", threading.Event())
+        monkeypatch.setattr(warmup, "_state", {"status": "idle", "steps": {}})
+        monkeypatch.setattr(warmup, "RETRY_BACKOFF_SECONDS", 0)
+        monkeypatch.setattr(warmup, "_warm_once", fail)
+
+        assert warmup.run_warmup(threads=2, attempts=3) is False
+        assert attempts == [2, 2, 2]
+        response = health_check(rf.get("/health/"))
+        assert response.status_code == 200
+        assert response.content == b"ok: degraded"
+
+    def test_warmup_connection_is_not_left_to_the_thread(self, monkeypatch):
+        import duckdb
+
+        opened = []
+
+        def open_conn():
+            opened.append(duckdb.connect())
+            return opened[-1]
+
+        monkeypatch.setattr(db_utils, "_open_conn", open_conn)
+        monkeypatch.delattr(db_utils._thread_local, "conn", raising=False)
+        with db_utils.dedicated_connection():
+            with db_utils.get_duckdb_connection() as conn:
+                assert conn.execute("SELECT 1").fetchone() == (1,)
+        assert conn is opened[0]
+        assert not hasattr(db_utils._thread_local, "conn")
+        with pytest.raises(duckdb.ConnectionException):
+            conn.execute("SELECT 1")
+
+
+class TestSchoolSearch:
+    ROWS = [
+        ("105001000001", "INSTITUCIÓN EDUCATIVA SAN JOSÉ", "I.E. SAN JOSE", "ANTIOQUIA", "MEDELLÍN",
+         "OFICIAL", "sk1", 900, "ie-san-jose-medellin"),
+        ("111001000002", "COLEGIO SAN JOSÉ DE BOGOTÁ", "COLEGIO SAN JOSE DE BOGOTA", "BOGOTÁ", "BOGOTÁ D.C.",
+         "NO OFICIAL", "sk2", 120, "colegio-san-jose-de-bogota-bogota"),
+        ("176834000003", "CENTRO EDUCATIVO RURAL LA ESPERANZA", None, "VALLE DEL CAUCA", "TULUÁ",
+         "OFICIAL", None, None, None),
+    ]
+
+    def test_accents_abbreviations_and_ranking(self):
+        index = school_search.SchoolSearchIndex(self.ROWS)
+
+        assert [d["codigo_dane"] for d in index.search("colegio san jose bogota")] == ["111001000002"]
+        assert index.search("I.E. San Jos")[0]["codigo_dane"] == "105001000001"
+        assert index.search("institucion educativa san jose")[0]["slug"] == "ie-san-jose-medellin"
+        # Both San José match; the bigger school wins the tie.
+        assert [d["codigo_dane"] for d in index.search("san jose")] == ["105001000001", "111001000002"]
+        assert index.search("C.E.R. esperanza")[0]["codigo_dane"] == "176834000003"
+        assert index.search("esperansa")[0]["codigo_dane"] == "176834000003"  # trigram fallback
+        assert [d["codigo_dane"] for d in index.search("1760")] == []
+        assert [d["codigo_dane"] for d in index.search("17683")] == ["176834000003"]
+        assert index.search("esperanza", with_results=True) == []
+
+
+class TestSlugResolver:
+    def test_canonical_aliases_and_collisions(self):
+        index = slug_resolver.SlugIndex(
+            slug_rows=[
+                (105001000001, "institucion-educativa-san-jose-medellin"),
+                (105001000001, "institucion-educativa-san-jose-medellin-antioquia"),
+            ],
+            name_rows=[
+                (105001000001, "INSTITUCIÓN EDUCATIVA SAN JOSÉ", "MEDELLÍN"),
+                (176834000003, "COLEGIO SAN JOSÉ", "TULUÁ"),
+                (111001000002, "COLEGIO SAN JOSÉ", "BOGOTÁ D.C."),
+            ],
+            historical_rows=[
+                ("105001000001", "I.E. SAN JOSE", "MEDELLIN"),
+            ],
+        )
+
+        assert index.resolve("institucion-educativa-san-jose-medellin") == slug_resolver.SlugMatch(
+            "105001000001", "institucion-educativa-san-jose-medellin", False,
+        )
+        # Generated canonical slug for a school missing from dim_colegios_slugs.
+        assert index.resolve("colegio-san-jose-tulua") == ("176834000003", "colegio-san-jose-tulua", False)
+        # Historical "I.E." spelling and extra slugs-table rows redirect to the canonical slug.
+        for alias in ("ie-san-jose-medellin", "institucion-educativa-san-jose-medellin-antioquia"):
+            assert index.resolve(alias) == ("105001000001", "institucion-educativa-san-jose-medellin", True)
+        # Name-only slug shared by two schools is ambiguous.
+        assert index.resolve("colegio-san-jose") is None
+        assert index.resolve("institucion-educativa-san-jose").slug == "institucion-educativa-san-jose-medellin"
+        assert index.canonical_slug(111001000002) == "colegio-san-jose-bogota-dc"
+
+    SHARED_SLUG_ROWS = [
+        ("176834000009", "colegio-san-jose-tulua"),
+        ("176834000003", "colegio-san-jose-tulua"),
+        ("176834000003", "colegio-san-jose-tulua-valle"),
+    ]
+
+    def test_shared_canonical_slug_is_disambiguated_with_the_codigo(self):
+        index = slug_resolver.SlugIndex(
+            slug_rows=self.SHARED_SLUG_ROWS,
+            name_rows=[("176834000005", "COLEGIO SAN JOSÉ", "TULUÁ")],
+        )
+
+        assert index.collisions == 2
+        assert index.resolve("colegio-san-jose-tulua") == ("176834000003", "colegio-san-jose-tulua", False)
+        assert index.canonical_slug("176834000009") == "colegio-san-jose-tulua-176834000009"
+        assert index.canonical_slug("176834000005") == "colegio-san-jose-tulua-176834000005"
+        assert index.resolve("colegio-san-jose-tulua-176834000009").codigo == "176834000009"
+        assert index.resolve("colegio-san-jose-tulua-valle") == (
+            "176834000003", "colegio-san-jose-tulua", True,
+        )
+
+    def test_sitemap_lists_canonical_slugs_only(self, monkeypatch):
+        import duckdb
+
+        from icfes_dashboard import sitemap_views
+
+        conn = duckdb.connect()
+        conn.execute("CREATE SCHEMA gold")
+        conn.execute("CREATE TABLE gold.dim_colegios_slugs (codigo VARCHAR, slug VARCHAR, created_at TIMESTAMP)")
+        conn.executemany(
+            "INSERT INTO gold.dim_colegios_slugs VALUES (?, ?, TIMESTAMP '2025-01-01')", self.SHARED_SLUG_ROWS,
+        )
+        conn.execute("""
+            CREATE TABLE gold.fct_colegio_historico AS
+            SELECT * FROM (VALUES ('176834000009', '2024', 40, 250.0), ('176834000003', '2024', 60, 260.0))
+                t(codigo_dane, ano, total_estudiantes, avg_punt_global)
+        """)
+        monkeypatch.setattr(db_utils._thread_local, "conn", conn, raising=False)
+        monkeypatch.setattr(sitemap_views, "resolve_schema", lambda sql: sql)
+        index = slug_resolver.SlugIndex(self.SHARED_SLUG_ROWS, [])
+        monkeypatch.setattr(sitemap_views, "get_slug_index", lambda: index)
+
+        urls = [entry.loc for entry in sitemap_views._school_entries("https://x")]
+        assert urls == [
+            "https://x/icfes/colegio/colegio-san-jose-tulua/",
+            "https://x/icfes/colegio/colegio-san-jose-tulua-176834000009/",
+        ]
+        assert sitemap_views._indexable_school_count(conn) == 2
+
+
+class TestGazetteer:
+    ROWS = [
+        (True, "Bogotá DC", "Bogotá D.C."),
+        (True, "Valle del Cauca", "Tuluá"),
+        (True, "Archipiélago de San Andrés, Providencia y Santa Catalina", "San Andrés"),
+        (True, "Norte de Santander", "Cúcuta"),
+        (False, "BOGOTÁ", "BOGOTA D.C."),
+        (False, "VALLE", None),
+        (False, "SAN ANDRES PROVIDENCIA Y SANTA CATALINA", None),
+        (False, "AMAZONAS", None),
+    ]
+
+    def test_any_variant_resolves_to_canonical(self):
+        gaz = gazetteer.Gazetteer(self.ROWS, region_rows=["Región Caribe"])
+
+        for value in ("bogota-dc", "bogota", "BOGOTA D.C.", "Bogotá DC"):
+            assert gaz.departamento(value).name == "Bogotá DC"
+        assert gaz.departamento("valle").slug == "valle-del-cauca"
+        assert gaz.departamento("norte-santander").name == "Norte de Santander"
+        assert gaz.departamento("san-andres").name.startswith("Archipiélago")
+        assert gaz.departamento("amazonas", primary_only=True) is None
+        assert gaz.canonical_departamento("BOGOTÁ") == "Bogotá DC"
+        assert gaz.canonical_departamento("Atlántico") == "Atlántico"
+
+        assert gaz.municipio("bogota", "bogota-d-c").name == "Bogotá D.C."
+        assert gaz.municipio("valle-del-cauca", "tulua").name == "Tuluá"
+        assert gaz.municipio("valle-del-cauca", "cucuta") is None
+
+        assert {"VALLE", "Valle del Cauca"} <= set(gaz.departamento_variants("Valle del Cauca"))
+        assert {"BOGOTA D.C.", "Bogotá D.C."} <= set(gaz.municipio_variants("bogota"))
+        assert "Región Caribe" in gaz.region_variants("REGION CARIBE")
+
+
+class TestSimilarSchools:
+    def _frame(self, n=600, years=(2023, 2024), seed=7):
+        rng = np.random.default_rng(seed)
+        frames = []
+        for year in years:
+            frame = pd.DataFrame({
+                "codigo_dane": [f"1{i:011d}" for i in range(n)],
+                "ano": year,
+                "sector": rng.choice(["OFICIAL", "NO OFICIAL"], n),
+                "total_estudiantes": rng.integers(5, 400, n),
+                "pct_nbi_total": rng.uniform(5, 80, n),
+            })
+            for col in similar_schools.SUBJECT_FEATURES:
+                frame[col] = rng.normal(50, 8, n)
+            frames.append(frame)
+        df = pd.concat(frames, ignore_index=True)
+        df.loc[3, "avg_punt_ingles"] = None
+        return df
+
+    def test_blocked_top_k_matches_brute_force(self):
+        df = self._frame(years=(2024,))
+        features = similar_schools.feature_matrix(df)
+        weights = similar_schools.parse_weights("")
+        idx, dist = similar_schools.top_k_neighbors(features, k=5, weights=weights)
+
+        full = (((features[:, None, :] - features[None, :, :]) ** 2) * weights).sum(axis=2)
+        np.fill_diagonal(full, np.inf)
+        expected = np.sort(full, axis=1)[:, :5]
+        assert idx.shape == (600, 5)
+        assert (idx != np.arange(600)[:, None]).all()
+        np.testing.assert_allclose(dist ** 2, expected, rtol=1e-3, atol=1e-3)
+
+    def test_lookup_and_weighted_neighbors(self, tmp_path):
+        arrays = similar_schools.build_arrays(self._frame(), k=5)
+        path = similar_schools.save_index(arrays, tmp_path / "similar.npz", dataset_version="v1")
+        index = similar_schools.load_index(path)
+
+        assert index.dataset_version == "v1"
+        latest = index.neighbors_of("100000000010", limit=3)
+        assert len(latest) == 3
+        assert all(ano == 2024 and code != "100000000010" for code, ano, _ in latest)
+        assert [d for _, _, d in latest] == sorted(d for _, _, d in latest)
+        assert index.neighbors_of("100000000010", ano=2023, limit=3)[0][1] == 2023
+        assert index.neighbors_of("999", limit=3) == []
+
+        default = similar_schools.parse_weights("")
+        assert index.weighted_neighbors_of("100000000010", default, limit=3) == latest
+        only_math = similar_schools.parse_weights(
+            "lectura:0,naturales:0,sociales:0,ingles:0,sector:0,tamano:0,nbi:0"
+        )
+        row = index._row("100000000010")
+        year_rows = index._year_rows[2024]
+        gaps = np.abs(index.features[year_rows, 0] - index.features[row, 0])
+        gaps[year_rows == row] = np.inf
+        code, _, _ = index.weighted_neighbors_of("100000000010", only_math, limit=1)[0]
+        assert code == str(index.codes[index.row_code[year_rows[np.argmin(gaps)]]])
+
+    def test_parse_weights_rejects_bad_input(self):
+        for raw in ("foo:1", "ingles", "ingles:-1", "ingles:nan", "ingles:99"):
+            with pytest.raises(ValueError):
+                similar_schools.parse_weights(raw)
+
+
+class TestScoreDistribution:
+    ROWS = [
+        # ano, sector, departamento, municipio, global, mat, lec, nat, soc, ing
+        (2024, "OFICIAL", "Antioquia", "Medellín", 250.0, 50, 52, 49, 48, None),
+        (2024, "NO OFICIAL", "ANTIOQUIA", "MEDELLIN", 300.0, 60, 61, 59, 58, 62),
+        (2024, "OFICIAL", "Antioquia", "Envigado", 280.0, 55, 56, 54, 53, 57),
+        (2024, "OFICIAL", "Bogotá DC", "Bogotá D.C.", 280.0, 56, 55, 55, 54, 58),
+        (2024, "OFICIAL", "Bogotá DC", "Bogotá D.C.", 200.0, 40, 41, 39, 38, 0),
+        (2023, "OFICIAL", "Antioquia", "Medellín", 240.0, 48, 50, 47, 46, 45),
+    ]
+
+    def test_rank_matches_sql_rank_semantics(self):
+        dist = score_distribution.ScoreDistributions(self.ROWS)
+
+        assert dist.years == [2023, 2024]
+        assert dist.rank(280.0, 2024) == score_distribution.Ranking(2, 5, 80.0)
+        assert dist.rank(500.0, 2024) == score_distribution.Ranking(1, 5, 100.0)
+        assert dist.rank(100.0, 2024) == score_distribution.Ranking(6, 5, 0.0)
+        assert dist.rank(280.0, 2024, "ingles").total == 3   # NULL / 0 left out
+
+        ranks = dist.ranks(275.0, 2024, departamento="antioquia", municipio="medellin", sector="oficial")
+        assert ranks["departamento"] == (3, 3, 33.3)
+        assert ranks["municipio"] == (2, 2, 50.0)
+        assert ranks["sector"] == (3, 4, 50.0)
+        assert "municipio" not in dist.ranks(275.0, 2024, municipio="medellin")
+        assert dist.rank(275.0, 2022) is None
+
+    def test_sector_accepts_any_spelling_and_rejects_unknown(self, rf, monkeypatch):
+        from icfes_dashboard import api_views
+
+        dist = score_distribution.ScoreDistributions(self.ROWS)
+        assert dist.sectors == ["NO OFICIAL", "OFICIAL"]
+        for spelling in ("NO OFICIAL", "no-oficial", "no_oficial", " No Oficial ", "privados"):
+            assert dist.ranks(275.0, 2024, sector=spelling)["sector"] == (2, 1, 0.0)
+
+        monkeypatch.setattr(score_distribution, "get_distributions", lambda: dist)
+
+        def get(sector):
+            return api_views.score_ranking(rf.get("/icfes/api/ranking/percentil/", {"puntaje": "275", "sector": sector}))
+
+        ok = get("no-oficial")
+        assert ok.status_code == 200
+        assert json.loads(ok.content)["rankings"]["sector"]["total"] == 1
+        unknown = get("publico")
+        assert unknown.status_code == 400
+        assert json.loads(unknown.content)["error"] == "sector must be one of NO OFICIAL, OFICIAL"
+
+    def test_calculate_ranking(self):
+        scores = [250.0, 300.0, 280.0, 280.0, 200.0]
+        assert calculate_ranking(280.0, scores) == {"rank": 2, "total": 5, "percentile": 80.0}
+        assert calculate_ranking(300.0, scores)["rank"] == 1
+        assert calculate_ranking(275.0, scores)["rank"] is None
+
+
+class TestLeaderboards:
+    @staticmethod
+    def _row(kind, ano, posicion, nombre, sector="OFICIAL", dep="", muni="", scope_sector="",
+             population=(None, None), **values):
+        fields = dict.fromkeys(leaderboards.LeaderboardRow._fields)
+        fields.update(
+            posicion=posicion, nombre_colegio=nombre, sector=sector, slug=nombre.lower(),
+            departamento="Antioquia", municipio="Medellín", **values,
+        )
+        return (kind, str(ano), scope_sector, dep, muni, *population, *fields.values())
+
+    def test_boards_keep_page_shape_and_order(self):
+        rows = [
+            self._row("general", 2024, 2, "B", punt_global=290.0, total_estudiantes=40),
+            self._row("general", 2024, 1, "A", punt_global=310.0, total_estudiantes=30),
+            self._row("general", 2023, 1, "C", punt_global=300.0, total_estudiantes=20),
+            self._row("sector", 2024, 1, "A", scope_sector="OFICIAL", dep="Antioquia", total_estudiantes=30),
+        ]
+        boards = leaderboards.Leaderboards(rows)
+
+        assert boards.years("general") == [2024, 2023]
+        assert boards.rows("general", 2024) == [
+            ("A", "Antioquia", "Medellín", "OFICIAL", 310.0, 30, "a"),
+            ("B", "Antioquia", "Medellín", "OFICIAL", 290.0, 40, "b"),
+        ]
+        assert len(boards.rows("sector", 2024, "OFICIAL", "Antioquia")[0]) == 17
+        # Materialized year, empty scope → []; year not materialized → None (SQL fallback).
+        assert boards.rows("sector", 2024, "OFICIAL", "Cauca") == []
+        assert boards.rows("general", 2019) is None
+        assert boards.rows("mejoraron", 2024) is None
+        assert [s[:3] for s in boards.scopes("sector", 2024)] == [("OFICIAL", "Antioquia", "")]
+
+    def test_sitemap_thresholds_use_the_whole_municipio(self, monkeypatch):
+        from icfes_dashboard import sitemap_views
+
+        rows = [
+            # One named school on the board, but three schools and 45 students in the municipio.
+            self._row("sector", 2024, 1, "A", scope_sector="OFICIAL", dep="Antioquia", muni="Medellín",
+                      population=(3, 45), total_estudiantes=15),
+            # Two schools on the board, but under 20 students between them.
+            self._row("sector", 2024, 1, "B", scope_sector="OFICIAL", dep="Antioquia", muni="Bello",
+                      population=(2, 19), total_estudiantes=10),
+            self._row("sector", 2024, 2, "C", scope_sector="OFICIAL", dep="Antioquia", muni="Bello",
+                      population=(2, 19), total_estudiantes=9),
+            self._row("sector", 2024, 1, "A", scope_sector="OFICIAL", dep="Antioquia",
+                      population=(5, 64), total_estudiantes=15),
+        ]
+        monkeypatch.setattr(sitemap_views, "get_leaderboards", lambda: leaderboards.Leaderboards(rows))
+
+        assert sitemap_views._materialized_sector_scopes(municipal=True) == [
+            ("OFICIAL", "Antioquia", "Medellín"),
+        ]
+        assert sitemap_views._materialized_sector_scopes(municipal=False) == [("OFICIAL", "Antioquia")]
+
+
+class TestSchoolBundle:
+    @override_settings(CACHES=LOCMEM_CACHE)
+    def test_sections_run_once_and_cache_separately(self, rf, monkeypatch):
+        from django.core.cache import cache
+        from django.http import JsonResponse
+
+        cache.clear()
+        calls = []
+
+        def resumen(request, colegio_sk):
+            calls.append("resumen")
+            return JsonResponse({"info_basica": {"colegio_sk": colegio_sk}})
+
+        def chart(request, colegio_sk):
+            calls.append(("chart", request.GET.get("ano")))
+            return JsonResponse({"labels": []})
+
+        def missing(request, colegio_sk):
+            return JsonResponse({"error": "Colegio no encontrado"}, status=404)
+
+        def html_error(request, colegio_sk):
+            return HttpResponse("<html>Server Error</html>", status=502)
+
+        monkeypatch.setattr(views_school_bundle, "SECTIONS", {
+            "resumen": (resumen, ()),
+            "comparacion_chart_data": (chart, ("ano",)),
+            "correlaciones": (missing, ()),
+            "distribucion_niveles": (html_error, ()),
+        })
+        monkeypatch.setattr(views_school_bundle, "_latest_year", lambda sk: 2024)
+        monkeypatch.setattr(views_school_bundle, "get_duckdb_connection", lambda: contextlib.nullcontext())
+
+        url = "/icfes/api/colegio/42/bundle/"
+        data = json.loads(views_school_bundle.api_colegio_bundle(rf.get(url), "42").content)
+        assert data["sections"] == {"resumen": {"info_basica": {"colegio_sk": "42"}}, "comparacion_chart_data": {"labels": []}}
+        assert data["errors"] == {
+            "correlaciones": {"status": 404, "error": "Colegio no encontrado"},
+            # A body that is not JSON fails only its own section.
+            "distribucion_niveles": {"status": 500, "error": "Error interno"},
+        }
+        assert calls == ["resumen", ("chart", "2024")]
+
+        # Cached per section: a different combination reuses resumen.
+        views_school_bundle.api_colegio_bundle(rf.get(url, {"sections": "resumen"}), "42")
+        views_school_bundle.api_colegio_bundle(rf.get(url, {"sections": "comparacion_chart_data", "ano": "2023"}), "42")
+        assert calls == ["resumen", ("chart", "2024"), ("chart", "2023")]
+
+        assert views_school_bundle.api_colegio_bundle(rf.get(url, {"sections": "nope"}), "42").status_code == 400
+
+
+class TestDashboardBundle:
+    def test_panels_stream_on_cursors_of_the_request_connection(self, rf, monkeypatch):
+        import duckdb
+        from django.http import JsonResponse
+
+        parent = duckdb.connect()
+        monkeypatch.setattr(db_utils._thread_local, "conn", parent, raising=False)
+        seen = []
+
+        def panel(value):
+            def view(request):
+                with db_utils.get_duckdb_connection() as conn:
+                    seen.append(conn is not parent)
+                    row = conn.execute("SELECT ?::INTEGER + 1", [value]).fetchone()
+                return JsonResponse({"data": row[0], "ano": request.GET.get("ano")})
+            return view
+
+        def broken(request):
+            return JsonResponse({"error": "tabla no existe"}, status=500)
+
+        monkeypatch.setitem(views_dashboard_bundle.DASHBOARDS, "test", {
+            "uno": (panel(1), ("ano",), {}),
+            "dos": (panel(2), (), {}),
+            "roto": (broken, (), {}),
+        })
+
+        response = views_dashboard_bundle.api_dashboard_bundle(rf.get("/", {"ano": "2024"}), "test")
+        assert response["Content-Type"] == "application/x-ndjson"
+        lines = [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+        panels = {line["panel"]: line for line in lines}
+        assert panels["uno"]["data"] == {"data": 2, "ano": "2024"}
+        assert panels["dos"]["data"] == {"data": 3, "ano": None}
+        assert panels["roto"] == {"panel": "roto", "status": 500, "error": "tabla no existe"}
+        assert seen == [True, True]
+
+        assert views_dashboard_bundle.api_dashboard_bundle(rf.get("/"), "nope").status_code == 404
+        assert views_dashboard_bundle.api_dashboard_bundle(rf.get("/", {"panels": "x"}), "test").status_code == 400
+
+    def test_gzip_clients_get_each_panel_as_it_finishes(self, rf, monkeypatch):
+        import zlib
+
+        from django.http import JsonResponse
+        from django.middleware.gzip import GZipMiddleware
+
+        monkeypatch.setattr(views_dashboard_bundle, "get_duckdb_connection", contextlib.nullcontext)
+        monkeypatch.setattr(views_dashboard_bundle, "borrowed_cursor", lambda conn: contextlib.nullcontext())
+        first_read = threading.Event()
+
+        def fast(request):
+            return JsonResponse({"data": "rápido"})
+
+        def slow(request):
+            assert first_read.wait(5), "el primer panel no salió antes que el último"
+            return JsonResponse({"data": "lento"})
+
+        monkeypatch.setitem(views_dashboard_bundle.DASHBOARDS, "test", {
+            "rapido": (fast, (), {}),
+            "lento": (slow, (), {}),
+        })
+
+        request = rf.get("/", HTTP_ACCEPT_ENCODING="gzip, br")
+        response = GZipMiddleware(lambda req: views_dashboard_bundle.api_dashboard_bundle(req, "test"))(request)
+        assert response["Content-Encoding"] == "gzip"
+        assert "Accept-Encoding" in response["Vary"]
+
+        decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        chunks = iter(response.streaming_content)
+        first = json.loads(decoder.decompress(next(chunks)))
+        assert first == {"panel": "rapido", "status": 200, "data": {"data": "rápido"}}
+        first_read.set()
+
+        rest = b"".join(decoder.decompress(chunk) for chunk in chunks) + decoder.flush()
+        assert json.loads(rest)["panel"] == "lento"
+
+    def test_counts_one_query_per_panel(self, rf, monkeypatch):
+        from types import SimpleNamespace
+
+        monkeypatch.setattr(views_dashboard_bundle, "stream_panels", lambda *args: iter(()))
+        plan = SimpleNamespace(max_queries_per_day=10, tier="free")
+
+        def request(remaining, panels):
+            req = rf.get("/", {"panels": panels})
+            req.subscription = SimpleNamespace(
+                plan=plan, queries_today=10 - remaining, get_remaining_queries=lambda: remaining,
+            )
+            return req
+
+        allowed = request(3, "tendencia,regiones,brechas")
+        assert views_dashboard_bundle.api_dashboard_bundle(allowed, "historia").status_code == 200
+        assert allowed.query_cost == 3
+
+        short = request(2, "tendencia,regiones,brechas")
+        response = views_dashboard_bundle.api_dashboard_bundle(short, "historia")
+        assert response.status_code == 429
+        assert json.loads(response.content)["queries_used"] == 8
+
+
+class TestStreamingExports:
+    @pytest.fixture
+    def duck(self, monkeypatch):
+        import duckdb
+
+        conn = duckdb.connect()
+        conn.execute("CREATE SCHEMA gold")
+        conn.execute("""
+            CREATE TABLE gold.fct_colegio_historico AS
+            SELECT CAST(2024 AS VARCHAR) AS ano, 'Colegio ' || i AS nombre_colegio,
+                   'Depto ' || (i % 3) AS departamento, 'Muni' AS municipio, 'OFICIAL' AS sector,
+                   200.0 + i AS avg_punt_global, 50.0 AS avg_punt_lectura_critica,
+                   50.0 AS avg_punt_matematicas, 50.0 AS avg_punt_sociales_ciudadanas,
+                   50.0 AS avg_punt_c_naturales, 50.0 AS avg_punt_ingles, 10 + i AS total_estudiantes
+            FROM range(5000) t(i)
+        """)
+        monkeypatch.setattr(db_utils._thread_local, "conn", conn, raising=False)
+        monkeypatch.setattr(export_views, "resolve_schema", lambda sql: sql)
+        return conn
+
+    def test_csv_streams_in_batches(self, duck, monkeypatch):
+        monkeypatch.setattr(export_views, "EXPORT_BATCH_ROWS", 1000)
+        cursor = export_views._export_cursor(export_views.SCHOOL_SEARCH_EXPORT_SQL, [2024, "%colegio%"])
+        chunks = list(export_views.stream_csv(cursor, ["Nombre"]))
+
+        assert len(chunks) == 1 + 5              # header + 5 fetchmany batches
+        assert chunks[0] == "Nombre\r\n"
+        assert chunks[1].startswith("Colegio 4999,")
+        assert sum(chunk.count("\n") for chunk in chunks[1:]) == 5000
+
+    def test_parquet_is_written_by_duckdb(self, duck, tmp_path):
+        response = export_views._parquet_response(export_views.RANKING_EXPORT_SQL, [2024], "ranking")
+        temporary = response.file_to_stream.name
+        out = tmp_path / "ranking.parquet"
+        out.write_bytes(b"".join(response.streaming_content))
+        assert os.path.exists(temporary)           # open while it is being sent
+        response.file_to_stream.close()           # what HttpResponse.close() runs
+        assert not os.path.exists(temporary)
+
+        assert response["Content-Disposition"] == 'attachment; filename="ranking.parquet"'
+        rows = duck.execute(f"SELECT departamento, total_estudiantes FROM '{out}' ORDER BY 1").fetchall()
+        assert [r[0] for r in rows] == ["Depto 0", "Depto 1", "Depto 2"]
+        assert sum(r[1] for r in rows) == sum(10 + i for i in range(5000))
+
+    def test_ranking_averages_ignore_schools_without_the_score(self, duck):
+        duck.execute("UPDATE gold.fct_colegio_historico SET avg_punt_ingles = NULL WHERE departamento = 'Depto 0'")
+        duck.execute("UPDATE gold.fct_colegio_historico SET avg_punt_ingles = 80.0 WHERE nombre_colegio = 'Colegio 0'")
+        rows = duck.execute(export_views.RANKING_EXPORT_SQL, [2024]).fetchall()
+        ingles = {row[0]: row[6] for row in rows}
+        assert ingles == {"Depto 0": 80.0, "Depto 1": 50.0, "Depto 2": 50.0}
+
+
+class TestPdfReportJobs:
+    @pytest.fixture
+    def duck(self, monkeypatch):
+        import duckdb
+
+        conn = duckdb.connect()
+        conn.execute("CREATE SCHEMA gold")
+        conn.execute("""
+            CREATE TABLE gold.dim_colegios AS
+            SELECT 'sk1' AS colegio_sk, 'Colegio Uno' AS cole_nombre_establecimiento,
+                   'ANTIOQUIA' AS cole_depto_ubicacion, 'MEDELLIN' AS cole_mcpio_ubicacion,
+                   'OFICIAL' AS cole_naturaleza, 'A' AS cole_calendario
+        """)
+        conn.execute("""
+            CREATE TABLE gold.fct_colegio_historico AS
+            SELECT 'sk1' AS colegio_sk, CAST(2015 + i AS VARCHAR) AS ano,
+                   250.0 + i AS avg_punt_global, 50.0 AS avg_punt_lectura_critica,
+                   50.0 AS avg_punt_matematicas, 50.0 AS avg_punt_sociales_ciudadanas,
+                   50.0 AS avg_punt_c_naturales, 50.0 AS avg_punt_ingles, 80 AS total_estudiantes
+            FROM range(10) t(i)
+        """)
+        monkeypatch.setattr(db_utils._thread_local, "conn", conn, raising=False)
+        monkeypatch.setattr(pdf_reports, "resolve_schema", lambda sql: sql)
+        monkeypatch.setattr(pdf_reports, "get_dataset_version", lambda: None)
+        return conn
+
+    @override_settings(CACHES=LOCMEM_CACHE)
+    def test_eager_task_serves_pdf_and_caches_it(self, duck, rf, monkeypatch):
+        params = {"colegio_sk": "sk1", "ano": 2022}
+        response = export_views._report_response(rf.get("/"), "school", params)
+
+        assert response.status_code == 200
+        assert response.content.startswith(b"%PDF")
+        assert response["Content-Disposition"] == 'attachment; filename="reporte_sk1.pdf"'
+
+        monkeypatch.setitem(pdf_reports.BUILDERS, "school", lambda **kw: pytest.fail("rebuilt"))
+        assert export_views._report_response(rf.get("/"), "school", params).content == response.content
+
+    @override_settings(CACHES=LOCMEM_CACHE)
+    def test_queued_job_is_polled_until_ready(self, duck, rf, monkeypatch):
+        queued = []
+        monkeypatch.setattr(tasks.generate_pdf_report, "delay", lambda *args: queued.append(args))
+        request = rf.get("/", HTTP_ACCEPT="application/json")
+        params = {"colegios": ["sk1", "sk2"], "ano": 2024}
+
+        first = export_views._report_response(request, "comparison", params)
+        second = export_views._report_response(request, "comparison", params)
+        job = json.loads(first.content)
+
+        assert first.status_code == second.status_code == 202
+        assert job["status"] == pdf_reports.PENDING
+        assert len(queued) == 1                  # second click joins the pending job
+
+        tasks.generate_pdf_report(*queued[0])
+        assert pdf_reports.job_status(job["job_id"]) == {"status": pdf_reports.READY}
+        assert export_views._report_response(request, "comparison", params).status_code == 200
+
+    @override_settings(CACHES=LOCMEM_CACHE)
+    def test_unknown_school_is_404(self, duck, rf):
+        response = export_views._report_response(rf.get("/"), "school", {"colegio_sk": "nope", "ano": None})
+        assert response.status_code == 404
+
+    @override_settings(CACHES=LOCMEM_CACHE)
+    def test_failed_job_is_reported_not_requeued(self, duck, rf, monkeypatch):
+        def broken(**kw):
+            raise RuntimeError("boom")
+
+        monkeypatch.setitem(pdf_reports.BUILDERS, "school", broken)
+        request = rf.get("/", HTTP_ACCEPT="application/json")
+        params = {"colegio_sk": "sk1", "ano": 2021}
+
+        first = export_views._report_response(request, "school", params)
+        assert first.status_code == 500
+        assert json.loads(first.content)["status"] == pdf_reports.ERROR
+
+        monkeypatch.setattr(tasks, "enqueue_report", lambda *args: pytest.fail("requeued"))
+        monkeypatch.setattr(export_views, "enqueue_report", lambda *args: pytest.fail("requeued"))
+        assert export_views._report_response(request, "school", params).status_code == 500
+
+    @override_settings(CACHES=LOCMEM_CACHE)
+    def test_builds_inline_when_broker_is_down(self, duck, rf, monkeypatch):
+        def no_broker(*args):
+            raise ConnectionError("broker unreachable")
+
+        monkeypatch.setattr(tasks.generate_pdf_report, "delay", no_broker)
+        response = export_views._report_response(rf.get("/"), "school", {"colegio_sk": "sk1", "ano": 2020})
+        assert response.status_code == 200
+        assert response.content.startswith(b"%PDF")
+
+
+def _student_frame(n=3000, seed=0):
+    """Filas sintéticas de icfes_silver.icfes con las columnas de SQL_PREDICTOR."""
+    fe = feature_engineering
+    rng = np.random.default_rng(seed)
+
+    def pick(values):
+        return rng.choice(list(values) + [None], n)
+
+    return pd.DataFrame({
+        "punt_global": rng.normal(250, 40, n).round(),
+        "fami_estratovivienda": pick(list(fe.ESTRATO_MAP) + ["Otro"]),
+        "fami_educacionmadre": pick(fe.EDU_MAP),
+        "fami_educacionpadre": pick(fe.EDU_MAP),
+        "fami_tieneinternet": pick(["Si ", "No"]),
+        "fami_tienecomputador": pick(["S", "N"]),
+        "fami_numlibros": pick(fe.LIBROS_MAP),
+        "fami_personashogar": pick(["3", "4", "5", "x"]),
+        "fami_situacioneconomica": pick(fe.SITUACION_ECO_MAP),
+        "cole_naturaleza": pick(["oficial ", "NO OFICIAL"]),
+        "cole_area_ubicacion": pick(["URBANO", "rural"]),
+        "estu_genero": pick(["F", "M"]),
+        "estu_horassemanatrabaja": pick(fe.HORAS_TRABAJO_MAP),
+        "estu_dedicacionlecturadiaria": pick(fe.HORAS_LECTURA_MAP),
+        "ano": rng.integers(2014, 2025, n),
+        "pct_nbi_total": np.where(rng.random(n) < 0.1, np.nan, rng.random(n) * 60),
+    })
+
+
+def _use_students(monkeypatch, df):
+    import duckdb
+
+    conn = duckdb.connect()
+    conn.execute("CREATE SCHEMA icfes_silver")
+    conn.register("src", df)
+    conn.execute("CREATE TABLE icfes_silver.icfes AS SELECT * FROM src")
+    monkeypatch.setattr(db_utils._thread_local, "conn", conn, raising=False)
+    monkeypatch.setattr(streaming, "resolve_schema", lambda sql: sql)
+
+
+class TestStreamingTraining:
+    sql = "SELECT * FROM icfes_silver.icfes"
+
+    @pytest.fixture
+    def students(self, monkeypatch):
+        df = _student_frame()
+        _use_students(monkeypatch, df)
+        return df
+
+    def test_batches_encode_like_encode_features(self, students):
+        spec = streaming.fit_encoding_spec_sql(self.sql)
+        blocks = [feature_engineering.encode_batch(b, spec) for b in streaming.iter_batches(self.sql, 1024)]
+        encoded = np.vstack(blocks)
+
+        assert len(blocks) > 1
+        assert encoded.dtype == np.float32
+        assert spec == feature_engineering.fit_encoding_spec(students)
+        expected = feature_engineering.encode_features(students, spec).to_numpy(np.float32)
+        np.testing.assert_array_equal(encoded, expected)
+
+    def test_hash_split_is_deterministic_and_disjoint(self, students):
+        def rows(test):
+            return sorted(
+                repr(tuple(r)) for b in streaming.iter_batches(streaming.split_sql(self.sql, test))
+                for r in b.itertuples(index=False)
+            )
+
+        train, test = rows(False), rows(True)
+        assert len(train) + len(test) == len(students)
+        assert 0.10 < len(test) / len(students) < 0.20
+        assert rows(True) == test
+
+    def test_streaming_training_writes_artifacts(self, students, monkeypatch, tmp_path):
+        monkeypatch.setattr(train_models, "ARTIFACTS_DIR", tmp_path)
+        monkeypatch.setattr(train_models, "NUM_BOOST_ROUND", 5)
+        monkeypatch.setattr(train_models, "SHAP_SAMPLE_ROWS", 500)
+
+        result = train_models.train_predictor_streaming(self.sql, batch_rows=1024)
+
+        assert result["n_rows"] == len(students)
+        importances = json.loads((tmp_path / "shap_importances.json").read_text())
+        assert {i["feature"] for i in importances} == set(feature_engineering.FEATURE_COLS)
+        assert train_models.load_encoding_spec(tmp_path / "encoding_spec.json")["checksum"] == result["encoding_spec"]
+
+
+class TestFeatureEncoding:
+    @pytest.fixture
+    def df(self):
+        return pd.DataFrame({
+            "fami_estratovivienda": ["Estrato 2", None, "Otro", "Estrato 6"],
+            "fami_educacionmadre": ["Postgrado", "Ninguno", None, "Primaria completa"],
+            "fami_educacionpadre": [None, "Postgrado", "Postgrado", "No sabe"],
+            "fami_tieneinternet": ["Si ", "No", None, "Si"],
+            "fami_tienecomputador": ["S", "N", "N", None],
+            "fami_numlibros": ["0 a 10", "Más de 100", None, "11 a 25"],
+            "fami_personashogar": ["3", "x", None, "6"],
+            "fami_situacioneconomica": [None] * 4,
+            "cole_naturaleza": ["oficial ", "NO OFICIAL", None, "OFICIAL"],
+            "cole_area_ubicacion": ["rural", "URBANO", None, "x"],
+            "estu_genero": ["F", "M", None, "M"],
+            "estu_horassemanatrabaja": ["0", "Más de 30 horas", None, "0"],
+            "estu_dedicacionlecturadiaria": ["No leo", None, "Más de 2 horas", "No leo"],
+            "ano": [2014, 2024, None, 2020],
+            "pct_nbi_total": [10.0, None, 30.0, 50.0],
+        })
+
+    def test_compact_dtypes_match_dictmap_encoding(self, df):
+        from icfes_dashboard.management.commands.benchmark_feature_encoding import encode_features_dictmap
+
+        encoded = feature_engineering.encode_features(df)
+
+        assert list(encoded.columns) == feature_engineering.FEATURE_COLS
+        assert encoded["fami_estratovivienda"].dtype == np.int8
+        assert encoded["ano"].dtype == np.int16
+        assert encoded["pct_nbi_total"].dtype == np.float32
+        np.testing.assert_array_equal(encoded.to_numpy(np.float64), encode_features_dictmap(df).to_numpy())
+
+    def test_spec_round_trips_through_json(self, df):
+        spec = feature_engineering.fit_encoding_spec(df)
+        loaded = feature_engineering.validate_encoding_spec(json.loads(json.dumps(spec)))
+
+        pd.testing.assert_frame_equal(
+            feature_engineering.encode_features(df.iloc[:2], loaded),
+            feature_engineering.encode_features(df, spec).iloc[:2],
+        )
+        loaded["features"][0]["fill"] = 3
+        with pytest.raises(ValueError):
+            feature_engineering.validate_encoding_spec(loaded)
+
+
+class TestShapPopulation:
+    sql = "SELECT * FROM icfes_silver.icfes"
+
+    @pytest.fixture
+    def trained(self, monkeypatch, tmp_path):
+        from icfes_dashboard.ml import shap_population
+
+        df = _student_frame(5000, seed=1)
+        rng = np.random.default_rng(1)
+        df["colegio_bk"] = rng.choice(["c1", "c2", "c3", None], len(df))
+        df["departamento"] = df["colegio_bk"].map({"c1": "ANTIOQUIA", "c2": "ANTIOQUIA", "c3": "CHOCO"})
+        _use_students(monkeypatch, df)
+        monkeypatch.setattr(shap_population, "resolve_schema", lambda sql: sql)
+        monkeypatch.setattr(train_models, "ARTIFACTS_DIR", tmp_path)
+        monkeypatch.setattr(shap_population, "ARTIFACTS_DIR", tmp_path)
+        monkeypatch.setattr(train_models, "NUM_BOOST_ROUND", 5)
+        monkeypatch.setattr(train_models, "SHAP_SAMPLE_ROWS", 200)
+        train_models.train_predictor_streaming(self.sql, batch_rows=1024)
+        return df
+
+    @staticmethod
+    def _read(path):
+        import duckdb
+
+        return duckdb.connect().execute("SELECT * FROM read_parquet(?)", [str(path)]).fetchdf()
+
+    def test_aggregates_match_direct_pred_contribs(self, trained, tmp_path, settings, rf):
+        from types import SimpleNamespace
+
+        from icfes_dashboard import views_ml
+        import xgboost as xgb
+        from icfes_dashboard.ml import shap_population
+
+        settings.SHAP_POPULATION_DIR = str(tmp_path / "shap")
+        manifest = shap_population.build_shap_population(
+            self.sql, workers=2, chunk_rows=2048, spec_path=tmp_path / "encoding_spec.json",
+        )
+
+        spec = train_models.load_encoding_spec(tmp_path / "encoding_spec.json")
+        model = train_models.load_predictor(tmp_path / "predictor.ubj", spec)
+        X = feature_engineering.encode_features(trained, spec)
+        contribs = model.predict(xgb.DMatrix(X, feature_names=feature_engineering.FEATURE_COLS), pred_contribs=True)
+        direct = trained[["colegio_bk", "departamento", "ano"]].assign(
+            shap_ano=contribs[:, feature_engineering.FEATURE_COLS.index("ano")],
+            pred=contribs.sum(axis=1),
+        )
+        expected = (
+            direct.dropna(subset=["colegio_bk"])
+            .groupby(["colegio_bk", "ano"])[["shap_ano", "pred"]].mean()
+        )
+
+        table = self._read(shap_population.table_path("colegio_ano")).set_index(["colegio_bk", "ano"])
+        assert manifest["filas"] == len(trained)
+        assert table["n"].sum() == trained["colegio_bk"].notna().sum()
+        np.testing.assert_allclose(table.loc[expected.index, "shap_ano"], expected["shap_ano"], atol=1e-3)
+        np.testing.assert_allclose(table.loc[expected.index, "puntaje_predicho"], expected["pred"], atol=1e-3)
+
+        depto = self._read(shap_population.table_path("departamento_ano"))
+        assert depto["n"].sum() == len(trained)
+        shap_cols = [f"shap_{f}" for f in feature_engineering.FEATURE_COLS]
+        np.testing.assert_allclose(depto["base"] + depto[shap_cols].sum(axis=1), depto["puntaje_predicho"], atol=1e-2)
+
+        request = rf.get("/icfes/api/ml/shap-colegio/", {"colegio_bk": "c3", "ano": "2020"})
+        request.user = SimpleNamespace(is_authenticated=True)
+        data = json.loads(views_ml.api_ml_shap_colegio(request).content)
+        assert data["encontrado"] and data["departamento"] == "CHOCO"
+        assert data["puntaje_predicho"] == pytest.approx(expected.loc[("c3", 2020), "pred"], abs=0.1)
+        assert len(data["contribuciones"]) == len(feature_engineering.FEATURE_COLS)
+
+    def test_rejects_booster_from_another_encoding(self, trained, tmp_path):
+        spec = train_models.load_encoding_spec(tmp_path / "encoding_spec.json")
+        spec["checksum"] = "otro"
+
+        with pytest.raises(ValueError):
+            train_models.load_predictor(tmp_path / "predictor.ubj", spec)
+
+
+class TestWhatIf:
+    sql = "SELECT * FROM icfes_silver.icfes WHERE colegio_bk IS NOT NULL"
+
+    @pytest.fixture
+    def engine(self, monkeypatch, tmp_path):
+        from icfes_dashboard.ml import what_if
+
+        df = _student_frame(3000, seed=2)
+        df["colegio_bk"] = np.random.default_rng(2).choice(["c1", "c2", "c3", None], len(df))
+        _use_students(monkeypatch, df)
+        monkeypatch.setattr(what_if, "resolve_schema", lambda sql: sql)
+        monkeypatch.setattr(train_models, "ARTIFACTS_DIR", tmp_path)
+        monkeypatch.setattr(what_if, "ARTIFACTS_DIR", tmp_path)
+        monkeypatch.setattr(train_models, "NUM_BOOST_ROUND", 5)
+        monkeypatch.setattr(train_models, "SHAP_SAMPLE_ROWS", 200)
+        monkeypatch.setattr(what_if, "_engine", None)
+        train_models.train_predictor_streaming("SELECT * FROM icfes_silver.icfes", batch_rows=1024)
+
+        spec = train_models.load_encoding_spec()
+        ano = what_if.latest_year(self.sql)
+        what_if.save_population(what_if.build_population(spec, ano, self.sql, batch_rows=1024))
+        return what_if.get_engine(), df[df["colegio_bk"].notna() & (df["ano"] == ano)]
+
+    def test_scenarios_match_direct_prediction(self, engine):
+        import xgboost as xgb
+        from icfes_dashboard.ml import what_if
+
+        engine, students = engine
+        school = students[students["colegio_bk"] == "c2"]
+        result = engine.evaluate("c2", [{"libros": 1}, {"internet": 50}])
+
+        spec = train_models.load_encoding_spec()
+        X = feature_engineering.encode_features(school, spec).to_numpy(np.float32)
+        model = train_models.load_predictor(spec=spec)
+
+        def predict(matrix):
+            return model.predict(xgb.DMatrix(matrix, feature_names=feature_engineering.FEATURE_COLS)).mean()
+
+        libros = X.copy()
+        j = feature_engineering.FEATURE_COLS.index("fami_numlibros")
+        libros[:, j] = np.clip(libros[:, j] + 1, 1, 4)
+        assert result["n_estudiantes"] == len(school)
+        assert result["puntaje_predicho"] == pytest.approx(predict(X), abs=1e-3)
+        assert result["escenarios"][0]["puntaje_predicho"] == pytest.approx(predict(libros), abs=1e-3)
+        assert result["escenarios"][0]["estudiantes_afectados"] == int((X[:, j] < 4).sum())
+
+        j = feature_engineering.FEATURE_COLS.index("fami_tieneinternet")
+        without = int((X[:, j] == 0).sum())
+        assert result["escenarios"][1]["estudiantes_afectados"] == min(without, round(len(X) / 2))
+        assert engine.evaluate("c2", [{"internet": 50}])["escenarios"][0] == result["escenarios"][1]
+        assert engine.evaluate("desconocido", [{"libros": 1}]) is None
+        assert what_if.parse_scenario("internet:+20, libros:1") == {"internet": 20, "libros": 1}
+        for raw in ("estrato:1", "libros:9", "libros:x", ""):
+            with pytest.raises(ValueError):
+                what_if.parse_scenario(raw)
+
+    def test_view_batches_scenarios(self, engine, rf):
+        from types import SimpleNamespace
+
+        from icfes_dashboard import views_ml
+
+        def get(params):
+            request = rf.get("/icfes/api/ml/what-if/", params)
+            request.user = SimpleNamespace(is_authenticated=True)
+            return views_ml.api_ml_what_if(request)
+
+        data = json.loads(get({"colegio_bk": "c1", "escenario": ["internet:20,libros:1", "lectura:-2"]}).content)
+        assert data["encontrado"]
+        assert [e["escenario"] for e in data["escenarios"]] == ["internet:+20,libros:+1", "lectura:-2"]
+        assert len(json.loads(get({"colegio_bk": "c1"}).content)["escenarios"]) == 5
+        assert get({"colegio_bk": "c1", "escenario": "estrato:1"}).status_code == 400
+        assert json.loads(get({"colegio_bk": "c9"}).content) == {"encontrado": False, "colegio_bk": "c9"}
+
+
+class TestPalancasColegio:
+    def test_colegio_bk_is_a_query_parameter(self, monkeypatch, rf):
+        import duckdb
+        from types import SimpleNamespace
+
+        from icfes_dashboard import views_ml
+
+        conn = duckdb.connect()
+        conn.execute("CREATE SCHEMA gold")
+        conn.execute("""
+            CREATE TABLE gold.fct_ml_palancas_colegio AS
+            SELECT 'c1' AS colegio_bk, 120 AS n_estudiantes, 250.0 AS puntaje_actual, 1 AS palanca_rank,
+                   'fami_numlibros' AS feature, 'Libros en casa' AS feature_label, '📚' AS icono,
+                   4.5 AS delta_pts, 'Más libros' AS descripcion
+        """)
+        conn.execute("""
+            CREATE TABLE gold.fct_agg_colegios_ano AS
+            SELECT '1' AS colegio_bk, '2024' AS ano, 'Colegio Uno' AS nombre_colegio,
+                   'ANTIOQUIA' AS departamento, 'OFICIAL' AS sector
+        """)
+        monkeypatch.setattr(db_utils._thread_local, "conn", conn, raising=False)
+        monkeypatch.setattr(views_ml, "resolve_schema", lambda sql: sql)
+
+        def get(colegio_bk):
+            request = rf.get("/icfes/api/ml/palancas/", {"colegio_bk": colegio_bk})
+            request.user = SimpleNamespace(is_authenticated=True)
+            return json.loads(views_ml.api_ml_palancas_colegio(request).content)
+
+        assert get("c1")["colegio"]["nombre_colegio"] == "Colegio Uno"
+        assert get("x' OR '1'='1") == {"encontrado": False, "colegio_bk": "x' OR '1'='1"}
+
+
+class TestIncrementalClustering:
+    @pytest.fixture
+    def artifacts(self, monkeypatch, tmp_path):
+        from icfes_dashboard.ml import clustering
+
+        monkeypatch.setattr(train_models, "ARTIFACTS_DIR", tmp_path)
+        monkeypatch.setattr(clustering, "ARTIFACTS_DIR", tmp_path)
+        return tmp_path
+
+    @staticmethod
+    def _schools(seed=0, noise=0.0):
+        rng = np.random.default_rng(seed)
+        centers = [(330, 70, 5, 5, 1), (270, 55, 3, 15, 0), (250, 50, 2, 30, 0), (230, 47, 2, 45, 0), (200, 42, 1, 70, 0)]
+        rows = []
+        for k, (glob, ing, est, nbi, priv) in enumerate(centers):
+            for i in range(120):
+                rows.append({
+                    "colegio_bk": f"c{k}{i:04d}",
+                    "nombre": f"Colegio {k}-{i}",
+                    "dpto": "ANTIOQUIA",
+                    "sector": "NO OFICIAL" if priv else "OFICIAL",
+                    "avg_global": glob + rng.normal(0, 8),
+                    "avg_ingles": ing + rng.normal(0, 3),
+                    "n_estudiantes": int(rng.integers(20, 200)),
+                    "pct_nbi": max(0.0, nbi + rng.normal(0, 4)),
+                    "avg_estrato": max(0.0, est + rng.normal(0, 0.3)),
+                })
+        df = pd.DataFrame(rows)
+        if noise:
+            for col in ("avg_global", "avg_ingles", "pct_nbi"):
+                df[col] += rng.normal(0, noise, len(df))
+        return df
+
+    def test_warm_start_keeps_cluster_ids_and_names(self, artifacts):
+        from icfes_dashboard.ml import clustering
+
+        first = train_models.train_clustering(self._schools(), data_key="v1")
+        ids_before = clustering.load_assignments()
+        names_before = [p["nombre"] for p in sorted(
+            json.loads((artifacts / "cluster_profiles.json").read_text())["profiles"], key=lambda p: p["cluster_id"])]
+
+        again = train_models.train_clustering(self._schools(), data_key="v1")
+        updated = train_models.train_clustering(self._schools(noise=3.0), data_key="v2")
+
+        assert not first["warm_start"] and again["skipped"]
+        assert updated["warm_start"] and not updated["skipped"]
+        assert updated["reasignados"] < 0.05 * first["n_colegios"]
+        ids_after = clustering.load_assignments()
+        assert sum(ids_after[c] == ids_before[c] for c in ids_before) >= 0.95 * len(ids_before)
+        names_after = [p["nombre"] for p in sorted(
+            json.loads((artifacts / "cluster_profiles.json").read_text())["profiles"], key=lambda p: p["cluster_id"])]
+        assert names_after == names_before
+        assert train_models.train_clustering(self._schools(noise=3.0), data_key="v2", cold_start=True)["warm_start"] is False
+
+    def test_feature_matrix_is_cached_per_dataset_version(self, artifacts, monkeypatch):
+        import duckdb
+        from icfes_dashboard.ml import clustering
+
+        conn = duckdb.connect()
+        conn.register("src", self._schools())
+        conn.execute("CREATE TABLE escuelas AS SELECT * FROM src")
+        monkeypatch.setattr(db_utils._thread_local, "conn", conn, raising=False)
+        version = db_utils.DatasetVersion("v1", None)
+        monkeypatch.setattr(clustering, "get_dataset_version", lambda: version)
+        sql = "SELECT * FROM escuelas"
+
+        df, key, hit = clustering.load_cluster_features(sql)
+        conn.execute("DELETE FROM escuelas WHERE avg_global > 300")
+        cached, same_key, hit_again = clustering.load_cluster_features(sql)
+
+        assert not hit and hit_again and key == same_key
+        assert len(cached) == len(df) == 600
+        assert cached["avg_global"].dtype == np.float64
+
+        version = db_utils.DatasetVersion("v2", None)
+        fresh, new_key, hit = clustering.load_cluster_features(sql)
+        assert not hit and new_key != key and len(fresh) == (df["avg_global"] <= 300).sum()
+        assert [p.name for p in artifacts.glob("cluster_features_*.parquet")] == [f"cluster_features_{new_key}.parquet"]
+
+
+class TestIAGeneration:
+    def test_generate_all_bounds_concurrency_and_retries_transient_errors(self, monkeypatch):
+        from icfes_dashboard import ia_generation
+
+        monkeypatch.setattr(ia_generation, "BACKOFF_BASE", 0.001)
+        client = ia_generation.StubClient(latency=0.02, fallos=2)
+        jobs = [ia_generation.Job(i, f"Dpto {i}\n###SITUACION###\n###BRECHA###", f"h{i}") for i in range(8)]
+
+        results = ia_generation.generate_all(jobs, "modelo", 100, client=client, concurrency=3, rpm=60_000)
+
+        assert [r.job.key for r in results] == list(range(8))
+        assert all(r.error is None for r in results)
+        assert client.calls == 10 and client.max_in_flight == 3
+        assert ia_generation.input_hash({"a": pd.DataFrame({"x": [1.0]})}, "modelo") != \
+            ia_generation.input_hash({"a": pd.DataFrame({"x": [2.0]})}, "modelo")
+
+        class BadRequest(Exception):
+            status_code = 400
+
+        class Broken(ia_generation.StubClient):
+            async def create(self, **kwargs):
+                self.calls += 1
+                raise BadRequest("prompt inválido")
+
+        broken = Broken()
+        [failed] = ia_generation.generate_all(jobs[:1], "modelo", 100, client=broken, rpm=60_000)
+        assert failed.error == "prompt inválido" and broken.calls == 1
+
+    @pytest.mark.django_db
+    def test_ml_command_skips_unchanged_years_and_archives_in_bulk(self, monkeypatch):
+        from django.core.management import call_command
+
+        from icfes_dashboard import ia_generation
+        from icfes_dashboard.management.commands import generate_ml_ia_analisis as command
+        from icfes_dashboard.models import MlAnalisisIA
+
+        shap = {"pts": 10.0}
+        monkeypatch.setattr(command, "_get_ml_data", lambda ano: {
+            "shap": pd.DataFrame({"shap_pts": [shap["pts"]]}), "clusters": pd.DataFrame(), "riesgo_top": pd.DataFrame(),
+        })
+        monkeypatch.setattr(command, "_build_prompt", lambda data, ano: f"{ano}\n###SHAP###\n###PALANCAS###")
+        client = ia_generation.StubClient()
+        monkeypatch.setattr(command, "make_client", lambda stub=False: client)
+
+        call_command("generate_ml_ia_analisis", "--ano", "2023", "2024", "--stub", stdout=io.StringIO())
+        call_command("generate_ml_ia_analisis", "--ano", "2023", "2024", "--stub", stdout=io.StringIO())
+        assert client.calls == 2
+
+        call_command("generate_ml_ia_analisis", "--ano", "2022", "2023", "--stub", stdout=io.StringIO())
+        assert client.calls == 3
+
+        shap["pts"] = 13.0
+        call_command("generate_ml_ia_analisis", "--ano", "2023", "2024", "--stub", stdout=io.StringIO())
+
+        assert client.calls == 5
+        activos = MlAnalisisIA.objects.filter(estado=MlAnalisisIA.ESTADO_ACTIVO)
+        assert sorted(activos.values_list("ano_referencia", flat=True)) == [2022, 2023, 2024]
+        assert MlAnalisisIA.objects.filter(estado=MlAnalisisIA.ESTADO_ARCHIVADO).count() == 2
+        assert activos.get(ano_referencia=2024).shap_narrative.startswith("Texto de prueba")
+
+    def test_department_data_comes_from_a_fixed_number_of_grouped_queries(self, monkeypatch):
+        import duckdb
+
+        from icfes_dashboard.management.commands import generate_ingles_ia_analisis as command
+
+        rng = np.random.default_rng(3)
+        deptos = ["ANTIOQUIA", "BOGOTA", "Cauca", "NARIÑO"]
+        resumen = pd.DataFrame({
+            "ano": [str(a) for a in range(2019, 2025) for _ in range(80)],
+            "cole_depto_ubicacion": [deptos[i % 4] for _ in range(2019, 2025) for i in range(80)],
+            "cole_cod_dane_establecimiento": [f"{i:05d}" for _ in range(2019, 2025) for i in range(80)],
+            "avg_ingles": rng.uniform(30, 70, 480),
+            "estudiantes": rng.integers(1, 50, 480),
+        })
+        clusters = pd.DataFrame({
+            "departamento": deptos, "cluster_label": ["A", "A", "B", "A"],
+            "promedio_reciente": [50.0, 52.0, 40.0, 45.0], "tendencia_pendiente": [0.1, 0.2, 0.3, 0.4],
+            "cambio_abs": [1.0, 2.0, 3.0, 4.0], "n_colegios_activos": [10, 20, 30, 40],
+        })
+        pred = pd.DataFrame({
+            "departamento": [deptos[i % 4] for i in range(60)],
+            "nombre_colegio": [f"col{i}" for i in range(60)],
+            "avg_ingles_actual": rng.uniform(30, 60, 60), "avg_ingles_predicho": rng.uniform(30, 60, 60),
+            "cambio_predicho": rng.normal(0, 3, 60), "tendencia": [("Mejora", "Estable", "Declive")[i % 3] for i in range(60)],
+        })
+        conn = duckdb.connect()
+        conn.execute("CREATE SCHEMA gold")
+        for name, df in [("icfes_master_resumen", resumen), ("fct_clusters_depto_ingles", clusters),
+                         ("fct_prediccion_ingles", pred)]:
+            conn.register("src", df)
+            conn.execute(f"CREATE TABLE gold.{name} AS SELECT * FROM src")
+            conn.unregister("src")
+        monkeypatch.setattr(db_utils._thread_local, "conn", conn, raising=False)
+        monkeypatch.setattr(db_utils, "resolve_schema", lambda sql: sql)
+        queries = []
+        execute_query = db_utils.execute_query
+        monkeypatch.setattr(db_utils, "execute_query", lambda *a: queries.append(a) or execute_query(*a))
+
+        data = command._get_duckdb_data_deptos(2024, ["BOGOTA", "CAUCA", "SAN ANDRES"])
+
+        assert len(queries) == 6
+        bogota, cauca = data["BOGOTA"], data["CAUCA"]
+        actual = resumen[(resumen["ano"] == "2024") & (resumen["estudiantes"] >= 5)]
+        assert bogota["kpis"]["promedio_depto"] == round(actual[actual["cole_depto_ubicacion"] == "BOGOTA"]["avg_ingles"].mean(), 2)
+        assert bogota["kpis"]["promedio_nacional"] == round(actual["avg_ingles"].mean(), 2)
+        assert [r["ano"] for r in bogota["tendencia"]] == list(range(2020, 2025))
+        assert [r["departamento"] for r in bogota["cluster_pares"]] == ["ANTIOQUIA", "NARIÑO"]
+        assert cauca["cluster"]["cluster_label"] == "B" and cauca["cluster_pares"] == []
+        mejora = pred[pred["departamento"] == "BOGOTA"].nlargest(5, "cambio_predicho")["nombre_colegio"].tolist()
+        assert [r["nombre_colegio"] for r in bogota["prediccion"]["top_mejora"]] == mejora
+        assert sum(r["n_colegios"] for r in cauca["prediccion"]["distribucion"]) == 15
+        assert data["SAN ANDRES"]["ranking_nacional"] is None and data["SAN ANDRES"]["tendencia"] == []
+
+
+class _IndexNowStandIn:
+    """Local HTTP stand-in for the IndexNow endpoint: records every payload."""
+
+    def __init__(self, statuses=()):
+        import http.server
+
+        self.payloads = []
+        self.statuses = list(statuses)
+        stand_in = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                stand_in.payloads.append(body)
+                if any("bad" in url for url in body["urlList"]):
+                    status = 422
+                else:
+                    status = stand_in.statuses.pop(0) if stand_in.statuses else 202
+                self.send_response(status)
+                self.send_header("Retry-After", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/indexnow"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def submitted(self):
+        return sorted({url for body in self.payloads for url in body["urlList"]})
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class TestIndexNow:
+    @pytest.fixture
+    def stand_in(self):
+        server = _IndexNowStandIn(statuses=[429])
+        yield server
+        server.close()
+
+    @pytest.mark.django_db
+    def test_only_new_or_changed_sitemap_urls_are_submitted(self, stand_in, monkeypatch):
+        from django.core.management import call_command
+
+        from icfes_dashboard import indexnow
+        from icfes_dashboard.models import IndexNowUrl
+        from icfes_dashboard.sitemap_views import SitemapEntry
+
+        base = "https://www.example.com"
+        pages = {
+            "icfes": {"a": [2024, 40, 250.0], "b": [2024, 12, 231.5]},
+            "static": {"": None},
+        }
+        version = {"v": "v1"}
+
+        def entries(base, sections=None):
+            for section in sections or pages:
+                for slug, data in pages[section].items():
+                    yield section, SitemapEntry(f"{base}/{slug}", "2025-01-01", "monthly", "0.6", data)
+
+        monkeypatch.setattr(indexnow, "iter_sitemap_entries", entries)
+        monkeypatch.setattr(indexnow, "get_dataset_version", lambda: db_utils.DatasetVersion(version["v"], None))
+
+        def run():
+            stand_in.payloads.clear()
+            with override_settings(INDEXNOW_KEY="k123", INDEXNOW_ENDPOINT=stand_in.url, PUBLIC_SITE_URL=base):
+                call_command("ping_indexnow", "--send", stdout=io.StringIO())
+            return stand_in.submitted()
+
+        assert run() == [f"{base}/", f"{base}/a", f"{base}/b"]
+        assert len(stand_in.payloads) == 2   # 429, then accepted on retry
+        assert stand_in.payloads[-1]["keyLocation"] == f"{base}/k123.txt"
+        assert run() == []
+
+        pages["icfes"]["b"] = [2024, 12, 240.0]
+        del pages["icfes"]["a"]
+        assert run() == [f"{base}/b"]
+        assert set(IndexNowUrl.objects.values_list("url", flat=True)) == {f"{base}/", f"{base}/b"}
+
+        version["v"] = "v2"
+        assert run() == [f"{base}/"]
+
+    def test_batches_are_posted_concurrently_and_failures_reported(self, stand_in):
+        from icfes_dashboard import indexnow
+
+        urls = [f"https://www.example.com/{i}" for i in range(4)] + ["https://www.example.com/bad"]
+        results = indexnow.submit(urls, "k123", "https://www.example.com", concurrency=3,
+                                  batch_limit=2, endpoint=stand_in.url)
+
+        assert [r.urls for r in results] == [urls[0:2], urls[2:4], urls[4:]]
+        assert [r.error is None for r in results] == [True, True, False]
+        assert results[2].status == 422 and results[2].attempts == 1
+        assert sum(r.attempts for r in results) == 4   # one 429 retried
+
+
+class TestRailwayImport:
+    LINES = [
+        {"requestId": "r1", "timestamp": "2025-02-20T12:34:56.123456789Z", "method": "GET",
+         "path": "/icfes/colegio/colegio-a/?utm_source=news&utm_campaign=feb", "host": "www.icfes-analytics.com",
+         "httpStatus": 200, "totalDuration": 12, "txBytes": 5120, "clientUa": "Mozilla/5.0 (GPTBot/1.0)",
+         "srcIp": "203.0.113.7", "edgeRegion": "us-east4"},
+        {"requestId": "r2", "timestamp": "2025-02-20T12:35:00Z", "path": "/icfes/", "httpStatus": 404,
+         "clientUa": "curl\t8.0 \\ x", "srcIp": "unknown", "upstreamErrors": "line1\nline2"},
+        {"requestId": "r3", "timestamp": "2025-02-20T12:36:00+00:00", "path": "/", "httpStatus": "301"},
+        {"requestId": "r1", "timestamp": "2025-02-20T12:40:00Z", "path": "/again", "httpStatus": 200},
+        {"requestId": "r4", "timestamp": "2025-02-20T12:37:00Z", "path": "/no-status"},
+    ]
+
+    @pytest.fixture
+    def jsonl(self, tmp_path):
+        path = tmp_path / "railway_logs.jsonl"
+        path.write_text("\n".join([json.dumps(self.LINES[0]), "{not json", ""]
+                                  + [json.dumps(line) for line in self.LINES[1:]]) + "\n", encoding="utf-8")
+        return path
+
+    def _run(self, path, *args):
+        from django.core.management import call_command
+
+        out = io.StringIO()
+        call_command("import_railway_logs", "--input", str(path), "--allow-disabled",
+                     "--chunk-mb", "0.0002", *args, stdout=out)
+        return out.getvalue()
+
+    @pytest.mark.django_db
+    def test_import_merges_duplicates_and_skips_bad_lines(self, jsonl):
+        from icfes_dashboard.models import RailwayTrafficLog
+
+        out = self._run(jsonl, "--workers", "0")
+        assert "read=6 inserted=3 duplicates=1 skipped=2" in out
+        assert "rows/s" in out
+
+        logs = {log.request_id: log for log in RailwayTrafficLog.objects.all()}
+        assert sorted(logs) == ["r1", "r2", "r3"]
+        first = logs["r1"]
+        assert first.path.startswith("/icfes/colegio/colegio-a/")
+        assert first.timestamp == datetime(2025, 2, 20, 12, 34, 56, 123456, tzinfo=timezone.utc)
+        assert (first.bot_category, first.school_slug, first.utm_source, first.utm_campaign) == (
+            "ai_bot", "colegio-a", "news", "feb")
+        assert (first.src_ip, first.tx_bytes, first.total_duration_ms) == ("203.0.113.7", 5120, 12)
+        assert logs["r2"].src_ip is None and logs["r2"].bot_category == "human_or_other"
+        assert logs["r3"].http_status == 301 and logs["r3"].bot_category == "unknown"
+
+        # Re-importing the same export through the worker pool inserts nothing
+        out = self._run(jsonl, "--workers", "1")
+        assert "read=6 inserted=0 duplicates=4 skipped=2" in out
+        assert RailwayTrafficLog.objects.count() == 3
+
+    @pytest.mark.django_db
+    def test_requests_captured_by_the_middleware_are_not_imported_again(self, jsonl):
+        from icfes_dashboard.models import RailwayTrafficLog
+
+        # The middleware stamps its own clock, a few seconds after the edge
+        RailwayTrafficLog.objects.create(
+            request_id="r2", timestamp=datetime(2025, 2, 20, 12, 35, 3, tzinfo=timezone.utc),
+            path="/icfes/", http_status=404,
+        )
+        # Same request_id much later: a different request
+        RailwayTrafficLog.objects.create(
+            request_id="r3", timestamp=datetime(2025, 2, 21, 12, 36, tzinfo=timezone.utc),
+            path="/", http_status=200,
+        )
+
+        out = self._run(jsonl, "--workers", "0")
+        assert "read=6 inserted=2 duplicates=2 skipped=2" in out
+        assert RailwayTrafficLog.objects.filter(request_id="r2").count() == 1
+        assert RailwayTrafficLog.objects.filter(request_id="r3").count() == 2
+
+    def test_ranges_cover_every_line_and_copy_rows_are_escaped(self, jsonl):
+        from icfes_dashboard import traffic_import
+        from icfes_dashboard import traffic_import_worker
+
+        ranges = traffic_import.split_ranges(str(jsonl), chunk_bytes=100)
+        assert len(ranges) > 1
+        assert ranges[0][0] == 0 and ranges[-1][1] == jsonl.stat().st_size
+        assert all(a[1] == b[0] for a, b in zip(ranges, ranges[1:]))
+
+        whole = traffic_import_worker.parse_range(str(jsonl), 0, jsonl.stat().st_size)
+        parts = [traffic_import_worker.parse_range(str(jsonl), s, e) for s, e in ranges]
+        assert b"".join(p[0] for p in parts) == whole[0]
+        assert [sum(p[i] for p in parts) for i in (1, 2, 3)] == list(whole[1:]) == [4, 6, 2]
+
+        lines = whole[0].decode("utf-8").splitlines()
+        assert len(lines) == 4
+        r2 = lines[1].split("\t")
+        assert len(r2) == len(traffic_import_worker.COLUMNS)
+        assert r2[traffic_import_worker.COLUMNS.index("client_ua")] == "curl\\t8.0 \\\\ x"
+        assert r2[traffic_import_worker.COLUMNS.index("upstream_errors")] == "line1\\nline2"
+        assert r2[traffic_import_worker.COLUMNS.index("src_ip")] == "\\N"
+        assert r2[traffic_import_worker.COLUMNS.index("tx_bytes")] == "\\N"
+
+
+class TestTrafficRetention:
+    @staticmethod
+    def _log(request_id, when, **extra):
+        from icfes_dashboard.models import RailwayTrafficLog
+
+        fields = dict(path="/", http_status=200, bot_category="human_or_other")
+        fields.update(extra)
+        return RailwayTrafficLog(request_id=request_id, timestamp=when, **fields)
+
+    @pytest.fixture
+    def logs(self, tmp_path):
+        from django.utils import timezone as dj_timezone
+
+        from icfes_dashboard.models import RailwayTrafficLog
+
+        now = dj_timezone.now().replace(hour=12, minute=0, second=0, microsecond=0)
+        RailwayTrafficLog.objects.bulk_create([
+            self._log("old-1", now - timedelta(days=40), path="/icfes/colegio/a/", school_slug="a"),
+            self._log("old-2", now - timedelta(days=35), http_status=404, path="/missing",
+                      bot_category="seo_bot"),
+            self._log("old-3", now - timedelta(days=35, hours=1), path="/icfes/colegio/a/", school_slug="a"),
+            self._log("new-1", now - timedelta(days=1), path="/icfes/colegio/b/", school_slug="b"),
+        ])
+        with override_settings(TRAFFIC_ARCHIVE_DIR=str(tmp_path / "archive"), TRAFFIC_ANALYTICS_ENABLED=True):
+            yield now
+
+    def _archive(self, *args):
+        from django.core.management import call_command
+
+        out = io.StringIO()
+        call_command("archive_traffic_logs", "--days", "30", *args, stdout=out)
+        return out.getvalue()
+
+    @pytest.mark.django_db
+    def test_old_days_move_to_parquet_and_leave_the_table(self, logs):
+        from icfes_dashboard import traffic_archive
+        from icfes_dashboard.ml.streaming import read_parquet
+        from icfes_dashboard.models import RailwayTrafficLog
+
+        assert "2 days to archive" in self._archive("--dry-run")
+        assert RailwayTrafficLog.objects.count() == 4
+
+        out = self._archive()
+        assert "2 days, 3 rows archived" in out
+        assert list(RailwayTrafficLog.objects.values_list("request_id", flat=True)) == ["new-1"]
+
+        files = traffic_archive.archived_days()
+        assert sorted(files) == [(logs - timedelta(days=40)).date(), (logs - timedelta(days=35)).date()]
+        day = read_parquet(files[(logs - timedelta(days=35)).date()])
+        assert list(day.columns) == traffic_archive.COLUMNS
+        assert list(day["request_id"]) == ["old-3", "old-2"]
+
+        # A late import of an archived day is merged into its file, without duplicates
+        RailwayTrafficLog.objects.bulk_create([
+            self._log("old-1", logs - timedelta(days=40), path="/icfes/colegio/a/", school_slug="a"),
+            self._log("late", logs - timedelta(days=40, hours=2)),
+        ])
+        assert "1 days, 2 rows archived" in self._archive()
+        assert sorted(read_parquet(files[(logs - timedelta(days=40)).date()])["request_id"]) == ["late", "old-1"]
+
+    @pytest.mark.django_db
+    def test_run_is_skipped_while_another_holds_the_lock(self, logs, monkeypatch):
+        from icfes_dashboard.management.commands import archive_traffic_logs
+        from icfes_dashboard.models import RailwayTrafficLog
+
+        monkeypatch.setattr(archive_traffic_logs, "archive_lock", lambda: contextlib.nullcontext(False))
+        assert "holds the lock, skipping" in self._archive()
+        assert RailwayTrafficLog.objects.count() == 4
+
+    @pytest.mark.django_db
+    def test_dashboard_summary_reads_archived_days_through_duckdb(self, logs):
+        from icfes_dashboard import traffic_archive
+        from icfes_dashboard import traffic_views
+
+        self._archive()
+        assert traffic_archive.summary(logs - timedelta(days=7), logs, {410}) is None
+
+        archived = traffic_archive.summary(logs - timedelta(days=60), logs, {410})
+        assert (archived["total"], archived["s2xx"], archived["s4xx"], archived["humans"]) == (3, 2, 1, 2)
+        assert [row["total"] for row in archived["daily"]] == [1, 2]
+        assert archived["top_school_slugs"] == [{"school_slug": "a", "total": 2}]
+        assert archived["top_404"] == [{"path": "/missing", "total": 1}]
+
+        live = [{"school_slug": "b", "total": 1}, {"school_slug": "a", "total": 1}]
+        assert traffic_views._merge_counts(live, archived["top_school_slugs"], "school_slug", 25) == [
+            {"school_slug": "a", "total": 3}, {"school_slug": "b", "total": 1}]
+        daily = traffic_views._merge_daily(
+            [{"day": logs.date(), "total": 5, "humans": 4, "bots": 1}], archived["daily"], ["total", "humans", "bots"])
+        assert [row["total"] for row in daily] == [1, 2, 5]
+        assert daily[1]["bots"] == 1
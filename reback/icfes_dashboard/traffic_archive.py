@@ -0,0 +1,159 @@
+"""
+Parquet archive of RailwayTrafficLog days older than TRAFFIC_RETENTION_DAYS.
+
+`archive_traffic_logs` writes one zstd Parquet file per day
+(TRAFFIC_ARCHIVE_DIR/railway_traffic_YYYY-MM-DD.parquet, same columns as the
+table) before the day is dropped from Postgres. The traffic dashboard reads
+them back through DuckDB (summary()) when the selected window reaches past
+what is still in Postgres.
+"""
+import logging
+import re
+from datetime import datetime
+from pathlib import Path
+
+import duckdb
+import pandas as pd
+from django.conf import settings
+
+from .models import RailwayTrafficLog
+from .traffic_partitions import day_bounds
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = [f.attname for f in RailwayTrafficLog._meta.concrete_fields]
+TOP_LIMIT = 1000          # rows per top-N list; the dashboard merges them with the live ones
+_FILE_RE = re.compile(r"^railway_traffic_(\d{4}-\d{2}-\d{2})\.parquet$")
+
+
+def archive_dir():
+    return Path(settings.TRAFFIC_ARCHIVE_DIR)
+
+
+def archive_path(day):
+    return archive_dir() / f"railway_traffic_{day:%Y-%m-%d}.parquet"
+
+
+def archived_days():
+    """{day: path} of the archive files on disk."""
+    folder = archive_dir()
+    if not folder.is_dir():
+        return {}
+    days = {}
+    for path in folder.iterdir():
+        match = _FILE_RE.match(path.name)
+        if match:
+            days[datetime.strptime(match.group(1), "%Y-%m-%d").date()] = path
+    return days
+
+
+def _sql_list(paths):
+    return "[" + ", ".join("'" + str(p).replace("'", "''") + "'" for p in paths) + "]"
+
+
+def archive_day(day):
+    """
+    Write the rows of `day` to its Parquet file and return how many it holds.
+    Rows already archived for that day (an earlier run, a late import) are
+    kept; a request_id is written once.
+    """
+    from .ml.streaming import write_parquet
+
+    start, end = day_bounds(day)
+    rows = list(
+        RailwayTrafficLog.objects.filter(timestamp__gte=start, timestamp__lt=end)
+        .order_by("timestamp")
+        .values_list(*COLUMNS)
+        .iterator(chunk_size=20_000)
+    )
+    df = pd.DataFrame.from_records(rows, columns=COLUMNS)
+    df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True)
+    df["created_at"] = pd.to_datetime(df["created_at"], utc=True)
+
+    path = archive_path(day)
+    if path.exists():
+        con = duckdb.connect()
+        try:
+            previous = con.execute(f"SELECT * FROM read_parquet({_sql_list([path])})").fetchdf()
+        finally:
+            con.close()
+        df = (
+            pd.concat([previous[COLUMNS], df], ignore_index=True)
+            .drop_duplicates(["request_id"])
+            .sort_values("timestamp", kind="stable")
+            .reset_index(drop=True)
+        )
+    if df.empty:
+        return 0
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    write_parquet(df, path)
+    logger.info(f"[Traffic archive] {path.name}: {len(df):,} rows")
+    return len(df)
+
+
+def summary(since, until, controlled_statuses=()):
+    """
+    Aggregates of the archived rows with since <= timestamp < until, or None
+    when no archive file covers that range. Same shapes as the dashboard's
+    live querysets: totals, daily rows and top-N lists of dicts.
+    """
+    days = archived_days()
+    paths = [path for day, path in sorted(days.items())
+             if day_bounds(day)[1] > since and day_bounds(day)[0] < until]
+    if not paths:
+        return None
+
+    controlled = ", ".join(str(int(s)) for s in controlled_statuses) or "NULL"
+    con = duckdb.connect()
+    try:
+        con.execute(
+            f"CREATE TEMP VIEW logs AS SELECT * FROM read_parquet({_sql_list(paths)}, filename = true) "
+            f"WHERE timestamp >= '{since.isoformat()}'::TIMESTAMPTZ AND timestamp < '{until.isoformat()}'::TIMESTAMPTZ"
+        )
+
+        def rows(sql):
+            cursor = con.execute(sql)
+            names = [c[0] for c in cursor.description]
+            return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+        daily = rows(f"""
+            SELECT
+                filename,
+                COUNT(*) AS total,
+                COUNT(*) FILTER (WHERE http_status >= 200 AND http_status < 300) AS s2xx,
+                COUNT(*) FILTER (WHERE http_status >= 300 AND http_status < 400) AS s3xx,
+                COUNT(*) FILTER (WHERE http_status >= 400 AND http_status < 500) AS s4xx,
+                COUNT(*) FILTER (WHERE http_status IN ({controlled})) AS s4xx_controlled,
+                COUNT(*) FILTER (WHERE http_status >= 500) AS s5xx,
+                COUNT(*) FILTER (WHERE bot_category = 'human_or_other') AS humans
+            FROM logs GROUP BY filename
+        """)
+        for row in daily:
+            name = Path(row.pop("filename")).name
+            row["day"] = datetime.strptime(_FILE_RE.match(name).group(1), "%Y-%m-%d").date()
+            row["bots"] = row["total"] - row["humans"]
+        daily.sort(key=lambda r: r["day"])
+
+        def top(column, where="TRUE"):
+            return rows(f"""
+                SELECT {column}, COUNT(*) AS total FROM logs WHERE {where}
+                GROUP BY {column} ORDER BY total DESC, {column} LIMIT {TOP_LIMIT}
+            """)
+
+        result = {
+            "days": [row["day"] for row in daily],
+            "daily": daily,
+            "bot_counts": top("bot_category"),
+            "status_counts": top("http_status"),
+            "top_paths": top("path"),
+            "top_school_slugs": top("school_slug", "school_slug <> ''"),
+            "top_404": top("path", "http_status = 404"),
+            "top_500": top("path", "http_status >= 500"),
+        }
+    finally:
+        con.close()
+
+    for key in ("total", "s2xx", "s3xx", "s4xx", "s4xx_controlled", "s5xx", "humans"):
+        result[key] = sum(row[key] for row in daily)
+    return result
@@ -0,0 +1,187 @@
+"""
+Bulk importer for Railway JSONL HTTP logs (`manage.py import_railway_logs`).
+
+Multi-day exports reach gigabytes; parsing, classifying and bulk_create-ing
+one record at a time in the management command was the bottleneck. Here:
+
+- the file is split into byte ranges aligned to line starts; a spawn pool
+  (traffic_import_worker) parses each range, classifies user agents and
+  paths through per-worker caches and returns it encoded as COPY text;
+- on PostgreSQL the parent streams each range into a temporary staging
+  table with COPY and merges it into RailwayTrafficLog with
+  INSERT ... SELECT ... WHERE NOT EXISTS;
+- other backends (SQLite in local dev and tests) get the same rows through
+  bulk_create after the same check in Python.
+
+A request is stored once per request_id: rows whose request_id is already
+in the table within REQUEST_ID_WINDOW of their timestamp are skipped, as are
+repeats inside a range. That covers repeated exports and overlapping windows,
+and requests already captured by TrafficIngestMiddleware, which stamps them
+with its own clock instead of the edge timestamp. The table is partitioned
+by timestamp (migration 0010), so request_id cannot be UNIQUE by itself; the
+window keeps the lookup on the (request_id, timestamp) index and on one or
+two partitions.
+
+Ranges are loaded in file order, with at most 2 ranges in flight per worker.
+"""
+import io
+import logging
+import multiprocessing
+import os
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+from django.db import connection, transaction
+
+from . import traffic_import_worker
+from .models import RailwayTrafficLog
+from .traffic_import_worker import COLUMNS
+
+logger = logging.getLogger(__name__)
+
+CHUNK_BYTES = 32 * 1024 * 1024
+ORM_BATCH_SIZE = 1000
+STAGING_TABLE = "railway_import_staging"
+REQUEST_ID_WINDOW = timedelta(minutes=10)
+
+ImportStats = namedtuple("ImportStats", ["read", "parsed", "inserted", "skipped", "seconds"])
+
+
+def split_ranges(path, chunk_bytes=CHUNK_BYTES):
+    """[(start, end), ...] byte ranges of about `chunk_bytes`, each ending at a line boundary."""
+    size = os.path.getsize(path)
+    ranges = []
+    start = 0
+    with open(path, "rb") as fh:
+        while start < size:
+            fh.seek(min(start + chunk_bytes, size))
+            fh.readline()
+            end = min(fh.tell(), size)
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+class _CopyLoader:
+    """COPY into a temporary staging table, then merge the request_ids not loaded yet."""
+
+    copy = True
+
+    def __init__(self):
+        self.table = connection.ops.quote_name(RailwayTrafficLog._meta.db_table)
+        self.columns = ", ".join(connection.ops.quote_name(c) for c in COLUMNS)
+        self.staged = ", ".join(f"s.{connection.ops.quote_name(c)}" for c in COLUMNS)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TEMPORARY TABLE IF NOT EXISTS {STAGING_TABLE} AS "
+                f"SELECT {self.columns} FROM {self.table} WITH NO DATA"
+            )
+
+    def _copy(self, cursor, payload):
+        sql = f"COPY {STAGING_TABLE} ({self.columns}) FROM STDIN"
+        raw = cursor.cursor
+        if hasattr(raw, "copy"):           # psycopg 3
+            with raw.copy(sql) as copy:
+                copy.write(payload)
+        else:                              # psycopg2
+            raw.copy_expert(sql, io.BytesIO(payload))
+
+    def load(self, payload):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"TRUNCATE {STAGING_TABLE}")
+            self._copy(cursor, payload)
+            cursor.execute(
+                f"INSERT INTO {self.table} ({self.columns}, created_at) "
+                f"SELECT DISTINCT ON (s.request_id) {self.staged}, now() FROM {STAGING_TABLE} s "
+                f"WHERE NOT EXISTS ("
+                f"  SELECT 1 FROM {self.table} t WHERE t.request_id = s.request_id"
+                f"  AND t.timestamp BETWEEN s.timestamp - %s AND s.timestamp + %s"
+                f") ORDER BY s.request_id, s.timestamp",
+                [REQUEST_ID_WINDOW, REQUEST_ID_WINDOW],
+            )
+            return cursor.rowcount
+
+
+class _OrmLoader:
+    """Same merge as _CopyLoader in Python, then bulk_create, for backends without COPY."""
+
+    copy = False
+
+    def __init__(self, batch_size=ORM_BATCH_SIZE):
+        self.batch_size = batch_size
+
+    def _loaded(self, rows):
+        """{request_id: [timestamp, ...]} already in the table around the rows' timestamps."""
+        timestamps = [row[1] for row in rows]
+        request_ids = sorted({row[0] for row in rows})
+        loaded = {}
+        for i in range(0, len(request_ids), self.batch_size):
+            found = RailwayTrafficLog.objects.filter(
+                request_id__in=request_ids[i:i + self.batch_size],
+                timestamp__gte=min(timestamps) - REQUEST_ID_WINDOW,
+                timestamp__lte=max(timestamps) + REQUEST_ID_WINDOW,
+            ).values_list("request_id", "timestamp")
+            for request_id, timestamp in found:
+                loaded.setdefault(request_id, []).append(timestamp)
+        return loaded
+
+    def load(self, rows):
+        if not rows:
+            return 0
+        first = {}
+        for row in sorted(rows, key=lambda row: row[1]):
+            first.setdefault(row[0], row)
+        loaded = self._loaded(list(first.values()))
+        objs = [
+            RailwayTrafficLog(**dict(zip(COLUMNS, row)))
+            for request_id, row in first.items()
+            if not any(abs(ts - row[1]) <= REQUEST_ID_WINDOW for ts in loaded.get(request_id, ()))
+        ]
+        with transaction.atomic():
+            RailwayTrafficLog.objects.bulk_create(objs, batch_size=self.batch_size)
+        return len(objs)
+
+
+def _loader(batch_size):
+    return _CopyLoader() if connection.vendor == "postgresql" else _OrmLoader(batch_size)
+
+
+def import_file(path, workers=None, chunk_bytes=CHUNK_BYTES, batch_size=ORM_BATCH_SIZE):
+    """Import the JSONL at `path`. workers=0 parses in this process. Returns ImportStats."""
+    started = time.perf_counter()
+    path = str(path)
+    loader = _loader(batch_size)
+    ranges = split_ranges(path, chunk_bytes)
+    if workers is None:
+        workers = min(os.cpu_count() or 1, len(ranges))
+
+    read = parsed = inserted = skipped = 0
+
+    def add(result):
+        nonlocal read, parsed, inserted, skipped
+        payload, n_rows, n_read, n_skipped = result
+        read += n_read
+        parsed += n_rows
+        skipped += n_skipped
+        if n_rows:
+            inserted += loader.load(payload)
+        elapsed = time.perf_counter() - started
+        logger.info(f"[Railway import] {read:,} lines | {inserted:,} inserted | {read / max(elapsed, 1e-9):,.0f} lines/s")
+
+    if workers <= 0:
+        for start, end in ranges:
+            add(traffic_import_worker.parse_range(path, start, end, loader.copy))
+    else:
+        pending = deque()
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            for start, end in ranges:
+                # at most 2 ranges in flight per worker: bounded memory in the parent
+                if len(pending) >= 2 * workers:
+                    add(pending.popleft().result())
+                pending.append(pool.submit(traffic_import_worker.parse_range, path, start, end, loader.copy))
+            while pending:
+                add(pending.popleft().result())
+
+    return ImportStats(read, parsed, inserted, skipped, time.perf_counter() - started)
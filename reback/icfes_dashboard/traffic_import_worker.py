@@ -0,0 +1,155 @@
+"""
+Worker process for the Railway JSONL importer (see traffic_import).
+
+Only imports the standard library and traffic_utils: the pool is created
+with spawn and the workers never load Django. Each worker parses one byte
+range of the file and returns it already encoded for PostgreSQL COPY (text
+format), so the parent only streams bytes into the staging table.
+"""
+import ipaddress
+import json
+import re
+from datetime import datetime
+from functools import lru_cache
+
+from icfes_dashboard.traffic_utils import classify_bot, extract_path_fields
+
+# Column order of every row and of the staging table.
+COLUMNS = (
+    "request_id", "timestamp", "method", "path", "host", "http_status",
+    "total_duration_ms", "upstream_rq_duration_ms", "tx_bytes", "rx_bytes",
+    "client_ua", "src_ip", "edge_region", "upstream_errors",
+    "bot_category", "school_slug", "utm_source", "utm_medium", "utm_campaign",
+)
+
+# Railway writes nanoseconds; datetime only takes microseconds.
+_FRACTION_RE = re.compile(r"(\.\d{6})\d+")
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r", "\x00": ""})
+
+# Few distinct user agents / paths / IPs in millions of lines: parse each once per worker.
+classify_ua = lru_cache(maxsize=65_536)(classify_bot)
+path_fields = lru_cache(maxsize=262_144)(extract_path_fields)
+
+
+@lru_cache(maxsize=262_144)
+def valid_ip(value):
+    """`value` if it is an IPv4/IPv6 address (inet column), else None."""
+    try:
+        ipaddress.ip_address(value)
+    except ValueError:
+        return None
+    return value
+
+
+def parse_timestamp(value):
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(_FRACTION_RE.sub(r"\1", value))
+    except ValueError:
+        return None
+
+
+def _int(value):
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _text(value):
+    if type(value) is str:
+        return value.strip()
+    return str(value).strip() if value is not None else ""
+
+
+def parse_record(record):
+    """Row tuple in COLUMNS order, or None when requestId/timestamp/httpStatus is missing."""
+    request_id = _text(record.get("requestId"))[:64]
+    timestamp = parse_timestamp(_text(record.get("timestamp")))
+    http_status = _int(record.get("httpStatus"))
+    if not request_id or timestamp is None or http_status is None:
+        return None
+
+    path = _text(record.get("path"))
+    user_agent = _text(record.get("clientUa"))
+    fields = path_fields(path)
+    src_ip = record.get("srcIp")
+    return (
+        request_id,
+        timestamp,
+        _text(record.get("method"))[:12],
+        path,
+        _text(record.get("host"))[:255],
+        http_status,
+        _int(record.get("totalDuration")),
+        _int(record.get("upstreamRqDuration")),
+        _int(record.get("txBytes")),
+        _int(record.get("rxBytes")),
+        user_agent,
+        valid_ip(str(src_ip).strip()) if src_ip else None,
+        _text(record.get("edgeRegion"))[:64],
+        _text(record.get("upstreamErrors")),
+        classify_ua(user_agent),
+        fields["school_slug"][:255],
+        fields["utm_source"],
+        fields["utm_medium"],
+        fields["utm_campaign"],
+    )
+
+
+def _esc(value):
+    if "\\" in value or not value.isprintable():
+        return value.translate(_COPY_ESCAPES)
+    return value
+
+
+def _num(value):
+    return "\\N" if value is None else str(value)
+
+
+def copy_line(row):
+    """One line of COPY text format (tab-separated, \\N for NULL) for a parse_record row."""
+    (request_id, timestamp, method, path, host, http_status, total_duration, upstream_duration,
+     tx_bytes, rx_bytes, user_agent, src_ip, edge_region, upstream_errors,
+     bot_category, school_slug, utm_source, utm_medium, utm_campaign) = row
+    return (
+        f"{_esc(request_id)}\t{timestamp.isoformat()}\t{_esc(method)}\t{_esc(path)}\t{_esc(host)}\t"
+        f"{http_status}\t{_num(total_duration)}\t{_num(upstream_duration)}\t{_num(tx_bytes)}\t{_num(rx_bytes)}\t"
+        f"{_esc(user_agent)}\t{_num(src_ip)}\t{_esc(edge_region)}\t{_esc(upstream_errors)}\t"
+        f"{bot_category}\t{_esc(school_slug)}\t{_esc(utm_source)}\t{_esc(utm_medium)}\t{_esc(utm_campaign)}\n"
+    )
+
+
+def parse_range(path, start, end, copy=True):
+    """
+    Parse the lines in bytes [start, end) of `path` (range aligned to line
+    starts). Returns (payload, rows, read, skipped): payload is the COPY text
+    as UTF-8 bytes when `copy`, otherwise the list of row tuples.
+    """
+    with open(path, "rb") as fh:
+        fh.seek(start)
+        data = fh.read(end - start)
+
+    rows = []
+    read = skipped = 0
+    for line in data.splitlines():
+        if not line.strip():
+            continue
+        read += 1
+        try:
+            record = json.loads(line)
+        except ValueError:
+            skipped += 1
+            continue
+        row = parse_record(record) if isinstance(record, dict) else None
+        if row is None:
+            skipped += 1
+            continue
+        rows.append(row)
+
+    if copy:
+        return "".join(map(copy_line, rows)).encode("utf-8"), len(rows), read, skipped
+    return rows, len(rows), read, skipped
@@ -0,0 +1,158 @@
+"""
+Daily partitions of RailwayTrafficLog on PostgreSQL.
+
+Migration 0010 turns the table into one range-partitioned by `timestamp`
+with a DEFAULT partition; days follow settings.TIME_ZONE, same as the
+dashboard's TruncDate. `archive_traffic_logs` (run daily) uses these helpers
+to create the next days' partitions, move rows that landed in the DEFAULT
+partition (late imports of old logs) into their own day and drop the days
+already archived to Parquet.
+
+On other backends (SQLite in dev and tests) the table is not partitioned:
+is_partitioned() is False and days are deleted with a range DELETE instead.
+
+archive_lock() serializes archive runs across processes and replicas with
+a PostgreSQL advisory lock, so overlapping runs never drop the same
+partitions.
+"""
+import logging
+import re
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import RailwayTrafficLog
+
+logger = logging.getLogger(__name__)
+
+TABLE = RailwayTrafficLog._meta.db_table
+DEFAULT_PARTITION = f"{TABLE}_default"
+_PARTITION_RE = re.compile(rf"^{TABLE}_p(\d{{8}})$")
+ARCHIVE_LOCK_ID = zlib.crc32(b"archive_traffic_logs")
+
+
+def day_bounds(day):
+    """[start, end) of `day` in the default time zone, as aware datetimes."""
+    tz = timezone.get_default_timezone()
+    return (
+        datetime.combine(day, time.min, tzinfo=tz),
+        datetime.combine(day + timedelta(days=1), time.min, tzinfo=tz),
+    )
+
+
+@contextmanager
+def archive_lock():
+    """
+    Yields True if this session got the archive lock (pg_try_advisory_lock,
+    held until the block exits), False if another run holds it. Always True
+    off PostgreSQL.
+    """
+    if connection.vendor != "postgresql":
+        yield True
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_try_advisory_lock(%s)", [ARCHIVE_LOCK_ID])
+        acquired = cursor.fetchone()[0]
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_unlock(%s)", [ARCHIVE_LOCK_ID])
+
+
+def partition_name(day):
+    return f"{TABLE}_p{day:%Y%m%d}"
+
+
+def is_partitioned():
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [TABLE])
+        row = cursor.fetchone()
+    return bool(row) and row[0] == "p"
+
+
+def partitions():
+    """{day: partition name} of the attached daily partitions."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(%s)",
+            [TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    days = {}
+    for name in names:
+        match = _PARTITION_RE.match(name)
+        if match:
+            days[datetime.strptime(match.group(1), "%Y%m%d").date()] = name
+    return days
+
+
+def create_partition(day):
+    """
+    Partition for `day`. Rows of that day sitting in the DEFAULT partition
+    are moved into it first (ATTACH fails otherwise). Returns rows moved.
+    """
+    name = partition_name(day)
+    start, end = day_bounds(day)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS)")
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE "timestamp" >= %s AND "timestamp" < %s RETURNING *) '
+            f"INSERT INTO {name} SELECT * FROM moved",
+            [start, end],
+        )
+        moved = cursor.rowcount
+        cursor.execute(
+            f"ALTER TABLE {TABLE} ATTACH PARTITION {name} "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        )
+    logger.info(f"[Traffic partitions] {name} created ({moved} rows from default)")
+    return moved
+
+
+def ensure_partitions(first_day, last_day):
+    """Create the missing partitions for every day in [first_day, last_day]. Returns the days created."""
+    existing = partitions()
+    created = []
+    day = first_day
+    while day <= last_day:
+        if day not in existing:
+            create_partition(day)
+            created.append(day)
+        day += timedelta(days=1)
+    return created
+
+
+def split_default():
+    """Give every day found in the DEFAULT partition its own partition. Returns those days."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT DISTINCT ("timestamp" AT TIME ZONE %s)::date FROM {DEFAULT_PARTITION}',
+            [timezone.get_default_timezone_name()],
+        )
+        days = sorted(row[0] for row in cursor.fetchall())
+    for day in days:
+        create_partition(day)
+    return days
+
+
+def drop_day(day):
+    """Remove every row of `day`: DROP its partition, or a range DELETE when not partitioned."""
+    if is_partitioned():
+        name = partitions().get(day)
+        if name is None:
+            return
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"ALTER TABLE {TABLE} DETACH PARTITION {name}")
+            cursor.execute(f"DROP TABLE {name}")
+        return
+    start, end = day_bounds(day)
+    RailwayTrafficLog.objects.filter(timestamp__gte=start, timestamp__lt=end).delete()
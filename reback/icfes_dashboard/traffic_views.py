@@ -11,6 +11,7 @@ from django.shortcuts import render
 from django.utils import timezone
 from django.db.models.functions import TruncDate
 
+from icfes_dashboard import traffic_archive
 from icfes_dashboard.models import RailwayTrafficLog
 from reback.users.models import User
 
@@ -31,6 +32,24 @@ def _safe_pct(part, total):
     return round((part * 100.0) / total, 2)
 
 
+def _merge_counts(live_rows, archived_rows, key, limit=None):
+    """Live top-N rows plus the archive's (traffic_archive.summary), re-ranked by total."""
+    totals = Counter()
+    for row in list(live_rows) + archived_rows:
+        totals[row[key]] += row["total"]
+    return [{key: value, "total": total} for value, total in totals.most_common(limit)]
+
+
+def _merge_daily(live_rows, archived_rows, fields):
+    """Live per-day rows plus the archived days, summing `fields`."""
+    merged = {}
+    for row in list(live_rows) + archived_rows:
+        day = merged.setdefault(row["day"], {"day": row["day"], **dict.fromkeys(fields, 0)})
+        for field in fields:
+            day[field] += row[field] or 0
+    return [merged[day] for day in sorted(merged)]
+
+
 def _is_operational_error(status):
     code = status or 0
     return code >= 400 and code not in CONTROLLED_HTTP_STATUSES
@@ -235,7 +254,7 @@ def traffic_dashboard(request):
 
     days = request.GET.get("days", "7")
     try:
-        days_int = max(1, min(int(days), 90))
+        days_int = max(1, min(int(days), 365))
     except ValueError:
         days_int = 7
     explorer_ua = (request.GET.get("explorer_ua") or "").strip()
@@ -395,6 +414,27 @@ def traffic_dashboard(request):
         .order_by("-total")[:20]
     )
 
+    # Days already moved to Parquet by archive_traffic_logs (only for windows past the retention).
+    archived = traffic_archive.summary(since, now, CONTROLLED_HTTP_STATUSES)
+    if archived:
+        total_requests += archived["total"]
+        status_2xx += archived["s2xx"]
+        status_3xx += archived["s3xx"]
+        status_4xx += archived["s4xx"]
+        status_4xx_controlled += archived["s4xx_controlled"]
+        status_4xx_operational = max(status_4xx - status_4xx_controlled, 0)
+        status_5xx += archived["s5xx"]
+        human_count += archived["humans"]
+        bot_count = total_requests - human_count
+        bot_counts = _merge_counts(bot_counts, archived["bot_counts"], "bot_category")
+        status_counts = _merge_counts(status_counts, archived["status_counts"], "http_status", 10)
+        daily_status = _merge_daily(daily_status, archived["daily"], ["s2xx", "s3xx", "s4xx", "s5xx"])
+        daily_traffic_split = _merge_daily(daily_traffic_split, archived["daily"], ["total", "humans", "bots"])
+        top_paths = _merge_counts(top_paths, archived["top_paths"], "path", 25)
+        top_school_slugs = _merge_counts(top_school_slugs, archived["top_school_slugs"], "school_slug", 25)
+        top_404 = _merge_counts(top_404, archived["top_404"], "path", 20)
+        top_500 = _merge_counts(top_500, archived["top_500"], "path", 20)
+
     top_utm_campaigns = (
         base_qs.exclude(utm_campaign="")
         .values("utm_source", "utm_medium", "utm_campaign")
@@ -1052,6 +1092,7 @@ def traffic_dashboard(request):
     context = {
         "days": days_int,
         "since": since,
+        "archived_days": len(archived["days"]) if archived else 0,
         "total_requests": total_requests,
         "requests_5m": requests_5m,
         "requests_1h": requests_1h,
@@ -6,6 +6,7 @@ from django.views.generic import RedirectView
 from . import (
     api_views,
     bilingues_landing_views,
+    cache_views,
     email_graph_views,
     export_views,
     geo_landing_views,
@@ -16,6 +17,7 @@ from . import (
     traffic_views,
     views,
     views_cuadrante,
+    views_dashboard_bundle,
     views_ingles,
     views_mi_colegio,
     views_ml,
@@ -23,6 +25,7 @@ from . import (
     views_motivacional_landing,
     views_potencial,
     views_pronostico,
+    views_school_bundle,
     views_school_endpoints,
 )
 
@@ -56,6 +59,7 @@ urlpatterns = [
     path('ml/', views_ml.ml_dashboard, name='ml_dashboard'),
     path('motivacional/', views.motivacional_dashboard, name='motivacional_dashboard'),
     path('trafico/', traffic_views.traffic_dashboard, name='traffic_dashboard'),
+    path('api/cache/purge/', cache_views.api_cache_purge, name='api_cache_purge'),
     path('pronostico/', views_pronostico.pronostico_page, name='pronostico_colegio'),
 
     # API endpoints — Dashboard Motivacional
@@ -86,6 +90,8 @@ urlpatterns = [
     path('api/ml/generate-ia/', views_ml.api_ml_generate_ia, name='api_ml_generate_ia'),
     path('api/ml/partial-all/', views_ml.api_ml_partial_all, name='api_ml_partial_all'),
     path('api/ml/palancas/', views_ml.api_ml_palancas_colegio, name='api_ml_palancas_colegio'),
+    path('api/ml/what-if/', views_ml.api_ml_what_if, name='api_ml_what_if'),
+    path('api/ml/shap-colegio/', views_ml.api_ml_shap_colegio, name='api_ml_shap_colegio'),
     path('api/ml/palancas-nacional/', views_ml.api_ml_palancas_nacional, name='api_ml_palancas_nacional'),
 
     # API endpoints — Dashboard Social (NBI, conectividad, presidentes, generaciones)
@@ -277,6 +283,10 @@ urlpatterns = [
     path('api/colegio/<str:colegio_sk>/distribucion-niveles/',
          views.api_colegio_distribucion_niveles, name='api_colegio_distribucion_niveles'),
 
+    # Bundle: varias secciones del detalle del colegio en una sola petición
+    path('api/colegio/<str:colegio_sk>/bundle/',
+         views_school_bundle.api_colegio_bundle, name='api_colegio_bundle'),
+
     # Endpoints de Mapa Geográfico
     path('api/mapa-colegios/', views.api_mapa_colegios, name='api_mapa_colegios'),
     path('api/mapa-estudiantes-heatmap/', views.api_mapa_estudiantes_heatmap,
@@ -343,6 +353,7 @@ urlpatterns = [
     path('api/schools/search/', api_views.search_schools, name='search_schools'),
     path('api/departments/', api_views.get_departments, name='get_departments'),
     path('api/municipalities/', api_views.get_municipalities, name='get_municipalities'),
+    path('api/ranking/percentil/', api_views.score_ranking, name='score_ranking'),
 
     # Brecha Educativa API endpoints
     path('api/brecha/kpis/', api_views.brecha_kpis, name='brecha_kpis'),
@@ -355,6 +366,9 @@ urlpatterns = [
     path('api/brecha/tendencia-brecha/', api_views.brecha_tendencia_brecha_sector, name='brecha_tendencia_brecha'),
     path('api/brecha/area-fortalezas/', api_views.brecha_area_fortalezas, name='brecha_area_fortalezas'),
     path('api/brecha/zscore-distribucion/', api_views.brecha_zscore_distribucion, name='brecha_zscore_distribucion'),
+
+    # Bundles de dashboards (brecha / historia / inteligencia / ingles): NDJSON por panel
+    path('api/bundle/<slug:dashboard>/', views_dashboard_bundle.api_dashboard_bundle, name='api_dashboard_bundle'),
     
     # Módulo de invitaciones (solo superadmin)
     path('invitar/', invitacion_views.invitar, name='invitar'),
@@ -372,6 +386,10 @@ urlpatterns = [
          name='export_school_pdf'),
     path('export/comparison/pdf/', export_views.export_comparison_pdf,
          name='export_comparison_pdf'),
+    path('export/pdf/<str:job_id>/status/', export_views.export_pdf_status,
+         name='export_pdf_status'),
+    path('export/pdf/<str:job_id>/', export_views.export_pdf_download,
+         name='export_pdf_download'),
 ]
 
 
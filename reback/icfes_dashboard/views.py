@@ -5,7 +5,6 @@ Conecta con la base de datos DuckDB del proyecto dbt.
 from functools import wraps
 import logging
 import json
-import unicodedata
 
 import pandas as pd
 from django.contrib.admin.views.decorators import staff_member_required
@@ -13,7 +12,6 @@ from django.contrib.auth.decorators import login_required
 from django.core.cache import cache
 from django.http import JsonResponse
 from django.shortcuts import render
-from django.views.decorators.cache import cache_page
 from django.views.decorators.http import require_http_methods
 from reback.users.decorators import subscription_required
 
@@ -25,6 +23,9 @@ from .db_utils import (
     get_estadisticas_generales,
     get_promedios_ubicacion
 )
+from . import school_search
+from .gazetteer import departamento_variants, geo_key, get_gazetteer
+from .response_cache import compressed_cache_page
 from .views_school_endpoints import *
 
 logger = logging.getLogger(__name__)
@@ -99,51 +100,10 @@ def _public_api_rate_limit(max_requests=120, window_seconds=60):
 
 
 def _normalize_departamento_variants(name):
-    """Retorna variantes para filtrar departamento de forma robusta."""
+    """Retorna variantes para filtrar departamento de forma robusta (ver gazetteer)."""
     if not name:
         return None
-
-    raw = str(name).strip()
-    original = raw.upper()
-    no_accents = ''.join(
-        c for c in unicodedata.normalize('NFD', original)
-        if unicodedata.category(c) != 'Mn'
-    )
-    no_punct = ''.join(ch if ch.isalnum() or ch.isspace() else ' ' for ch in no_accents)
-    no_punct = ' '.join(no_punct.split())
-
-    values = set([raw, original, no_accents, no_punct])
-
-    if 'BOGOTA' in no_punct:
-        values.update([
-            'BOGOTA', 'BOGOTÁ',
-            'BOGOTA D.C.', 'BOGOTÁ D.C.',
-            'BOGOTA DC', 'BOGOTÁ DC',
-            'Bogotá DC', 'Bogotá D.C.', 'BOGOTA D C',
-        ])
-    if 'VALLE DEL CAUCA' in no_punct:
-        values.update(['VALLE', 'VALLE DEL CAUCA', 'Valle del Cauca'])
-    if 'NORTE DE SANTANDER' in no_punct:
-        values.update(['NORTE DE SANTANDER', 'NORTE SANTANDER'])
-    if 'SAN ANDRES' in no_punct:
-        values.update([
-            'SAN ANDRES',
-            'SAN ANDRES PROVIDENCIA Y SANTA CATALINA',
-            'ARCHIPIELAGO DE SAN ANDRES PROVIDENCIA Y SANTA CATALINA',
-            'Archipiélago de San Andrés, Providencia y Santa Catalina',
-        ])
-
-    return sorted(values)
-
-
-def _dept_key(value):
-    """Clave de comparación robusta para nombres de departamento."""
-    if value is None:
-        return ""
-    s = str(value).strip().upper()
-    s = ''.join(c for c in unicodedata.normalize('NFD', s) if unicodedata.category(c) != 'Mn')
-    s = ''.join(ch if ch.isalnum() or ch.isspace() else ' ' for ch in s)
-    return ' '.join(s.split())
+    return departamento_variants(name)
 
 
 # ============================================================================
@@ -245,7 +205,7 @@ def motivacional_dashboard(request):
 # ============================================================================
 
 @_public_api_rate_limit(max_requests=120, window_seconds=60)
-@cache_page(60 * 15)  # 15 minutos - estadísticas generales
+@compressed_cache_page(60 * 15)  # 15 minutos - estadísticas generales
 @require_http_methods(["GET"])
 def icfes_estadisticas_generales(request):
     """
@@ -260,7 +220,7 @@ def icfes_estadisticas_generales(request):
     return JsonResponse(stats, safe=False)
 
 
-@cache_page(60 * 60 * 24)  # 24 horas - lista de años cambia raramente
+@compressed_cache_page(60 * 60 * 24)  # 24 horas - lista de años cambia raramente
 @require_http_methods(["GET"])
 def icfes_anos_disponibles(request):
     """Endpoint: Lista de años disponibles.
@@ -274,7 +234,7 @@ def icfes_anos_disponibles(request):
 # ENDPOINTS API - TENDENCIAS REGIONALES
 # ============================================================================
 
-@cache_page(60 * 60)  # 1 hora - tendencias regionales
+@compressed_cache_page(60 * 60)  # 1 hora - tendencias regionales
 @require_http_methods(["GET"])
 def tendencias_regionales(request):
     """
@@ -337,7 +297,7 @@ def colegios_agregados(request):
 
 
 @_public_api_rate_limit(max_requests=60, window_seconds=60)
-@cache_page(60 * 30)  # 30 minutos - top colegios
+@compressed_cache_page(60 * 30)  # 30 minutos - top colegios
 @require_http_methods(["GET"])
 def colegios_destacados(request):
     """
@@ -436,7 +396,7 @@ def colegio_detalle(request, colegio_sk):
 # ENDPOINTS API - BRECHAS EDUCATIVAS
 # ============================================================================
 
-@cache_page(60 * 60)  # 1 hora - brechas educativas
+@compressed_cache_page(60 * 60)  # 1 hora - brechas educativas
 @require_http_methods(["GET"])
 def brechas_educativas(request):
     """
@@ -469,7 +429,7 @@ def brechas_educativas(request):
 # ENDPOINTS API - ANÁLISIS COMPARATIVOS
 # ============================================================================
 
-@cache_page(60 * 30)  # 30 minutos - comparación sectores
+@compressed_cache_page(60 * 30)  # 30 minutos - comparación sectores
 @require_http_methods(["GET"])
 def comparacion_sectores(request):
     """
@@ -504,7 +464,7 @@ def comparacion_sectores(request):
     return JsonResponse(data, safe=False)
 
 
-@cache_page(60 * 60)  # 1 hora - ranking departamental
+@compressed_cache_page(60 * 60)  # 1 hora - ranking departamental
 @require_http_methods(["GET"])
 def ranking_departamental(request):
     """
@@ -599,7 +559,7 @@ def icfes_resumen(request):
 # ENDPOINTS API - STORYTELLING EJECUTIVO
 # ============================================================================
 
-@cache_page(60 * 30)  # 30 minutos
+@compressed_cache_page(60 * 30)  # 30 minutos
 @require_http_methods(["GET"])
 def api_story_resumen_ejecutivo(request):
     """
@@ -691,7 +651,7 @@ def api_story_resumen_ejecutivo(request):
     return JsonResponse(df.to_dict(orient='records')[0], safe=False)
 
 
-@cache_page(60 * 60)  # 1 hora
+@compressed_cache_page(60 * 60)  # 1 hora
 @require_http_methods(["GET"])
 def api_story_serie_anual(request):
     """Endpoint: Serie anual consolidada (promedio, brecha y riesgo)."""
@@ -763,7 +723,7 @@ def api_story_serie_anual(request):
     return JsonResponse(df.to_dict(orient='records'), safe=False)
 
 
-@cache_page(60 * 30)  # 30 minutos
+@compressed_cache_page(60 * 30)  # 30 minutos
 @require_http_methods(["GET"])
 def api_story_brechas_clave(request):
     """
@@ -854,7 +814,7 @@ def api_story_brechas_clave(request):
     }, safe=False)
 
 
-@cache_page(60 * 15)  # 15 minutos
+@compressed_cache_page(60 * 15)  # 15 minutos
 @require_http_methods(["GET"])
 def api_story_priorizacion(request):
     """
@@ -948,11 +908,9 @@ def api_story_priorizacion(request):
 
     # Filtrado robusto por departamento en Python para evitar problemas de acentos/puntuación
     if depto_vals:
-        target_keys = {_dept_key(v) for v in depto_vals}
-        if 'BOGOTA DC' in target_keys or 'BOGOTA D C' in target_keys or 'BOGOTA' in target_keys:
-            target_keys.update({'BOGOTA', 'BOGOTA DC', 'BOGOTA D C'})
+        target_key = geo_key(departamento)
         if not df.empty:
-            df = df[df['departamento'].apply(lambda x: _dept_key(x) in target_keys)]
+            df = df[df['departamento'].map(geo_key) == target_key]
 
     if not df.empty:
         df = df.sort_values(by='priority_score', ascending=False).head(limit)
@@ -970,7 +928,7 @@ def api_story_priorizacion(request):
 # ENDPOINTS API - CHARTS DATA
 # ============================================================================
 
-@cache_page(60 * 60 * 24)  # Cache 24 horas - datos históricos no cambian
+@compressed_cache_page(60 * 60 * 24)  # Cache 24 horas - datos históricos no cambian
 @require_http_methods(["GET"])
 def api_tendencias_nacionales(request):
     """
@@ -998,7 +956,7 @@ def api_tendencias_nacionales(request):
     return JsonResponse(data, safe=False)
 
 
-@cache_page(60 * 30)  # Cache 30 minutos
+@compressed_cache_page(60 * 30)  # Cache 30 minutos
 @require_http_methods(["GET"])
 def api_comparacion_sectores_chart(request):
     """
@@ -1034,7 +992,7 @@ def api_comparacion_sectores_chart(request):
     return JsonResponse(data, safe=False)
 
 
-@cache_page(60 * 60)  # 1 hora - ranking departamental
+@compressed_cache_page(60 * 60)  # 1 hora - ranking departamental
 @require_http_methods(["GET"])
 def api_ranking_departamentos(request):
     """
@@ -1068,7 +1026,7 @@ def api_ranking_departamentos(request):
     return JsonResponse(data, safe=False)
 
 
-@cache_page(60 * 60)  # Cache 1 hora
+@compressed_cache_page(60 * 60)  # Cache 1 hora
 @require_http_methods(["GET"])
 def api_distribucion_regional(request):
     """
@@ -1441,8 +1399,17 @@ def hierarchy_history(request):
         )
     """
 
-    # strip_accents + upper normaliza variantes: "Boyacá" == "BOYACA" == "BOYACÁ"
-    norm = "strip_accents(upper(trim({}))) = strip_accents(upper(trim(?)))"
+    # Variantes conocidas del gazetteer ("Boyacá", "BOYACA", "BOYACÁ") → IN (...) sobre la
+    # columna cruda; normalizar cada fila con strip_accents(upper(trim())) impedía el pruning.
+    gazetteer = get_gazetteer()
+    variants = {
+        'region': gazetteer.region_variants,
+        'department': gazetteer.departamento_variants,
+        'municipality': gazetteer.municipio_variants,
+    }.get(level, lambda value: [value])(entity_id)
+
+    def norm(column):
+        return f"{column} IN ({', '.join(['?'] * len(variants))})"
 
     if level == 'region':
         query = f"""
@@ -1456,7 +1423,7 @@ def hierarchy_history(request):
                     AVG(avg_punt_ingles)               AS punt_ingles,
                     SUM(total_estudiantes)             AS total_estudiantes
                 FROM gold.vw_fct_colegios_region
-                WHERE {norm.format('region')}
+                WHERE {norm('region')}
                 GROUP BY ano
             ),
             {nacional_cte}
@@ -1477,7 +1444,7 @@ def hierarchy_history(request):
                     AVG(avg_punt_ingles)               AS punt_ingles,
                     SUM(total_estudiantes)             AS total_estudiantes
                 FROM gold.vw_fct_colegios_region
-                WHERE {norm.format('departamento')}
+                WHERE {norm('departamento')}
                 GROUP BY ano
             ),
             {nacional_cte}
@@ -1498,7 +1465,7 @@ def hierarchy_history(request):
                     AVG(avg_punt_ingles)               AS punt_ingles,
                     SUM(total_estudiantes)             AS total_estudiantes
                 FROM gold.fct_agg_colegios_ano
-                WHERE {norm.format('municipio')}
+                WHERE {norm('municipio')}
                 GROUP BY ano
             ),
             {nacional_cte}
@@ -1532,7 +1499,7 @@ def hierarchy_history(request):
         return JsonResponse({'error': 'Nivel no válido'}, status=400)
 
     try:
-        df = execute_query(query, params=[entity_id])
+        df = execute_query(query, params=[entity_id] if level == 'school' else variants)
         data = df.to_dict(orient='records')
         return JsonResponse(data, safe=False)
     except Exception as e:
@@ -1557,33 +1524,19 @@ def api_search_colegios(request):
     except (ValueError, TypeError):
         limit = 20
 
-    # Sanitizar el texto de búsqueda para LIKE (usar parámetros)
-    search_pattern      = f'%{query_text}%'
-    starts_with_pattern = f'{query_text}%'
-
-    query = '''
-        WITH latest AS (
-            SELECT colegio_sk, codigo_dane, nombre_colegio,
-                   departamento, municipio, sector,
-                   ROW_NUMBER() OVER (
-                       PARTITION BY codigo_dane
-                       ORDER BY CAST(ano AS INTEGER) DESC
-                   ) AS rn
-            FROM gold.fct_colegio_historico
-            WHERE LOWER(nombre_colegio) LIKE LOWER(?)
-               OR codigo_dane LIKE ?
-        )
-        SELECT colegio_sk, codigo_dane, nombre_colegio,
-               departamento, municipio, sector
-        FROM latest
-        WHERE rn = 1
-        ORDER BY
-            CASE WHEN LOWER(nombre_colegio) LIKE LOWER(?) THEN 0 ELSE 1 END,
-            nombre_colegio
-        LIMIT ?
-    '''
-    df = execute_query(query, params=[search_pattern, search_pattern, starts_with_pattern, limit])
-    return JsonResponse(df.to_dict(orient='records'), safe=False)
+    # Índice en memoria (school_search): sin acentos, abreviaturas I.E., ranking por relevancia
+    results = [
+        {
+            'colegio_sk': doc['colegio_sk'],
+            'codigo_dane': doc['codigo_dane'],
+            'nombre_colegio': doc['nombre_historico'],
+            'departamento': doc['departamento'],
+            'municipio': doc['municipio'],
+            'sector': doc['sector'],
+        }
+        for doc in school_search.search_schools(query_text, limit=limit, with_results=True)
+    ]
+    return JsonResponse(results, safe=False)
 
 
 @require_http_methods(["GET"])
@@ -3592,7 +3545,7 @@ def social_dashboard(request):
 
 
 @login_required
-@cache_page(60 * 60)
+@compressed_cache_page(60 * 60)
 def api_social_kpis(request):
     """4 KPIs de encabezado: municipios con NBI, NBI nacional prom, con internet, brecha pub/priv."""
     try:
@@ -3614,7 +3567,7 @@ def api_social_kpis(request):
 
 
 @login_required
-@cache_page(60 * 60)
+@compressed_cache_page(60 * 60)
 def api_social_nbi_brechas(request):
     """Puntaje promedio por categoría NBI (4 tiers) — 2024 y evolución 2010 vs 2024."""
     try:
@@ -3657,7 +3610,7 @@ def api_social_nbi_brechas(request):
 
 
 @login_required
-@cache_page(60 * 30)
+@compressed_cache_page(60 * 30)
 def api_social_colegios_heroes(request):
     """Colegios con mejor puntaje en municipios con NBI > umbral (default 40%)."""
     nbi_min = float(request.GET.get('nbi_min', 40))
@@ -3720,7 +3673,7 @@ def api_social_scatter_municipios(request):
 
 
 @login_required
-@cache_page(60 * 60)
+@compressed_cache_page(60 * 60)
 def api_social_conectividad_materias(request):
     """Correlación internet residencial vs cada materia + tiers conectividad vs puntaje."""
     try:
@@ -3780,7 +3733,7 @@ def api_social_conectividad_materias(request):
 
 
 @login_required
-@cache_page(60 * 60)
+@compressed_cache_page(60 * 60)
 def api_social_serie_historica(request):
     """Serie 1996-2024: puntaje por año con contexto presidencial y eventos."""
     try:
@@ -3808,7 +3761,7 @@ def api_social_serie_historica(request):
 
 
 @login_required
-@cache_page(60 * 60)
+@compressed_cache_page(60 * 60)
 def api_social_era_tecnologica(request):
     """Puntaje promedio por era tecnológica (pre-internet, YouTube, smartphones, IA)."""
     try:
@@ -3882,7 +3835,7 @@ def api_social_era_tecnologica(request):
 
 
 @login_required
-@cache_page(60 * 60)
+@compressed_cache_page(60 * 60)
 def api_social_brecha_sector(request):
     """Brecha puntaje oficial vs no-oficial por período de gobierno."""
     try:
@@ -3927,7 +3880,7 @@ def api_social_brecha_sector(request):
 
 
 @login_required
-@cache_page(60 * 5)
+@compressed_cache_page(60 * 5)
 def api_social_estrato(request):
     """Puntaje por estrato socioeconómico (E1–E6 + Sin Estrato) — snapshot 2024 + evolución 2014-2024."""
     try:
@@ -3953,7 +3906,7 @@ def api_social_estrato(request):
 
 
 @login_required
-@cache_page(60 * 60)
+@compressed_cache_page(60 * 60)
 def api_social_mapa_departamentos(request):
     """Puntaje + NBI + Inglés por departamento (2024) para el mapa coroplético."""
     try:
@@ -23,10 +23,11 @@ from django.core.cache import cache
 from django.http import Http404, JsonResponse
 from django.shortcuts import redirect, render
 from django.utils.text import slugify
-from django.views.decorators.cache import cache_page
 from django.views.decorators.http import require_GET
 
 from .db_utils import execute_query, get_departamentos, resolve_schema
+from .gazetteer import canonical_departamento, get_gazetteer
+from .response_cache import compressed_cache_page
 
 logger = logging.getLogger(__name__)
 
@@ -34,19 +35,6 @@ _CACHE_TTL = 60 * 60 * 2       # 2 hours  (API endpoint)
 _LANDING_CACHE_TTL = 60 * 60 * 24  # 24 hours (landing pages)
 _LANDING_ANO = 2024
 
-DEPT_NAME_CANONICAL = {
-    "BOGOTÁ": "Bogotá DC",
-    "BOGOTA": "Bogotá DC",
-    "BOGOTÁ DC": "Bogotá DC",
-    "ANTIOQUIA": "Antioquia",
-    "CALDAS": "Caldas",
-    "CASANARE": "Casanare",
-    "CAUCA": "Cauca",
-    "CUNDINAMARCA": "Cundinamarca",
-    "LA GUAJIRA": "La Guajira",
-    "SANTANDER": "Santander",
-}
-
 # ---------------------------------------------------------------------------
 # Metadata for landing pages
 # ---------------------------------------------------------------------------
@@ -100,18 +88,6 @@ _CUADRANTE_META = {
     },
 }
 
-_DEPTO_SLUG_ALIASES = {
-    "bogota": "Bogotá DC",
-    "bogota-dc": "Bogotá DC",
-    "norte-santander": "Norte de Santander",
-    "norte-de-santander": "Norte de Santander",
-    "san-andres": "San Andr",
-    "valle": "Valle del Cauca",
-    "valle-del-cauca": "Valle del Cauca",
-    "la-guajira": "La Guajira",
-    "amazonas": "Amazonas",
-}
-
 # Sort criteria for top-N per quadrant
 _SORT_CFG = {
     "estrella":    ("tendencia", False),           # highest tendencia first
@@ -262,34 +238,15 @@ def _clean_school_name(value):
 # ---------------------------------------------------------------------------
 
 def _resolve_depto_slug(slug):
-    """Map a URL slug to the exact departamento name stored in the DB.
-    Returns the DB name string or None if not found.
-    """
+    """Slug → nombre canónico del departamento (fct_agg_colegios_ano) o None."""
     slug = (slug or "").strip().lower()
     if not slug:
         return None
     try:
-        q = resolve_schema(
-            "SELECT DISTINCT departamento FROM gold.fct_agg_colegios_ano "
-            "WHERE CAST(ano AS INTEGER) = ? AND departamento IS NOT NULL "
-            "ORDER BY departamento"
-        )
-        df = execute_query(q, params=[_LANDING_ANO])
-        deptos = df["departamento"].tolist() if not df.empty else []
+        place = get_gazetteer().departamento(slug, primary_only=True)
     except Exception:
-        deptos = []
-
-    for dep in deptos:
-        if slugify(dep) == slug:
-            return dep
-
-    # Alias fallback (partial fragment match)
-    fragment = _DEPTO_SLUG_ALIASES.get(slug)
-    if fragment:
-        for dep in deptos:
-            if fragment.lower() in dep.lower():
-                return dep
-    return None
+        return None
+    return place.name if place else None
 
 
 def _resolve_municipio_slug(depto_nombre, slug):
@@ -545,7 +502,7 @@ def api_cuadrante_data(request):
 # SEO Landing page  — /cuadrante/<cuadrante>/[<depto_slug>/]
 # ---------------------------------------------------------------------------
 
-@cache_page(_LANDING_CACHE_TTL)
+@compressed_cache_page(_LANDING_CACHE_TTL)
 def cuadrante_landing(request, cuadrante, depto_slug=None, municipio_slug=None):
     """Public SEO landing page for a quadrant: national, by department, or by municipality."""
     if cuadrante not in _CUADRANTE_META:
@@ -593,7 +550,7 @@ def cuadrante_landing(request, cuadrante, depto_slug=None, municipio_slug=None):
     # Sanitize NaN floats → None (safe for JSON)
     for r in records:
         r["nombre_colegio"] = _clean_school_name(r.get("nombre_colegio"))
-        r["departamento"] = DEPT_NAME_CANONICAL.get(_clean_text(r.get("departamento")), _clean_text(r.get("departamento")))
+        r["departamento"] = canonical_departamento(_clean_text(r.get("departamento")))
         r["municipio"] = _clean_text(r.get("municipio"))
         for k in ("tendencia", "desempeno_relativo", "puntaje"):
             r[k] = _safe_float(r.get(k))
@@ -623,7 +580,7 @@ def cuadrante_landing(request, cuadrante, depto_slug=None, municipio_slug=None):
     # Department nav list (always shown)
     try:
         all_deptos = get_departamentos()
-        deptos_raw = [DEPT_NAME_CANONICAL.get(_clean_text(d), _clean_text(d)) for d in all_deptos if _clean_text(d)]
+        deptos_raw = [canonical_departamento(_clean_text(d)) for d in all_deptos if _clean_text(d)]
         deptos_raw.sort(key=lambda x: (x == x.upper(), x))
         seen_slugs = set()
         deptos_nav = []
@@ -0,0 +1,207 @@
+"""
+Bundles de los dashboards analíticos: /api/bundle/<dashboard>/?ano=&departamento=
+
+Brecha, historia, inteligencia e inglés piden entre 6 y 17 endpoints al
+cargar, cada uno con su petición HTTP, su pasada por middleware y su
+conexión. El bundle evalúa todos los paneles del dashboard para un juego de
+filtros en una sola petición:
+
+- los paneles son las vistas existentes (mismos datos, mismas claves de
+  caché que el endpoint individual);
+- corren en paralelo en un pool de hilos por worker, cada uno sobre un
+  cursor de la conexión DuckDB del request (db_utils.borrowed_cursor);
+- la respuesta es NDJSON en streaming: una línea por panel en cuanto termina,
+  {"panel", "status", "data"} o {"panel", "status", "error"}. Si el cliente
+  acepta gzip se comprime aquí con un flush por línea: GZipMiddleware
+  (railway) comprime los streams sin flush y entregaría todo al final.
+
+Query params: ?ano=, ?departamento= (según el dashboard) y ?panels=a,b para
+pedir solo algunos paneles.
+
+Cuenta contra el límite diario de SubscriptionMiddleware como una query por
+panel servido (request.query_cost), igual que los endpoints individuales; si
+no quedan queries para todos los paneles responde 429 sin servir ninguno.
+"""
+import json
+import logging
+import re
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.http import require_GET
+
+from reback.users.subscription_middleware import query_limit_response
+
+from . import api_views, views_ingles
+from .db_utils import borrowed_cursor, get_duckdb_connection
+from .views_school_bundle import section_request
+
+logger = logging.getLogger(__name__)
+
+_BRECHA_FILTERS = ('ano', 'departamento')
+
+# dashboard → {panel: (vista, filtros reenviados, parámetros fijos)}
+DASHBOARDS = {
+    'brecha': {
+        'kpis': (api_views.brecha_kpis, _BRECHA_FILTERS, {}),
+        'por_materia': (api_views.brecha_por_materia, _BRECHA_FILTERS, {}),
+        'tendencia_historica': (api_views.brecha_tendencia_historica, _BRECHA_FILTERS, {}),
+        'niveles_desempeno': (api_views.brecha_niveles_desempeno, _BRECHA_FILTERS, {}),
+        'departamental': (api_views.brecha_departamental, _BRECHA_FILTERS, {}),
+        'niveles_por_materia': (api_views.brecha_niveles_por_materia, _BRECHA_FILTERS, {}),
+        'convergencia_regional': (api_views.brecha_convergencia_regional, ('ano',), {}),
+        'tendencia_brecha': (api_views.brecha_tendencia_brecha_sector, _BRECHA_FILTERS, {}),
+        'area_fortalezas': (api_views.brecha_area_fortalezas, _BRECHA_FILTERS, {}),
+        'zscore_distribucion': (api_views.brecha_zscore_distribucion, _BRECHA_FILTERS, {}),
+    },
+    'historia': {
+        'tendencia': (api_views.historia_tendencia_nacional, (), {}),
+        'regiones': (api_views.historia_regiones, (), {}),
+        'brechas': (api_views.historia_brechas, (), {}),
+        'convergencia': (api_views.historia_convergencia, (), {}),
+        'riesgo': (api_views.historia_riesgo, (), {}),
+        'ingles': (api_views.historia_ingles, (), {}),
+    },
+    'inteligencia': {
+        'trayectorias': (api_views.inteligencia_trayectorias, (), {}),
+        'resilientes': (api_views.inteligencia_resilientes, (), {}),
+        'movilidad': (api_views.inteligencia_movilidad, (), {}),
+        'promesa_ingles': (api_views.inteligencia_promesa_ingles, (), {}),
+        'potencial': (api_views.inteligencia_potencial, (), {}),
+    },
+    # Mismos parámetros que dashboard-ingles.html al cargar (sin IA ni serie por colegio).
+    'ingles': {
+        'kpis': (views_ingles.api_ingles_kpis, ('ano', 'departamento'), {}),
+        'tendencia': (views_ingles.api_ingles_tendencia, ('departamento',), {}),
+        'distribucion': (views_ingles.api_ingles_distribucion, ('ano', 'departamento'), {}),
+        'colegios_top': (views_ingles.api_ingles_colegios_top, ('ano', 'departamento'), {}),
+        'mcer_historico': (views_ingles.api_ingles_mcer_historico, ('departamento',), {}),
+        'brechas': (views_ingles.api_ingles_brechas, (), {}),
+        'potencial_transformadores': (views_ingles.api_ingles_potencial, ('ano', 'departamento'), {'modo': 'transformadores'}),
+        'potencial_riesgo': (views_ingles.api_ingles_potencial, ('ano', 'departamento'), {'modo': 'riesgo'}),
+        'story': (views_ingles.api_ingles_story, ('ano',), {}),
+        'estado_animo': (views_ingles.api_ingles_estado_animo, ('ano',), {}),
+        'mapa_depto': (views_ingles.api_ingles_mapa_depto, ('ano',), {}),
+        'alertas_declive': (views_ingles.api_ingles_alertas_declive, ('ano',), {}),
+        'prediccion_mejora': (views_ingles.api_ingles_prediccion, ('departamento',), {'limit': '10', 'orden': 'mejora'}),
+        'prediccion_riesgo': (views_ingles.api_ingles_prediccion, ('departamento',), {'limit': '10', 'orden': 'riesgo'}),
+        'prioridad': (views_ingles.api_ingles_prioridad, ('ano',), {'limit': '20'}),
+        'clusters_depto': (views_ingles.api_ingles_clusters_depto, (), {}),
+        'correlaciones': (views_ingles.api_ingles_correlaciones, ('ano',), {}),
+    },
+}
+
+_ACCEPTS_GZIP = re.compile(r'\bgzip\b')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=max(1, getattr(settings, 'DASHBOARD_BUNDLE_WORKERS', 4)),
+                    thread_name_prefix='dashboard-bundle',
+                )
+    return _executor
+
+
+def parse_panels(dashboard, raw):
+    """'kpis,por_materia' → lista de paneles (todos si viene vacío). ValueError si hay desconocidos."""
+    panels = DASHBOARDS[dashboard]
+    if not raw:
+        return list(panels)
+    names = list(dict.fromkeys(p.strip() for p in raw.split(',') if p.strip()))
+    unknown = [p for p in names if p not in panels]
+    if unknown:
+        raise ValueError(', '.join(unknown))
+    return names
+
+
+def _panel_params(request, forwarded, fixed):
+    params = {name: request.GET[name] for name in forwarded if request.GET.get(name)}
+    params.update(fixed)
+    return params
+
+
+def _run_panel(conn, request, panel, view, params):
+    """Línea NDJSON del panel; corre en un hilo del pool sobre un cursor de `conn`."""
+    try:
+        with borrowed_cursor(conn):
+            response = view(section_request(request, params))
+        status, payload = response.status_code, json.loads(response.content)
+    except Exception:
+        logger.exception('[DashboardBundle] Panel %s falló', panel)
+        status, payload = 500, {'error': 'Error interno'}
+    line = {'panel': panel, 'status': status}
+    if status == 200:
+        line['data'] = payload
+    else:
+        line['error'] = payload.get('error') if isinstance(payload, dict) else 'Error'
+    return json.dumps(line, ensure_ascii=False, default=str) + '\n'
+
+
+def stream_panels(request, dashboard, panels):
+    """Genera una línea NDJSON por panel, en orden de finalización."""
+    spec = DASHBOARDS[dashboard]
+    with get_duckdb_connection() as conn:
+        futures = [
+            _get_executor().submit(
+                _run_panel, conn, request, panel, spec[panel][0],
+                _panel_params(request, spec[panel][1], spec[panel][2]),
+            )
+            for panel in panels
+        ]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def gzip_lines(lines):
+    """Comprime el stream en gzip con Z_SYNC_FLUSH tras cada línea: cada panel sale completo."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for line in lines:
+        yield compressor.compress(line.encode()) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+@require_GET
+def api_dashboard_bundle(request, dashboard):
+    """Todos los paneles de un dashboard como NDJSON en streaming."""
+    if dashboard not in DASHBOARDS:
+        return JsonResponse({'error': 'Dashboard desconocido'}, status=404)
+    try:
+        panels = parse_panels(dashboard, request.GET.get('panels'))
+    except ValueError as exc:
+        return JsonResponse({'error': f'Paneles desconocidos: {exc}'}, status=400)
+
+    ano = request.GET.get('ano')
+    if ano:
+        try:
+            int(ano)
+        except (ValueError, TypeError):
+            return JsonResponse({'error': 'ano inválido'}, status=400)
+
+    subscription = getattr(request, 'subscription', None)
+    if subscription is not None and subscription.get_remaining_queries() < len(panels):
+        return query_limit_response(subscription)
+    request.query_cost = len(panels)
+
+    lines = stream_panels(request, dashboard, panels)
+    gzipped = bool(_ACCEPTS_GZIP.search(request.META.get('HTTP_ACCEPT_ENCODING', '')))
+    response = StreamingHttpResponse(
+        gzip_lines(lines) if gzipped else lines, content_type='application/x-ndjson',
+    )
+    if gzipped:
+        # Con Content-Encoding puesto, GZipMiddleware deja la respuesta como está.
+        response['Content-Encoding'] = 'gzip'
+    patch_vary_headers(response, ('Accept-Encoding',))
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'   # que el proxy no acumule las líneas
+    return response
@@ -1053,8 +1053,9 @@ def api_ingles_ai_analisis(request):
     from icfes_dashboard.management.commands.generate_ingles_ia_analisis import (
         _get_duckdb_data_nacional, _get_duckdb_data_depto,
         _build_prompt_nacional, _build_prompt_depto,
-        _parse_sections, MODEL_IA, MAX_TOKENS,
+        _parse_sections, MODEL_IA, MAX_TOKENS, PROMPT_VERSION,
     )
+    from icfes_dashboard.ia_generation import input_hash
 
     ano         = int(request.GET.get('ano', 2024))
     departamento = request.GET.get('departamento', '').strip().upper()
@@ -1152,6 +1153,7 @@ def api_ingles_ai_analisis(request):
             modelo_ia=MODEL_IA,
             tokens_input=tokens_input,
             tokens_output=tokens_output,
+            input_hash=input_hash(data, MODEL_IA, PROMPT_VERSION),
         )
 
         return JsonResponse({
@@ -9,6 +9,8 @@ Endpoints:
   GET /icfes/api/ml/b1/                 → colegios que superan predicción B1
   GET /icfes/api/ml/partial-all/        → partial dependence de todas las variables accionables
   GET /icfes/api/ml/palancas/?colegio_bk=X → top-3 palancas de mejora para un colegio
+  GET /icfes/api/ml/shap-colegio/?colegio_bk=X&ano= → SHAP de población completa del colegio
+  GET /icfes/api/ml/what-if/?colegio_bk=X&escenario=internet:20,libros:1 → escenarios de palancas
   POST /icfes/api/ml/generate-ia/       → genera narrativa IA (staff only)
 """
 import logging
@@ -348,7 +350,7 @@ def api_ml_palancas_colegio(request):
         return JsonResponse({'error': 'colegio_bk requerido'}, status=400)
 
     try:
-        q = resolve_schema(f"""
+        q = resolve_schema("""
             SELECT
                 p.colegio_bk,
                 COALESCE(NULLIF(f.nombre_colegio, ''), p.colegio_bk) AS nombre_colegio,
@@ -361,11 +363,11 @@ def api_ml_palancas_colegio(request):
             LEFT JOIN gold.fct_agg_colegios_ano f
                 ON f.colegio_bk = SUBSTRING(p.colegio_bk, 2)
                 AND f.ano = '2024'
-            WHERE p.colegio_bk = '{colegio_bk}'
+            WHERE p.colegio_bk = ?
             ORDER BY p.palanca_rank
         """)
         with get_duckdb_connection() as con:
-            rows = con.execute(q).fetchall()
+            rows = con.execute(q, [colegio_bk]).fetchall()
 
         if not rows:
             return JsonResponse({'encontrado': False, 'colegio_bk': colegio_bk})
@@ -404,6 +406,136 @@ def api_ml_palancas_colegio(request):
         return JsonResponse({'error': str(e)}, status=500)
 
 
+# ---------------------------------------------------------------------------
+# API — Escenarios "qué pasaría si" sobre los estudiantes de un colegio
+# ---------------------------------------------------------------------------
+
+@login_required
+@require_GET
+def api_ml_what_if(request):
+    """Puntaje predicho del colegio si se mueven palancas, para cada escenario pedido.
+
+    Query params:
+        colegio_bk  — clave del colegio (ej. c105001000001)
+        escenario   — repetible, 'palanca:cambio,...' (ej. internet:20,libros:1).
+                      Sin escenario: cada palanca por separado.
+    """
+    from .ml import what_if
+
+    colegio_bk = request.GET.get('colegio_bk', '').strip()
+    if not colegio_bk:
+        return JsonResponse({'error': 'colegio_bk requerido'}, status=400)
+    raw = request.GET.getlist('escenario') or what_if.DEFAULT_SCENARIOS
+    if len(raw) > what_if.MAX_SCENARIOS:
+        return JsonResponse({'error': f'máximo {what_if.MAX_SCENARIOS} escenarios'}, status=400)
+    try:
+        scenarios = [what_if.parse_scenario(r) for r in raw]
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    try:
+        engine = what_if.get_engine()
+        if engine is None:
+            return JsonResponse({'encontrado': False, 'colegio_bk': colegio_bk, 'pending': True})
+        result = engine.evaluate(colegio_bk, scenarios)
+    except Exception as e:
+        logger.error("api_ml_what_if error: %s", e)
+        return JsonResponse({'error': str(e)}, status=500)
+
+    if result is None:
+        return JsonResponse({'encontrado': False, 'colegio_bk': colegio_bk})
+    for key in ('puntaje_real', 'puntaje_predicho'):
+        result[key] = round(result[key], 1)
+    for escenario in result['escenarios']:
+        escenario['puntaje_predicho'] = round(escenario['puntaje_predicho'], 1)
+        escenario['delta_pts'] = round(escenario['delta_pts'], 1)
+    return JsonResponse({'encontrado': True, 'colegio_bk': colegio_bk, **result})
+
+
+# ---------------------------------------------------------------------------
+# API — SHAP de población completa para un colegio
+# ---------------------------------------------------------------------------
+
+@login_required
+@require_GET
+def api_ml_shap_colegio(request):
+    """Contribuciones SHAP medias de todos los estudiantes del colegio, vs. su departamento.
+
+    Query params:
+        colegio_bk  — clave del colegio (ej. c105001000001)
+        ano         — año (default: el último con datos)
+    """
+    colegio_bk = request.GET.get('colegio_bk', '').strip()
+    if not colegio_bk:
+        return JsonResponse({'error': 'colegio_bk requerido'}, status=400)
+    ano = request.GET.get('ano')
+    if ano:
+        try:
+            ano = int(ano)
+        except (ValueError, TypeError):
+            return JsonResponse({'error': 'ano inválido'}, status=400)
+    else:
+        ano = None
+
+    from .ml.feature_engineering import FEATURE_COLS, FEATURE_ICONS, FEATURE_LABELS
+    from .ml.shap_population import table_path
+
+    path_colegio, path_depto = table_path('colegio_ano'), table_path('departamento_ano')
+    if not path_colegio.exists() or not path_depto.exists():
+        return JsonResponse({'encontrado': False, 'colegio_bk': colegio_bk, 'pending': True})
+
+    try:
+        with get_duckdb_connection() as con:
+            anos = con.execute(
+                "SELECT * FROM read_parquet(?) WHERE colegio_bk = ? ORDER BY ano DESC",
+                [str(path_colegio), colegio_bk],
+            ).fetchdf()
+            if ano is not None:
+                filas = anos[anos['ano'] == ano]
+            else:
+                filas = anos.head(1)
+            if filas.empty:
+                return JsonResponse({'encontrado': False, 'colegio_bk': colegio_bk})
+            colegio = filas.iloc[0]
+            depto = con.execute(
+                "SELECT * FROM read_parquet(?) WHERE departamento IS NOT DISTINCT FROM ? AND ano = ?",
+                [str(path_depto), colegio['departamento'], int(colegio['ano'])],
+            ).fetchdf()
+        depto = depto.iloc[0] if not depto.empty else None
+
+        contribuciones = [
+            {
+                'feature':           f,
+                'label':             FEATURE_LABELS[f],
+                'icono':             FEATURE_ICONS[f],
+                'shap_pts':          round(float(colegio[f'shap_{f}']), 2),
+                'abs_pts':           round(float(colegio[f'abs_{f}']), 2),
+                'shap_departamento': round(float(depto[f'shap_{f}']), 2) if depto is not None else None,
+            }
+            for f in FEATURE_COLS
+        ]
+        contribuciones.sort(key=lambda c: c['abs_pts'], reverse=True)
+        return JsonResponse({
+            'encontrado':       True,
+            'colegio_bk':       colegio_bk,
+            'departamento':     colegio['departamento'],
+            'ano':              int(colegio['ano']),
+            'anos':             sorted(int(a) for a in anos['ano']),
+            'n_estudiantes':    int(colegio['n']),
+            'puntaje_real':     round(float(colegio['puntaje_real']), 1),
+            'puntaje_predicho': round(float(colegio['puntaje_predicho']), 1),
+            'base':             round(float(colegio['base']), 1),
+            'departamento_puntaje_predicho': (
+                round(float(depto['puntaje_predicho']), 1) if depto is not None else None
+            ),
+            'contribuciones':   contribuciones,
+        })
+
+    except Exception as e:
+        logger.error("api_ml_shap_colegio error: %s", e)
+        return JsonResponse({'error': str(e)}, status=500)
+
+
 # ---------------------------------------------------------------------------
 # API — Resumen nacional de palancas educativas
 # ---------------------------------------------------------------------------
@@ -523,8 +655,9 @@ def api_ml_generate_ia(request):
     if not getattr(settings, 'ANTHROPIC_API_KEY', ''):
         return JsonResponse({'ok': False, 'error': 'ANTHROPIC_API_KEY no configurada'}, status=400)
 
+    from .ia_generation import input_hash
     from .management.commands.generate_ml_ia_analisis import (
-        _get_ml_data, _build_prompt, _llamar_api, _parse_sections, _guardar,
+        MODEL_IA, PROMPT_VERSION, _get_ml_data, _build_prompt, _llamar_api, _parse_sections, _guardar,
     )
     from .models import MlAnalisisIA
 
@@ -546,7 +679,8 @@ def api_ml_generate_ia(request):
         prompt      = _build_prompt(data, ano)
         analisis_md, tokens_in, tokens_out = _llamar_api(prompt)
         sections    = _parse_sections(analisis_md)
-        obj         = _guardar(ano, analisis_md, sections, tokens_in, tokens_out)
+        obj         = _guardar(ano, analisis_md, sections, tokens_in, tokens_out,
+                               input_hash(data, MODEL_IA, PROMPT_VERSION))
         logger.info("api_ml_generate_ia: ok id=%s tokens_out=%s", obj.pk, tokens_out)
         return JsonResponse({'ok': True, 'id': obj.pk, 'tokens': tokens_out})
     except Exception as e:
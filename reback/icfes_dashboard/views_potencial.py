@@ -19,10 +19,11 @@ from django.core.cache import cache
 from django.http import Http404, JsonResponse
 from django.shortcuts import redirect, render
 from django.utils.text import slugify
-from django.views.decorators.cache import cache_page
 from django.views.decorators.http import require_GET
 
 from .db_utils import execute_query, get_departamentos, resolve_schema
+from .gazetteer import canonical_departamento, get_gazetteer
+from .response_cache import compressed_cache_page
 
 logger = logging.getLogger(__name__)
 
@@ -39,33 +40,6 @@ _SECTOR_LABEL = {
     "privado": "Privados",
 }
 
-# Maps known raw-name variants (ALL-CAPS or short forms from fct_potencial_educativo)
-# to the canonical display name used in dim_colegios_slugs.
-# Used by nav dedup in views and sitemap_views to avoid duplicate dept buttons/URLs.
-DEPT_NAME_CANONICAL = {
-    "BOGOTÁ":    "Bogotá DC",
-    "BOGOTA":    "Bogotá DC",
-    "BOGOTÁ DC": "Bogotá DC",
-    "ANTIOQUIA": "Antioquia",
-    "CALDAS": "Caldas",
-    "CASANARE": "Casanare",
-    "CAUCA": "Cauca",
-    "CUNDINAMARCA": "Cundinamarca",
-    "LA GUAJIRA": "La Guajira",
-    "SANTANDER": "Santander",
-}
-
-_DEPTO_SLUG_ALIASES = {
-    "bogota": "Bogotá DC",
-    "bogota-dc": "Bogotá DC",
-    "norte-santander": "Norte de Santander",
-    "norte-de-santander": "Norte de Santander",
-    "san-andres": "San Andr",
-    "valle": "Valle del Cauca",
-    "valle-del-cauca": "Valle del Cauca",
-    "la-guajira": "La Guajira",
-}
-
 _QUERY = """
 SELECT
     p.nombre_colegio,
@@ -89,32 +63,15 @@ LIMIT 500
 
 
 def _resolve_depto_slug(slug: str):
-    """Slug → nombre canónico (de fct_agg_colegios_ano) o None si no existe."""
+    """Slug → nombre canónico del departamento (fct_agg_colegios_ano) o None."""
     slug = (slug or "").strip().lower()
     if not slug:
         return None
     try:
-        # Use canonical names from fct_agg_colegios_ano (same as views_cuadrante)
-        q = resolve_schema(
-            "SELECT DISTINCT departamento FROM gold.fct_agg_colegios_ano "
-            "WHERE CAST(ano AS INTEGER) = 2024 AND departamento IS NOT NULL "
-            "ORDER BY departamento"
-        )
-        df = execute_query(q)
-        deptos = df["departamento"].tolist() if not df.empty else []
+        place = get_gazetteer().departamento(slug, primary_only=True)
     except Exception:
-        deptos = []
-
-    for dep in deptos:
-        if slugify(dep) == slug:
-            return dep
-
-    fragment = _DEPTO_SLUG_ALIASES.get(slug)
-    if fragment:
-        for dep in deptos:
-            if fragment.lower() in dep.lower():
-                return dep
-    return None
+        return None
+    return place.name if place else None
 
 
 def _safe_float(v):
@@ -156,7 +113,7 @@ def _build_query(depto_name=None, sector_db=None):
 # Landing page view
 # ---------------------------------------------------------------------------
 
-@cache_page(_LANDING_CACHE_TTL)
+@compressed_cache_page(_LANDING_CACHE_TTL)
 def potencial_landing(request, first_slug=None, sector_slug=None):
     """
     Handles 4 URL patterns:
@@ -214,7 +171,7 @@ def potencial_landing(request, first_slug=None, sector_slug=None):
     # Sanitize NaN
     for r in records:
         r["nombre_colegio"] = _clean_school_name(r.get("nombre_colegio"))
-        r["departamento"] = DEPT_NAME_CANONICAL.get(_clean_text(r.get("departamento")), _clean_text(r.get("departamento")))
+        r["departamento"] = canonical_departamento(_clean_text(r.get("departamento")))
         r["municipio"] = _clean_text(r.get("municipio"))
         for k in ("puntaje_real", "puntaje_esperado", "exceso", "percentil_exceso"):
             r[k] = _safe_float(r.get(k))
@@ -244,7 +201,7 @@ def potencial_landing(request, first_slug=None, sector_slug=None):
         # (COALESCE returns dim_colegios_slugs name when join succeeds, uppercase
         #  from fct_potencial_educativo when it doesn't — same dept, two formats)
         deptos_raw = [
-            DEPT_NAME_CANONICAL.get(d.strip(), d)
+            canonical_departamento(d.strip())
             for d in nav_df["dep"].tolist() if d and d.strip()
         ]
         deptos_raw.sort(key=lambda x: (x == x.upper(), x))  # title-case first
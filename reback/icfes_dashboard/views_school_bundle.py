@@ -0,0 +1,166 @@
+"""
+Bundle del colegio: /api/colegio/<sk>/bundle/?sections=resumen,historico,...
+
+La página de detalle pedía una docena de endpoints por colegio (cada uno con
+su pasada por SubscriptionMiddleware, sesión y auth). El bundle corre las
+secciones pedidas en una sola petición, todas sobre la conexión DuckDB del
+hilo, y reutiliza las vistas existentes tal cual: cada sección devuelve lo
+mismo que su endpoint individual.
+
+Cada sección se cachea por separado (clave = versión del dataset + sección +
+colegio + parámetros de la sección), así un bundle con otra combinación de
+secciones reaprovecha lo ya calculado. Solo se cachean respuestas 200.
+
+Respuesta:
+    {"colegio_sk": ..., "sections": {nombre: datos}, "errors": {nombre: {"status", "error"}}}
+"""
+import copy
+import hashlib
+import json
+import logging
+
+from django.core.cache import cache
+from django.http import JsonResponse, QueryDict
+from django.views.decorators.http import require_http_methods
+
+from . import views, views_school_endpoints
+from .db_utils import execute_query, get_duckdb_connection, peek_dataset_version
+
+logger = logging.getLogger(__name__)
+
+BUNDLE_CACHE_TTL = 60 * 60 * 24   # la clave ya incluye la versión del dataset
+
+# nombre → (vista, parámetros GET que se le reenvían)
+SECTIONS = {
+    'resumen': (views.api_colegio_resumen, ()),
+    'historico': (views.api_colegio_historico, ()),
+    'correlaciones': (views.api_colegio_correlaciones, ()),
+    'fortalezas': (views.api_colegio_fortalezas, ()),
+    'comparacion': (views.api_colegio_comparacion, ()),
+    'comparacion_contexto': (views.api_colegio_comparacion_contexto, ('ano',)),
+    'comparacion_chart_data': (views.api_colegio_comparacion_chart_data, ('ano',)),
+    'indicadores_excelencia': (views.api_colegio_indicadores_excelencia, ()),
+    'indicadores_ingles': (views.api_colegio_indicadores_ingles, ()),
+    'distribucion_niveles': (views.api_colegio_distribucion_niveles, ('ano',)),
+    'ingles': (views_school_endpoints.api_colegio_ingles, ()),
+    'niveles_historico': (views_school_endpoints.api_colegio_niveles_historico, ()),
+    'similares': (views_school_endpoints.api_colegios_similares, ('limit',)),
+}
+
+# Secciones que necesitan un año: si no llega ?ano= se usa el último del colegio.
+_NEEDS_YEAR = {'comparacion_chart_data', 'distribucion_niveles'}
+
+
+def parse_sections(raw):
+    """'resumen,historico' → ['resumen', 'historico'] (todas si viene vacío). ValueError si hay desconocidas."""
+    if not raw:
+        return list(SECTIONS)
+    names = list(dict.fromkeys(s.strip() for s in raw.split(',') if s.strip()))
+    unknown = [s for s in names if s not in SECTIONS]
+    if unknown:
+        raise ValueError(', '.join(unknown))
+    return names
+
+
+def section_cache_key(section, colegio_sk, params):
+    dataset = peek_dataset_version()
+    version = dataset.version if dataset else 'none'
+    raw = json.dumps(sorted(params.items()))
+    digest = hashlib.md5(raw.encode('utf-8')).hexdigest()[:12]
+    return f'school-bundle:{version}:{section}:{colegio_sk}:{digest}'
+
+
+def _latest_year(colegio_sk):
+    df = execute_query("""
+        SELECT MAX(CAST(ano AS INTEGER)) AS ano
+        FROM gold.fct_colegio_historico
+        WHERE colegio_sk = ?
+    """, params=[str(colegio_sk)])
+    if df.empty or df['ano'][0] is None:
+        return None
+    return int(df['ano'][0])
+
+
+def section_request(request, params):
+    """Copia del request con solo los parámetros GET de la sección."""
+    sub = copy.copy(request)
+    sub.GET = QueryDict(mutable=True)
+    sub.GET.update(params)
+    return sub
+
+
+def _run_section(request, section, colegio_sk, params):
+    """(status, payload) de la vista de la sección."""
+    view, _ = SECTIONS[section]
+    try:
+        response = view(section_request(request, params), colegio_sk)
+        # Dentro del try: un cuerpo que no es JSON (página de error, 204,
+        # redirect) es un error de esa sección, no del bundle.
+        return response.status_code, json.loads(response.content)
+    except Exception:
+        logger.exception('[SchoolBundle] Sección %s falló (colegio_sk=%s)', section, colegio_sk)
+        return 500, {'error': 'Error interno'}
+
+
+@require_http_methods(["GET"])
+def api_colegio_bundle(request, colegio_sk):
+    """
+    Todas (o algunas) secciones del detalle del colegio en una respuesta.
+
+    Query params:
+        sections: lista separada por comas (default: todas, ver SECTIONS)
+        ano:      año para comparacion_contexto, comparacion_chart_data y
+                  distribucion_niveles; sin él, las dos últimas usan el último
+                  año del colegio y comparacion_contexto devuelve todos los años
+        limit:    número de colegios similares
+    """
+    if not colegio_sk or not str(colegio_sk).replace('-', '').replace('_', '').isalnum():
+        return JsonResponse({'error': 'colegio_sk inválido'}, status=400)
+
+    try:
+        sections = parse_sections(request.GET.get('sections'))
+    except ValueError as exc:
+        return JsonResponse({'error': f'Secciones desconocidas: {exc}'}, status=400)
+
+    ano = request.GET.get('ano')
+    if ano:
+        try:
+            ano = str(int(ano))
+        except (ValueError, TypeError):
+            return JsonResponse({'error': 'Parámetro ano inválido'}, status=400)
+
+    colegio_sk = str(colegio_sk)
+    out = {'colegio_sk': colegio_sk, 'sections': {}, 'errors': {}}
+
+    with get_duckdb_connection():
+        default_ano = ano
+        if not ano and _NEEDS_YEAR.intersection(sections):
+            latest = _latest_year(colegio_sk)
+            default_ano = str(latest) if latest else None
+
+        requested = {}
+        for section in sections:
+            _, forwarded = SECTIONS[section]
+            params = {name: request.GET[name] for name in forwarded if request.GET.get(name)}
+            section_ano = default_ano if section in _NEEDS_YEAR else ano
+            if section_ano and 'ano' in forwarded:
+                params['ano'] = section_ano
+            requested[section_cache_key(section, colegio_sk, params)] = (section, params)
+
+        cached = cache.get_many(list(requested))
+        fresh = {}
+        for key, (section, params) in requested.items():
+            if key in cached:
+                out['sections'][section] = cached[key]
+                continue
+            status, payload = _run_section(request, section, colegio_sk, params)
+            if status == 200:
+                out['sections'][section] = payload
+                fresh[key] = payload
+            else:
+                error = payload.get('error') if isinstance(payload, dict) else None
+                out['errors'][section] = {'status': status, 'error': error or 'Error'}
+
+    if fresh:
+        cache.set_many(fresh, BUNDLE_CACHE_TTL)
+    return JsonResponse(out)
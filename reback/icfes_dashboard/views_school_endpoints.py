@@ -3,12 +3,18 @@ New API endpoints for School Individual View.
 Append this content to icfes_dashboard/views.py
 """
 
+import logging
+
 from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods
 from .db_utils import execute_query
+from .ml.similar_schools import parse_weights
+from .ml.similar_schools import similar_schools as knn_similar_schools
 import pandas as pd
 import json
 
+logger = logging.getLogger(__name__)
+
 
 
 @require_http_methods(["GET"])
@@ -269,8 +275,13 @@ def api_colegio_resumen(request, colegio_sk):
 @require_http_methods(["GET"])
 def api_colegios_similares(request, colegio_sk):
     """
-    Encuentra colegios similares basados en el cluster del mismo año.
-    Query params: ?limit=5 (opcional)
+    Colegios similares: vecinos k-NN precalculados sobre los cinco puntajes
+    por área + sector, tamaño y NBI (python manage.py build_similar_schools).
+    Query params:
+      ?limit=5 (opcional, máx 20)
+      ?weights=matematicas:2,ingles:0,nbi:1 (opcional, solo usuarios autenticados;
+        recalcula los vecinos con esos pesos)
+    Sin índice construido, cae al cluster del mismo año ordenado por puntaje global.
     """
     # Validar colegio_sk
     if not colegio_sk or not str(colegio_sk).replace('-', '').replace('_', '').isalnum():
@@ -282,8 +293,80 @@ def api_colegios_similares(request, colegio_sk):
     except (ValueError, TypeError):
         limit = 5
 
+    weights = None
+    if request.GET.get('weights'):
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'Pesos personalizados requieren iniciar sesión'}, status=403)
+        try:
+            weights = parse_weights(request.GET['weights'])
+        except ValueError as exc:
+            return JsonResponse({'error': f'weights inválido: {exc}'}, status=400)
+
     colegio_sk_str = str(colegio_sk)
 
+    records = _similares_knn(colegio_sk_str, limit, weights)
+    if records is not None:
+        return JsonResponse(records, safe=False)
+    return _similares_por_cluster(colegio_sk_str, limit)
+
+
+def _similares_knn(colegio_sk_str, limit, weights=None):
+    """Records desde el índice k-NN, o None si el índice/colegio no está."""
+    df_target = execute_query("""
+        SELECT CAST(codigo_dane AS VARCHAR) AS codigo_dane, ano, avg_punt_global
+        FROM gold.fct_colegio_historico
+        WHERE colegio_sk = ?
+        ORDER BY CAST(ano AS INTEGER) DESC
+        LIMIT 1
+    """, params=[colegio_sk_str])
+    if df_target.empty:
+        return None
+
+    codigo = df_target['codigo_dane'][0]
+    try:
+        neighbors = knn_similar_schools(codigo, limit=limit, weights=weights)
+    except Exception:
+        logger.exception('Índice de colegios similares no disponible')
+        return None
+    if not neighbors:
+        return None
+
+    ano = neighbors[0][1]
+    codes = [code for code, _, _ in neighbors]
+    placeholders = ', '.join('?' for _ in codes)
+    df = execute_query(f"""
+        SELECT
+            colegio_sk,
+            nombre_colegio,
+            municipio,
+            departamento,
+            avg_punt_global,
+            total_estudiantes,
+            CAST(codigo_dane AS VARCHAR) AS codigo_dane
+        FROM gold.fct_colegio_historico
+        WHERE CAST(ano AS INTEGER) = ?
+          AND CAST(codigo_dane AS VARCHAR) IN ({placeholders})
+    """, params=[ano, *codes])
+    by_code = {row['codigo_dane']: row for row in df.to_dict(orient='records')}
+
+    target_score = df_target['avg_punt_global'][0]
+    records = []
+    for code, _, distancia in neighbors:
+        row = by_code.get(code)
+        if row is None:
+            continue
+        score = row['avg_punt_global']
+        row['diff_score'] = (
+            abs(score - target_score) if score is not None and target_score is not None else None
+        )
+        row['distancia'] = distancia
+        row['ano'] = ano
+        records.append(row)
+    return records
+
+
+def _similares_por_cluster(colegio_sk_str, limit):
+    """Fallback sin índice k-NN: mismo cluster y año, ordenado por puntaje global."""
     # 1. Obtener cluster y año del colegio objetivo (último disponible)
     query_target = """
         SELECT cluster_id, ano
@@ -0,0 +1,181 @@
+"""
+Worker boot warm-up.
+
+Started from gunicorn's post_worker_init hook (gunicorn.conf.py) in a
+background thread. Until it finishes, /health/ answers 503 so Railway does
+not switch traffic to a cold deploy. Steps:
+
+1. DuckDB file + connection pool (one pre-opened connection per gunicorn thread)
+2. Page in the hot columns of the landing tables (sequential scans)
+3. Populate the gazetteer, the in-process lru_caches (years, location
+   pairs), the dataset version, the school search and slug indexes, the
+   score distributions, the materialized leaderboards and the precomputed
+   similar-schools k-NN artefact
+4. One canary query per subsystem
+
+Steps 1 and 4 (DuckDB canaries) are required; anything else only logs. A
+failed required step retries the warm-up with exponential backoff
+(WORKER_WARMUP_ATTEMPTS); after the last attempt the worker is reported
+ready anyway with status "degraded", so /health/ never stays 503 for good.
+
+The warm-up runs on its own DuckDB connection (closed when it finishes),
+not on one of the pre-opened connections meant for request threads.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import gazetteer, leaderboards, school_search, score_distribution, slug_resolver
+from .ml import similar_schools
+from .db_utils import (
+    dedicated_connection,
+    get_dataset_version,
+    get_duckdb_connection,
+    prewarm_connections,
+    resolve_schema,
+)
+
+logger = logging.getLogger(__name__)
+
+# Sequential scans over the columns public pages read most, so the first
+# real request doesn't pay the page faults over the multi-GB file.
+_PREFETCH_QUERIES = {
+    "fct_agg_colegios_ano": """
+        SELECT COUNT(*), MAX(avg_punt_global), COUNT(DISTINCT departamento),
+               COUNT(DISTINCT municipio), MAX(total_estudiantes)
+        FROM gold.fct_agg_colegios_ano
+    """,
+    "fct_colegio_historico": """
+        SELECT COUNT(*), MAX(avg_punt_global), MAX(avg_punt_matematicas),
+               MAX(avg_punt_ingles), COUNT(DISTINCT codigo_dane), MAX(ano)
+        FROM gold.fct_colegio_historico
+    """,
+    "dim_colegios_slugs": """
+        SELECT COUNT(*), MAX(LENGTH(slug)), COUNT(DISTINCT codigo)
+        FROM gold.dim_colegios_slugs
+    """,
+}
+
+_CANARY_QUERIES = {
+    "landing": "SELECT slug FROM gold.dim_colegios_slugs LIMIT 1",
+    "geo": "SELECT departamento FROM gold.fct_agg_colegios_ano LIMIT 1",
+    "ranking": "SELECT codigo_dane, avg_punt_global FROM gold.fct_colegio_historico LIMIT 1",
+    "indicadores": "SELECT 1 FROM gold.fct_indicadores_desempeno LIMIT 1",
+}
+
+RETRY_BACKOFF_SECONDS = 5   # doubled after every failed attempt
+
+_ready = threading.Event()
+_started = False
+_lock = threading.Lock()
+_state = {"status": "idle", "steps": {}, "started_at": None, "finished_at": None}
+
+
+def is_ready():
+    """True once warm-up finished, or if it was never started (runserver, tests, commands)."""
+    return _ready.is_set() or not _started
+
+
+def state():
+    return dict(_state, steps=dict(_state["steps"]))
+
+
+def start_warmup(threads=None):
+    """Start the warm-up in a daemon thread (idempotent per process)."""
+    global _started
+    with _lock:
+        if _started:
+            return
+        _started = True
+    threading.Thread(
+        target=run_warmup,
+        kwargs={"threads": threads},
+        name="icfes-warmup",
+        daemon=True,
+    ).start()
+
+
+def _step(name, func, required=False):
+    t0 = time.perf_counter()
+    try:
+        result = func()
+    except Exception as exc:
+        _state["steps"][name] = {"ok": False, "ms": round((time.perf_counter() - t0) * 1000), "error": str(exc)}
+        logger.warning("[warmup] %s failed: %s", name, exc)
+        if required:
+            raise
+        return None
+    _state["steps"][name] = {"ok": True, "ms": round((time.perf_counter() - t0) * 1000)}
+    return result
+
+
+def _run_sql(query):
+    def _run():
+        with get_duckdb_connection() as conn:
+            return conn.execute(resolve_schema(query)).fetchall()
+    return _run
+
+
+def _warm_dimension_caches():
+    # Imported lazily: view modules pull in templates/ML helpers.
+    from . import longtail_landing_views
+
+    gazetteer.get_gazetteer()
+    years = longtail_landing_views._get_cached_years_snapshot()
+    for year in years[:2]:
+        for sector in ("OFICIAL", "NO OFICIAL"):
+            longtail_landing_views._get_location_pairs(sector, year)
+
+
+def _check_redis():
+    cache.set("warmup:canary", 1, timeout=60)
+    if cache.get("warmup:canary") != 1:
+        raise RuntimeError("Redis no respondió")
+
+
+def _warm_once(threads):
+    # Retries keep the connections already opened by a previous attempt.
+    if not _state["steps"].get("connections", {}).get("ok"):
+        _step("connections", lambda: prewarm_connections(threads), required=True)
+    with dedicated_connection():
+        for table, query in _PREFETCH_QUERIES.items():
+            _step(f"prefetch:{table}", _run_sql(query))
+        _step("dimension_caches", _warm_dimension_caches)
+        _step("dataset_version", get_dataset_version)
+        _step("search_index", school_search.get_index)
+        _step("slug_index", slug_resolver.get_index)
+        _step("score_distributions", score_distribution.get_distributions)
+        _step("leaderboards", leaderboards.get_leaderboards)
+        _step("similar_index", similar_schools.get_index)
+        for subsystem, query in _CANARY_QUERIES.items():
+            _step(f"canary:{subsystem}", _run_sql(query), required=subsystem != "indicadores")
+    _step("canary:redis", _check_redis)
+
+
+def run_warmup(threads=None, attempts=None):
+    threads = threads or getattr(settings, "WORKER_WARMUP_CONNECTIONS", 4)
+    attempts = max(1, attempts or getattr(settings, "WORKER_WARMUP_ATTEMPTS", 3))
+    _state.update(status="running", started_at=time.time(), attempts=0)
+    t0 = time.perf_counter()
+    for attempt in range(1, attempts + 1):
+        _state["attempts"] = attempt
+        try:
+            _warm_once(threads)
+        except Exception:
+            logger.error("[warmup] attempt %s/%s failed: %s", attempt, attempts, _state["steps"])
+            if attempt < attempts:
+                time.sleep(RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1))
+            continue
+        _state.update(status="ready", finished_at=time.time())
+        _ready.set()
+        logger.warning("[warmup] worker ready in %.1fs", time.perf_counter() - t0)
+        return True
+
+    # Serve cold rather than fail the health check forever.
+    _state.update(status="degraded", finished_at=time.time())
+    _ready.set()
+    logger.error("[warmup] worker degraded after %s attempts (%.1fs)", attempts, time.perf_counter() - t0)
+    return False
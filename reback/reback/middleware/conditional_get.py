@@ -0,0 +1,163 @@
+"""
+Dataset-versioned conditional GET for public pages, sitemaps and public APIs.
+
+Public content only changes when a new DuckDB gold file is deployed, so the
+validators are derived from the dataset version (computed once per loaded
+file, see icfes_dashboard.db_utils.get_dataset_version), the request URL,
+HTTP_TEMPLATE_VERSION (commit SHA on Railway) and the tokens of the cache
+tags the response carries (response_cache.add_cache_tags): purging a
+school's tag rotates the validators of that school's pages only.
+Crawlers re-fetching a URL with If-None-Match / If-Modified-Since get a 304
+before any view or DuckDB work runs.
+
+A URL's tags are only known once some worker has served it: they are stored
+in the shared cache under the URL, so the pre-view check costs one get for
+the URL's tags plus one get_many for their tokens (none for untagged URLs),
+on any worker and across restarts. A URL nobody has served yet, or whose
+entry expired, falls through to the view once.
+
+ETags are strong for identity bodies. Pre-compressed cache hits get a weak
+ETag (same content, different encoding), and GZipMiddleware weakens the ones
+it compresses; If-None-Match uses weak comparison so all of them validate.
+"""
+import hashlib
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from icfes_dashboard.db_utils import get_dataset_version, peek_dataset_version
+from icfes_dashboard.response_cache import tag_tokens, token_purged_at
+
+# Paths whose content depends only on the dataset (same for every visitor).
+# Keep in sync with public_cache._PUBLIC_PREFIXES. The bare /icfes/colegio/
+# and /icfes/cuadrante/ are login-protected dashboards, so those two only
+# match with a slug segment: a 304 must never skip a view's auth check.
+_CONDITIONAL_PATTERNS = (
+    r"/icfes/colegio/[^/]+/",
+    r"/icfes/departamento/",
+    r"/icfes/municipio/",
+    r"/icfes/departamentos/",
+    r"/icfes/ranking/",
+    r"/icfes/historico/",
+    r"/icfes/materia/",
+    r"/icfes/colegios-bilingues/",
+    r"/icfes/colegios-que-mas-mejoraron/",
+    r"/icfes/supero-prediccion/",
+    r"/icfes/cuadrante/[^/]+/",
+    r"/icfes/bandas-motivacionales/",
+    r"/icfes/ingles-seo/",
+    r"/icfes/og/",
+    r"/icfes/api/estadisticas/",
+    r"/icfes/api/anos/",
+    r"/icfes/api/tendencias/",
+    r"/icfes/api/brechas/",
+    r"/icfes/api/comparacion-sectores/",
+    r"/icfes/api/ranking-departamental/",
+    r"/icfes/api/colegios/destacados/",
+    r"/icfes/api/charts/",
+    r"/icfes/api/story/",
+    r"/social-card/",
+    r"/email-graphs/",
+    r"/sitemap",
+)
+_CONDITIONAL_RE = re.compile("|".join(_CONDITIONAL_PATTERNS))
+
+
+def _is_conditional_path(path):
+    return _CONDITIONAL_RE.match(path) is not None
+
+
+# full path → tags of its last 200 response, shared by every worker
+_URL_TAGS_PREFIX = "cond:tags:"
+_URL_TAGS_TIMEOUT = 30 * 24 * 3600
+
+
+def _url_tags_key(full_path):
+    return _URL_TAGS_PREFIX + hashlib.md5(full_path.encode("utf-8"), usedforsecurity=False).hexdigest()
+
+
+def _known_tags(full_path):
+    """Tags last served for this URL (tuple, empty when untagged), or None if never seen."""
+    tags = cache.get(_url_tags_key(full_path))
+    return tuple(tags) if tags is not None else None
+
+
+def _response_tag_tokens(request, response):
+    tokens = getattr(response, "cache_tag_tokens", None)
+    if tokens is None:
+        tokens = tag_tokens(getattr(request, "_cache_tags", None) or ())
+    return tokens
+
+
+def _remember_tags(full_path, tokens, known):
+    tags = tuple(sorted(tokens))
+    if tags != known:
+        cache.set(_url_tags_key(full_path), tags, _URL_TAGS_TIMEOUT)
+
+
+def _validators(request, dataset, tokens):
+    template_version = getattr(settings, "HTTP_TEMPLATE_VERSION", "")
+    tag_key = ",".join(f"{tag}={token}" for tag, token in sorted(tokens.items()))
+    url_key = f"{request.get_full_path()}|{template_version}|{tag_key}"
+    url_hash = hashlib.md5(url_key.encode("utf-8"), usedforsecurity=False).hexdigest()[:12]
+    etag = f'"{dataset.version}-{url_hash}"'
+    # Same on every worker: template-only deploys rotate the ETag (which
+    # takes precedence over If-Modified-Since), not Last-Modified.
+    purged_at = max((token_purged_at(token) for token in tokens.values()), default=0)
+    last_modified = int(max(dataset.updated_at.timestamp(), purged_at))
+    return etag, last_modified
+
+
+class DatasetConditionalGetMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if (
+            not getattr(settings, "CONDITIONAL_GET_ENABLED", True)
+            or request.method not in ("GET", "HEAD")
+            or not _is_conditional_path(request.path)
+        ):
+            return self.get_response(request)
+
+        # Before the view: only use an already-computed version and the tags
+        # some worker already served for this URL, never open DuckDB here.
+        dataset = peek_dataset_version()
+        full_path = request.get_full_path()
+        tags = _known_tags(full_path) if dataset is not None else None
+        if tags is not None:
+            etag, last_modified = _validators(request, dataset, tag_tokens(tags))
+            conditional = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if conditional is not None:
+                # 304 (or 412 on a failed If-Match) — nothing else runs.
+                conditional["ETag"] = etag
+                conditional["Last-Modified"] = http_date(last_modified)
+                request._cache_status = "NOT_MODIFIED"
+                return conditional
+
+        response = self.get_response(request)
+        if (
+            response.status_code != 200
+            or response.streaming
+            or response.has_header("ETag")
+            or response.cookies
+        ):
+            return response
+
+        dataset = dataset or get_dataset_version()
+        if dataset is None:
+            return response
+
+        tokens = _response_tag_tokens(request, response)
+        _remember_tags(full_path, tokens, tags)
+        etag, last_modified = _validators(request, dataset, tokens)
+        if response.has_header("Content-Encoding"):
+            etag = f"W/{etag}"
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(last_modified)
+        # URL not seen yet (or its tags changed): the view ran, but a
+        # matching client still gets the 304 instead of the body.
+        return get_conditional_response(request, etag=etag, last_modified=last_modified, response=response)
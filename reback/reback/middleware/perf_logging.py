@@ -6,6 +6,8 @@ import time
 
 from django.conf import settings
 
+from icfes_dashboard.response_cache import is_cache_warm_request
+
 
 perf_logger = logging.getLogger("perf")
 _NOISY_PATH_PREFIXES = ("/static/", "/media/")
@@ -14,7 +16,7 @@ _NOISY_PATHS = ("/favicon.ico", "/robots.txt", "/sitemap.xml")
 
 class CacheDebugHeaderMiddleware:
     """
-    Attach cache status as X-Cache response header.
+    Attach cache status as X-Cache response header (always for warm_cache requests).
     """
 
     def __init__(self, get_response):
@@ -22,7 +24,7 @@ class CacheDebugHeaderMiddleware:
 
     def __call__(self, request):
         response = self.get_response(request)
-        if getattr(settings, "CACHE_DEBUG_HEADER_ENABLED", False):
+        if getattr(settings, "CACHE_DEBUG_HEADER_ENABLED", False) or is_cache_warm_request(request):
             response["X-Cache"] = getattr(request, "_cache_status", "BYPASS")
         return response
 
@@ -8,6 +8,8 @@ import logging
 from django.core.cache import cache
 from django.http import HttpResponse
 
+from icfes_dashboard.response_cache import is_cache_warm_request
+
 logger = logging.getLogger(__name__)
 
 # Paths worth rate-limiting (scraper targets)
@@ -39,6 +41,8 @@ class RateLimitMiddleware:
         path = request.path_info or ""
         if not any(path.startswith(p) for p in _RATE_LIMITED_PREFIXES):
             return self.get_response(request)
+        if is_cache_warm_request(request):
+            return self.get_response(request)
 
         ip = _client_ip(request)
         key = f"rl:{ip}"
@@ -7,10 +7,11 @@ import time
 import uuid
 
 from django.conf import settings
-from django.db import DatabaseError, IntegrityError
+from django.db import DatabaseError
 from django.utils import timezone
 
 from icfes_dashboard.models import RailwayTrafficLog
+from icfes_dashboard.response_cache import is_cache_warm_request
 from icfes_dashboard.traffic_utils import classify_bot, extract_path_fields
 
 
@@ -49,6 +50,9 @@ class TrafficIngestMiddleware:
 
         if not getattr(settings, "TRAFFIC_ANALYTICS_ENABLED", False):
             return response
+        # Cache warmer requests are not traffic (and would skew its own ranking).
+        if is_cache_warm_request(request):
+            return response
 
         try:
             full_path = request.get_full_path() or request.path or ""
@@ -93,12 +97,9 @@ class TrafficIngestMiddleware:
                 utm_medium=fields["utm_medium"],
                 utm_campaign=fields["utm_campaign"],
             )
-            try:
-                RailwayTrafficLog.objects.create(**payload)
-            except IntegrityError:
-                # Retry with a generated id if upstream request id collides.
-                payload["request_id"] = str(uuid.uuid4())
-                RailwayTrafficLog.objects.create(**payload)
+            # request_id is not unique: a later JSONL import of the same
+            # request is skipped by the importer, not here.
+            RailwayTrafficLog.objects.create(**payload)
 
             TrafficIngestMiddleware.captured_count += 1
             if getattr(settings, "TRAFFIC_ANALYTICS_DEBUG_LOGS", False):
@@ -125,6 +125,20 @@ def subscription_required(tier='pro'):
     return decorator
 
 
+def user_has_tier(user, tier: str) -> bool:
+    """True if `user` (superusers always) has an active plan at or above `tier`."""
+    if not user.is_authenticated:
+        return False
+    if user.is_superuser:
+        return True
+    subscription = (
+        UserSubscription.objects.select_related('plan')
+        .filter(user=user, is_active=True)
+        .first()
+    )
+    return subscription is not None and _tier_level(subscription.plan.tier) >= _tier_level(tier)
+
+
 def _redirect_with_message(request, required_tier: str, user_tier: str = 'free'):
     """Helper: add a contextual warning message before redirecting."""
     required_name = TIER_DISPLAY_NAMES.get(required_tier, required_tier.capitalize())
@@ -9,6 +9,18 @@ from datetime import date
 import time
 
 
+def query_limit_response(subscription):
+    """429 de límite diario de queries alcanzado."""
+    return JsonResponse({
+        'error': 'Daily query limit exceeded',
+        'message': f'You have reached your daily limit of {subscription.plan.max_queries_per_day} queries',
+        'current_plan': subscription.plan.tier,
+        'queries_used': subscription.queries_today,
+        'queries_limit': subscription.plan.max_queries_per_day,
+        'upgrade_url': reverse('pages:pricing')
+    }, status=429)
+
+
 class SubscriptionMiddleware:
     """
     Middleware para verificar permisos de suscripción antes de cada request.
@@ -67,14 +79,7 @@ class SubscriptionMiddleware:
                 
                 # Verificar límite de queries diarias (solo para endpoints no exentos)
                 if not is_exempt and not subscription.can_make_query():
-                    return JsonResponse({
-                        'error': 'Daily query limit exceeded',
-                        'message': f'You have reached your daily limit of {subscription.plan.max_queries_per_day} queries',
-                        'current_plan': subscription.plan.tier,
-                        'queries_used': subscription.queries_today,
-                        'queries_limit': subscription.plan.max_queries_per_day,
-                        'upgrade_url': reverse('pages:pricing')
-                    }, status=429)
+                    return query_limit_response(subscription)
                 
                 # Agregar info de suscripción al request
                 request.subscription = subscription
@@ -107,7 +112,8 @@ class SubscriptionMiddleware:
             ])
             
             if 200 <= response.status_code < 300 and not is_exempt:
-                request.subscription.increment_query_count()
+                # Los bundles cuentan una query por panel servido (request.query_cost)
+                request.subscription.increment_query_count(getattr(request, 'query_cost', 1))
                 
                 # Registrar en log
                 response_time = int((time.time() - request._start_time) * 1000)
@@ -166,10 +166,10 @@ class UserSubscription(models.Model):
         self.reset_daily_queries_if_needed()
         return self.queries_today < self.plan.max_queries_per_day
     
-    def increment_query_count(self):
-        """Incrementa el contador de queries."""
+    def increment_query_count(self, count=1):
+        """Incrementa el contador de queries (count > 1 para bundles de varios paneles)."""
         self.reset_daily_queries_if_needed()
-        self.queries_today += 1
+        self.queries_today += count
         self.save(update_fields=['queries_today'])
     
     def get_remaining_queries(self):